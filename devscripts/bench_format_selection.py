@@ -0,0 +1,87 @@
+#!/usr/bin/env python
+from __future__ import unicode_literals, print_function
+
+"""
+Benchmark format selection over YouTube like format lists, comparing
+a selector built again for every video (as before) with the one
+YoutubeDL.build_format_selector keeps for each format spec.
+"""
+
+import optparse
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from youtube_dl import YoutubeDL
+from youtube_dl.extractor import YoutubeIE
+
+ITAGS = [
+    '5', '17', '18', '22', '36', '43', '139', '140', '141', '133', '134',
+    '135', '136', '137', '160', '171', '172', '242', '243', '244', '247',
+    '248', '249', '250', '251', '264', '266', '271', '278', '298', '299',
+    '302', '303', '313',
+]
+
+SPECS = [
+    'bestvideo+bestaudio/best',
+    'best[height<=720]',
+    'bestvideo[height<=?1080][ext=mp4]+bestaudio[ext=m4a]/best[ext=mp4]/best',
+    '(mp4,webm)[filesize<50M][fps>30]',
+    '22/18/best',
+]
+
+
+def youtube_formats():
+    ie = YoutubeIE(YoutubeDL({'quiet': True}))
+    formats = []
+    for i, itag in enumerate(ITAGS):
+        f = dict(YoutubeIE._formats[itag])
+        if f.get('format_note') == 'DASH audio':
+            f['vcodec'] = 'none'
+        elif f.get('format_note') == 'DASH video':
+            f['acodec'] = 'none'
+        f.update({
+            'format_id': itag,
+            'url': 'https://r1---sn-example.googlevideo.com/videoplayback?itag=%s' % itag,
+            'filesize': 1000000 * (i + 1),
+            'http_headers': {'Referer': 'https://www.youtube.com/'},
+        })
+        formats.append(f)
+    ie._sort_formats(formats)
+    return formats
+
+
+def main():
+    parser = optparse.OptionParser(usage='%prog [options]')
+    parser.add_option(
+        '-n', '--number', type=int, default=200,
+        help='Number of videos to select formats for')
+    opts, _ = parser.parse_args()
+
+    ydl = YoutubeDL({'quiet': True})
+    formats = youtube_formats()
+    ctx = {'formats': formats, 'incomplete_formats': False}
+
+    def rebuilt(spec):
+        ydl._format_selectors.clear()
+        return list(ydl.build_format_selector(spec)(ctx))
+
+    def reused(spec):
+        return list(ydl.build_format_selector(spec)(ctx))
+
+    print('%d formats, %d videos' % (len(formats), opts.number))
+    for spec in SPECS:
+        selected = [f['format_id'] for f in rebuilt(spec)]
+        assert selected == [f['format_id'] for f in reused(spec)]
+        timings = [
+            min(timeit.repeat(lambda: func(spec), number=opts.number, repeat=3))
+            for func in (rebuilt, reused)]
+        print('%-72s -> %s' % (spec, ', '.join(selected)))
+        print('    rebuilt: %8.2f ms   reused: %8.2f ms (%.1fx)' % (
+            timings[0] * 1000, timings[1] * 1000, timings[0] / timings[1]))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,168 @@
+#!/usr/bin/env python
+from __future__ import unicode_literals, print_function
+
+"""
+Benchmark utils.js_to_json against the previous regex based implementation,
+checking that both give the same output on every sample.
+
+Samples are the inputs js_to_json gets from extractors. Capture them once
+(this needs network access) by running the tests of some extractors:
+
+    devscripts/bench_js_to_json.py --capture DIR [IE_NAME ...]
+
+and benchmark them afterwards with
+
+    devscripts/bench_js_to_json.py DIR
+
+Without a directory, a synthetic corpus resembling jwplayer setups and
+inline player configs is used.
+"""
+
+import io
+import optparse
+import os
+import re
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import youtube_dl
+from youtube_dl import utils
+
+
+def js_to_json_re(code):
+    COMMENT_RE = r'/\*(?:(?!\*/).)*?\*/|//[^\n]*'
+    SKIP_RE = r'\s*(?:{comment})?\s*'.format(comment=COMMENT_RE)
+    INTEGER_TABLE = (
+        (r'(?s)^(0[xX][0-9a-fA-F]+){skip}:?$'.format(skip=SKIP_RE), 16),
+        (r'(?s)^(0+[0-7]+){skip}:?$'.format(skip=SKIP_RE), 8),
+    )
+
+    def fix_kv(m):
+        v = m.group(0)
+        if v in ('true', 'false', 'null'):
+            return v
+        elif v.startswith('/*') or v.startswith('//') or v == ',':
+            return ""
+
+        if v[0] in ("'", '"'):
+            v = re.sub(r'(?s)\\.|"', lambda m: {
+                '"': '\\"',
+                "\\'": "'",
+                '\\\n': '',
+                '\\x': '\\u00',
+            }.get(m.group(0), m.group(0)), v[1:-1])
+
+        for regex, base in INTEGER_TABLE:
+            im = re.match(regex, v)
+            if im:
+                i = int(im.group(1), base)
+                return '"%d":' % i if v.endswith(':') else '%d' % i
+
+        return '"%s"' % v
+
+    return re.sub(r'''(?sx)
+        "(?:[^"\\]*(?:\\\\|\\['"nurtbfx/\n]))*[^"\\]*"|
+        '(?:[^'\\]*(?:\\\\|\\['"nurtbfx/\n]))*[^'\\]*'|
+        {comment}|,(?={skip}[\]}}])|
+        [a-zA-Z_][.a-zA-Z_0-9]*|
+        \b(?:0[xX][0-9a-fA-F]+|0+[0-7]+)(?:{skip}:)?|
+        [0-9]+(?={skip}:)
+        '''.format(comment=COMMENT_RE, skip=SKIP_RE), fix_kv, code)
+
+
+def synthetic_corpus():
+    source = '''{
+        file: 'https://cdn.example.com/videos/%(i)d/master.m3u8',
+        image: "https:\\/\\/cdn.example.com\\/thumbs\\/%(i)d.jpg",
+        title: 'Episode %(i)d: The CW\\'s "show"', // inline comment
+        duration: 0x%(i)x, start: 0%(i)o,
+        /* block
+           comment */
+        %(i)d: {label: '720p', bitrate: %(i)d, default: true, hls: null},
+        sources: [{src: '/v/%(i)d.mp4', type: 'video/mp4'}, {src: '/v/%(i)d.webm', type: "video\\x2fwebm"},],
+        tracks: [{kind: 'captions', file: '/c/%(i)d.vtt', label: 'English'}],
+        advertising: {client: 'vast', tag: 'https://ads.example.com/?q=%(i)d&amp;r=1'},
+    }'''
+    big = '[' + ',\n'.join(source % {'i': i} for i in range(1, 500)) + ']'
+    return [('jwplayer-setup', big)] + [
+        ('config-%d' % i, source % {'i': i}) for i in range(1, 50)]
+
+
+def load_corpus(path):
+    corpus = []
+    for fn in sorted(os.listdir(path)):
+        with io.open(os.path.join(path, fn), encoding='utf-8') as f:
+            corpus.append((fn, f.read()))
+    return corpus
+
+
+def capture(path, ie_names):
+    """ Run extractor tests and store every js_to_json input in path """
+    from test.helper import get_params, gettestcases
+
+    if not os.path.exists(path):
+        os.makedirs(path)
+    counter = [0]
+    real_js_to_json = utils.js_to_json
+
+    def recording_js_to_json(code):
+        counter[0] += 1
+        with io.open(os.path.join(path, '%05d.js' % counter[0]), 'w', encoding='utf-8') as f:
+            f.write(code)
+        return real_js_to_json(code)
+
+    # Extractors import js_to_json by name
+    for module in list(sys.modules.values()):
+        if getattr(module, 'js_to_json', None) is real_js_to_json:
+            module.js_to_json = recording_js_to_json
+
+    ydl = youtube_dl.YoutubeDL(get_params({'simulate': True, 'quiet': True}))
+    for tc in gettestcases():
+        ie_name = tc['name'][:-2] if tc['name'].endswith('IE') else tc['name']
+        if ie_names and ie_name not in ie_names:
+            continue
+        try:
+            ydl.extract_info(tc['url'], download=False)
+        except Exception as e:
+            print('%s: %s' % (tc['url'], e), file=sys.stderr)
+    print('Captured %d samples in %s' % (counter[0], path))
+
+
+def main():
+    parser = optparse.OptionParser(usage='%prog [--capture] [DIR] [IE_NAME...]')
+    parser.add_option(
+        '--capture', action='store_true', default=False,
+        help='Store the js_to_json inputs of the tests of the given extractors in DIR')
+    parser.add_option(
+        '-n', '--number', type=int, default=20,
+        help='Run each sample this many times')
+    opts, args = parser.parse_args()
+
+    if opts.capture:
+        if not args:
+            parser.error('--capture needs a directory')
+        return capture(args[0], args[1:])
+
+    corpus = load_corpus(args[0]) if args else synthetic_corpus()
+    total_size = sum(len(code) for _, code in corpus)
+
+    for name, code in corpus:
+        expected, got = js_to_json_re(code), utils.js_to_json(code)
+        if expected != got:
+            print('Output differs on %s' % name, file=sys.stderr)
+            sys.exit(1)
+
+    timings = []
+    for func in (js_to_json_re, utils.js_to_json):
+        timings.append(min(timeit.repeat(
+            lambda: [func(code) for _, code in corpus],
+            number=opts.number, repeat=3)) / opts.number)
+    print('%d samples, %d characters' % (len(corpus), total_size))
+    print('regex:   %8.2f ms' % (timings[0] * 1000))
+    print('scanner: %8.2f ms (%.1fx)' % (timings[1] * 1000, timings[0] / timings[1]))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,117 @@
+#!/usr/bin/env python
+from __future__ import unicode_literals, print_function
+
+"""
+Benchmark m3u8 media playlist parsing on a synthetic VOD playlist,
+comparing youtube_dl.m3u8 with the line loops HlsFD used before.
+"""
+
+import optparse
+import os
+import re
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from youtube_dl.compat import compat_urlparse
+from youtube_dl.m3u8 import M3U8MediaParser, parse_m3u8_media
+from youtube_dl.utils import parse_m3u8_attributes
+
+BASE_URL = 'https://cdn.example.com/vod/1234/index.m3u8'
+
+
+def make_playlist(segments):
+    lines = [
+        '#EXTM3U',
+        '#EXT-X-VERSION:3',
+        '#EXT-X-TARGETDURATION:6',
+        '#EXT-X-MEDIA-SEQUENCE:0',
+        '#EXT-X-PLAYLIST-TYPE:VOD',
+    ]
+    for i in range(segments):
+        if i % 1000 == 0:
+            lines.append('#EXT-X-KEY:METHOD=AES-128,URI="https://keys.example.com/%d",IV=0x%032x' % (i, i))
+        if i % 5000 == 2500:
+            lines.append('#EXT-X-DISCONTINUITY')
+        lines.append('#EXTINF:6.006,')
+        lines.append('segment-%d.ts?token=0123456789abcdef' % i)
+    lines.append('#EXT-X-ENDLIST')
+    return '\n'.join(lines) + '\n'
+
+
+def legacy_parse(s, man_url=BASE_URL):
+    """ What HlsFD.real_download did with the manifest, downloads aside """
+    total_frags = 0
+    for line in s.splitlines():
+        line = line.strip()
+        if line and not line.startswith('#'):
+            total_frags += 1
+
+    fragments = []
+    media_sequence = 0
+    decrypt_info = {'METHOD': 'NONE'}
+    for line in s.splitlines():
+        line = line.strip()
+        if line:
+            if not line.startswith('#'):
+                frag_url = (
+                    line
+                    if re.match(r'^https?://', line)
+                    else compat_urlparse.urljoin(man_url, line))
+                fragments.append((frag_url, media_sequence, decrypt_info.get('URI')))
+                media_sequence += 1
+            elif line.startswith('#EXT-X-KEY'):
+                decrypt_info = parse_m3u8_attributes(line[11:])
+                if not re.match(r'^https?://', decrypt_info['URI']):
+                    decrypt_info['URI'] = compat_urlparse.urljoin(man_url, decrypt_info['URI'])
+            elif line.startswith('#EXT-X-MEDIA-SEQUENCE'):
+                media_sequence = int(line[22:])
+    return total_frags, fragments
+
+
+def parse(s):
+    playlist = parse_m3u8_media(s, BASE_URL)
+    return len(playlist.segments), [
+        (segment.url, segment.media_sequence, segment.key and segment.key.url)
+        for segment in playlist.segments]
+
+
+def parse_incremental(s, chunk_size=64 * 1024):
+    parser = M3U8MediaParser(BASE_URL)
+    for i in range(0, len(s), chunk_size):
+        parser.feed(s[i:i + chunk_size])
+    return parser.close()
+
+
+def main():
+    parser = optparse.OptionParser(usage='%prog [options]')
+    parser.add_option(
+        '-s', '--segments', type=int, default=50000,
+        help='Number of segments of the playlist')
+    parser.add_option(
+        '-n', '--number', type=int, default=3,
+        help='Parse the playlist this many times')
+    opts, _ = parser.parse_args()
+
+    s = make_playlist(opts.segments)
+    if legacy_parse(s) != parse(s):
+        print('Parsed playlists differ', file=sys.stderr)
+        sys.exit(1)
+
+    print('%d segments, %d characters' % (opts.segments, len(s)))
+    # The URLs are only resolved when a segment is downloaded
+    benchmarks = [
+        ('HlsFD loops', lambda: legacy_parse(s)),
+        ('parse_m3u8_media', lambda: parse_m3u8_media(s, BASE_URL)),
+        ('incremental, 64k chunks', lambda: parse_incremental(s)),
+    ]
+    reference = None
+    for name, func in benchmarks:
+        t = min(timeit.repeat(func, number=opts.number, repeat=3)) / opts.number
+        reference = reference or t
+        print('%-24s %8.2f ms (%.1fx)' % (name, t * 1000, reference / t))
+
+
+if __name__ == '__main__':
+    main()
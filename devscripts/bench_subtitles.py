@@ -0,0 +1,138 @@
+#!/usr/bin/env python
+from __future__ import unicode_literals, print_function
+
+"""
+Time converting a subtitle corpus to each --convert-subs format with
+youtube_dl.subtitles and with an ffmpeg process per file, like
+FFmpegSubtitlesConvertorPP did before. The corpus is the srt, vtt, ass and
+dfxp/ttml files of the given directories, or synthetic files.
+
+    devscripts/bench_subtitles.py [DIRECTORY ...]
+"""
+
+import io
+import optparse
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import youtube_dl
+from youtube_dl.postprocessor.ffmpeg import FFmpegPostProcessor
+from youtube_dl.subtitles import (
+    convert_subtitles,
+    PARSERS,
+    SubtitlesConversionError,
+    WRITERS,
+)
+from youtube_dl.utils import dfxp2srt
+
+
+def timestamp(ms, separator):
+    return '%02d:%02d:%02d%s%03d' % (ms // 3600000, ms // 60000 % 60, ms // 1000 % 60, separator, ms % 1000)
+
+
+def make_corpus(directory, files, cues):
+    for i in range(files):
+        texts = [
+            ('Line %d of file %d' % (c, i), '<i>Second</i> line & more' if c % 3 else 'Only line')
+            for c in range(cues)]
+        times = [(c * 2000, c * 2000 + 1500) for c in range(cues)]
+        with io.open(os.path.join(directory, '%d.srt' % i), 'wt', encoding='utf-8') as f:
+            for c, ((start, end), text) in enumerate(zip(times, texts), 1):
+                f.write('%d\n%s --> %s\n%s\n\n' % (
+                    c, timestamp(start, ','), timestamp(end, ','), '\n'.join(text)))
+        with io.open(os.path.join(directory, '%d.vtt' % i), 'wt', encoding='utf-8') as f:
+            f.write('WEBVTT\n\n')
+            for (start, end), text in zip(times, texts):
+                f.write('%s --> %s\n%s\n\n' % (
+                    timestamp(start, '.'), timestamp(end, '.'), '\n'.join(text).replace('& ', '&amp; ')))
+        with io.open(os.path.join(directory, '%d.dfxp' % i), 'wt', encoding='utf-8') as f:
+            f.write('<?xml version="1.0" encoding="UTF-8"?>\n<tt xmlns="http://www.w3.org/ns/ttml"><body><div>\n')
+            for (start, end), text in zip(times, texts):
+                f.write('<p begin="%.3fs" end="%.3fs">%s</p>\n' % (
+                    start / 1000.0, end / 1000.0,
+                    '<br/>'.join(text).replace('& ', '&amp; ').replace('<i>', '').replace('</i>', '')))
+            f.write('</div></body></tt>\n')
+
+
+def find_corpus(directories):
+    corpus = []
+    for directory in directories:
+        for root, _, filenames in os.walk(directory):
+            for fn in filenames:
+                ext = fn.rpartition('.')[2]
+                if ext in PARSERS:
+                    corpus.append((os.path.join(root, fn), ext))
+    return sorted(corpus)
+
+
+def convert_natively(path, ext, out_path, out_ext):
+    convert_subtitles(path, ext, out_path, out_ext)
+
+
+def convert_with_ffmpeg(ffmpeg, path, ext, out_path, out_ext):
+    """ What FFmpegSubtitlesConvertorPP did """
+    if ext in ('dfxp', 'ttml', 'tt'):
+        with io.open(path, 'rt', encoding='utf-8') as f:
+            srt_data = dfxp2srt(f.read())
+        path = out_path + '.srt'
+        with io.open(path, 'wt', encoding='utf-8') as f:
+            f.write(srt_data)
+        if out_ext == 'srt':
+            return
+    ffmpeg.run_ffmpeg(path, out_path, ['-f', 'webvtt' if out_ext == 'vtt' else out_ext])
+
+
+def main():
+    parser = optparse.OptionParser(usage='%prog [options] [DIRECTORY ...]')
+    parser.add_option(
+        '-f', '--files', type=int, default=20,
+        help='Number of synthetic files of each format')
+    parser.add_option(
+        '-c', '--cues', type=int, default=500,
+        help='Number of cues of the synthetic files')
+    opts, directories = parser.parse_args()
+
+    temp_dir = tempfile.mkdtemp(prefix='bench_subtitles_')
+    try:
+        if not directories:
+            corpus_dir = os.path.join(temp_dir, 'corpus')
+            os.mkdir(corpus_dir)
+            make_corpus(corpus_dir, opts.files, opts.cues)
+            directories = [corpus_dir]
+        corpus = find_corpus(directories)
+        size = sum(os.path.getsize(path) for path, _ in corpus)
+        print('%d files, %.1f MB' % (len(corpus), size / 1024.0 / 1024))
+
+        ffmpeg = FFmpegPostProcessor(youtube_dl.YoutubeDL({'quiet': True}))
+        converters = [('native', convert_natively)]
+        if ffmpeg.available:
+            converters.append(('ffmpeg', lambda *args: convert_with_ffmpeg(ffmpeg, *args)))
+        else:
+            print('ffmpeg not found, only timing the native converters', file=sys.stderr)
+
+        print('%-4s %-8s %10s %12s' % ('to', '', 'time', 'fallbacks'))
+        for out_ext in sorted(WRITERS):
+            for name, convert in converters:
+                fallbacks = 0
+                start = time.time()
+                for i, (path, ext) in enumerate(corpus):
+                    if ext == out_ext:
+                        continue
+                    out_path = os.path.join(temp_dir, '%d.%s' % (i, out_ext))
+                    try:
+                        convert(path, ext, out_path, out_ext)
+                    except SubtitlesConversionError:
+                        # Left to ffmpeg by FFmpegSubtitlesConvertorPP
+                        fallbacks += 1
+                print('%-4s %-8s %8.2f s %12d' % (out_ext, name, time.time() - start, fallbacks))
+    finally:
+        shutil.rmtree(temp_dir)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,156 @@
+#!/usr/bin/env python
+from __future__ import unicode_literals, print_function
+
+"""
+Measure the peak memory and time taken to parse synthetic multi-MB ISM, MPD
+and F4M manifests into formats, reading and parsing the whole text like
+InfoExtractor did before _download_xml_stream and streaming it.
+"""
+
+import base64
+import io
+import optparse
+import os
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import youtube_dl
+from youtube_dl.compat import compat_etree_fromstring
+from youtube_dl.extractor.common import (
+    InfoExtractor,
+    _F4M_PRUNE_TEXT,
+    _ISM_COMPACT,
+    _MPD_COMPACT,
+    _XML_CHUNK_SIZE,
+)
+from youtube_dl.utils import (
+    fix_xml_ampersands,
+    fix_xml_ampersands_stream,
+    parse_xml_stream,
+)
+
+
+def make_ism(chunks):
+    return ''.join([
+        '<?xml version="1.0" encoding="UTF-8"?>\n',
+        '<SmoothStreamingMedia MajorVersion="2" MinorVersion="2" Duration="%d">\n' % (chunks * 20000000),
+        '<StreamIndex Type="video" Name="video" Url="QualityLevels({bitrate})/Fragments(video={start time})">\n',
+        '<QualityLevel Bitrate="2000000" FourCC="AVC1" MaxWidth="1280" MaxHeight="720"/>\n',
+    ] + [
+        # Varying durations, as in DVR windows
+        '<c t="%d" d="%d"/>\n' % (i * 20000000, 20000000 + i % 7) for i in range(chunks)
+    ] + ['</StreamIndex>\n</SmoothStreamingMedia>\n'])
+
+
+def make_mpd(segments):
+    return ''.join([
+        '<?xml version="1.0" encoding="UTF-8"?>\n',
+        '<MPD xmlns="urn:mpeg:dash:schema:mpd:2011" type="static" mediaPresentationDuration="PT%dS">\n' % (segments * 2),
+        '<Period><BaseURL>http://cdn.example.com/dvr/</BaseURL>\n',
+        '<AdaptationSet mimeType="video/mp4">\n',
+        '<SegmentTemplate timescale="90000" initialization="$RepresentationID$/init.mp4" media="$RepresentationID$/$Time$.m4s">\n',
+        '<SegmentTimeline>\n',
+    ] + [
+        '<S t="%d" d="%d"/>\n' % (i * 180000, 180000 + i % 3) for i in range(segments)
+    ] + [
+        '</SegmentTimeline></SegmentTemplate>\n',
+        '<Representation id="v1" bandwidth="800000" width="640" height="360" codecs="avc1.4d401e"/>\n',
+        '<Representation id="v2" bandwidth="2400000" width="1280" height="720" codecs="avc1.4d401f"/>\n',
+        '</AdaptationSet></Period></MPD>\n',
+    ])
+
+
+def make_f4m(size):
+    blob = base64.b64encode(os.urandom(size * 3 // 8)).decode('ascii')
+    return ''.join([
+        '<?xml version="1.0" encoding="UTF-8"?>\n',
+        '<manifest xmlns="http://ns.adobe.com/f4m/1.0">\n',
+        '<id>dvr?a=1&b=2</id>\n',
+        '<bootstrapInfo profile="named" id="bootstrap0">%s</bootstrapInfo>\n' % blob,
+        '<media url="stream" bitrate="1500" bootstrapInfoId="bootstrap0">',
+        '<metadata>%s</metadata></media>\n' % blob,
+        '</manifest>\n',
+    ])
+
+
+def parse_whole(ie, kind, data):
+    """ Like _download_webpage_handle and compat_etree_fromstring """
+    content = data.read().decode('utf-8')
+    source = content
+    if kind == 'f4m':
+        content = fix_xml_ampersands(content).strip()
+    # The text of F4M manifests is kept for F4mFD
+    return compat_etree_fromstring(content.encode('utf-8')), source if kind == 'f4m' else None
+
+
+def parse_streamed(ie, kind, data):
+    """ Like _download_xml_stream """
+    chunks = iter(lambda: data.read(_XML_CHUNK_SIZE), b'')
+    if kind != 'f4m':
+        return parse_xml_stream(chunks, _ISM_COMPACT if kind == 'ism' else _MPD_COMPACT), None
+    kept = []
+
+    def keep(chunks):
+        for chunk in chunks:
+            kept.append(chunk)
+            yield chunk
+
+    doc = parse_xml_stream(fix_xml_ampersands_stream(keep(chunks)), prune_text=_F4M_PRUNE_TEXT)
+    return doc, b''.join(kept).decode('utf-8', 'ignore')
+
+
+def parse_formats(ie, kind, doc):
+    if kind == 'ism':
+        return ie._parse_ism_formats(doc, 'http://example.com/v.ism/Manifest')
+    elif kind == 'mpd':
+        return ie._parse_mpd_formats(doc, mpd_base_url='http://example.com/')
+    return ie._parse_f4m_formats(doc, 'http://example.com/v.f4m', 'v')
+
+
+def measure(ie, kind, body, parse):
+    data = io.BytesIO(body)
+    tracemalloc.start()
+    start = time.time()
+    doc, source = parse(ie, kind, data)
+    doc_peak = tracemalloc.get_traced_memory()[1]
+    formats = parse_formats(ie, kind, doc)
+    elapsed = time.time() - start
+    peak = tracemalloc.get_traced_memory()[1]
+    del doc, source
+    tracemalloc.stop()
+    return formats, doc_peak, peak, elapsed
+
+
+def main():
+    parser = optparse.OptionParser(usage='%prog [options]')
+    parser.add_option(
+        '-s', '--size', type=int, default=4,
+        help='Approximate size of the manifests in MB')
+    opts, _ = parser.parse_args()
+
+    ie = InfoExtractor(youtube_dl.YoutubeDL({'quiet': True}))
+    manifests = [
+        ('ism', make_ism(opts.size * 1024 * 1024 // 40)),
+        ('mpd', make_mpd(opts.size * 1024 * 1024 // 30)),
+        ('f4m', make_f4m(opts.size * 1024 * 1024)),
+    ]
+    mb = 1024.0 * 1024
+    print('%-4s %8s  %-8s %12s %12s %9s' % ('', 'size', '', 'doc peak', 'total peak', 'time'))
+    for kind, text in manifests:
+        body = text.encode('utf-8')
+        results = []
+        for name, parse in (('whole', parse_whole), ('streamed', parse_streamed)):
+            formats, doc_peak, peak, elapsed = measure(ie, kind, body, parse)
+            results.append(formats)
+            print('%-4s %6.1fMB  %-8s %10.1fMB %10.1fMB %7.2fs' % (
+                kind, len(body) / mb, name, doc_peak / mb, peak / mb, elapsed))
+        if results[0] != results[1]:
+            print('%s formats differ' % kind, file=sys.stderr)
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
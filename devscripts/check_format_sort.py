@@ -0,0 +1,66 @@
+#!/usr/bin/env python
+from __future__ import unicode_literals, print_function
+
+"""
+Check that InfoExtractor._sort_formats orders the formats found by the
+extractor tests (this needs network access) exactly like the implementation
+preceding FORMAT_SORT_FIELDS did, and time both.
+
+    devscripts/check_format_sort.py [IE_NAME ...]
+"""
+
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import youtube_dl
+from youtube_dl.extractor.common import InfoExtractor
+from test.helper import get_params, gettestcases
+from test.test_format_sort import legacy_sort_formats
+
+
+def main():
+    ie_names = sys.argv[1:]
+    stats = {'calls': 0, 'formats': 0, 'mismatches': 0, 'legacy': 0.0, 'current': 0.0}
+    real_sort_formats = InfoExtractor._sort_formats
+
+    def checking_sort_formats(self, formats, field_preference=None):
+        expected = [dict(f) for f in formats]
+        start = time.time()
+        legacy_sort_formats(
+            expected, self._downloader.params.get('prefer_free_formats'), field_preference)
+        stats['legacy'] += time.time() - start
+        start = time.time()
+        real_sort_formats(self, formats, field_preference)
+        stats['current'] += time.time() - start
+        stats['calls'] += 1
+        stats['formats'] += len(formats)
+        if expected != formats:
+            stats['mismatches'] += 1
+            print('%s: order differs: %s != %s' % (
+                self.IE_NAME, [f.get('format_id') for f in formats],
+                [f.get('format_id') for f in expected]), file=sys.stderr)
+
+    InfoExtractor._sort_formats = checking_sort_formats
+
+    ydl = youtube_dl.YoutubeDL(get_params({'simulate': True, 'quiet': True}))
+    for tc in gettestcases():
+        ie_name = tc['name'][:-2] if tc['name'].endswith('IE') else tc['name']
+        if ie_names and ie_name not in ie_names:
+            continue
+        try:
+            ydl.extract_info(tc['url'], download=False)
+        except Exception as e:
+            print('%s: %s' % (tc['url'], e), file=sys.stderr)
+
+    print('%d format lists, %d formats, %d mismatches' % (
+        stats['calls'], stats['formats'], stats['mismatches']))
+    print('legacy: %.2f ms, current: %.2f ms' % (stats['legacy'] * 1000, stats['current'] * 1000))
+    if stats['mismatches']:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
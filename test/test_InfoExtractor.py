@@ -9,9 +9,20 @@ import unittest
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 from test.helper import FakeYDL, expect_dict
-from youtube_dl.extractor.common import InfoExtractor
+from youtube_dl.compat import compat_etree_fromstring
+from youtube_dl.extractor.common import InfoExtractor, _ISM_COMPACT, _MPD_COMPACT
 from youtube_dl.extractor import YoutubeIE, get_info_extractor
-from youtube_dl.utils import encode_data_uri, strip_jsonp, ExtractorError, RegexNotFoundError
+from youtube_dl.utils import (
+    encode_data_uri,
+    parse_xml_stream,
+    strip_jsonp,
+    ExtractorError,
+    RegexNotFoundError,
+)
+
+
+def chunks(data, size=7):
+    return [data[i:i + size] for i in range(0, len(data), size)]
 
 
 class TestIE(InfoExtractor):
@@ -84,6 +95,153 @@ class TestInfoExtractor(unittest.TestCase):
         self.assertRaises(ExtractorError, self.ie._download_json, uri, None)
         self.assertEqual(self.ie._download_json(uri, None, fatal=False), None)
 
+    def test_extract_m3u8_formats(self):
+        master = '''#EXTM3U
+#EXT-X-INDEPENDENT-SEGMENTS
+#EXT-X-MEDIA:TYPE=AUDIO,GROUP-ID="aac",LANGUAGE="en",NAME="English",DEFAULT=YES,URI="audio/en.m3u8"
+#EXT-X-MEDIA:TYPE=AUDIO,GROUP-ID="aac",LANGUAGE="de",NAME="Deutsch",URI="http://other.example.com/de.m3u8"
+#EXT-X-MEDIA:TYPE=SUBTITLES,GROUP-ID="subs",NAME="English",URI="subs/en.m3u8"
+#EXT-X-STREAM-INF:BANDWIDTH=1280000,AVERAGE-BANDWIDTH=1000000,RESOLUTION=640x360,CODECS="avc1.4d401e,mp4a.40.2",AUDIO="aac",FRAME-RATE=29.970
+low/index.m3u8
+#EXT-X-STREAM-INF:BANDWIDTH=2560000,RESOLUTION=1280x720,CODECS="avc1.4d401f,mp4a.40.2",AUDIO="aac"
+http://cdn.example.com/hi/index.m3u8?audio=128000-video=2400000
+
+#EXT-X-MEDIA:TYPE=AUDIO,GROUP-ID="mp3",NAME="Main"
+#EXT-X-STREAM-INF:BANDWIDTH=64000,CODECS="mp4a.40.5",AUDIO="mp3"
+  audio-only.m3u8  
+'''
+        url = 'http://example.com/hls/master.m3u8'
+
+        class FakeURLHandle(object):
+            def geturl(self):
+                return url
+
+        def extract(doc, **kwargs):
+            self.ie._download_webpage_handle = lambda *args, **kwargs: (doc, FakeURLHandle())
+            return self.ie._extract_m3u8_formats(url, 'id', 'mp4', 'm3u8_native', **kwargs)
+
+        formats = extract(master, m3u8_id='hls')
+        self.assertEqual(formats, [{
+            'format_id': 'hls-meta', 'url': url, 'ext': 'mp4', 'protocol': 'm3u8',
+            'preference': -100, 'resolution': 'multiple', 'format_note': 'Quality selection URL',
+        }, {
+            'format_id': 'aac-English', 'url': 'http://example.com/hls/audio/en.m3u8', 'language': 'en',
+            'ext': 'mp4', 'protocol': 'm3u8_native', 'preference': None, 'vcodec': 'none',
+        }, {
+            'format_id': 'aac-Deutsch', 'url': 'http://other.example.com/de.m3u8', 'language': 'de',
+            'ext': 'mp4', 'protocol': 'm3u8_native', 'preference': None, 'vcodec': 'none',
+        }, {
+            'format_id': 'hls-1000', 'url': 'http://example.com/hls/low/index.m3u8',
+            'manifest_url': 'http://example.com/hls/low/index.m3u8', 'tbr': 1000, 'ext': 'mp4',
+            'fps': 29.97, 'protocol': 'm3u8_native', 'preference': None, 'width': 640, 'height': 360,
+            'vcodec': 'avc1.4d401e', 'acodec': 'none',
+        }, {
+            'format_id': 'hls-2560', 'url': 'http://cdn.example.com/hi/index.m3u8?audio=128000-video=2400000',
+            'manifest_url': 'http://cdn.example.com/hi/index.m3u8?audio=128000-video=2400000', 'tbr': 2560,
+            'ext': 'mp4', 'fps': None, 'protocol': 'm3u8_native', 'preference': None, 'width': 1280,
+            'height': 720, 'abr': 128.0, 'vbr': 2400.0, 'vcodec': 'avc1.4d401f', 'acodec': 'none',
+        }, {
+            'format_id': 'hls-Main', 'url': 'http://example.com/hls/audio-only.m3u8',
+            'manifest_url': 'http://example.com/hls/audio-only.m3u8', 'tbr': 64, 'ext': 'mp4',
+            'fps': None, 'protocol': 'm3u8_native', 'preference': None, 'vcodec': 'none',
+            'acodec': 'mp4a.40.5',
+        }])
+
+        formats = extract(master, live=True)
+        self.assertEqual([f['format_id'] for f in formats], ['meta', 'aac-English', 'aac-Deutsch', '', '', ''])
+
+        self.assertEqual(extract('#EXTM3U\n#EXT-X-TARGETDURATION:10\n#EXTINF:10,\n0.ts\n', m3u8_id='hls'), [{
+            'url': url, 'format_id': 'hls', 'ext': 'mp4', 'protocol': 'm3u8_native', 'preference': None,
+        }])
+        # Only complete media playlists are kept for the downloader
+        self.assertEqual(self.ie._downloader.load_manifest(url, 60), None)
+        vod = '#EXTM3U\n#EXT-X-TARGETDURATION:10\n#EXTINF:10,\n0.ts\n#EXT-X-ENDLIST\n'
+        extract(vod, live=True)
+        self.assertEqual(self.ie._downloader.load_manifest(url, 60), None)
+        extract(vod)
+        self.assertEqual(self.ie._downloader.load_manifest(url, 60), (vod, url))
+
+    def test_parse_mpd_formats(self):
+        mpd = b'''<?xml version="1.0"?>
+<MPD xmlns="urn:mpeg:dash:schema:mpd:2011" mediaPresentationDuration="PT21.5S" type="static">
+  <Period>
+    <BaseURL>http://cdn.example.com/live/</BaseURL>
+    <AdaptationSet mimeType="audio/mp4">
+      <SegmentTemplate timescale="48000" initialization="init-$RepresentationID$.m4a" media="$RepresentationID$/$Time$.m4a">
+        <SegmentTimeline>
+          <S t="960000" d="96000" r="1"/>
+          <S d="48000"/>
+          <S t="2000000" d="96256" r="1"/>
+        </SegmentTimeline>
+      </SegmentTemplate>
+      <Representation id="a1" bandwidth="128000" codecs="mp4a.40.2" audioSamplingRate="48000"/>
+    </AdaptationSet>
+    <AdaptationSet mimeType="video/mp4">
+      <SegmentTemplate timescale="1000" duration="4000" startNumber="3" media="v-$Number%03d$-$Bandwidth$.mp4"/>
+      <Representation id="v1" bandwidth="800000" width="640" height="360" codecs="avc1.4d401e"/>
+    </AdaptationSet>
+    <AdaptationSet mimeType="video/mp4">
+      <Representation id="137" bandwidth="4000000" width="1920" height="1080" codecs="avc1.640028">
+        <BaseURL>https://r1.example.com/id/137/</BaseURL>
+        <SegmentList timescale="1000">
+          <Initialization sourceURL="range/0-700"/>
+          <SegmentTimeline>
+            <S d="5005" r="1"/>
+            <S d="4004"/>
+          </SegmentTimeline>
+          <SegmentURL media="sq/0"/>
+          <SegmentURL media="sq/1"/>
+          <SegmentURL media="sq/2"/>
+        </SegmentList>
+      </Representation>
+    </AdaptationSet>
+  </Period>
+</MPD>'''
+        # The streamed document only keeps tuples for the segments
+        for mpd_doc in (compat_etree_fromstring(mpd), parse_xml_stream(chunks(mpd), _MPD_COMPACT)):
+            formats = self.ie._parse_mpd_formats(mpd_doc, mpd_id='dash', mpd_url='http://example.com/m.mpd')
+            self.assertEqual([f['format_id'] for f in formats], ['dash-a1', 'dash-v1', 'dash-137'])
+            for f in formats:
+                self.assertEqual(f['protocol'], 'http_dash_segments')
+            self.assertEqual(list(formats[0]['fragments']), [
+                {'url': 'http://cdn.example.com/live/init-a1.m4a'},
+                {'url': 'http://cdn.example.com/live/a1/960000.m4a', 'duration': 2.0},
+                {'url': 'http://cdn.example.com/live/a1/1056000.m4a', 'duration': 2.0},
+                {'url': 'http://cdn.example.com/live/a1/1152000.m4a', 'duration': 1.0},
+                {'url': 'http://cdn.example.com/live/a1/2000000.m4a', 'duration': 96256 / 48000.0},
+                {'url': 'http://cdn.example.com/live/a1/2096256.m4a', 'duration': 96256 / 48000.0},
+            ])
+            self.assertEqual(list(formats[1]['fragments']), [{
+                'url': 'http://cdn.example.com/live/v-%03d-800000.mp4' % n,
+                'duration': 4.0,
+            } for n in range(3, 9)])
+            self.assertEqual(list(formats[2]['fragments']), [
+                {'url': 'https://r1.example.com/id/137/range/0-700'},
+                {'url': 'https://r1.example.com/id/137/sq/0', 'duration': 5.005},
+                {'url': 'https://r1.example.com/id/137/sq/1', 'duration': 5.005},
+                {'url': 'https://r1.example.com/id/137/sq/2', 'duration': 4.004},
+            ])
+
+    def test_parse_ism_formats(self):
+        ism = b'''<?xml version="1.0" encoding="UTF-8"?>
+<SmoothStreamingMedia MajorVersion="2" MinorVersion="2" Duration="100000000" TimeScale="10000000">
+  <StreamIndex Type="video" Name="video" Chunks="4" Url="QualityLevels({bitrate})/Fragments(video={start time})">
+    <QualityLevel Index="0" Bitrate="800000" FourCC="AVC1" MaxWidth="640" MaxHeight="360" CodecPrivateData="00"/>
+    <c t="0" d="20000000" r="2"/>
+    <c d="30000000"/>
+    <c t="70000000"/>
+    <c t="90000000" d="10000000"/>
+  </StreamIndex>
+  <StreamIndex Type="text" Name="sub" Url="sub/{start time}"><c t="0"/></StreamIndex>
+</SmoothStreamingMedia>'''
+        for ism_doc in (compat_etree_fromstring(ism), parse_xml_stream(chunks(ism), _ISM_COMPACT)):
+            formats = self.ie._parse_ism_formats(ism_doc, 'http://example.com/v.ism/Manifest', 'mss')
+            self.assertEqual([f['format_id'] for f in formats], ['mss-video-800'])
+            self.assertEqual(formats[0]['fragments'], [{
+                'url': 'http://example.com/v.ism/QualityLevels(800000)/Fragments(video=%d)' % t,
+                'duration': d,
+            } for t, d in ((0, 2), (20000000, 2), (40000000, 3), (70000000, 2), (90000000, 1))])
+
     def test_extract_jwplayer_data_realworld(self):
         # from http://www.suffolk.edu/sjc/
         expect_dict(
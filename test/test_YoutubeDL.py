@@ -10,14 +10,24 @@ import unittest
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 import copy
+import shutil
+import threading
+import time
 
 from test.helper import FakeYDL, assertRegexpMatches
 from youtube_dl import YoutubeDL
 from youtube_dl.compat import compat_str, compat_urllib_error
 from youtube_dl.extractor import YoutubeIE
 from youtube_dl.extractor.common import InfoExtractor
+from youtube_dl.postprocessor import FFmpegExtractAudioPP
 from youtube_dl.postprocessor.common import PostProcessor
-from youtube_dl.utils import ExtractorError, match_filter_func
+from youtube_dl.utils import (
+    DownloadError,
+    encode_data_uri,
+    ExtractorError,
+    match_filter_func,
+    PostProcessingError,
+)
 
 TEST_URL = 'http://localhost/sample.mp4'
 
@@ -448,6 +458,35 @@ class TestFormatSelection(unittest.TestCase):
             pass
         self.assertEqual(ydl.downloaded_info_dicts, [])
 
+    def test_format_selector_reuse(self):
+        formats = [
+            {'format_id': '1', 'ext': 'mp4', 'height': 360, 'url': 'http://_/1', 'acodec': 'none'},
+            {'format_id': '2', 'ext': 'mp4', 'height': 720, 'url': 'http://_/2', 'acodec': 'none'},
+            {'format_id': '3', 'ext': 'm4a', 'url': 'http://_/3', 'vcodec': 'none'},
+        ]
+        ydl = YDL({'format': 'bestvideo[height<=480]+bestaudio'})
+        selector = ydl.build_format_selector('bestvideo[height<=480]+bestaudio')
+        self.assertIs(ydl.build_format_selector('bestvideo[height<=480]+bestaudio'), selector)
+        self.assertIsNot(ydl.build_format_selector('bestvideo+bestaudio'), selector)
+
+        for i in range(3):
+            info_dict = _make_result(copy.deepcopy(formats))
+            info_dict['id'] = 'v%d' % i
+            ydl.process_ie_result(info_dict)
+        self.assertEqual(
+            [info['format_id'] for info in ydl.downloaded_info_dicts], ['1+3'] * 3)
+        self.assertEqual(
+            sorted(ydl._format_selectors), ['bestvideo+bestaudio', 'bestvideo[height<=480]+bestaudio'])
+
+        # The formats given to the selector are left untouched
+        ctx = {'formats': formats, 'incomplete_formats': False}
+        self.assertEqual(len(list(selector(ctx))), 1)
+        self.assertEqual(ctx['formats'], formats)
+        self.assertEqual(len(formats), 3)
+
+        self.assertRaises(SyntaxError, ydl.build_format_selector, 'best+')
+        self.assertNotIn('best+', ydl._format_selectors)
+
 
 class TestYoutubeDL(unittest.TestCase):
     def test_subtitles(self):
@@ -598,6 +637,303 @@ class TestYoutubeDL(unittest.TestCase):
         self.assertTrue(os.path.exists(filename), '%s doesn\'t exist' % filename)
         os.unlink(filename)
 
+    def test_sidecar_downloads(self):
+        prefix = 'sidecar-testfile'
+        lock = threading.Lock()
+        counts = {'active': 0, 'peak': 0}
+
+        class SlowYDL(YoutubeDL):
+            def urlopen(self, req):
+                url = req if isinstance(req, compat_str) else req.get_full_url()
+                with lock:
+                    counts['active'] += 1
+                    counts['peak'] = max(counts['peak'], counts['active'])
+                try:
+                    time.sleep(0.2)
+                    if url == missing_url:
+                        raise compat_urllib_error.URLError('missing')
+                    return super(SlowYDL, self).urlopen(url)
+                finally:
+                    with lock:
+                        counts['active'] -= 1
+
+        class Logger(object):
+            def __init__(self):
+                self.warnings = []
+
+            def debug(self, msg):
+                pass
+
+            def warning(self, msg):
+                self.warnings.append(msg)
+
+        class ListFilesPP(PostProcessor):
+            # The subtitles and thumbnails are written before postprocessing
+            def run(self, info):
+                self.files = sorted(f for f in os.listdir('.') if f.startswith(prefix))
+                return [], info
+
+        def data_uri(data):
+            return encode_data_uri(data, 'text/plain')
+        missing_url = data_uri(b'missing')
+
+        logger = Logger()
+        ydl = SlowYDL({
+            'outtmpl': prefix + '.%(ext)s', 'logger': logger,
+            'writesubtitles': True, 'write_all_thumbnails': True, 'sidecar_downloads': 3,
+        })
+        pp = ListFilesPP()
+        ydl.add_post_processor(pp)
+        try:
+            with ydl:
+                ydl.process_info({
+                    'id': 'testid', 'title': 'sidecars', 'ext': 'mp4', 'extractor': 'testex',
+                    'extractor_key': 'Generic', 'webpage_url': 'http://example.com/',
+                    'url': data_uri(b'media'),
+                    'requested_subtitles': {
+                        'en': {'ext': 'vtt', 'url': data_uri(b'WEBVTT en')},
+                        'fr': {'ext': 'vtt', 'url': missing_url},
+                        'de': {'ext': 'vtt', 'data': 'WEBVTT de'},
+                    },
+                    'thumbnails': [
+                        {'id': '0', 'url': data_uri(b'jpeg 0')},
+                        {'id': '1', 'url': missing_url},
+                    ],
+                })
+            self.assertTrue(counts['peak'] > 1)
+            self.assertEqual(pp.files, [
+                prefix + '.de.vtt', prefix + '.en.vtt', prefix + '.mp4', prefix + '_0.jpg'])
+            self.assertEqual(len(logger.warnings), 2)
+            self.assertTrue(any('subtitle for "fr"' in w for w in logger.warnings))
+            self.assertTrue(any('Unable to download thumbnail' in w for w in logger.warnings))
+            with open(prefix + '.en.vtt') as f:
+                self.assertEqual(f.read(), 'WEBVTT en')
+        finally:
+            for f in os.listdir('.'):
+                if f.startswith(prefix):
+                    os.unlink(f)
+
+    def test_sidecar_failures(self):
+        prefix = 'sidecar-failures-testfile'
+        release = threading.Event()
+
+        class BlockingYDL(YoutubeDL):
+            def urlopen(self, req):
+                url = req if isinstance(req, compat_str) else req.get_full_url()
+                if url == thumbnail_url:
+                    release.wait(10)
+                return super(BlockingYDL, self).urlopen(req)
+
+        def interrupt(status):
+            raise KeyboardInterrupt()
+
+        thumbnail_url = encode_data_uri(b'jpeg', 'text/plain')
+        info = {
+            'id': 'testid', 'title': 'sidecars', 'ext': 'mp4', 'extractor': 'testex',
+            'extractor_key': 'Generic', 'webpage_url': 'http://example.com/',
+            'url': encode_data_uri(b'media', 'text/plain'),
+            'requested_subtitles': {'en': {'ext': 'vtt', 'data': 'WEBVTT en'}},
+        }
+        # The subtitles can't be written over a directory
+        os.mkdir(prefix + '.en.vtt')
+        try:
+            ydl = YoutubeDL({'outtmpl': prefix + '.%(ext)s', 'quiet': True, 'writesubtitles': True})
+            with self.assertRaises(DownloadError) as cm:
+                ydl.process_info(dict(info))
+            self.assertTrue('Cannot write subtitles file' in compat_str(cm.exception))
+            # Reported once the media is downloaded
+            self.assertTrue(os.path.exists(prefix + '.mp4'))
+            os.unlink(prefix + '.mp4')
+
+            # Ctrl-C is not replaced and does not wait for the thumbnails
+            ydl = BlockingYDL({
+                'outtmpl': prefix + '.%(ext)s', 'quiet': True, 'writesubtitles': True,
+                'writethumbnail': True, 'progress_hooks': [interrupt],
+            })
+            start = time.time()
+            self.assertRaises(KeyboardInterrupt, ydl.process_info, dict(
+                info, thumbnails=[{'id': '0', 'url': thumbnail_url}]))
+            self.assertTrue(time.time() - start < 5)
+        finally:
+            release.set()
+            ydl._sidecar_pool.shutdown()
+            for f in os.listdir('.'):
+                if f.startswith(prefix):
+                    if os.path.isdir(f):
+                        os.rmdir(f)
+                    else:
+                        os.unlink(f)
+
+    def test_background_postprocessing(self):
+        prefix = 'bgpp-testfile'
+        archive = prefix + '-archive.txt'
+        release = threading.Event()
+
+        class BlockingPP(PostProcessor):
+            def run(self, info):
+                release.wait(10)
+                if info['id'] == 'fail':
+                    raise PostProcessingError('failed')
+                return [], info
+
+        def process(ydl, video_id):
+            ydl.process_info({
+                'id': video_id, 'title': video_id, 'ext': 'mp4', 'extractor': 'testex',
+                'extractor_key': 'Generic', 'webpage_url': 'http://example.com/',
+                'url': encode_data_uri(b'media', 'text/plain'),
+            })
+
+        def archived():
+            with open(archive) as f:
+                return sorted(line.split()[1] for line in f)
+
+        params = {
+            'outtmpl': prefix + '-%(id)s.%(ext)s', 'quiet': True,
+            'download_archive': archive, 'postprocess_workers': 2,
+        }
+        try:
+            ydl = YoutubeDL(dict(params, ignoreerrors=True))
+            ydl.add_post_processor(BlockingPP())
+            for video_id in ('a', 'fail', 'b'):
+                process(ydl, video_id)
+            # All downloaded while the first files are still postprocessed
+            self.assertEqual(len([f for f in os.listdir('.') if f.startswith(prefix + '-')]), 3)
+            self.assertFalse(os.path.exists(archive))
+            release.set()
+            ydl.wait_for_postprocessing()
+            self.assertEqual(archived(), ['a', 'b'])
+            self.assertEqual(ydl._download_retcode, 1)
+
+            ydl = YoutubeDL(dict(params, outtmpl=prefix + '-%(id)s-2.%(ext)s'))
+            ydl.add_post_processor(BlockingPP())
+            process(ydl, 'fail')
+            self.assertRaises(DownloadError, ydl.wait_for_postprocessing)
+            self.assertEqual(archived(), ['a', 'b'])
+        finally:
+            for f in os.listdir('.'):
+                if f.startswith(prefix):
+                    os.unlink(f)
+
+    def test_background_transcodes(self):
+        prefix = 'bgtranscode-testfile'
+        archive = prefix + '-archive.txt'
+        release = threading.Event()
+        main_thread = threading.current_thread()
+        finished = []
+        errors = []
+
+        class Logger(object):
+            def debug(self, msg):
+                pass
+
+            def warning(self, msg):
+                pass
+
+            def error(self, msg):
+                errors.append(msg)
+
+        class ExtractAudioPP(FFmpegExtractAudioPP):
+            def run(self, info):
+                release.wait(10)
+                if info['id'] == 'fail':
+                    raise PostProcessingError('failed')
+                return [], info
+
+        class FinishPP(PostProcessor):
+            def run(self, info):
+                finished.append((info['id'], threading.current_thread() is main_thread))
+                return [], info
+
+        ydl = YoutubeDL({
+            'outtmpl': prefix + '-%(id)s.%(ext)s', 'logger': Logger(),
+            'download_archive': archive, 'extract_audio_workers': 2,
+            'ignoreerrors': True,
+        })
+        ydl.add_post_processor(ExtractAudioPP())
+        ydl.add_post_processor(FinishPP())
+        try:
+            for video_id in ('a', 'fail', 'b'):
+                ydl.process_info({
+                    'id': video_id, 'title': video_id, 'ext': 'mp4', 'extractor': 'testex',
+                    'extractor_key': 'Generic', 'webpage_url': 'http://example.com/',
+                    'url': encode_data_uri(b'media', 'text/plain'),
+                })
+            # All downloaded while the first files are still transcoded
+            self.assertEqual(len([f for f in os.listdir('.') if f.startswith(prefix + '-')]), 3)
+            self.assertEqual(finished, [])
+            release.set()
+            ydl.wait_for_postprocessing()
+            # The postprocessors after the transcode run in download order
+            self.assertEqual(finished, [('a', True), ('fail', True), ('b', True)])
+            with open(archive) as f:
+                self.assertEqual([line.split()[1] for line in f], ['a', 'b'])
+            self.assertEqual(len(errors), 1)
+            self.assertTrue(prefix + '-fail.mp4: failed' in errors[0])
+            self.assertEqual(ydl._download_retcode, 1)
+        finally:
+            for f in os.listdir('.'):
+                if f.startswith(prefix):
+                    os.unlink(f)
+
+    @unittest.skipIf(not hasattr(os, 'mkfifo'), 'needs named pipes')
+    def test_live_merge(self):
+        prefix = 'live-merge-testfile'
+        bin_dir = prefix + '-bin'
+        os.mkdir(bin_dir)
+        exe = os.path.join(bin_dir, 'ffmpeg')
+        with open(exe, 'w') as f:
+            # Concatenates its inputs, which must be named pipes, into the
+            # output file, the last argument
+            f.write('''#!/bin/sh
+if [ "$1" = -version ]; then echo "ffmpeg version 4.0"; exit; fi
+inputs=
+while [ $# -gt 1 ]; do
+    if [ "$1" = -i ]; then
+        [ -p "${2#file:}" ] || exit 1
+        inputs="$inputs ${2#file:}"
+    fi
+    shift
+done
+cat $inputs > "${1#file:}"
+''')
+        os.chmod(exe, 0o755)
+
+        def process(ydl, audio_url):
+            ydl.process_info({
+                'id': 'testid', 'title': 'live merge', 'ext': 'webm', 'extractor': 'testex',
+                'extractor_key': 'Generic', 'webpage_url': 'http://example.com/',
+                'requested_formats': [
+                    {'format_id': '1', 'ext': 'webm', 'url': encode_data_uri(b'video', 'video/webm')},
+                    {'format_id': '2', 'ext': 'webm', 'url': audio_url},
+                ],
+            })
+
+        class MissingAudioYDL(YoutubeDL):
+            def urlopen(self, req):
+                if 'missing' in (req if isinstance(req, compat_str) else req.get_full_url()):
+                    raise compat_urllib_error.URLError('missing')
+                return super(MissingAudioYDL, self).urlopen(req)
+
+        params = {
+            'outtmpl': prefix + '.%(ext)s', 'quiet': True, 'live_merge': True,
+            'ffmpeg_location': os.path.abspath(exe), 'cachedir': False,
+        }
+        try:
+            process(YoutubeDL(params), encode_data_uri(b'audio', 'audio/webm'))
+            with open(prefix + '.webm', 'rb') as f:
+                self.assertEqual(f.read(), b'videoaudio')
+            # No intermediate files
+            self.assertEqual(sorted(f for f in os.listdir('.') if f.startswith(prefix)), [bin_dir, prefix + '.webm'])
+            os.unlink(prefix + '.webm')
+
+            self.assertRaises(DownloadError, process, MissingAudioYDL(params), 'http://example.com/missing')
+            self.assertEqual([f for f in os.listdir('.') if f.startswith(prefix)], [bin_dir])
+        finally:
+            shutil.rmtree(bin_dir)
+            for f in os.listdir('.'):
+                if f.startswith(prefix):
+                    os.unlink(f)
+
     def test_match_filter(self):
         class FilterYDL(YDL):
             def __init__(self, *args, **kwargs):
@@ -781,5 +1117,73 @@ class TestYoutubeDL(unittest.TestCase):
         self.assertEqual(downloaded['url'], TEST_URL)
 
 
+class TestYoutubeDLThreadSafety(unittest.TestCase):
+    def test_concurrent_extract_info(self):
+        THREADS = 16
+        CALLS = 25
+
+        class ThreadYDL(YoutubeDL):
+            def __init__(self, *args, **kwargs):
+                super(ThreadYDL, self).__init__(*args, **kwargs)
+                self.filenames = []
+
+            def to_stdout(self, message, skip_eol=False, check_quiet=False):
+                if not check_quiet:
+                    # Only --get-filename output is not checked for quiet
+                    self.filenames.append(message)
+
+        class ThreadIE(InfoExtractor):
+            _VALID_URL = r'thread:(?P<id>\d+)'
+            initialized = 0
+
+            def _real_initialize(self):
+                ThreadIE.initialized += 1
+
+            def _real_extract(self, url):
+                video_id = self._match_id(url)
+                return _make_result([
+                    {'url': TEST_URL, 'format_id': '%d' % h, 'height': h, 'ext': 'mp4'}
+                    for h in (360, 720, 1080)], id=video_id, title=video_id)
+
+        ydl = ThreadYDL({
+            'simulate': True,
+            'quiet': True,
+            'forcefilename': True,
+            'outtmpl': '%(autonumber)s-%(id)s.%(ext)s',
+            'format': 'best[height<=720]',
+        }, auto_init=False)
+        ydl.add_info_extractor(ThreadIE())
+
+        results = {}
+        errors = []
+
+        def work(thread_num):
+            try:
+                for i in range(CALLS):
+                    video_id = '%d' % (thread_num * CALLS + i)
+                    res = ydl.extract_info('thread:' + video_id)
+                    results[video_id] = (res['id'], res['format_id'])
+            except Exception as e:
+                errors.append(e)
+
+        threads = [threading.Thread(target=work, args=(n,)) for n in range(THREADS)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+
+        self.assertEqual(errors, [])
+        self.assertEqual(ThreadIE.initialized, 1)
+        self.assertEqual(ydl._num_downloads, THREADS * CALLS)
+        self.assertEqual(len(results), THREADS * CALLS)
+        for video_id, (res_id, format_id) in results.items():
+            self.assertEqual(res_id, video_id)
+            self.assertEqual(format_id, '720')
+        # Every download got its own autonumber
+        self.assertEqual(
+            sorted(int(fn.partition('-')[0]) for fn in ydl.filenames),
+            list(range(1, THREADS * CALLS + 1)))
+
+
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,227 @@
+#!/usr/bin/env python
+# coding: utf-8
+from __future__ import unicode_literals
+
+# Allow direct execution
+import os
+import sys
+import unittest
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import gzip
+import io
+import socket
+import threading
+import time
+
+from youtube_dl import YoutubeDL
+from youtube_dl.asynchttp import asyncio
+from youtube_dl.compat import (
+    compat_HTTPError,
+    compat_http_server,
+)
+from youtube_dl.utils import (
+    HEADRequest,
+    sanitized_Request,
+)
+
+
+class HTTPTestRequestHandler(compat_http_server.BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, format, *args):
+        pass
+
+    def _respond(self, body, code=200, headers={}, chunked=False, send_body=True, keep_alive=False):
+        self.send_response(code)
+        for k, v in headers.items():
+            self.send_header(k, v)
+        if chunked:
+            self.send_header('Transfer-Encoding', 'chunked')
+        else:
+            self.send_header('Content-Length', '%d' % len(body))
+        if not keep_alive:
+            self.send_header('Connection', 'close')
+        self.end_headers()
+        if not send_body:
+            return
+        if chunked:
+            for i in range(0, len(body), 7):
+                chunk = body[i:i + 7]
+                self.wfile.write(b'%x\r\n' % len(chunk) + chunk + b'\r\n')
+            self.wfile.write(b'0\r\n\r\n')
+        else:
+            self.wfile.write(body)
+
+    def do_HEAD(self):
+        self._respond(b'\x00' * 14, headers={'Content-Type': 'video/mp4'}, send_body=False)
+
+    def do_POST(self):
+        data = self.rfile.read(int(self.headers['Content-Length']))
+        self._respond(b'posted: ' + data)
+
+    def do_GET(self):
+        if self.path == '/plain':
+            self._respond(b'plain text')
+        elif self.path == '/gzip':
+            buf = io.BytesIO()
+            with gzip.GzipFile(fileobj=buf, mode='wb') as f:
+                f.write(b'compressed text')
+            self._respond(buf.getvalue(), headers={'Content-Encoding': 'gzip'})
+        elif self.path == '/chunked':
+            self._respond(b'a body sent in several chunks', chunked=True)
+        elif self.path == '/redirect':
+            self._respond(b'', code=302, headers={
+                'Location': '/cookie',
+                'Set-Cookie': 'test=yes; path=/',
+            })
+        elif self.path == '/cookie':
+            self._respond(('cookie: %s' % self.headers.get('Cookie')).encode('utf-8'))
+        elif self.path == '/large':
+            self._respond(b'x' * (3 * 1024 * 1024))
+        elif self.path == '/keepalive':
+            self._respond(('%d' % self.client_address[1]).encode('utf-8'), keep_alive=True)
+        elif self.path == '/closing':
+            # Closed without telling the client, once it sent another request
+            self._respond(b'closing', keep_alive=True)
+            self.wfile.flush()
+            time.sleep(0.2)
+            self.close_connection = True
+        elif self.path == '/vid.mp4':
+            self._respond(b'\x00' * 14, headers={'Content-Type': 'video/mp4'})
+        else:
+            self._respond(b'not found', code=404)
+
+
+class FakeLogger(object):
+    def debug(self, msg):
+        pass
+
+    def warning(self, msg):
+        pass
+
+    def error(self, msg):
+        pass
+
+
+@unittest.skipIf(asyncio is None, 'asyncio is not available')
+class TestAsyncHTTP(unittest.TestCase):
+    def setUp(self):
+        self.httpd = compat_http_server.HTTPServer(
+            ('localhost', 0), HTTPTestRequestHandler)
+        self.base_url = 'http://localhost:%d' % self.httpd.server_address[1]
+        t = threading.Thread(target=self.httpd.serve_forever)
+        t.daemon = True
+        t.start()
+        self.loop = asyncio.new_event_loop()
+        self.ydl = YoutubeDL({'proxy': '', 'logger': FakeLogger()})
+        self.transport = self.ydl._get_async_transport(self.loop)
+
+    def tearDown(self):
+        self.transport.close()
+        self.loop.run_until_complete(asyncio.sleep(0))
+        self.loop.close()
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def fetch(self, path, req_class=sanitized_Request, data=None):
+        req = req_class(self.base_url + path, data=data)
+        resp, body = self.loop.run_until_complete(self.transport.fetch(req))
+        return resp, body
+
+    def test_fetch(self):
+        resp, body = self.fetch('/plain')
+        self.assertEqual(resp.getcode(), 200)
+        self.assertEqual(body, b'plain text')
+        self.assertEqual(resp.headers['Content-Length'], '10')
+
+        self.assertEqual(self.fetch('/gzip')[1], b'compressed text')
+        self.assertEqual(self.fetch('/chunked')[1], b'a body sent in several chunks')
+        self.assertEqual(self.fetch('/post', data=b'some data')[1], b'posted: some data')
+        self.assertEqual(len(self.fetch('/large')[1]), 3 * 1024 * 1024)
+
+        resp, body = self.fetch('/vid.mp4', req_class=HEADRequest)
+        self.assertEqual(resp.headers['Content-Type'], 'video/mp4')
+        self.assertEqual(body, b'')
+
+    def test_keep_alive(self):
+        ports = [self.fetch('/keepalive')[1] for _ in range(3)]
+        self.assertEqual(len(set(ports)), 1)
+        # Connections closed by the server are not reused
+        self.assertEqual(self.fetch('/plain')[1], b'plain text')
+        self.assertNotEqual(self.fetch('/keepalive')[1], ports[0])
+        # Requests sent on connections the server has closed are sent again
+        self.assertEqual(self.fetch('/closing')[1], b'closing')
+        self.assertEqual(self.fetch('/chunked')[1], b'a body sent in several chunks')
+
+    def test_connect_timeout(self):
+        ydl = YoutubeDL({'proxy': '', 'logger': FakeLogger(), 'socket_timeout': 0.5})
+        transport = ydl._get_async_transport(self.loop)
+        attempts = []
+        create_connection = self.loop.create_connection
+        getaddrinfo = socket.getaddrinfo
+
+        def create_connection_hanging_once(*args, **kwargs):
+            attempts.append(args[1:3])
+            if len(attempts) == 1:
+                return asyncio.sleep(60)
+            return create_connection(*args, **kwargs)
+
+        # Every address is tried for socket_timeout seconds
+        self.loop.create_connection = create_connection_hanging_once
+        socket.getaddrinfo = lambda *args: getaddrinfo(*args)[:1] * 2
+        try:
+            start = time.time()
+            resp, body = self.loop.run_until_complete(
+                transport.fetch(sanitized_Request(self.base_url + '/plain')))
+        finally:
+            socket.getaddrinfo = getaddrinfo
+            del self.loop.create_connection
+        self.assertEqual(body, b'plain text')
+        self.assertEqual(len(attempts), 2)
+        self.assertTrue(time.time() - start < 10)
+
+    def test_redirect_and_cookies(self):
+        resp, body = self.fetch('/redirect')
+        self.assertEqual(resp.geturl(), self.base_url + '/cookie')
+        self.assertEqual(body, b'cookie: test=yes')
+        self.assertTrue(any(c.name == 'test' for c in self.ydl.cookiejar))
+
+    def test_http_error(self):
+        with self.assertRaises(compat_HTTPError) as cm:
+            self.fetch('/missing')
+        self.assertEqual(cm.exception.code, 404)
+        self.assertEqual(cm.exception.read(), b'not found')
+
+    def test_threaded_urlopen(self):
+        results = []
+
+        def work():
+            resp = self.transport.urlopen(sanitized_Request(self.base_url + '/large'))
+            # Reading in small pieces makes the transport pause and resume
+            size = 0
+            while True:
+                chunk = resp.read(65536)
+                if not chunk:
+                    break
+                size += len(chunk)
+            results.append(size)
+
+        threads = [threading.Thread(target=work) for _ in range(4)]
+        for t in threads:
+            t.start()
+        while any(t.is_alive() for t in threads):
+            self.loop.run_until_complete(asyncio.sleep(0.01))
+        self.assertEqual(results, [3 * 1024 * 1024] * 4)
+
+    def test_extract_info_async(self):
+        futures = [
+            self.ydl.extract_info_async(self.base_url + '/vid.mp4', loop=self.loop)
+            for _ in range(5)]
+        results = self.loop.run_until_complete(asyncio.gather(*futures))
+        self.assertEqual([r['ext'] for r in results], ['mp4'] * 5)
+        self.assertEqual(results[0]['url'], self.base_url + '/vid.mp4')
+
+
+if __name__ == '__main__':
+    unittest.main()
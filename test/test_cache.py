@@ -4,6 +4,7 @@
 from __future__ import unicode_literals
 
 import shutil
+import time
 
 # Allow direct execution
 import os
@@ -13,7 +14,10 @@ sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 
 from test.helper import FakeYDL
-from youtube_dl.cache import Cache
+from youtube_dl.cache import (
+    Cache,
+    sqlite3,
+)
 
 
 def _is_empty(d):
@@ -54,6 +58,74 @@ class TestCache(unittest.TestCase):
         self.assertFalse(os.path.exists(self.test_dir))
         self.assertEqual(c.load('test_cache', 'k.'), None)
 
+    def test_cache_memory(self):
+        c = Cache(FakeYDL({'cachedir': self.test_dir}))
+        c.store('test_cache', 'k', {'x': [1]})
+        # Served from memory now
+        shutil.rmtree(self.test_dir)
+        obj = c.load('test_cache', 'k')
+        self.assertEqual(obj, {'x': [1]})
+        # Modifying the result does not change the cache
+        obj['x'].append(2)
+        self.assertEqual(c.load('test_cache', 'k'), {'x': [1]})
+        # Changing the cache dir invalidates memory
+        c._ydl.params['cachedir'] = self.test_dir + '2'
+        self.assertEqual(c.load('test_cache', 'k'), None)
+
+    def _test_policy(self, params):
+        params['cachedir'] = self.test_dir
+        c = Cache(FakeYDL(params))
+        c.set_policy('test_ttl', ttl=60)
+        c.store('test_ttl', 'k', 'v')
+        self.assertEqual(c.load('test_ttl', 'k'), 'v')
+        c2 = Cache(FakeYDL(params))
+        c2.set_policy('test_ttl', ttl=60)
+        self.assertEqual(c2.load('test_ttl', 'k'), 'v')
+        real_time = time.time
+        time.time = lambda: real_time() + 120
+        try:
+            self.assertEqual(c.load('test_ttl', 'k'), None)
+            self.assertEqual(c2.load('test_ttl', 'k'), None)
+        finally:
+            time.time = real_time
+
+        # Each entry is 12 bytes of JSON, the least recently used goes first
+        c.set_policy('test_size', max_size=30)
+        c.store('test_size', 'a', 'x' * 10)
+        time.sleep(0.01)
+        c.store('test_size', 'b', 'x' * 10)
+        time.sleep(0.01)
+        self.assertTrue(Cache(FakeYDL(params)).load('test_size', 'a'))
+        time.sleep(0.01)
+        c.store('test_size', 'c', 'x' * 10)
+        c = Cache(FakeYDL(params))
+        self.assertEqual(
+            [c.load('test_size', k) is not None for k in 'abc'], [True, False, True])
+
+    def test_cache_policy(self):
+        self._test_policy({})
+
+    @unittest.skipIf(sqlite3 is None, 'sqlite3 is not available')
+    def test_cache_sqlite(self):
+        ydl = FakeYDL({
+            'cachedir': self.test_dir,
+            'cache_backend': 'sqlite',
+        })
+        c = Cache(ydl)
+        obj = {'x': 1, 'y': ['ä', '\\a', True]}
+        self.assertEqual(c.load('test_cache', 'k.'), None)
+        c.store('test_cache', 'k.', obj)
+        self.assertTrue(os.path.exists(os.path.join(self.test_dir, 'cache.sqlite3')))
+        self.assertFalse(os.path.exists(os.path.join(self.test_dir, 'test_cache')))
+        self.assertEqual(Cache(ydl).load('test_cache', 'k.'), obj)
+        self.assertEqual(Cache(ydl).load('test_cache2', 'k.'), None)
+        c.remove()
+        self.assertFalse(os.path.exists(self.test_dir))
+        self.assertEqual(c.load('test_cache', 'k.'), None)
+
+        self.tearDown()
+        self._test_policy({'cache_backend': 'sqlite'})
+
 
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,216 @@
+#!/usr/bin/env python
+
+from __future__ import unicode_literals
+
+# Allow direct execution
+import os
+import random
+import sys
+import unittest
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from test.helper import FakeYDL
+from youtube_dl.extractor import YoutubeIE
+from youtube_dl.extractor.common import InfoExtractor, format_sort_key
+from youtube_dl.utils import determine_ext, determine_protocol, ExtractorError
+
+
+def legacy_sort_formats(formats, prefer_free_formats=False, field_preference=None):
+    """ InfoExtractor._sort_formats as it was before FORMAT_SORT_FIELDS """
+    for f in formats:
+        if 'tbr' not in f and f.get('abr') is not None and f.get('vbr') is not None:
+            f['tbr'] = f['abr'] + f['vbr']
+    formats.sort(key=lambda f: legacy_formats_key(f, prefer_free_formats, field_preference))
+
+
+def legacy_formats_key(f, prefer_free_formats, field_preference):
+    if not f.get('ext') and 'url' in f:
+        f['ext'] = determine_ext(f['url'])
+
+    if isinstance(field_preference, (list, tuple)):
+        return tuple(
+            f.get(field)
+            if f.get(field) is not None
+            else ('' if field == 'format_id' else -1)
+            for field in field_preference)
+
+    preference = f.get('preference')
+    if preference is None:
+        preference = 0
+        if f.get('ext') in ['f4f', 'f4m']:  # Not yet supported
+            preference -= 0.5
+
+    protocol = f.get('protocol') or determine_protocol(f)
+    proto_preference = 0 if protocol in ['http', 'https'] else (-0.5 if protocol == 'rtsp' else -0.1)
+
+    if f.get('vcodec') == 'none':  # audio only
+        preference -= 50
+        if prefer_free_formats:
+            ORDER = ['aac', 'mp3', 'm4a', 'webm', 'ogg', 'opus']
+        else:
+            ORDER = ['webm', 'opus', 'ogg', 'mp3', 'aac', 'm4a']
+        ext_preference = 0
+        try:
+            audio_ext_preference = ORDER.index(f['ext'])
+        except ValueError:
+            audio_ext_preference = -1
+    else:
+        if f.get('acodec') == 'none':  # video only
+            preference -= 40
+        if prefer_free_formats:
+            ORDER = ['flv', 'mp4', 'webm']
+        else:
+            ORDER = ['webm', 'flv', 'mp4']
+        try:
+            ext_preference = ORDER.index(f['ext'])
+        except ValueError:
+            ext_preference = -1
+        audio_ext_preference = 0
+
+    return (
+        preference,
+        f.get('language_preference') if f.get('language_preference') is not None else -1,
+        f.get('quality') if f.get('quality') is not None else -1,
+        f.get('tbr') if f.get('tbr') is not None else -1,
+        f.get('filesize') if f.get('filesize') is not None else -1,
+        f.get('vbr') if f.get('vbr') is not None else -1,
+        f.get('height') if f.get('height') is not None else -1,
+        f.get('width') if f.get('width') is not None else -1,
+        proto_preference,
+        ext_preference,
+        f.get('abr') if f.get('abr') is not None else -1,
+        audio_ext_preference,
+        f.get('fps') if f.get('fps') is not None else -1,
+        f.get('filesize_approx') if f.get('filesize_approx') is not None else -1,
+        f.get('source_preference') if f.get('source_preference') is not None else -1,
+        f.get('format_id') if f.get('format_id') is not None else '',
+    )
+
+
+def youtube_formats():
+    formats = []
+    for itag, f in YoutubeIE._formats.items():
+        f = dict(f, format_id=itag)
+        note = f.get('format_note') or ''
+        if note.startswith('DASH audio'):
+            f['vcodec'] = 'none'
+        elif note.startswith('DASH video'):
+            f['acodec'] = 'none'
+        f['url'] = 'https://r1---sn-example.googlevideo.com/videoplayback?itag=%s' % itag
+        formats.append(f)
+    return formats
+
+
+def random_formats(count, seed):
+    rnd = random.Random(seed)
+
+    def maybe(*values):
+        return rnd.choice((None,) + values)
+
+    formats = []
+    for i in range(count):
+        ext = rnd.choice(['mp4', 'webm', 'flv', 'm4a', 'mp3', 'ogg', 'opus', 'aac', 'f4m', 'm3u8', 'mpd', '3gp'])
+        f = {
+            'format_id': maybe('hls-%d' % i, 'dash-%d' % i, '%d' % rnd.randint(0, 10)),
+            'url': rnd.choice(['http', 'https', 'rtmp', 'rtsp', 'mms']) + '://example.com/%d.%s' % (i, ext),
+            'ext': maybe(ext),
+            'protocol': maybe('m3u8_native', 'http_dash_segments', 'https', 'rtmp', 'f4m'),
+            'vcodec': maybe('none', 'avc1.64001f', 'vp9'),
+            'acodec': maybe('none', 'mp4a.40.2', 'opus'),
+            'preference': maybe(-10, -1, 0, 1, 2.5),
+            'language_preference': maybe(-1, 10),
+            'quality': maybe(0, 1, 2),
+            'tbr': maybe(64, 128, 800, 2500, 2500.5),
+            'abr': maybe(64, 128),
+            'vbr': maybe(600, 2300),
+            'filesize': maybe(1000, 2000),
+            'filesize_approx': maybe(1500),
+            'height': maybe(240, 720, 1080),
+            'width': maybe(426, 1280, 1920),
+            'fps': maybe(25, 30, 60),
+            'source_preference': maybe(-1, 1),
+        }
+        formats.append(dict((k, v) for k, v in f.items() if v is not None or rnd.random() < 0.3))
+    return formats
+
+
+class SortIE(InfoExtractor):
+    pass
+
+
+class TestFormatSort(unittest.TestCase):
+    FIXTURES = [
+        ('youtube', youtube_formats()),
+        ('random', random_formats(500, 0)),
+        ('random-small', random_formats(20, 1)),
+    ]
+
+    # Field preferences passed by extractors
+    FIELD_PREFERENCES = [
+        ('width', 'height', 'tbr', 'format_id'),
+        ('preference', 'width', 'height', 'tbr', 'format_id'),
+        ('preference', 'height', 'width', 'fps', 'tbr', 'format_id'),
+        ('height', 'quality', 'format_id'),
+        ['format_id'],
+    ]
+
+    def assertSameOrder(self, formats, params={}, field_preference=None):
+        expected = [dict(f) for f in formats]
+        legacy_sort_formats(expected, params.get('prefer_free_formats', False), field_preference)
+        got = [dict(f) for f in formats]
+        SortIE(FakeYDL(params))._sort_formats(got, field_preference)
+        self.assertEqual(
+            [f.get('format_id') for f in got], [f.get('format_id') for f in expected])
+        self.assertEqual(got, expected)
+
+    def test_parity(self):
+        for name, formats in self.FIXTURES:
+            for prefer_free_formats in (False, True):
+                self.assertSameOrder(formats, {'prefer_free_formats': prefer_free_formats})
+            for field_preference in self.FIELD_PREFERENCES:
+                self.assertSameOrder(formats, field_preference=field_preference)
+
+    def test_parity_shuffled(self):
+        rnd = random.Random(2)
+        for _ in range(20):
+            formats = random_formats(50, rnd.random())
+            rnd.shuffle(formats)
+            self.assertSameOrder(formats)
+
+    def test_user_fields(self):
+        formats = [
+            {'format_id': 'hls-1080', 'url': 'http://x/1080.m3u8', 'protocol': 'm3u8_native', 'height': 1080, 'tbr': 5000, 'preference': -1},
+            {'format_id': 'http-720', 'url': 'http://x/720.mp4', 'height': 720, 'tbr': 2000},
+            {'format_id': 'http-360-60', 'url': 'http://x/360.mp4', 'height': 360, 'fps': 60, 'tbr': 800},
+        ]
+        ie = SortIE(FakeYDL({}))
+        ie._sort_formats(formats)
+        self.assertEqual([f['format_id'] for f in formats], ['hls-1080', 'http-360-60', 'http-720'])
+
+        ie = SortIE(FakeYDL({'format_sort': ['height']}))
+        ie._sort_formats(formats)
+        self.assertEqual([f['format_id'] for f in formats], ['http-360-60', 'http-720', 'hls-1080'])
+
+        ie = SortIE(FakeYDL({'format_sort': ['fps', 'proto_preference']}))
+        ie._sort_formats(formats)
+        self.assertEqual([f['format_id'] for f in formats], ['hls-1080', 'http-720', 'http-360-60'])
+
+        # String fields, some formats lacking them
+        formats[1]['vcodec'] = 'avc1'
+        ie = SortIE(FakeYDL({'format_sort': ['vcodec']}))
+        ie._sort_formats(formats)
+        self.assertEqual(formats[-1]['format_id'], 'http-720')
+
+        ie = SortIE(FakeYDL({'format_sort': ['heigth']}))
+        self.assertRaises(ExtractorError, ie._sort_formats, formats)
+
+    def test_format_sort_key(self):
+        key = format_sort_key(['height', 'ext_preference'], prefer_free_formats=True)
+        self.assertEqual(key({'url': 'http://x/a.webm', 'ext': 'webm', 'height': 720}), (720, 2))
+        self.assertEqual(key({'url': 'http://x/a.mp4', 'ext': 'mp4'}), (-1, 1))
+        key = format_sort_key(['format_id', 'audio_ext_preference'])
+        self.assertEqual(key({'url': 'http://x/a', 'ext': 'm4a', 'vcodec': 'none'}), ('', 5))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,167 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+from __future__ import unicode_literals
+
+# Allow direct execution
+import os
+import struct
+import sys
+import unittest
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from test.helper import FakeYDL
+from youtube_dl.id3 import (
+    comment_frame,
+    ID3Error,
+    ID3Tag,
+    picture_frame,
+    text_frame,
+    user_text_frame,
+)
+from youtube_dl.postprocessor import (
+    EmbedThumbnailPP,
+    FFmpegMetadataPP,
+)
+
+TEST_FILE = 'id3-testfile.mp3'
+THUMBNAIL_FILE = 'id3-testfile.png'
+AUDIO = b'\xff\xfb\x90\x00' * 64
+
+
+def make_tag(frames, version=4, padding=0, flags=0):
+    data = b''
+    for frame_id, payload in frames:
+        if version == 4:
+            size = struct.pack(b'>4B', 0, 0, len(payload) >> 7, len(payload) & 0x7f)
+        else:
+            size = struct.pack(b'>I', len(payload))
+        data += frame_id + size + b'\0\0' + payload
+    data += b'\0' * padding
+    return b'ID3' + struct.pack(b'>BBB4B', version, 0, flags, 0, 0, len(data) >> 7, len(data) & 0x7f) + data
+
+
+class TestID3(unittest.TestCase):
+    def tearDown(self):
+        for fn in (TEST_FILE, THUMBNAIL_FILE):
+            if os.path.exists(fn):
+                os.remove(fn)
+
+    def write(self, data):
+        with open(TEST_FILE, 'wb') as f:
+            f.write(data)
+
+    def read(self):
+        with open(TEST_FILE, 'rb') as f:
+            return f.read()
+
+    def test_new_tag(self):
+        self.write(AUDIO)
+        tag = ID3Tag(TEST_FILE)
+        self.assertEqual((tag.frames, tag.size), ([], 0))
+        tag.set(b'TIT2', text_frame('Ünïcödé'))
+        tag.save()
+        data = self.read()
+        self.assertEqual(data[:5], b'ID3\x04\x00')
+        self.assertTrue(data.endswith(AUDIO))
+        tag = ID3Tag(TEST_FILE)
+        self.assertEqual(tag.frames, [(b'TIT2', b'\x03' + 'Ünïcödé'.encode('utf-8'))])
+        # Room was left for more tags
+        self.assertEqual(tag.size, len(data) - len(AUDIO))
+        self.assertTrue(tag.size > 1024)
+
+    def test_in_place(self):
+        original = make_tag([
+            (b'TIT2', text_frame('old title')),
+            (b'TXXX', b'\x01' + 'purl'.encode('utf-16') + b'\0\0' + 'u'.encode('utf-16')),
+            (b'TXXX', user_text_frame('other', 'x')),
+        ], padding=512) + AUDIO
+        self.write(original)
+        tag = ID3Tag(TEST_FILE)
+        tag.set(b'TIT2', text_frame('title'))
+        tag.set(b'TXXX', user_text_frame('purl', 'http://example.com/'))
+        tag.set(b'COMM', comment_frame('comment'))
+        tag.set(b'APIC', picture_frame(b'\x89PNG\r\n\x1a\n', 'image/png', 'Album cover'))
+        tag.save()
+        data = self.read()
+        self.assertEqual(len(data), len(original))
+        self.assertTrue(data.endswith(AUDIO))
+        self.assertEqual(ID3Tag(TEST_FILE).frames, [
+            (b'TXXX', b'\x03other\0x'),
+            (b'TIT2', b'\x03title'),
+            (b'TXXX', b'\x03purl\0http://example.com/'),
+            (b'COMM', b'\x03eng\0comment'),
+            (b'APIC', b'\x03image/png\0\x03Album cover\0\x89PNG\r\n\x1a\n'),
+        ])
+
+    def test_versions(self):
+        # ID3v2.3 tags are saved as ID3v2.4
+        self.write(make_tag([(b'TALB', b'\0album' * 30)], version=3) + AUDIO)
+        tag = ID3Tag(TEST_FILE)
+        self.assertEqual(tag.frames, [(b'TALB', b'\0album' * 30)])
+        tag.save()
+        self.assertEqual(self.read()[3:4], b'\x04')
+        self.assertEqual(ID3Tag(TEST_FILE).frames, [(b'TALB', b'\0album' * 30)])
+
+        self.write(make_tag([], version=2) + AUDIO)
+        self.assertRaises(ID3Error, ID3Tag, TEST_FILE)
+        # Unsynchronisation
+        self.write(make_tag([], flags=0x80) + AUDIO)
+        self.assertRaises(ID3Error, ID3Tag, TEST_FILE)
+
+    def test_tag_pps(self):
+        ydl = FakeYDL({'quiet': True})
+        self.write(AUDIO)
+        with open(THUMBNAIL_FILE, 'wb') as f:
+            f.write(b'\x89PNG\r\n\x1a\n')
+        info = {
+            'filepath': TEST_FILE, 'ext': 'mp3', 'title': 'title', 'description': 'desc',
+            'thumbnails': [{'filename': THUMBNAIL_FILE}],
+        }
+        for pp in (FFmpegMetadataPP(ydl), EmbedThumbnailPP(ydl, already_have_thumbnail=True)):
+            self.assertEqual(pp.copy_plan(info), None)
+            self.assertEqual(pp.run(info), ([], info))
+        self.assertTrue(os.path.exists(THUMBNAIL_FILE))
+        self.assertTrue(self.read().endswith(AUDIO))
+        self.assertEqual(ID3Tag(TEST_FILE).frames, [
+            (b'COMM', b'\x03eng\0desc'),
+            (b'TXXX', b'\x03description\0desc'),
+            (b'TIT2', b'\x03title'),
+            (b'APIC', b'\x03image/png\0\x03Album cover\0\x89PNG\r\n\x1a\n'),
+        ])
+
+        # ffmpeg embeds other images
+        with open(THUMBNAIL_FILE, 'wb') as f:
+            f.write(b'RIFF\0\0\0\0WEBPVP8 ')
+        self.assertEqual(EmbedThumbnailPP(ydl).copy_plan(info).inputs, [THUMBNAIL_FILE])
+
+    def test_tag_pps_with_ffmpeg(self):
+        class MetadataPP(FFmpegMetadataPP):
+            available = True
+
+        class ThumbnailPP(EmbedThumbnailPP):
+            available = True
+
+        ydl = FakeYDL({'quiet': True})
+        with open(THUMBNAIL_FILE, 'wb') as f:
+            f.write(b'\x89PNG\r\n\x1a\n' + b'\0' * 2048)
+        info = {
+            'filepath': TEST_FILE, 'ext': 'mp3', 'title': 'a longer title',
+            'thumbnails': [{'filename': THUMBNAIL_FILE}],
+        }
+        # Tags outgrowing the padding ffmpeg leaves are written by a single
+        # ffmpeg command instead of copying the file for each postprocessor
+        self.write(make_tag([], padding=16) + AUDIO)
+        metadata_plan = MetadataPP(ydl).copy_plan(info)
+        thumbnail_plan = ThumbnailPP(ydl).copy_plan(info)
+        self.assertEqual(metadata_plan.metadata, [('-metadata', 'title=a longer title')])
+        self.assertEqual(thumbnail_plan.inputs, [THUMBNAIL_FILE])
+        self.assertTrue(metadata_plan.merge(thumbnail_plan) is not None)
+
+        self.write(make_tag([], padding=4096) + AUDIO)
+        self.assertEqual(MetadataPP(ydl).copy_plan(info), None)
+        self.assertEqual(ThumbnailPP(ydl).copy_plan(info), None)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -73,8 +73,6 @@ class TestJSInterpreter(unittest.TestCase):
         self.assertEqual(jsi.call_function('f'), -11)
 
     def test_comments(self):
-        'Skipping: Not yet fully implemented'
-        return
         jsi = JSInterpreter('''
         function x() {
             var x = /* 1 + */ 2;
@@ -112,6 +110,18 @@ class TestJSInterpreter(unittest.TestCase):
         ''')
         self.assertEqual(jsi.call_function('z'), 5)
 
+    def test_signature_style(self):
+        jsi = JSInterpreter('''
+        var Wo={Pk:function(a,b){a.splice(0,b)},gY:function(a){a.reverse()},
+        mD:function(a,b){var c=a[0];a[0]=a[b%a.length];a[b%a.length]=c}};
+        var Xo=function(a){a=a.split("");Wo.mD(a,3);Wo.Pk(a,2);Wo.gY(a,18);return a.join("")};
+        ''')
+        self.assertEqual(jsi.call_function('Xo', 'abcdefgh'), 'hgfeac')
+
+    def test_strings(self):
+        jsi = JSInterpreter('''function f(){return "a;b" + 'c\\'d' + "\\x65\\u0066";}''')
+        self.assertEqual(jsi.call_function('f'), "a;bc'def")
+
 
 if __name__ == '__main__':
     unittest.main()
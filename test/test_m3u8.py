@@ -0,0 +1,227 @@
+#!/usr/bin/env python
+
+from __future__ import unicode_literals
+
+# Allow direct execution
+import os
+import shutil
+import sys
+import unittest
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from test.helper import FakeYDL
+from youtube_dl.downloader.hls import HlsFD
+from youtube_dl.postprocessor import ffmpeg
+from youtube_dl.utils import encode_data_uri
+from youtube_dl.m3u8 import (
+    M3U8MasterPlaylist,
+    M3U8Media,
+    M3U8MediaParser,
+    M3U8MediaPlaylist,
+    parse_m3u8,
+    parse_m3u8_master,
+    parse_m3u8_media,
+)
+
+
+MEDIA_PLAYLIST = '''#EXTM3U
+#EXT-X-VERSION:4
+#EXT-X-TARGETDURATION:10
+#EXT-X-MEDIA-SEQUENCE:7
+#EXT-X-PLAYLIST-TYPE:VOD
+#EXT-X-MAP:URI="init.mp4",BYTERANGE="720@0"
+#EXTINF:9.009,first
+#EXT-X-BYTERANGE:1000@720
+media.mp4
+#EXTINF:9.009,
+#EXT-X-BYTERANGE:2000
+media.mp4
+#EXT-X-KEY:METHOD=AES-128,URI="https://keys.example.com/k1",IV=0x0000000000000000000000000000000A
+#EXTINF:3.003,
+#EXT-X-PROGRAM-DATE-TIME:2017-04-01T10:00:00.000Z
+http://cdn.example.com/seg2.ts
+#EXT-X-DISCONTINUITY
+#EXT-X-KEY:METHOD=NONE
+#EXTINF:10,
+seg3.ts
+#EXT-X-ENDLIST
+'''
+
+
+class TestM3U8(unittest.TestCase):
+    def test_media_playlist(self):
+        playlist = parse_m3u8_media(MEDIA_PLAYLIST, 'http://example.com/hls/index.m3u8')
+        self.assertTrue(isinstance(playlist, M3U8MediaPlaylist))
+        self.assertEqual(playlist.version, 4)
+        self.assertEqual(playlist.target_duration, 10)
+        self.assertEqual(playlist.media_sequence, 7)
+        self.assertEqual(playlist.playlist_type, 'VOD')
+        self.assertTrue(playlist.endlist)
+        self.assertAlmostEqual(playlist.duration, 31.021)
+        self.assertEqual([k.method for k in playlist.keys], ['AES-128', 'NONE'])
+
+        s0, s1, s2, s3 = playlist.segments
+        self.assertEqual(
+            [s.url for s in playlist.segments],
+            ['http://example.com/hls/media.mp4', 'http://example.com/hls/media.mp4',
+             'http://cdn.example.com/seg2.ts', 'http://example.com/hls/seg3.ts'])
+        self.assertEqual([s.media_sequence for s in playlist.segments], [7, 8, 9, 10])
+        self.assertEqual([s.duration for s in playlist.segments], [9.009, 9.009, 3.003, 10.0])
+        self.assertEqual([s.title for s in playlist.segments], ['first', None, None, None])
+        self.assertEqual([s.byterange for s in playlist.segments], [(1000, 720), (2000, 1720), None, None])
+        self.assertEqual([s.discontinuity for s in playlist.segments], [False, False, False, True])
+        self.assertEqual(s2.program_date_time, '2017-04-01T10:00:00.000Z')
+
+        self.assertEqual(s0.map.url, 'http://example.com/hls/init.mp4')
+        self.assertEqual(s0.map.byterange, (720, 0))
+        self.assertTrue(s3.map is s0.map)
+
+        self.assertTrue(s0.key is None and s1.key is None and s3.key is None)
+        self.assertEqual(s2.key.method, 'AES-128')
+        self.assertEqual(s2.key.url, 'https://keys.example.com/k1')
+        self.assertEqual(s2.key.iv, b'\x00' * 15 + b'\x0a')
+
+    def test_incremental(self):
+        whole = parse_m3u8_media(MEDIA_PLAYLIST, 'http://example.com/')
+        for chunk_size in (1, 7, 50):
+            parser = M3U8MediaParser('http://example.com/')
+            counts = []
+            for i in range(0, len(MEDIA_PLAYLIST), chunk_size):
+                counts.append(len(parser.feed(MEDIA_PLAYLIST[i:i + chunk_size])))
+            playlist = parser.close()
+            self.assertEqual(sum(counts), 4)
+            self.assertEqual(
+                [(s.url, s.byterange, s.media_sequence, s.duration) for s in playlist.segments],
+                [(s.url, s.byterange, s.media_sequence, s.duration) for s in whole.segments])
+
+        # Live playlist content appended after the first fetch
+        parser = M3U8MediaParser('http://example.com/live/')
+        segments = parser.feed('#EXTM3U\r\n#EXT-X-TARGETDURATION:2\r\n#EXT-X-MEDIA-SEQUENCE:100\r\n#EXTINF:2,\r\n100.ts\r\n#EXTINF:2,\r\n10')
+        self.assertEqual([s.uri for s in segments], ['100.ts'])
+        segments = parser.feed('1.ts\r\n#EXTINF:2,\r\n102.ts\r\n')
+        self.assertEqual([(s.uri, s.media_sequence) for s in segments], [('101.ts', 101), ('102.ts', 102)])
+        self.assertEqual(parser.feed('#EXT-X-ENDLIST'), [])
+        self.assertFalse(parser.playlist.endlist)
+        self.assertTrue(parser.close().endlist)
+        self.assertEqual(len(parser.playlist.segments), 3)
+
+    def test_master_playlist(self):
+        playlist = parse_m3u8('''#EXTM3U
+#EXT-X-MEDIA:TYPE=AUDIO,GROUP-ID="aud",NAME="English",URI="en/index.m3u8"
+#EXT-X-STREAM-INF:BANDWIDTH=800000,RESOLUTION=640x360,CODECS="avc1.4d401e,mp4a.40.2",AUDIO="aud"
+360p/index.m3u8
+#EXT-X-I-FRAME-STREAM-INF:BANDWIDTH=80000,URI="iframes.m3u8"
+#EXT-X-MEDIA:TYPE=AUDIO,GROUP-ID="aud2",NAME="Commentary"
+https://cdn.example.com/720p.m3u8
+''', 'http://example.com/master.m3u8')
+        self.assertTrue(isinstance(playlist, M3U8MasterPlaylist))
+        self.assertEqual(
+            [item.__class__.__name__ for item in playlist.items],
+            ['M3U8Media', 'M3U8Variant', 'M3U8Media', 'M3U8Variant'])
+        media, variants = playlist.media, playlist.variants
+        self.assertEqual(media[0].url, 'http://example.com/en/index.m3u8')
+        self.assertEqual(media[1].url, None)
+        self.assertEqual(media[1].attributes['NAME'], 'Commentary')
+        self.assertEqual([v.url for v in variants], [
+            'http://example.com/360p/index.m3u8', 'https://cdn.example.com/720p.m3u8'])
+        self.assertEqual(variants[0].attributes, {
+            'BANDWIDTH': '800000', 'RESOLUTION': '640x360',
+            'CODECS': 'avc1.4d401e,mp4a.40.2', 'AUDIO': 'aud'})
+        self.assertEqual(variants[1].attributes, {})
+        self.assertTrue(isinstance(playlist.items[0], M3U8Media))
+        self.assertEqual(parse_m3u8_master('#EXTM3U\n').items, [])
+
+    def test_hls_can_download(self):
+        def can_download(manifest, info_dict={}):
+            return HlsFD.can_download('#EXTM3U\n#EXT-X-TARGETDURATION:10\n%s\n#EXTINF:10,\n0.ts\n' % manifest, info_dict)
+
+        self.assertTrue(can_download(''))
+        self.assertTrue(can_download('#EXT-X-KEY:METHOD=NONE'))
+        self.assertFalse(can_download('#EXT-X-KEY:METHOD=SAMPLE-AES,URI="k"'))
+        self.assertFalse(can_download('#EXT-X-BYTERANGE:100@0'))
+        self.assertFalse(can_download('', {'is_live': True}))
+        playlist = parse_m3u8_media('#EXTM3U\n#EXTINF:10,\n0.ts\n')
+        self.assertTrue(HlsFD.can_download(playlist, {}))
+
+    def test_manifest_reuse(self):
+        url = 'http://example.com/hls/index.m3u8'
+        fetched = []
+
+        class ManifestYDL(FakeYDL):
+            def urlopen(self, req):
+                fetched.append(req)
+                raise IOError('no network')
+
+        ydl = ManifestYDL()
+        fd = HlsFD(ydl, {})
+        ydl.store_manifest(url, MEDIA_PLAYLIST, 'http://cdn.example.com/index.m3u8')
+        self.assertEqual(
+            fd._download_manifest({'url': url}, url),
+            (MEDIA_PLAYLIST, 'http://cdn.example.com/index.m3u8'))
+        self.assertEqual(fetched, [])
+        # Live playlists and stale manifests are downloaded again
+        self.assertRaises(IOError, fd._download_manifest, {'url': url, 'is_live': True}, url)
+        self.assertEqual(ydl.load_manifest(url, -1), None)
+        self.assertRaises(IOError, fd._download_manifest, {'url': url + '?x'}, url + '?x')
+        self.assertEqual(len(fetched), 2)
+
+        for i in range(ydl._MANIFEST_STORE_SIZE):
+            ydl.store_manifest('http://example.com/%d.m3u8' % i, '')
+        self.assertEqual(ydl.load_manifest(url, 60), None)
+        self.assertEqual(len(ydl._manifests), ydl._MANIFEST_STORE_SIZE)
+
+    @unittest.skipIf(os.name != 'posix', 'uses a shell script as ffmpeg')
+    def test_pipe_remux(self):
+        test_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'testdata', 'hls_remux_test')
+        if os.path.exists(test_dir):
+            shutil.rmtree(test_dir)
+        os.makedirs(test_dir)
+        log = os.path.join(test_dir, 'ffmpeg.log')
+        exe = os.path.join(test_dir, 'ffmpeg')
+        with open(exe, 'w') as f:
+            # Writes what it reads to the output file, the last argument
+            f.write('''#!/bin/sh
+echo "$@" >> "%s"
+if [ "$1" = -version ]; then echo "ffmpeg version 3.0"; exit; fi
+for out; do :; done
+cat > "${out#file:}"
+''' % log)
+        os.chmod(exe, 0o755)
+        ffmpeg._exe_versions.clear()
+
+        url = 'http://example.com/hls/index.m3u8'
+        playlist = '#EXTM3U\n#EXT-X-TARGETDURATION:10\n%s#EXT-X-ENDLIST\n' % ''.join(
+            '#EXTINF:10,\n%s\n' % encode_data_uri(data, 'video/mp2t') for data in (b'frag0', b'frag1'))
+        filename = os.path.join(test_dir, 'video.mp4')
+        params = {'hls_pipe_remux': True, 'ffmpeg_location': exe, 'cachedir': False, 'quiet': True}
+        ydl = FakeYDL(params)
+        ydl.store_manifest(url, playlist)
+        progress = []
+        fd = HlsFD(ydl, params)
+        fd.add_progress_hook(lambda s: progress.append(s['status']))
+        try:
+            self.assertTrue(fd.real_download(filename, {'url': url, 'acodec': 'mp4a.40.2'}))
+            with open(filename, 'rb') as f:
+                self.assertEqual(f.read(), b'frag0frag1')
+            with open(log) as f:
+                args = f.read().splitlines()[-1].split()
+            self.assertEqual(args[args.index('-i') + 1:-1], [
+                'pipe:0', '-c', 'copy', '-f', 'mp4', '-bsf:a', 'aac_adtstoasc'])
+            self.assertEqual(progress[-1], 'finished')
+            self.assertEqual(sorted(os.listdir(test_dir)), ['ffmpeg', 'ffmpeg.log', 'video.mp4'])
+
+            # ffmpeg is stopped and its output removed when a fragment fails
+            class FailingHlsFD(HlsFD):
+                def _start_frag_download(self, ctx):
+                    ctx['dl'].download = lambda *args: False
+                    return HlsFD._start_frag_download(self, ctx)
+
+            os.remove(filename)
+            self.assertFalse(FailingHlsFD(ydl, params).real_download(filename, {'url': url}))
+            self.assertEqual(sorted(os.listdir(test_dir)), ['ffmpeg', 'ffmpeg.log'])
+        finally:
+            shutil.rmtree(test_dir)
+
+
+if __name__ == '__main__':
+    unittest.main()
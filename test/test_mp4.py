@@ -0,0 +1,235 @@
+#!/usr/bin/env python
+
+from __future__ import unicode_literals
+
+# Allow direct execution
+import os
+import sys
+import unittest
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from test.helper import FakeYDL
+from youtube_dl.mp4 import (
+    box,
+    full_box,
+    itunes_item,
+    itunes_number_item,
+    ITUNES_JPEG,
+    MP4EditError,
+    MP4File,
+    parse_boxes,
+    set_display_aspect_ratio,
+    set_itunes_items,
+    u16,
+    u32,
+)
+from youtube_dl.postprocessor import (
+    EmbedThumbnailPP,
+    FFmpegFixupM4aPP,
+    FFmpegFixupStretchedPP,
+    FFmpegMetadataPP,
+)
+
+TEST_FILE = 'mp4-testfile.mp4'
+THUMBNAIL_FILE = 'mp4-testfile.jpg'
+SAMPLES = b'\x01\x02\x03\x04' * 16
+
+
+def make_moov(width=640, height=360, fragmented=False):
+    tkhd = full_box(b'tkhd', 0, 7, b'\0' * 72 + u32.pack(width << 16) + u32.pack(height << 16))
+    hdlr = full_box(b'hdlr', 0, 0, u32.pack(0) + b'vide' + b'\0' * 12 + b'VideoHandler\0')
+    avc1 = box(b'avc1', b'\0' * 24 + u16.pack(width) + u16.pack(height) + b'\0' * 50 + box(b'avcC', b'\1\2\3'))
+    stsd = full_box(b'stsd', 0, 0, u32.pack(1) + avc1)
+    stco = full_box(b'stco', 0, 0, u32.pack(1) + u32.pack(0))
+    stbl = box(b'stbl', stsd + stco)
+    mdia = box(b'mdia', hdlr + box(b'minf', stbl))
+    mvex = box(b'mvex', full_box(b'trex', 0, 0, u32.pack(1) + b'\0' * 16)) if fragmented else b''
+    return box(b'moov', box(b'trak', tkhd + mdia) + mvex)
+
+
+def make_mp4(brands=b'dashiso6', padding=0, fragmented=False):
+    ftyp = box(b'ftyp', brands[:4] + u32.pack(0) + brands)
+    moov = make_moov(fragmented=fragmented)
+    if padding:
+        moov += box(b'free', b'\0' * (padding - 8))
+    if fragmented:
+        moov += box(b'moof', full_box(b'mfhd', 0, 0, u32.pack(1)))
+    return ftyp + moov + box(b'mdat', SAMPLES)
+
+
+def write_test_file(data):
+    with open(TEST_FILE, 'wb') as f:
+        f.write(data)
+
+
+def read_test_file():
+    with open(TEST_FILE, 'rb') as f:
+        return f.read()
+
+
+class TestMP4(unittest.TestCase):
+    def tearDown(self):
+        for fn in (TEST_FILE, THUMBNAIL_FILE):
+            if os.path.exists(fn):
+                os.remove(fn)
+
+    def test_parse_boxes(self):
+        moov = make_moov()
+        boxes = parse_boxes(moov)
+        self.assertEqual(len(boxes), 1)
+        self.assertEqual(boxes[0].serialize(), moov)
+        avc1 = boxes[0].find(b'trak', b'mdia', b'minf', b'stbl', b'stsd', b'avc1')
+        self.assertEqual([b.type for b in avc1.children], [b'avcC'])
+        self.assertEqual(avc1.find(b'avcC').payload, b'\1\2\3')
+        self.assertEqual(boxes[0].find(b'trak', b'udta'), None)
+        # What cannot be parsed is kept as is
+        self.assertEqual(parse_boxes(b'\0\0\0\x10moov'), None)
+        stsd = parse_boxes(full_box(b'stsd', 0, 0, u32.pack(1) + b'garbage'))[0]
+        self.assertEqual(stsd.children, None)
+        self.assertEqual(stsd.serialize(), full_box(b'stsd', 0, 0, u32.pack(1) + b'garbage'))
+
+    def test_brands(self):
+        data = make_mp4()
+        write_test_file(data)
+        with MP4File(TEST_FILE) as mp4:
+            self.assertEqual(mp4.brands, (b'dash', [b'dash', b'iso6']))
+            mp4.set_brands(b'M4A ', [b'isom', b'iso6'])
+            mp4.save()
+            self.assertEqual(mp4.brands, (b'M4A ', [b'isom', b'iso6']))
+            mp4.set_brands(b'M4A ', [b'isom'])
+            self.assertRaises(MP4EditError, mp4.check)
+        self.assertEqual(read_test_file(), data.replace(b'ftypdash', b'ftypM4A ').replace(b'dashiso6', b'isomiso6'))
+
+    def _set_aspect_ratio(self, data):
+        write_test_file(data)
+        with MP4File(TEST_FILE) as mp4:
+            set_display_aspect_ratio(mp4.moov, 16 / 9.0)
+            mp4.save()
+        return read_test_file()
+
+    def _check_samples(self, data, original):
+        # The samples do not move
+        self.assertEqual(data.index(SAMPLES), original.index(SAMPLES))
+
+    def _check_aspect_ratio(self, data, original):
+        self._check_samples(data, original)
+        moov = parse_boxes(data[data.index(b'moov') - 4:])
+        moov = [b for b in moov if b.type == b'moov'][0]
+        avc1 = moov.find(b'trak', b'mdia', b'minf', b'stbl', b'stsd', b'avc1')
+        self.assertEqual(avc1.find(b'pasp').payload, u32.pack(1) + u32.pack(1))
+        self.assertEqual(moov.find(b'trak', b'tkhd').payload[76:84], u32.pack(640 << 16) + u32.pack(360 << 16))
+
+    def test_aspect_ratio(self):
+        # Square pixels of a video stored as 4:3
+        write_test_file(make_mp4())
+        with MP4File(TEST_FILE) as mp4:
+            set_display_aspect_ratio(mp4.moov, 4 / 3.0)
+            mp4.save()
+        avc1 = mp4.moov.find(b'trak', b'mdia', b'minf', b'stbl', b'stsd', b'avc1')
+        self.assertEqual(avc1.find(b'pasp').payload, u32.pack(3) + u32.pack(4))
+        self.assertEqual(u32.unpack(mp4.moov.find(b'trak', b'tkhd').payload[76:80])[0], 480 << 16)
+
+        # Written over the free space following moov
+        original = make_mp4(padding=64)
+        data = self._set_aspect_ratio(original)
+        self.assertEqual(len(data), len(original))
+        self._check_aspect_ratio(data, original)
+        self.assertEqual(data.index(b'mdat'), original.index(b'mdat'))
+
+        # Moved to the end of the file, replaced with a free box
+        original = make_mp4()
+        data = self._set_aspect_ratio(original)
+        self.assertEqual(len(data), len(original) + len(make_moov()) + 16)
+        self.assertEqual(data.index(b'free'), original.index(b'moov'))
+        self._check_aspect_ratio(data, original)
+
+        # Fragments must follow moov
+        write_test_file(make_mp4(fragmented=True))
+        with MP4File(TEST_FILE) as mp4:
+            set_display_aspect_ratio(mp4.moov, 16 / 9.0)
+            self.assertRaises(MP4EditError, mp4.save)
+        self.assertEqual(read_test_file(), make_mp4(fragmented=True))
+
+    def test_fixup_pps(self):
+        ydl = FakeYDL({'quiet': True})
+        write_test_file(make_mp4())
+        pp = FFmpegFixupM4aPP(ydl)
+        info = {'filepath': TEST_FILE, 'container': 'm4a_dash'}
+        self.assertEqual(pp.copy_plan(info), None)
+        self.assertEqual(pp.run(info), ([], info))
+        self.assertEqual(read_test_file()[8:12], b'M4A ')
+
+        # Fragmented files are remuxed by ffmpeg
+        write_test_file(make_mp4(fragmented=True))
+        info = {'filepath': TEST_FILE, 'container': 'm4a_dash'}
+        self.assertEqual(pp.copy_plan(info).opts, [('-f', 'mp4')])
+        self.assertEqual(read_test_file(), make_mp4(fragmented=True))
+        with MP4File(TEST_FILE, readonly=True) as mp4:
+            self.assertTrue(mp4.fragmented)
+        write_test_file(make_mp4())
+        with MP4File(TEST_FILE, readonly=True) as mp4:
+            self.assertFalse(mp4.fragmented)
+
+        # ffmpeg rewrites fragmented files it cannot fix in place
+        write_test_file(make_mp4(fragmented=True))
+        pp = FFmpegFixupStretchedPP(ydl)
+        info = {'filepath': TEST_FILE, 'stretched_ratio': 16 / 9.0}
+        self.assertEqual(pp.copy_plan(info).opts, [('-aspect', '%f' % (16 / 9.0))])
+        self.assertTrue(pp.copy_plan({'filepath': TEST_FILE}).empty)
+        original = make_mp4(padding=64)
+        write_test_file(original)
+        self.assertEqual(pp.copy_plan(info), None)
+        self.assertEqual(pp.run(info), ([], info))
+        self._check_aspect_ratio(read_test_file(), original)
+
+    def test_itunes_items(self):
+        moov = parse_boxes(make_moov())[0]
+        set_itunes_items(moov, [itunes_item(b'\xa9nam', 'title'), itunes_number_item(b'trkn', 3)])
+        ilst = moov.find(b'udta', b'meta', b'ilst')
+        self.assertEqual(moov.find(b'udta', b'meta', b'hdlr').payload[8:12], b'mdir')
+        self.assertEqual([item.type for item in ilst.children], [b'\xa9nam', b'trkn'])
+        self.assertEqual(
+            ilst.find(b'trkn', b'data').payload, u32.pack(0) * 2 + u16.pack(0) + u16.pack(3) + u16.pack(0) * 2)
+
+        # Items are replaced, the free box of meta shrinks
+        moov.find(b'udta', b'meta').children.append(parse_boxes(box(b'free', b'\0' * 100))[0])
+        size = len(moov.serialize())
+        set_itunes_items(moov, [itunes_item(b'\xa9nam', 'new title'), itunes_item(b'covr', b'jpeg', ITUNES_JPEG)])
+        self.assertEqual(len(moov.serialize()), size)
+        moov = parse_boxes(moov.serialize())[0]
+        ilst = moov.find(b'udta', b'meta', b'ilst')
+        self.assertEqual([item.type for item in ilst.children], [b'\xa9nam', b'trkn', b'covr'])
+        self.assertEqual(ilst.find(b'\xa9nam', b'data').payload, u32.pack(1) + u32.pack(0) + b'new title')
+        self.assertEqual(ilst.find(b'covr', b'data').payload, u32.pack(13) + u32.pack(0) + b'jpeg')
+
+    def test_tag_pps(self):
+        ydl = FakeYDL({'quiet': True})
+        original = make_mp4(padding=1024)
+        write_test_file(original)
+        info = {
+            'filepath': TEST_FILE, 'ext': 'm4a', 'title': 'title', 'track_number': 2,
+            'webpage_url': 'http://example.com/', 'thumbnails': [{'filename': THUMBNAIL_FILE}],
+        }
+        pp = FFmpegMetadataPP(ydl)
+        self.assertEqual(pp.copy_plan(info), None)
+        self.assertEqual(pp.run(info), ([], info))
+        with open(THUMBNAIL_FILE, 'wb') as f:
+            f.write(b'\xff\xd8\xff\xe0JFIF')
+        pp = EmbedThumbnailPP(ydl)
+        self.assertEqual(pp.run(info), ([], info))
+        self.assertFalse(os.path.exists(THUMBNAIL_FILE))
+
+        data = read_test_file()
+        self.assertEqual(len(data), len(original))
+        self._check_samples(data, original)
+        ilst = parse_boxes(data)[1].find(b'udta', b'meta', b'ilst')
+        self.assertEqual([item.type for item in ilst.children], [b'\xa9nam', b'trkn', b'covr'])
+        self.assertEqual(ilst.find(b'covr', b'data').payload[8:], b'\xff\xd8\xff\xe0JFIF')
+
+        # ffmpeg writes the tags of files the editor cannot handle
+        write_test_file(make_mp4(fragmented=True))
+        self.assertTrue(('-metadata', 'title=title') in FFmpegMetadataPP(ydl).copy_plan(info).metadata)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -4,14 +4,267 @@ from __future__ import unicode_literals
 
 # Allow direct execution
 import os
+import shutil
 import sys
 import unittest
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-from youtube_dl.postprocessor import MetadataFromTitlePP
+from test.helper import FakeYDL
+from youtube_dl.downloader.common import FileDownloader
+from youtube_dl.postprocessor import (
+    FFmpegEmbedSubtitlePP,
+    FFmpegExtractAudioPP,
+    FFmpegFixupM4aPP,
+    FFmpegMetadataPP,
+    FFmpegPostProcessor,
+    MetadataFromTitlePP,
+)
+from youtube_dl.postprocessor import ffmpeg
+from youtube_dl.postprocessor.common import PostProcessor
+from youtube_dl.postprocessor.ffmpeg import FFmpegCopyPlan
+from youtube_dl.utils import PostProcessingError
 
 
 class TestMetadataFromTitle(unittest.TestCase):
     def test_format_to_regex(self):
         pp = MetadataFromTitlePP(None, '%(title)s - %(artist)s')
         self.assertEqual(pp._titleregex, '(?P<title>.+)\ \-\ (?P<artist>.+)')
+
+
+@unittest.skipIf(os.name != 'posix', 'uses shell scripts as executables')
+class TestFFmpegDiscovery(unittest.TestCase):
+    def setUp(self):
+        self.test_dir = os.path.join(
+            os.path.dirname(os.path.abspath(__file__)), 'testdata', 'ffmpeg_test')
+        self.tearDown()
+        self.bin_dir = os.path.join(self.test_dir, 'bin')
+        os.makedirs(self.bin_dir)
+        self.log = os.path.join(self.test_dir, 'runs.log')
+        ffmpeg._exe_versions.clear()
+
+    def tearDown(self):
+        if os.path.exists(self.test_dir):
+            shutil.rmtree(self.test_dir)
+
+    def _write_exe(self, name, version, output=None):
+        fn = os.path.join(self.bin_dir, name)
+        with open(fn, 'w') as f:
+            f.write('#!/bin/sh\necho %s >> "%s"\n' % (name, self.log))
+            if output is not None:
+                f.write('if [ "$1" != -version ]; then cat "%s"; exit; fi\n' % output)
+            f.write('echo "%s version %s"\n' % (name, version))
+        os.chmod(fn, 0o755)
+        # Distinct modification times however coarse the filesystem ones are
+        st = os.stat(fn)
+        os.utime(fn, (st.st_atime, st.st_mtime + len(version)))
+
+    def _runs(self):
+        if not os.path.exists(self.log):
+            return []
+        with open(self.log) as f:
+            return f.read().split()
+
+    def test_versions_cached(self):
+        self._write_exe('ffmpeg', '3.4')
+        self._write_exe('ffprobe', '3.4')
+        params = {
+            'cachedir': os.path.join(self.test_dir, 'cache'),
+            'ffmpeg_location': self.bin_dir,
+        }
+        pp = FFmpegPostProcessor(FakeYDL(params))
+        self.assertEqual(pp.basename, 'ffmpeg')
+        self.assertEqual(pp._versions['ffmpeg'], '3.4')
+        self.assertEqual(pp._versions['avconv'], False)
+        self.assertEqual(sorted(self._runs()), ['ffmpeg', 'ffprobe'])
+
+        # Other postprocessors and processes don't run them again
+        FFmpegPostProcessor(FakeYDL(params))
+        ffmpeg._exe_versions.clear()
+        self.assertEqual(FFmpegPostProcessor(FakeYDL(params))._versions, pp._versions)
+        self.assertEqual(len(self._runs()), 2)
+
+        # An upgrade is noticed
+        self._write_exe('ffmpeg', '4.0.1')
+        pp = FFmpegPostProcessor(FakeYDL(params))
+        self.assertEqual(pp._versions['ffmpeg'], '4.0.1')
+        self.assertEqual(len(self._runs()), 4)
+
+        # Downloaders have no cache
+        ffmpeg._exe_versions.clear()
+        pp = FFmpegPostProcessor(FileDownloader(FakeYDL(params), params))
+        self.assertEqual(pp._versions['ffmpeg'], '4.0.1')
+        self.assertEqual(len(self._runs()), 6)
+
+    def test_probe(self):
+        output = os.path.join(self.test_dir, 'probe.json')
+        with open(output, 'w') as f:
+            f.write('''{
+    "streams": [
+        {"index": 0, "codec_name": "h264", "codec_type": "video", "width": 1280, "height": 720},
+        {"index": 1, "codec_name": "aac", "codec_type": "audio", "sample_rate": "44100",
+         "channels": 2, "duration": "10.005", "bit_rate": "128000"}
+    ],
+    "format": {"format_name": "mpegts", "duration": "10.010000", "bit_rate": "1500000"}
+}''')
+        self._write_exe('ffmpeg', '3.4')
+        self._write_exe('ffprobe', '3.4', output)
+        media_file = os.path.join(self.test_dir, 'media.ts')
+        with open(media_file, 'w') as f:
+            f.write('media')
+        ffmpeg._probe_results.clear()
+
+        pp = FFmpegPostProcessor(FakeYDL({'cachedir': False, 'ffmpeg_location': self.bin_dir}))
+        media = pp.probe(media_file)
+        self.assertEqual(media['container'], 'mpegts')
+        self.assertEqual(media['duration'], 10.01)
+        self.assertEqual(media['bitrate'], 1500000)
+        self.assertEqual([s['codec'] for s in media['streams']], ['h264', 'aac'])
+        self.assertEqual(media['streams'][0]['height'], 720)
+        self.assertEqual(media['streams'][1]['sample_rate'], 44100)
+        self.assertEqual(media['streams'][1]['duration'], 10.005)
+        self.assertEqual(len(self._runs()), 3)
+
+        # Probed once while the file is not modified
+        self.assertEqual(pp.get_audio_codec(media_file), 'aac')
+        self.assertEqual(pp.probe(media_file), media)
+        self.assertEqual(len(self._runs()), 3)
+        with open(media_file, 'a') as f:
+            f.write('more')
+        pp.probe(media_file)
+        self.assertEqual(len(self._runs()), 4)
+
+        self.assertEqual(pp.probe(media_file + '.missing'), None)
+        self.assertEqual(FFmpegPostProcessor.parse_probe_output(b'error'), None)
+
+
+class TestFFmpegCopyPlan(unittest.TestCase):
+    def test_merge(self):
+        subs = FFmpegCopyPlan(
+            ['subs'], ['a.en.vtt'], ['{0}', '-{0}:s', '{1}:0'], [('-c:s', 'mov_text')],
+            [('-metadata:s:s:0', 'language=eng')], files_to_delete=['a.en.vtt'])
+        fixup = FFmpegCopyPlan(['fixup'], opts=[('-f', 'mp4')])
+        plan = fixup.merge(subs).merge(FFmpegCopyPlan(['meta'], metadata=[('-metadata', 'title=t')]))
+        self.assertEqual(plan.notes, ['fixup', 'subs', 'meta'])
+        self.assertEqual(plan.files_to_delete, ['a.en.vtt'])
+        self.assertEqual(plan.ffmpeg_args(), [
+            '-c', 'copy', '-map', '0', '-map', '-0:s', '-map', '1:0',
+            '-f', 'mp4', '-c:s', 'mov_text',
+            '-metadata:s:s:0', 'language=eng', '-metadata', 'title=t'])
+
+        # The inputs of the second plan are renumbered
+        thumbnail = FFmpegCopyPlan(['thumb'], ['a.jpg'], ['{0}', '{1}'])
+        plan = FFmpegCopyPlan(inputs=['a.srt']).merge(thumbnail)
+        self.assertEqual(plan.inputs, ['a.srt', 'a.jpg'])
+        self.assertEqual(plan.ffmpeg_args(), ['-c', 'copy', '-map', '0', '-map', '2'])
+
+        self.assertEqual(subs.merge(thumbnail), None)
+        self.assertEqual(fixup.merge(FFmpegCopyPlan(opts=[('-f', 'matroska')])), None)
+        self.assertTrue(FFmpegCopyPlan().empty)
+        self.assertFalse(fixup.merge(FFmpegCopyPlan()).empty)
+
+    def test_post_process(self):
+        commands = []
+
+        class RecordingMixin(object):
+            def run_ffmpeg_multiple_files(self, input_paths, out_path, opts):
+                commands.append((input_paths, opts))
+                with open(out_path, 'w') as f:
+                    f.write('processed')
+
+        class FixupM4aPP(RecordingMixin, FFmpegFixupM4aPP):
+            pass
+
+        class MetadataPP(RecordingMixin, FFmpegMetadataPP):
+            pass
+
+        class EmbedSubtitlePP(RecordingMixin, FFmpegEmbedSubtitlePP):
+            pass
+
+        class OtherPP(PostProcessor):
+            def run(self, info):
+                commands.append('other')
+                return [], info
+
+        class FailingPP(FFmpegPostProcessor):
+            def copy_plan(self, info):
+                raise PostProcessingError('Thumbnail was not found')
+
+        filename = 'copy-plan-testfile.mp4'
+        with open(filename, 'w') as f:
+            f.write('downloaded')
+        ydl = FakeYDL({'keepvideo': True})
+        for pp in (MetadataPP, OtherPP, EmbedSubtitlePP, MetadataPP, EmbedSubtitlePP):
+            ydl.add_post_processor(pp(ydl))
+        try:
+            self.assertTrue(ydl.post_process(filename, {
+                'id': 'x', 'title': 'copy plan', 'ext': 'mp4', 'container': 'm4a_dash',
+                'requested_subtitles': {'en': {'ext': 'vtt'}},
+                '__postprocessors': [FixupM4aPP(ydl)],
+            }))
+        finally:
+            os.unlink(filename)
+        sub_filename = 'copy-plan-testfile.en.vtt'
+        self.assertEqual(commands, [
+            ([filename], ['-c', 'copy', '-f', 'mp4', '-metadata', 'title=copy plan']),
+            'other',
+            ([filename, sub_filename], [
+                '-c', 'copy', '-map', '0', '-map', '-0:s', '-map', '1:0', '-c:s', 'mov_text',
+                '-metadata:s:s:0', 'language=eng', '-metadata', 'title=copy plan']),
+            # Both map streams, they are not run together
+            ([filename, sub_filename], [
+                '-c', 'copy', '-map', '0', '-map', '-0:s', '-map', '1:0', '-c:s', 'mov_text',
+                '-metadata:s:s:0', 'language=eng']),
+        ])
+
+        # The pending plan is carried out before the error is reported
+        del commands[:]
+        with open(filename, 'w') as f:
+            f.write('downloaded')
+        ydl = FakeYDL({'keepvideo': True})
+        ydl.add_post_processor(MetadataPP(ydl))
+        ydl.add_post_processor(FailingPP(ydl))
+        try:
+            with self.assertRaises(Exception) as cm:
+                ydl.post_process(filename, {
+                    'id': 'x', 'title': 'copy plan', 'ext': 'mp4', 'container': 'm4a_dash',
+                    '__postprocessors': [FixupM4aPP(ydl)],
+                })
+        finally:
+            os.unlink(filename)
+        self.assertTrue('Thumbnail was not found' in str(cm.exception))
+        self.assertEqual(commands, [
+            ([filename], ['-c', 'copy', '-f', 'mp4', '-metadata', 'title=copy plan'])])
+
+
+class TestFFmpegExtractAudio(unittest.TestCase):
+    def test_passthrough(self):
+        commands = []
+
+        class ExtractAudioPP(FFmpegExtractAudioPP):
+            def get_audio_codec(self, path):
+                return codec
+
+            def run_ffmpeg(self, path, out_path, codec, more_opts):
+                commands.append((out_path, codec, more_opts))
+
+        def run(preferredcodec, filename, nopostoverwrites=False):
+            del commands[:]
+            pp = ExtractAudioPP(FakeYDL({'quiet': True}), preferredcodec, nopostoverwrites=nopostoverwrites)
+            files_to_delete, info = pp.run({'filepath': filename, 'ext': filename.rpartition('.')[2]})
+            return files_to_delete, info['filepath'], commands
+
+        codec = 'opus'
+        self.assertEqual(run('opus', 'a.webm'), (['a.webm'], 'a.opus', [('a.opus', 'copy', [])]))
+        self.assertEqual(run('mp3', 'a.webm'), (['a.webm'], 'a.mp3', [('a.mp3', 'libmp3lame', [])]))
+        codec = 'pcm_s16le'
+        self.assertEqual(run('wav', 'a.mkv'), (['a.mkv'], 'a.wav', [('a.wav', 'copy', ['-f', 'wav'])]))
+        self.assertEqual(run('best', 'a.mkv'), (['a.mkv'], 'a.mp3', [('a.mp3', 'libmp3lame', [])]))
+        codec = 'mp3'
+        self.assertEqual(run('best', 'a.mp3'), ([], 'a.mp3', []))
+        filename = 'extract-audio-testfile.mp3'
+        with open(filename, 'w') as f:
+            f.write('mp3')
+        try:
+            self.assertEqual(run('mp3', 'extract-audio-testfile.webm', True), ([], filename, []))
+        finally:
+            os.unlink(filename)
@@ -0,0 +1,243 @@
+#!/usr/bin/env python
+# coding: utf-8
+from __future__ import unicode_literals
+
+# Allow direct execution
+import os
+import sys
+import unittest
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import json
+import shutil
+import tempfile
+import threading
+import time
+
+from youtube_dl import YoutubeDL
+from youtube_dl.compat import (
+    compat_HTTPError,
+    compat_http_server,
+    compat_urllib_request,
+)
+from youtube_dl.postprocessor.common import PostProcessor
+from youtube_dl.server import (
+    parse_serve_address,
+    ServerJob,
+    YoutubeDLServer,
+)
+from youtube_dl.utils import PostProcessingError
+
+
+class HTTPTestRequestHandler(compat_http_server.BaseHTTPRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+    def do_HEAD(self):
+        self._serve(False)
+
+    def do_GET(self):
+        self._serve(True)
+
+    def _serve(self, body):
+        assert self.path in ('/vid.mp4', '/fail.mp4')
+        self.send_response(200)
+        self.send_header('Content-Type', 'video/mp4')
+        self.send_header('Content-Length', '14')
+        self.end_headers()
+        if body:
+            self.wfile.write(b'\x00\x00\x00\x00\x20\x66\x74[video]')
+
+
+class FakeLogger(object):
+    def debug(self, msg):
+        pass
+
+    def warning(self, msg):
+        pass
+
+    def error(self, msg):
+        pass
+
+
+class TestServer(unittest.TestCase):
+    def setUp(self):
+        self.httpd = compat_http_server.HTTPServer(
+            ('localhost', 0), HTTPTestRequestHandler)
+        self.video_url = 'http://localhost:%d/vid.mp4' % self.httpd.server_address[1]
+        t = threading.Thread(target=self.httpd.serve_forever)
+        t.daemon = True
+        t.start()
+
+        self.server = YoutubeDLServer(
+            YoutubeDL({'proxy': '', 'simulate': True, 'logger': FakeLogger()}),
+            ('tcp', ('localhost', 0)), workers=2)
+        self.server.start()
+        self.base_url = 'http://localhost:%d' % self.server.server_address[1]
+        self.opener = compat_urllib_request.build_opener(
+            compat_urllib_request.ProxyHandler({}))
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def _request(self, path, data=None, headers={}):
+        if data is not None:
+            data = json.dumps(data).encode('utf-8')
+            headers = dict({'Content-Type': 'application/json'}, **headers)
+        req = compat_urllib_request.Request(self.base_url + path, data=data, headers=headers)
+        return self.opener.open(req)
+
+    def _assert_http_error(self, code, *args, **kwargs):
+        with self.assertRaises(compat_HTTPError) as cm:
+            self._request(*args, **kwargs)
+        self.assertEqual(cm.exception.code, code)
+
+    def test_parse_serve_address(self):
+        self.assertEqual(parse_serve_address('8080'), ('tcp', ('localhost', 8080)))
+        self.assertEqual(parse_serve_address('0.0.0.0:80'), ('tcp', ('0.0.0.0', 80)))
+        self.assertEqual(parse_serve_address('[::1]:80'), ('tcp', ('::1', 80)))
+        self.assertEqual(parse_serve_address('host:port'), None)
+        if hasattr(__import__('socket'), 'AF_UNIX'):
+            self.assertEqual(parse_serve_address('unix:/tmp/ydl.sock'), ('unix', '/tmp/ydl.sock'))
+        self.assertEqual(parse_serve_address('unix:'), None)
+
+    def test_job(self):
+        job = json.loads(self._request('/jobs', {
+            'url': self.video_url,
+            'options': {'forcetitle': True},
+        }).read().decode('utf-8'))
+        self.assertEqual(job['urls'], [self.video_url])
+
+        events = [
+            json.loads(line.decode('utf-8'))
+            for line in self._request('/jobs/%s/events' % job['id']).read().splitlines()]
+        self.assertEqual(events[0], {
+            'type': 'status', 'status': 'running', 'retcode': None, 'error': None})
+        self.assertEqual(events[-1]['status'], 'finished')
+        self.assertTrue({'type': 'log', 'level': 'debug', 'message': 'vid'} in events)
+
+        job = json.loads(self._request('/jobs/%s' % job['id']).read().decode('utf-8'))
+        self.assertEqual(job['status'], 'finished')
+        self.assertEqual(job['retcode'], 0)
+        self.assertEqual(job['result'][0]['ext'], 'mp4')
+
+        jobs = json.loads(self._request('/jobs').read().decode('utf-8'))
+        self.assertEqual([j['id'] for j in jobs], [job['id']])
+
+    def test_errors(self):
+        self._assert_http_error(400, '/jobs', {'options': {}})
+        self._assert_http_error(400, '/jobs', {'url': self.video_url, 'options': {'logger': None}})
+        self._assert_http_error(404, '/jobs/42')
+
+    def test_forbidden_jobs(self):
+        # Jobs can't run commands or write to other paths
+        for options in (
+                {'postprocessors': [{'key': 'ExecAfterDownload', 'exec_cmd': 'touch pwned'}]},
+                {'outtmpl': '/tmp/%(id)s'},
+                {'download_archive': 'archive.txt'},
+                {'cookiefile': 'cookies.txt'},
+                {'external_downloader': 'curl'}):
+            self._assert_http_error(400, '/jobs', {'url': self.video_url, 'options': options})
+
+        # Form posts of web pages
+        self._assert_http_error(
+            415, '/jobs', {'url': self.video_url}, headers={'Content-Type': 'text/plain'})
+        self._assert_http_error(
+            403, '/jobs', {'url': self.video_url}, headers={'Origin': 'http://example.com'})
+        self._assert_http_error(403, '/jobs', headers={'Origin': 'null'})
+        self.assertEqual(self.server.list_jobs(), [])
+        self.assertEqual(self._request('/jobs', headers={'Origin': self.base_url}).getcode(), 200)
+
+        # DNS rebinding, the names of the pages are sent as Host
+        port = self.server.server_address[1]
+        self._assert_http_error(403, '/jobs', headers={'Host': 'evil.example:%d' % port})
+        self._assert_http_error(403, '/jobs', {'url': self.video_url}, headers={
+            'Host': 'evil.example:%d' % port, 'Origin': 'http://evil.example:%d' % port})
+        self._assert_http_error(403, '/jobs', headers={'Host': 'localhost:%d' % (port + 1)})
+        for host in ('127.0.0.1', '[::1]', 'LOCALHOST'):
+            self.assertEqual(self._request('/jobs', headers={'Host': '%s:%d' % (host, port)}).getcode(), 200)
+        self.assertEqual(self.server.list_jobs(), [])
+
+    def test_retention(self):
+        self.server.MAX_FINISHED_JOBS = 2
+        ids = []
+        for _ in range(3):
+            job, _ = self._wait_job(json.loads(self._request('/jobs', {
+                'url': self.video_url,
+            }).read().decode('utf-8')))
+            ids.append(job['id'])
+        # Forgotten once the worker is done with the last job
+        for _ in range(50):
+            if len(self.server.list_jobs()) == 2:
+                break
+            time.sleep(0.1)
+        self.assertEqual([job.id for job in self.server.list_jobs()], ids[1:])
+        self._assert_http_error(404, '/jobs/%s' % ids[0])
+
+        # Only the latest progress of a download is kept
+        job = ServerJob('1', [self.video_url], {})
+        job.set_status('running')
+        for downloaded in (1, 2, 3):
+            job.progress_hook({'status': 'downloading', 'filename': 'a', 'downloaded_bytes': downloaded})
+        job.progress_hook({'status': 'finished', 'filename': 'a'})
+        job.progress_hook({'status': 'downloading', 'filename': 'b', 'downloaded_bytes': 1})
+        job.set_status('finished')
+        self.assertEqual(job.to_dict()['events'], 7)
+        self.assertEqual([event.get('status') for event in job.iter_events()], [
+            'running', 'finished', 'downloading', 'finished'])
+        self.assertEqual([event.get('filename') for event in job.iter_events(5)], ['b', None])
+
+    def _wait_job(self, job):
+        events = [
+            json.loads(line.decode('utf-8'))
+            for line in self._request('/jobs/%s/events' % job['id']).read().splitlines()]
+        return json.loads(self._request('/jobs/%s' % job['id']).read().decode('utf-8')), events
+
+    def test_background_postprocessing(self):
+        processed = []
+
+        class SlowPP(PostProcessor):
+            def run(self, info):
+                time.sleep(0.3)
+                self._downloader.report_warning('processing ' + os.path.basename(info['filepath']))
+                if 'fail' in info['filepath']:
+                    raise PostProcessingError('failed')
+                processed.append(info['filepath'])
+                return [], info
+
+        temp_dir = tempfile.mkdtemp()
+        ydl = YoutubeDL({
+            'proxy': '', 'logger': FakeLogger(), 'postprocess_workers': 1,
+            'outtmpl': os.path.join(temp_dir, '%(title)s.%(ext)s'),
+        })
+        ydl.add_post_processor(SlowPP())
+        server = YoutubeDLServer(ydl, ('tcp', ('localhost', 0)), workers=1)
+        server.start()
+        self.base_url = 'http://localhost:%d' % server.server_address[1]
+        try:
+            # Jobs are only done once their files are postprocessed
+            job, events = self._wait_job(json.loads(self._request('/jobs', {
+                'url': self.video_url,
+            }).read().decode('utf-8')))
+            self.assertEqual(job['status'], 'finished')
+            self.assertEqual(processed, [os.path.join(temp_dir, 'vid.mp4')])
+            # The postprocessors report to the job
+            self.assertTrue(any(
+                e['type'] == 'log' and 'processing vid.mp4' in e['message'] for e in events))
+
+            # and their postprocessing errors are theirs
+            for video, status in (('fail', 'error'), ('vid', 'finished')):
+                job, _ = self._wait_job(json.loads(self._request('/jobs', {
+                    'url': self.video_url.replace('vid', video),
+                }).read().decode('utf-8')))
+                self.assertEqual(job['status'], status)
+            self.assertEqual(len(processed), 2)
+        finally:
+            server.shutdown()
+            shutil.rmtree(temp_dir)
+
+
+if __name__ == '__main__':
+    unittest.main()
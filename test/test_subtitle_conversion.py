@@ -0,0 +1,157 @@
+#!/usr/bin/env python
+# coding: utf-8
+
+from __future__ import unicode_literals
+
+# Allow direct execution
+import io
+import os
+import sys
+import unittest
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from test.helper import FakeYDL
+from youtube_dl.postprocessor import FFmpegSubtitlesConvertorPP
+from youtube_dl.subtitles import (
+    convert_subtitles,
+    parse_ass,
+    parse_srt,
+    parse_ttml,
+    parse_vtt,
+    SubtitlesConversionError,
+    write_ass,
+    write_srt,
+    write_vtt,
+)
+from youtube_dl.utils import dfxp2srt
+
+SRT = '''1
+00:00:01,000 --> 00:00:02,500
+<i>Ünïcödé</i> & <B>bold</B>
+
+2
+01:00:00,005 --> 01:00:01,000
+a < b
+second line
+
+'''
+
+VTT = '''WEBVTT
+
+00:00:01.000 --> 00:00:02.500
+<i>Ünïcödé</i> &amp; <b>bold</b>
+
+01:00:00.005 --> 01:00:01.000
+a &lt; b
+second line
+
+'''
+
+ASS_EVENTS = '''Dialogue: 0,0:00:01.00,0:00:02.50,Default,,0,0,0,,{\\i1}Ünïcödé{\\i0} & {\\b1}bold{\\b0}
+Dialogue: 0,1:00:00.01,1:00:01.00,Default,,0,0,0,,a < b\\Nsecond line
+'''
+
+DFXP = '''<?xml version="1.0" encoding="UTF-8"?>
+<tt xmlns="http://www.w3.org/ns/ttml" xml:lang="en" xmlns:tts="http://www.w3.org/ns/ttml#parameter">
+<body>
+    <div xml:lang="en">
+        <p begin="0" end="1">The following line contains Chinese characters and special symbols</p>
+        <p begin="1" end="2">第二行<br/>♪♪ &amp; &lt;</p>
+        <p begin="2" dur="1"><span tts:fontStyle="italic">Third<br/>Line</span></p>
+        <p begin="3" end="-1">Lines with invalid timestamps are ignored</p>
+        <p begin="-1" end="-1">Ignore, two</p>
+        <p begin="3" dur="-1">Ignored, three</p>
+    </div>
+</body>
+</tt>'''
+
+
+def convert(parse, write, data):
+    out = io.StringIO()
+    source = io.BytesIO(data.encode('utf-8')) if parse is parse_ttml else io.StringIO(data)
+    write(parse(source), out)
+    return out.getvalue()
+
+
+class TestSubtitleConversion(unittest.TestCase):
+    def test_srt_vtt_ass(self):
+        self.assertEqual(convert(parse_srt, write_vtt, SRT), VTT)
+        self.assertEqual(convert(parse_vtt, write_srt, VTT), SRT.replace('<B>bold</B>', '<b>bold</b>'))
+        ass = convert(parse_srt, write_ass, SRT)
+        self.assertTrue(ass.startswith('[Script Info]\n'))
+        self.assertTrue(ass.endswith('\n[Events]\nFormat: Layer, Start, End, Style, Name, MarginL, MarginR, MarginV, Effect, Text\n' + ASS_EVENTS))
+        # Centiseconds
+        self.assertEqual(convert(parse_ass, write_vtt, ass), VTT.replace('00.005', '00.010'))
+
+    def test_vtt(self):
+        vtt = '''\ufeffWEBVTT
+Kind: captions
+
+NOTE a comment
+
+intro
+00:01.000 --> 00:02.000
+&nbsp;text
+'''
+        self.assertEqual(convert(parse_vtt, write_srt, vtt), '1\n00:00:01,000 --> 00:00:02,000\n\xa0text\n\n')
+
+    def test_ttml(self):
+        self.assertEqual(convert(parse_ttml, write_srt, DFXP), dfxp2srt(DFXP))
+        self.assertRaises(
+            SubtitlesConversionError, convert, parse_ttml, write_srt, '<tt><body></body></tt>')
+
+    def test_unsupported(self):
+        for parse, data in (
+                (parse_srt, '1\n00:00:01,000 --> 00:00:02,000\n<font color="red">red</font>\n'),
+                (parse_srt, '1\n00:00:01,000 --> 00:00:02,000\n{\\an8}top\n'),
+                (parse_srt, 'not a cue\n'),
+                (parse_vtt, 'WEBVTT\n\n00:01.000 --> 00:02.000 align:start position:0%\ntext\n'),
+                (parse_vtt, 'WEBVTT\n\n00:01.000 --> 00:02.000\n<c.colorE5E5E5>text</c>\n'),
+                (parse_vtt, 'WEBVTT\n\nSTYLE\n::cue { color: red }\n'),
+                (parse_vtt, '1\n00:00:01,000 --> 00:00:02,000\ntext\n'),
+                (parse_ass, '[Events]\nFormat: Start, End, Text\nDialogue: 0:00:01.00,0:00:02.00,{\\pos(1,2)}text\n')):
+            self.assertRaises(SubtitlesConversionError, convert, parse, write_srt, data)
+
+    def test_pp(self):
+        commands = []
+
+        class SubtitlesConvertorPP(FFmpegSubtitlesConvertorPP):
+            def run_ffmpeg(self, path, out_path, opts):
+                commands.append((path, out_path, opts))
+                with io.open(out_path, 'wt', encoding='utf-8') as f:
+                    f.write('converted')
+
+        filename = 'subtitle-conversion-testfile.mp4'
+        files = {
+            'en': (filename[:-3] + 'en.srt', SRT),
+            'fr': (filename[:-3] + 'fr.srt', '1\n00:00:01,000 --> 00:00:02,000\n{\\an8}top\n'),
+            'de': (filename[:-3] + 'de.dfxp', DFXP),
+        }
+        for sub_filename, data in files.values():
+            with io.open(sub_filename, 'wt', encoding='utf-8') as f:
+                f.write(data)
+        info = {
+            'filepath': filename,
+            'requested_subtitles': dict((lang, {'ext': f[0].rpartition('.')[2]}) for lang, f in files.items()),
+        }
+        try:
+            files_to_delete, info = SubtitlesConvertorPP(FakeYDL({'quiet': True}), 'vtt').run(info)
+            self.assertEqual(sorted(files_to_delete), sorted(f[0] for f in files.values()))
+            subs = info['requested_subtitles']
+            self.assertEqual(subs['en'], {'ext': 'vtt', 'data': VTT})
+            self.assertEqual(subs['de']['data'], convert(parse_ttml, write_vtt, DFXP))
+            # Styling the converters don't support is left to ffmpeg
+            self.assertEqual(subs['fr'], {'ext': 'vtt', 'data': 'converted'})
+            self.assertEqual(commands, [(files['fr'][0], filename[:-3] + 'fr.vtt', ['-f', 'webvtt'])])
+        finally:
+            for fn in list(f[0] for f in files.values()) + [filename[:-3] + lang + '.vtt' for lang in files]:
+                if os.path.exists(fn):
+                    os.remove(fn)
+
+    def test_convert_subtitles(self):
+        self.assertRaises(
+            SubtitlesConversionError, convert_subtitles, 'a.srt', 'srt', 'a.sbv', 'sbv')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -12,8 +12,14 @@ import errno
 import io
 import json
 import re
+import shutil
+import struct
 import subprocess
+import zlib
 
+from test.helper import FakeYDL
+from youtube_dl.cache import Cache
+from youtube_dl import swfinterp
 from youtube_dl.swfinterp import SWFInterpreter
 
 
@@ -21,8 +27,71 @@ TEST_DIR = os.path.join(
     os.path.dirname(os.path.abspath(__file__)), 'swftests')
 
 
+def _make_swf(class_name, main_code):
+    """ Build an SWF whose only class has a static main method running main_code """
+    def u30(v):
+        res = b''
+        while True:
+            b = v & 0x7f
+            v >>= 7
+            if not v:
+                return res + struct.pack('<B', b)
+            res += struct.pack('<B', b | 0x80)
+
+    def string(s):
+        return u30(len(s)) + s
+
+    abc = b''.join([
+        b'\x10\x00\x2e\x00',  # minor and major version
+        u30(0), u30(0), u30(0),  # ints, uints, doubles
+        u30(3), string(class_name), string(b'main'),
+        u30(2), b'\x16', u30(0),  # namespaces: the package one
+        u30(0),  # namespace sets
+        u30(3), b'\x07', u30(1), u30(1), b'\x07', u30(1), u30(2),  # QNames
+        u30(2),  # methods: cinit, main
+        u30(0), u30(0), u30(0), b'\x00',
+        u30(0), u30(0), u30(0), b'\x00',
+        u30(0),  # metadata
+        u30(1),  # classes
+        u30(1), u30(0), b'\x00', u30(0), u30(0), u30(0),  # instance
+        u30(0), u30(1), u30(2), b'\x01', u30(0), u30(1),  # class, main trait
+        u30(0),  # scripts
+        u30(2),  # method bodies
+        u30(0), u30(1), u30(1), u30(0), u30(1), string(b'\x47'), u30(0), u30(0),
+        u30(1), u30(1), u30(1), u30(0), u30(1), string(main_code), u30(0), u30(0),
+    ])
+    tag = b'\x00\x00\x00\x00\x00' + abc  # flags and empty name
+    content = (
+        b'\x00' + b'\x00\x18' + b'\x01\x00' +  # frame size, rate and count
+        struct.pack('<HI', (82 << 6) | 0x3f, len(tag)) + tag)
+    return b'CWS\x0a' + struct.pack('<I', 8 + len(content)) + zlib.compress(content)
+
+
 class TestSWFInterpreter(unittest.TestCase):
-    pass
+    def test_abc_cache(self):
+        cache_dir = os.path.join(
+            os.path.dirname(os.path.abspath(__file__)), 'testdata', 'swf_cache_test')
+        if os.path.exists(cache_dir):
+            shutil.rmtree(cache_dir)
+        ydl = FakeYDL({'cachedir': cache_dir})
+        # pushbyte 42, returnvalue
+        swf = _make_swf(b'Test', b'\x24\x2a\x48')
+        try:
+            swfi = SWFInterpreter.from_cache(Cache(ydl), swf)
+            self.assertEqual(swfi.extract_function(swfi.extract_class('Test'), 'main')([]), 42)
+
+            real_parse_abc = swfinterp._parse_abc
+
+            def _parse_abc(file_contents):
+                raise AssertionError('SWF parsed again')
+            swfinterp._parse_abc = _parse_abc
+            try:
+                swfi = SWFInterpreter.from_cache(Cache(ydl), swf)
+            finally:
+                swfinterp._parse_abc = real_parse_abc
+            self.assertEqual(swfi.extract_function(swfi.extract_class('Test'), 'main')([]), 42)
+        finally:
+            shutil.rmtree(cache_dir)
 
 
 def _make_testfunc(testfile):
@@ -20,6 +20,7 @@ from youtube_dl.utils import (
     args_to_str,
     encode_base_n,
     clean_html,
+    DashFragmentList,
     date_from_str,
     DateRange,
     detect_exe_version,
@@ -33,11 +34,13 @@ from youtube_dl.utils import (
     ExtractorError,
     find_xpath_attr,
     fix_xml_ampersands,
+    fix_xml_ampersands_stream,
     get_element_by_class,
     get_element_by_attribute,
     get_elements_by_class,
     get_elements_by_attribute,
     InAdvancePagedList,
+    InfoJSONEncoder,
     intlist_to_bytes,
     is_html,
     js_to_json,
@@ -52,6 +55,7 @@ from youtube_dl.utils import (
     parse_filesize,
     parse_count,
     parse_iso8601,
+    parse_xml_stream,
     pkcs1pad,
     read_batch_urls,
     sanitize_filename,
@@ -80,10 +84,12 @@ from youtube_dl.utils import (
     urshift,
     update_url_query,
     version_tuple,
+    WorkerPool,
     xpath_with_ns,
     xpath_element,
     xpath_text,
     xpath_attr,
+    xml_compact_children,
     render_table,
     match_str,
     parse_dfxp_time_expr,
@@ -547,6 +553,64 @@ class TestUtil(unittest.TestCase):
             fix_xml_ampersands('&#1234;&#x1abC;'), '&#1234;&#x1abC;')
         self.assertEqual(fix_xml_ampersands('&#&#'), '&amp;#&amp;#')
 
+        doc = b'<a href="?x=1&y=2&amp;z=&#x1abC;&#1234;&lt;&">&&apos;</a>'
+        for size in range(1, len(doc) + 1):
+            chunks = [doc[i:i + size] for i in range(0, len(doc), size)]
+            self.assertEqual(
+                b''.join(fix_xml_ampersands_stream(chunks)),
+                fix_xml_ampersands(doc.decode('ascii')).encode('ascii'))
+
+    def test_parse_xml_stream(self):
+        doc = '''
+<?xml version="1.0" encoding="UTF-8"?>
+<MPD xmlns="urn:mpeg:dash:schema:mpd:2011" type="static">
+  <SegmentTimeline>
+    <S t="0" d="10"/>
+    <S d="20" r="3">ignored<X/></S>
+  </SegmentTimeline>
+  <info lang="fr">caf\xe9</info>
+  <bootstrap profile="named">QUJDRA==</bootstrap>
+  <SegmentTimeline><S d="5"/></SegmentTimeline>
+</MPD>'''.encode('utf-8')
+        ns = '{urn:mpeg:dash:schema:mpd:2011}'
+        for size in (1, 5, len(doc)):
+            root = parse_xml_stream(
+                [doc[i:i + size] for i in range(0, len(doc), size)],
+                compact={'S': ('t', 'd', 'r')}, prune_text=['bootstrap'])
+            self.assertEqual(root.tag, ns + 'MPD')
+            self.assertEqual(root.get('type'), 'static')
+            timelines = root.findall(ns + 'SegmentTimeline')
+            self.assertEqual(len(timelines), 2)
+            self.assertEqual(timelines[0].findall(ns + 'S'), [])
+            self.assertEqual(
+                xml_compact_children(timelines[0], ns + 'S', ('t', 'd', 'r')),
+                [('0', '10', None), (None, '20', '3')])
+            self.assertEqual(xml_compact_children(timelines[1], ns + 'S', ('t', 'd', 'r')), [(None, '5', None)])
+            self.assertEqual(xml_compact_children(timelines[1], ns + 'X', ('a',)), [])
+            self.assertEqual(xpath_text(root, ns + 'info'), 'caf\xe9')
+            self.assertEqual(xpath_element(root, ns + 'info').get('lang'), 'fr')
+            self.assertEqual(xpath_text(root, ns + 'bootstrap'), None)
+            self.assertEqual(xpath_element(root, ns + 'bootstrap').get('profile'), 'named')
+
+        # Elements parsed as a whole work the same
+        root = compat_etree_fromstring(doc.strip())
+        self.assertEqual(
+            xml_compact_children(root.find(ns + 'SegmentTimeline'), ns + 'S', ('t', 'd', 'r')),
+            [('0', '10', None), (None, '20', '3')])
+
+    def test_worker_pool(self):
+        pool = WorkerPool(2)
+        jobs = [pool.submit(lambda x, y=0: x * 2 + y, i, y=1) for i in range(10)]
+        self.assertEqual([job.result() for job in jobs], [i * 2 + 1 for i in range(10)])
+        self.assertTrue(all(job.done() for job in jobs))
+        self.assertEqual(len(pool._threads), 2)
+        job = pool.submit(int, 'x')
+        self.assertRaises(ValueError, job.result)
+        pool.shutdown()
+        self.assertEqual(pool._threads, [])
+        self.assertEqual(pool.submit(len, 'abc').result(), 3)
+        pool.shutdown()
+
     def test_paged_list(self):
         def testPL(size, pagesize, sliceargs, expected):
             def get_page(pagenum):
@@ -572,6 +636,43 @@ class TestUtil(unittest.TestCase):
         testPL(5, 2, (2, 99), [2, 3, 4])
         testPL(5, 2, (20, 99), [])
 
+    def test_dash_fragment_list(self):
+        fragments = DashFragmentList(
+            'http://example.com/v/', [(100, 10, 3), (200, 5, 1), (0, 20, 2)], timescale=10,
+            media_template='%(Number)d-%(Time)d.m4s', start_number=5, initialization_url='init.mp4')
+        expected = [
+            {'url': 'http://example.com/v/init.mp4'},
+            {'url': 'http://example.com/v/5-100.m4s', 'duration': 1.0},
+            {'url': 'http://example.com/v/6-110.m4s', 'duration': 1.0},
+            {'url': 'http://example.com/v/7-120.m4s', 'duration': 1.0},
+            {'url': 'http://example.com/v/8-200.m4s', 'duration': 0.5},
+            {'url': 'http://example.com/v/9-0.m4s', 'duration': 2.0},
+            {'url': 'http://example.com/v/10-20.m4s', 'duration': 2.0},
+        ]
+        self.assertEqual(len(fragments), 7)
+        self.assertEqual(list(fragments), expected)
+        self.assertEqual([fragments[i] for i in range(-7, 7)], expected * 2)
+        self.assertEqual(fragments[:1], expected[:1])
+        self.assertEqual(fragments[2:6:3], expected[2:6:3])
+        self.assertEqual(fragments[::-1], expected[::-1])
+        self.assertRaises(IndexError, lambda: fragments[7])
+        self.assertRaises(IndexError, lambda: fragments[-8])
+        self.assertEqual(fragments, expected)
+        self.assertNotEqual(fragments, expected[1:])
+        self.assertEqual(json.loads(json.dumps({'fragments': fragments}, cls=InfoJSONEncoder)), {'fragments': expected})
+
+        fragments = DashFragmentList(
+            'https://example.com/', [(0, 4004, 2), (0, 1001, 1)], timescale=1000,
+            segment_urls=['sq/0', 'sq/1', 'http://other.example.com/sq/2'])
+        self.assertEqual(list(fragments), [
+            {'url': 'https://example.com/sq/0', 'duration': 4.004},
+            {'url': 'https://example.com/sq/1', 'duration': 4.004},
+            {'url': 'http://other.example.com/sq/2', 'duration': 1.001},
+        ])
+        self.assertEqual(fragments[-1], fragments[2])
+        self.assertEqual(len(DashFragmentList('', [])), 0)
+        self.assertEqual(list(DashFragmentList('', [])), [])
+
     def test_read_batch_urls(self):
         f = io.StringIO('''\xef\xbb\xbf foo
             bar\r
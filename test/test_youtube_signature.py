@@ -10,6 +10,7 @@ sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 import io
 import re
+import shutil
 import string
 
 from test.helper import FakeYDL
@@ -119,5 +120,62 @@ for test_spec in _TESTS:
     make_tfunc(*test_spec)
 
 
+_FAKE_PLAYER = '''
+var xx=function(a){a=a.split("");a=a.reverse();return a.join("")};
+c.sig||xx(c.s);
+'''
+
+
+class FakePlayerYoutubeIE(YoutubeIE):
+    def __init__(self, *args, **kwargs):
+        super(FakePlayerYoutubeIE, self).__init__(*args, **kwargs)
+        self.downloads = []
+        self.parses = 0
+
+    def _download_webpage(self, url, *args, **kwargs):
+        self.downloads.append(url)
+        return _FAKE_PLAYER
+
+    def _parse_sig_js(self, jscode):
+        self.parses += 1
+        return super(FakePlayerYoutubeIE, self)._parse_sig_js(jscode)
+
+
+class TestPlayerCache(unittest.TestCase):
+    PLAYER_URL = 'https://s.ytimg.com/yts/jsbin/player-vflTEST/base.js'
+
+    def setUp(self):
+        self.cache_dir = os.path.join(
+            os.path.dirname(os.path.abspath(__file__)), 'testdata', 'player_cache_test')
+        self.tearDown()
+
+    def tearDown(self):
+        if os.path.exists(self.cache_dir):
+            shutil.rmtree(self.cache_dir)
+
+    def make_ie(self):
+        return FakePlayerYoutubeIE(FakeYDL({'cachedir': self.cache_dir}))
+
+    def test_player_cache(self):
+        ie = self.make_ie()
+        self.assertEqual(ie._decrypt_signature('0123456789', 'id', self.PLAYER_URL), '9876543210')
+        self.assertEqual(ie.downloads, [self.PLAYER_URL])
+
+        # A new signature length for a known player does not download it again
+        ie = self.make_ie()
+        self.assertEqual(ie._decrypt_signature('abc.def', 'id', self.PLAYER_URL), 'fed.cba')
+        self.assertEqual((ie.downloads, ie.parses), ([], 1))
+
+        # Warming up a new player precomputes all the lengths seen so far
+        player_url = self.PLAYER_URL.replace('vflTEST', 'vflNEW')
+        ie = self.make_ie()
+        ie.warm_player_cache(player_url)
+        self.assertEqual((ie.downloads, ie.parses), ([player_url], 1))
+        ie = self.make_ie()
+        self.assertEqual(ie._decrypt_signature('0123456789', 'id', player_url), '9876543210')
+        self.assertEqual(ie._decrypt_signature('abc.def', 'id', player_url), 'fed.cba')
+        self.assertEqual((ie.downloads, ie.parses), ([], 0))
+
+
 if __name__ == '__main__':
     unittest.main()
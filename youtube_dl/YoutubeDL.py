@@ -5,14 +5,15 @@ from __future__ import absolute_import, unicode_literals
 
 import collections
 import contextlib
-import copy
 import datetime
 import errno
 import fileinput
+import functools
 import io
 import itertools
 import json
 import locale
+import multiprocessing
 import operator
 import os
 import platform
@@ -21,6 +22,8 @@ import shutil
 import subprocess
 import socket
 import sys
+import tempfile
+import threading
 import time
 import tokenize
 import traceback
@@ -58,6 +61,7 @@ from .utils import (
     format_bytes,
     formatSeconds,
     GeoRestrictedError,
+    InfoJSONEncoder,
     ISO3166Utils,
     locked_file,
     make_HTTPS_handler,
@@ -82,16 +86,23 @@ from .utils import (
     UnavailableVideoError,
     url_basename,
     version_tuple,
+    WorkerPool,
     write_json_file,
     write_string,
     YoutubeDLCookieProcessor,
+    YoutubeDLError,
     YoutubeDLHandler,
 )
+from .asynchttp import asyncio, AsyncHTTPTransport
 from .cache import Cache
 from .extractor import get_info_extractor, gen_extractor_classes, _LAZY_LOADER
 from .downloader import get_suitable_downloader
+from .downloader.dash import DashSegmentsFD
+from .downloader.hls import HlsFD
+from .downloader.http import HttpFD
 from .downloader.rtmp import rtmpdump_version
 from .postprocessor import (
+    FFmpegExtractAudioPP,
     FFmpegFixupM3u8PP,
     FFmpegFixupM4aPP,
     FFmpegFixupStretchedPP,
@@ -105,6 +116,35 @@ if compat_os_name == 'nt':
     import ctypes
 
 
+_FORMAT_FILTER_OPERATORS = {
+    '<': operator.lt,
+    '<=': operator.le,
+    '>': operator.gt,
+    '>=': operator.ge,
+    '=': operator.eq,
+    '!=': operator.ne,
+}
+_FORMAT_FILTER_RE = re.compile(r'''(?x)\s*
+    (?P<key>width|height|tbr|abr|vbr|asr|filesize|fps)
+    \s*(?P<op>%s)(?P<none_inclusive>\s*\?)?\s*
+    (?P<value>[0-9.]+(?:[kKmMgGtTpPeEzZyY]i?[Bb]?)?)
+    $
+    ''' % '|'.join(map(re.escape, _FORMAT_FILTER_OPERATORS.keys())))
+_FORMAT_STR_FILTER_OPERATORS = {
+    '=': operator.eq,
+    '!=': operator.ne,
+    '^=': lambda attr, value: attr.startswith(value),
+    '$=': lambda attr, value: attr.endswith(value),
+    '*=': lambda attr, value: value in attr,
+}
+_FORMAT_STR_FILTER_RE = re.compile(r'''(?x)
+    \s*(?P<key>ext|acodec|vcodec|container|protocol|format_id)
+    \s*(?P<op>%s)(?P<none_inclusive>\s*\?)?
+    \s*(?P<value>[a-zA-Z0-9._-]+)
+    \s*$
+    ''' % '|'.join(map(re.escape, _FORMAT_STR_FILTER_OPERATORS.keys())))
+
+
 class YoutubeDL(object):
     """YoutubeDL class.
 
@@ -130,6 +170,16 @@ class YoutubeDL(object):
     registers itself as the downloader in charge for the InfoExtractors
     that are added to it, so this is a "mutual registration".
 
+    A single YoutubeDL object may be shared between threads, which is much
+    cheaper than creating one per thread since the extractor instances and
+    the opener (with its cookie jar and connection handling) are set up only
+    once. Concurrent extract_info calls each work on their own result
+    dictionaries; the state shared between them (download counters, the
+    extractor instances and their caches, the filesystem cache and the
+    cookie jar) is guarded by locks and messages written to the screen are
+    never interleaved. Parameters should not be changed while calls are in
+    progress.
+
     Available options:
 
     username:          Username for authentication purposes.
@@ -154,6 +204,9 @@ class YoutubeDL(object):
                        (or video) as a single JSON line.
     simulate:          Do not download the video files.
     format:            Video format code. See options.py for more information.
+    format_sort:       A list of fields to rank the formats by before the
+                       default ones (see FORMAT_SORT_FIELDS in
+                       extractor/common.py).
     outtmpl:           Template for output names.
     restrictfilenames: Do not allow "&" and spaces in file names
     ignoreerrors:      Do not stop on download errors.
@@ -180,11 +233,15 @@ class YoutubeDL(object):
     listsubtitles:     Lists all available subtitles for the video
     subtitlesformat:   The format code for subtitles
     subtitleslangs:    List of languages of the subtitles to download
+    sidecar_downloads: Number of subtitles and thumbnails downloaded
+                       concurrently, alongside the media (default is 4)
     keepvideo:         Keep the video file after post-processing
     daterange:         A DateRange object, download only if the upload_date is in the range.
     skip_download:     Skip the actual download of the video file
     cachedir:          Location of the cache files in the filesystem.
                        False to disable filesystem cache.
+    cache_backend:     How cache entries are stored: 'files' (one JSON file
+                       per entry, default) or 'sqlite' (a single database).
     noplaylist:        Download single video instead of a playlist if in doubt.
     age_limit:         An integer representing the user's age in years.
                        Unsuitable videos for the given age are skipped.
@@ -248,6 +305,9 @@ class YoutubeDL(object):
                        Progress hooks are guaranteed to be called at least once
                        (with status "finished") if the download is successful.
     merge_output_format: Extension to use when merging formats.
+    live_merge:        Merge the formats while they are downloaded, through
+                       named pipes, when their downloaders and containers
+                       allow it.
     fixup:             Automatically correct known faults of the file.
                        One of:
                        - "never": do nothing
@@ -293,13 +353,24 @@ class YoutubeDL(object):
     the downloader (see youtube_dl/downloader/common.py):
     nopart, updatetime, buffersize, ratelimit, min_filesize, max_filesize, test,
     noresizebuffer, retries, continuedl, noprogress, consoletitle,
-    xattr_set_filesize, external_downloader_args, hls_use_mpegts.
+    xattr_set_filesize, external_downloader_args, hls_use_mpegts, hls_pipe_remux.
 
     The following options are used by the post processors:
     prefer_ffmpeg:     If True, use ffmpeg instead of avconv if both are available,
                        otherwise prefer avconv.
     postprocessor_args: A list of additional command-line arguments for the
                         postprocessor.
+    postprocess_workers: Run the postprocessors in the background with this
+                        many workers, 0 for one per CPU core, while the next
+                        videos are downloaded. None (the default) runs them
+                        before the next download.
+    extract_audio_workers: Without postprocess_workers, transcode the audio of
+                        FFmpegExtractAudioPP in the background with this many
+                        workers, 0 for one per CPU core, while the next videos
+                        are downloaded. The postprocessors following it still
+                        run one file at a time, in download order, once the
+                        transcode is done. None (the default) transcodes
+                        before the next download.
     """
 
     params = None
@@ -308,6 +379,8 @@ class YoutubeDL(object):
     _download_retcode = None
     _num_downloads = None
     _screen_file = None
+    # Manifests kept from extraction for the downloaders
+    _MANIFEST_STORE_SIZE = 16
 
     def __init__(self, params=None, auto_init=True):
         """Create a FileDownloader object with the given options."""
@@ -319,6 +392,19 @@ class YoutubeDL(object):
         self._progress_hooks = []
         self._download_retcode = 0
         self._num_downloads = 0
+        self._lock = threading.RLock()
+        self._output_lock = threading.RLock()
+        self._async_context = threading.local()
+        self._async_transport = None
+        self._format_selectors = {}
+        self._manifests = {}
+        self._manifest_urls = []
+        self._sidecar_pool = None
+        self._pp_pool = None
+        self._pp_jobs = []
+        self._transcode_pool = None
+        # (job, resume) of the background transcodes, in download order
+        self._transcodes = []
         self._screen_file = [sys.stdout, sys.stderr][params.get('logtostderr', False)]
         self._err_file = sys.stderr
         self.params = {
@@ -434,8 +520,11 @@ class YoutubeDL(object):
         """
         ie = self._ies_instances.get(ie_key)
         if ie is None:
-            ie = get_info_extractor(ie_key)()
-            self.add_info_extractor(ie)
+            with self._lock:
+                ie = self._ies_instances.get(ie_key)
+                if ie is None:
+                    ie = get_info_extractor(ie_key)()
+                    self.add_info_extractor(ie)
         return ie
 
     def add_default_info_extractors(self):
@@ -472,18 +561,20 @@ class YoutubeDL(object):
         return self.to_stdout(message, skip_eol, check_quiet=True)
 
     def _write_string(self, s, out=None):
-        write_string(s, out=out, encoding=self.params.get('encoding'))
+        with self._output_lock:
+            write_string(s, out=out, encoding=self.params.get('encoding'))
 
     def to_stdout(self, message, skip_eol=False, check_quiet=False):
         """Print message to stdout if not in quiet mode."""
         if self.params.get('logger'):
             self.params['logger'].debug(message)
         elif not check_quiet or not self.params.get('quiet', False):
-            message = self._bidi_workaround(message)
-            terminator = ['\n', ''][skip_eol]
-            output = message + terminator
+            with self._output_lock:
+                message = self._bidi_workaround(message)
+                terminator = ['\n', ''][skip_eol]
+                output = message + terminator
 
-            self._write_string(output, self._screen_file)
+                self._write_string(output, self._screen_file)
 
     def to_stderr(self, message):
         """Print message to stderr."""
@@ -491,9 +582,10 @@ class YoutubeDL(object):
         if self.params.get('logger'):
             self.params['logger'].error(message)
         else:
-            message = self._bidi_workaround(message)
-            output = message + '\n'
-            self._write_string(output, self._err_file)
+            with self._output_lock:
+                message = self._bidi_workaround(message)
+                output = message + '\n'
+                self._write_string(output, self._err_file)
 
     def to_console_title(self, message):
         if not self.params.get('consoletitle', False):
@@ -526,8 +618,14 @@ class YoutubeDL(object):
     def __exit__(self, *args):
         self.restore_console_title()
 
+        self.wait_for_postprocessing(raise_errors=False)
+        for pool in (self._sidecar_pool, self._pp_pool, self._transcode_pool):
+            if pool is not None:
+                pool.shutdown()
+
         if self.params.get('cookiefile') is not None:
-            self.cookiejar.save()
+            with self._lock:
+                self.cookiejar.save()
 
     def trouble(self, message=None, tb=None):
         """Determine action to take when a download problem appears.
@@ -818,7 +916,7 @@ class YoutubeDL(object):
             if ((extract_flat == 'in_playlist' and 'playlist' in extra_info) or
                     extract_flat is True):
                 if self.params.get('forcejson', False):
-                    self.to_stdout(json.dumps(ie_result))
+                    self.to_stdout(json.dumps(ie_result, cls=InfoJSONEncoder))
                 return ie_result
 
         if result_type == 'video':
@@ -979,21 +1077,7 @@ class YoutubeDL(object):
     def _build_format_filter(self, filter_spec):
         " Returns a function to filter the formats according to the filter_spec "
 
-        OPERATORS = {
-            '<': operator.lt,
-            '<=': operator.le,
-            '>': operator.gt,
-            '>=': operator.ge,
-            '=': operator.eq,
-            '!=': operator.ne,
-        }
-        operator_rex = re.compile(r'''(?x)\s*
-            (?P<key>width|height|tbr|abr|vbr|asr|filesize|fps)
-            \s*(?P<op>%s)(?P<none_inclusive>\s*\?)?\s*
-            (?P<value>[0-9.]+(?:[kKmMgGtTpPeEzZyY]i?[Bb]?)?)
-            $
-            ''' % '|'.join(map(re.escape, OPERATORS.keys())))
-        m = operator_rex.search(filter_spec)
+        m = _FORMAT_FILTER_RE.search(filter_spec)
         if m:
             try:
                 comparison_value = int(m.group('value'))
@@ -1005,38 +1089,40 @@ class YoutubeDL(object):
                     raise ValueError(
                         'Invalid value %r in format specification %r' % (
                             m.group('value'), filter_spec))
-            op = OPERATORS[m.group('op')]
+            op = _FORMAT_FILTER_OPERATORS[m.group('op')]
 
         if not m:
-            STR_OPERATORS = {
-                '=': operator.eq,
-                '!=': operator.ne,
-                '^=': lambda attr, value: attr.startswith(value),
-                '$=': lambda attr, value: attr.endswith(value),
-                '*=': lambda attr, value: value in attr,
-            }
-            str_operator_rex = re.compile(r'''(?x)
-                \s*(?P<key>ext|acodec|vcodec|container|protocol|format_id)
-                \s*(?P<op>%s)(?P<none_inclusive>\s*\?)?
-                \s*(?P<value>[a-zA-Z0-9._-]+)
-                \s*$
-                ''' % '|'.join(map(re.escape, STR_OPERATORS.keys())))
-            m = str_operator_rex.search(filter_spec)
+            m = _FORMAT_STR_FILTER_RE.search(filter_spec)
             if m:
                 comparison_value = m.group('value')
-                op = STR_OPERATORS[m.group('op')]
+                op = _FORMAT_STR_FILTER_OPERATORS[m.group('op')]
 
         if not m:
             raise ValueError('Invalid filter specification %r' % filter_spec)
 
+        key, none_inclusive = m.group('key', 'none_inclusive')
+
         def _filter(f):
-            actual_value = f.get(m.group('key'))
+            actual_value = f.get(key)
             if actual_value is None:
-                return m.group('none_inclusive')
+                return none_inclusive
             return op(actual_value, comparison_value)
         return _filter
 
     def build_format_selector(self, format_spec):
+        """
+        Return a function selecting the formats matching format_spec.
+
+        The function is built once per format_spec and reused afterwards.
+        """
+        selector = self._format_selectors.get(format_spec)
+        if selector is None:
+            selector = self._compile_format_selector(format_spec)
+            with self._lock:
+                selector = self._format_selectors.setdefault(format_spec, selector)
+        return selector
+
+    def _compile_format_selector(self, format_spec):
         def syntax_error(note, start):
             message = (
                 'Invalid format specification: '
@@ -1259,14 +1345,15 @@ class YoutubeDL(object):
                 video_selector, audio_selector = map(_build_selector_function, selector.selector)
 
                 def selector_function(ctx):
-                    for pair in itertools.product(
-                            video_selector(copy.deepcopy(ctx)), audio_selector(copy.deepcopy(ctx))):
+                    for pair in itertools.product(video_selector(ctx), audio_selector(ctx)):
                         yield _merge(pair)
 
             filters = [self._build_format_filter(f) for f in selector.filters]
 
             def final_selector(ctx):
-                ctx_copy = copy.deepcopy(ctx)
+                # Selectors never modify the format dicts, a shallow copy is
+                # enough to keep the filtered list away from the caller
+                ctx_copy = dict(ctx)
                 for _filter in filters:
                     ctx_copy['formats'] = list(filter(_filter, ctx_copy['formats']))
                 return selector_function(ctx_copy)
@@ -1600,9 +1687,12 @@ class YoutubeDL(object):
             self.to_screen('[download] ' + reason)
             return
 
-        self._num_downloads += 1
-
-        info_dict['_filename'] = filename = self.prepare_filename(info_dict)
+        with self._lock:
+            # Checked again since other threads may have downloaded meanwhile
+            if max_downloads is not None and self._num_downloads >= int(max_downloads):
+                raise MaxDownloadsReached()
+            self._num_downloads += 1
+            info_dict['_filename'] = filename = self.prepare_filename(info_dict)
 
         # Forced printings
         if self.params.get('forcetitle', False):
@@ -1627,7 +1717,7 @@ class YoutubeDL(object):
         if self.params.get('forceformat', False):
             self.to_stdout(info_dict['format'])
         if self.params.get('forcejson', False):
-            self.to_stdout(json.dumps(info_dict))
+            self.to_stdout(json.dumps(info_dict, cls=InfoJSONEncoder))
 
         # Do nothing else if in simulate mode
         if self.params.get('simulate', False):
@@ -1674,6 +1764,9 @@ class YoutubeDL(object):
                     self.report_error('Cannot write annotations file: ' + annofn)
                     return
 
+        # Subtitles and thumbnails are downloaded while the media is, they
+        # are waited for before postprocessing
+        sidecar_jobs = []
         subtitles_are_requested = any([self.params.get('writesubtitles', False),
                                        self.params.get('writeautomaticsub')])
 
@@ -1683,30 +1776,8 @@ class YoutubeDL(object):
             subtitles = info_dict['requested_subtitles']
             ie = self.get_info_extractor(info_dict['extractor_key'])
             for sub_lang, sub_info in subtitles.items():
-                sub_format = sub_info['ext']
-                if sub_info.get('data') is not None:
-                    sub_data = sub_info['data']
-                else:
-                    try:
-                        sub_data = ie._download_webpage(
-                            sub_info['url'], info_dict['id'], note=False)
-                    except ExtractorError as err:
-                        self.report_warning('Unable to download subtitle for "%s": %s' %
-                                            (sub_lang, error_to_compat_str(err.cause)))
-                        continue
-                try:
-                    sub_filename = subtitles_filename(filename, sub_lang, sub_format)
-                    if self.params.get('nooverwrites', False) and os.path.exists(encodeFilename(sub_filename)):
-                        self.to_screen('[info] Video subtitle %s.%s is already_present' % (sub_lang, sub_format))
-                    else:
-                        self.to_screen('[info] Writing video subtitles to: ' + sub_filename)
-                        # Use newline='' to prevent conversion of newline characters
-                        # See https://github.com/rg3/youtube-dl/issues/10268
-                        with io.open(encodeFilename(sub_filename), 'w', encoding='utf-8', newline='') as subfile:
-                            subfile.write(sub_data)
-                except (OSError, IOError):
-                    self.report_error('Cannot write subtitles file ' + sub_filename)
-                    return
+                sidecar_jobs.append(self._get_sidecar_pool().submit(
+                    self._write_subtitle, ie, info_dict, filename, sub_lang, sub_info))
 
         if self.params.get('writeinfojson', False):
             infofn = replace_extension(filename, 'info.json', info_dict.get('ext'))
@@ -1720,9 +1791,13 @@ class YoutubeDL(object):
                     self.report_error('Cannot write metadata to JSON file ' + infofn)
                     return
 
-        self._write_thumbnails(info_dict, filename)
+        sidecar_jobs.extend(self._write_thumbnails(info_dict, filename))
 
-        if not self.params.get('skip_download', False):
+        if self.params.get('skip_download', False):
+            self._report_sidecar_failures(self._wait_for_sidecars(sidecar_jobs))
+        else:
+            sidecar_failures = []
+            interrupted = False
             try:
                 def dl(name, info):
                     fd = get_suitable_downloader(info, self.params)(self, self.params)
@@ -1775,6 +1850,9 @@ class YoutubeDL(object):
                         self.to_screen(
                             '[download] %s has already been downloaded and '
                             'merged' % filename)
+                    elif self._can_merge_while_downloading(info_dict, postprocessors):
+                        success = self._merge_while_downloading(filename, info_dict, merger, dl)
+                        info_dict['__postprocessors'] = []
                     else:
                         for f in requested_formats:
                             new_info = dict(info_dict)
@@ -1797,6 +1875,17 @@ class YoutubeDL(object):
             except (ContentTooShortError, ) as err:
                 self.report_error('content too short (expected %s bytes and served %s)' % (err.expected, err.downloaded))
                 return
+            except KeyboardInterrupt:
+                interrupted = True
+                raise
+            finally:
+                # Their failures are only reported once the download
+                # succeeded, not to replace its error
+                if not interrupted:
+                    sidecar_failures = self._wait_for_sidecars(sidecar_jobs)
+
+            if not self._report_sidecar_failures(sidecar_failures):
+                return
 
             if success and filename != '-':
                 # Fixup content
@@ -1861,12 +1950,12 @@ class YoutubeDL(object):
                     else:
                         assert fixup_policy in ('ignore', 'never')
 
-                try:
-                    self.post_process(filename, info_dict)
-                except (PostProcessingError) as err:
-                    self.report_error('postprocessing: %s' % str(err))
-                    return
-                self.record_download_archive(info_dict)
+                if self.params.get('postprocess_workers') is not None:
+                    self._post_process_in_background(filename, info_dict)
+                else:
+                    self._post_process_and_record(
+                        filename, info_dict,
+                        transcode_in_background=self.params.get('extract_audio_workers') is not None)
 
     def download(self, url_list):
         """Download a given list of URLs."""
@@ -1877,19 +1966,25 @@ class YoutubeDL(object):
                 self.params.get('max_downloads') != 1):
             raise SameFileError(outtmpl)
 
-        for url in url_list:
-            try:
-                # It also downloads the videos
-                res = self.extract_info(
-                    url, force_generic_extractor=self.params.get('force_generic_extractor', False))
-            except UnavailableVideoError:
-                self.report_error('unable to download video')
-            except MaxDownloadsReached:
-                self.to_screen('[info] Maximum number of downloaded files reached.')
-                raise
-            else:
-                if self.params.get('dump_single_json', False):
-                    self.to_stdout(json.dumps(res))
+        try:
+            for url in url_list:
+                try:
+                    # It also downloads the videos
+                    res = self.extract_info(
+                        url, force_generic_extractor=self.params.get('force_generic_extractor', False))
+                except UnavailableVideoError:
+                    self.report_error('unable to download video')
+                except MaxDownloadsReached:
+                    self.to_screen('[info] Maximum number of downloaded files reached.')
+                    raise
+                else:
+                    if self.params.get('dump_single_json', False):
+                        self.to_stdout(json.dumps(res, cls=InfoJSONEncoder))
+        except Exception:
+            # Still finish with the videos already downloaded
+            self.wait_for_postprocessing(raise_errors=False)
+            raise
+        self.wait_for_postprocessing()
 
         return self._download_retcode
 
@@ -1901,7 +1996,9 @@ class YoutubeDL(object):
             info = self.filter_requested_info(json.loads('\n'.join(f)))
         try:
             self.process_ie_result(info, download=True)
+            self.wait_for_postprocessing()
         except DownloadError:
+            self.wait_for_postprocessing(raise_errors=False)
             webpage_url = info.get('webpage_url')
             if webpage_url is not None:
                 self.report_warning('The info failed to download, trying with "%s"' % webpage_url)
@@ -1917,26 +2014,274 @@ class YoutubeDL(object):
             if k not in ['requested_formats', 'requested_subtitles'])
 
     def post_process(self, filename, ie_info):
-        """Run all the postprocessors on the given file."""
+        """
+        Run all the postprocessors on the given file, return False if one
+        of them failed.
+        """
+        return self._post_process(filename, ie_info)
+
+    def _post_process(self, filename, ie_info, on_transcode=None):
+        """
+        Like post_process, if on_transcode is given the chain stops at an
+        FFmpegExtractAudioPP, on_transcode(pp, info, rest_of_chain, success)
+        is called instead and None returned.
+        """
         info = dict(ie_info)
         info['filepath'] = filename
         pps_chain = []
         if ie_info.get('__postprocessors') is not None:
             pps_chain.extend(ie_info['__postprocessors'])
         pps_chain.extend(self._pps)
-        for pp in pps_chain:
-            files_to_delete = []
+        return self._run_pps_chain(pps_chain, info, on_transcode=on_transcode)
+
+    def _run_pps_chain(self, pps_chain, info, success=True, on_transcode=None):
+        # Consecutive postprocessors copying the streams of the file with
+        # ffmpeg rewrite it once, with the options of all of them
+        copy_pp, copy_plan = None, None
+        for i, pp in enumerate(pps_chain + [None]):
+            plan, error = None, None
+            if isinstance(pp, FFmpegPostProcessor):
+                try:
+                    plan = pp.copy_plan(info)
+                except PostProcessingError as e:
+                    error = e
+            if plan is not None and copy_plan is not None:
+                merged_plan = copy_plan.merge(plan)
+                if merged_plan is not None:
+                    copy_plan = merged_plan
+                    continue
+            if copy_plan is not None:
+                info, ok = self._run_post_processor(
+                    functools.partial(copy_pp.run_copy_plan, copy_plan), info)
+                success = success and ok
+                copy_pp, copy_plan = None, None
+            if error is not None:
+                # Reported once the postprocessors before it are done, it
+                # raises unless ignoreerrors is set
+                self.report_error(error.msg)
+                success = False
+            elif plan is not None:
+                copy_pp, copy_plan = pp, plan
+            elif on_transcode is not None and isinstance(pp, FFmpegExtractAudioPP):
+                on_transcode(pp, info, pps_chain[i + 1:], success)
+                return None
+            elif pp is not None:
+                info, ok = self._run_post_processor(pp.run, info)
+                success = success and ok
+        return success
+
+    def _run_post_processor(self, run, info):
+        """
+        Return the info returned by run(info) and False if it raised a
+        PostProcessingError
+        """
+        files_to_delete = []
+        success = True
+        try:
+            files_to_delete, info = run(info)
+        except PostProcessingError as e:
+            self.report_error(e.msg)
+            success = False
+        if files_to_delete and not self.params.get('keepvideo', False):
+            for old_filename in files_to_delete:
+                self.to_screen('Deleting original file %s (pass -k to keep)' % old_filename)
+                try:
+                    os.remove(encodeFilename(old_filename))
+                except (IOError, OSError):
+                    self.report_warning('Unable to remove downloaded original file')
+        return info, success
+
+    def _can_merge_while_downloading(self, info_dict, postprocessors):
+        if (not self.params.get('live_merge') or not hasattr(os, 'mkfifo')
+                or not postprocessors or len(info_dict['requested_formats']) != 2
+                # The downloaders would take the pipes for finished downloads
+                or self.params.get('nooverwrites')):
+            return False
+        for f in info_dict['requested_formats']:
+            new_info = dict(info_dict)
+            new_info.update(f)
+            # The downloader must write the file from start to end and
+            # ffmpeg must be able to read it that way
+            if get_suitable_downloader(new_info, self.params) not in (HttpFD, HlsFD, DashSegmentsFD):
+                return False
+            if not (new_info['ext'] in ('webm', 'mkv', 'ts', 'flv')
+                    or (new_info.get('container') or '').endswith('_dash')
+                    or 'DASH' in (new_info.get('format_note') or '')
+                    or new_info['protocol'] in ('http_dash_segments', 'm3u8_native')):
+                return False
+        return True
+
+    def _merge_while_downloading(self, filename, info_dict, merger, dl):
+        """
+        Download the requested formats into named pipes which ffmpeg reads
+        at the same time, writing the merged file, return False on failure
+        """
+        pipe_dir = tempfile.mkdtemp(prefix='youtube-dl-')
+        temp_filename = prepend_extension(filename, 'temp')
+        pool = WorkerPool(3)
+        try:
+            pipes = []
+            for f in info_dict['requested_formats']:
+                pipe = os.path.join(
+                    pipe_dir, 'f%s.%s' % (sanitize_filename(f['format_id']), f['ext']))
+                os.mkfifo(pipe)
+                pipes.append(pipe)
+            self.to_screen('[ffmpeg] Merging formats into "%s" while downloading them' % filename)
+            merge_job = pool.submit(merger.merge, pipes, temp_filename)
+            dl_jobs = []
+            for f, pipe in zip(info_dict['requested_formats'], pipes):
+                new_info = dict(info_dict)
+                new_info.update(f)
+                dl_jobs.append(pool.submit(dl, pipe, new_info))
+
+            while not all(job.done() for job in dl_jobs + [merge_job]):
+                for pipe, job in zip(pipes, dl_jobs):
+                    # Whoever is left waiting for the other end of a pipe
+                    # would wait forever
+                    if job.done():
+                        self._open_pipe_end(pipe, os.O_WRONLY)
+                    if merge_job.done():
+                        self._open_pipe_end(pipe, os.O_RDONLY)
+                time.sleep(0.1)
+
             try:
-                files_to_delete, info = pp.run(info)
+                merge_job.result()
             except PostProcessingError as e:
-                self.report_error(e.msg)
-            if files_to_delete and not self.params.get('keepvideo', False):
-                for old_filename in files_to_delete:
-                    self.to_screen('Deleting original file %s (pass -k to keep)' % old_filename)
-                    try:
-                        os.remove(encodeFilename(old_filename))
-                    except (IOError, OSError):
-                        self.report_warning('Unable to remove downloaded original file')
+                self.report_error('merging failed: %s' % e.msg)
+                return False
+            success = True
+            for job in dl_jobs:
+                success = job.result() and success
+            if success:
+                os.rename(encodeFilename(temp_filename), encodeFilename(filename))
+            return success
+        finally:
+            pool.shutdown()
+            shutil.rmtree(pipe_dir, ignore_errors=True)
+            if os.path.exists(encodeFilename(temp_filename)):
+                os.remove(encodeFilename(temp_filename))
+
+    @staticmethod
+    def _open_pipe_end(pipe, mode):
+        """ Open and close an end of a named pipe if the other one is open """
+        try:
+            os.close(os.open(pipe, mode | os.O_NONBLOCK))
+        except OSError:
+            pass
+
+    def _post_process_and_record(self, filename, info_dict, transcode_in_background=False):
+        def on_transcode(pp, info, pps_chain, success):
+            self._transcode_in_background(
+                pp, info, lambda job: self._post_process_and_record_transcoded(
+                    job, info, pps_chain, success, info_dict))
+
+        try:
+            success = self._post_process(
+                filename, info_dict,
+                on_transcode=on_transcode if transcode_in_background else None)
+        except (PostProcessingError) as err:
+            self.report_error('postprocessing: %s' % str(err))
+            return
+        # Only completely processed videos are skipped next time
+        if success:
+            self.record_download_archive(info_dict)
+
+    def _post_process_and_record_transcoded(self, job, info, pps_chain, success, info_dict):
+        """ Finish _post_process_and_record once the transcode job is done """
+        try:
+            info, ok = self._run_post_processor(lambda _: job.result(), info)
+            success = self._run_pps_chain(pps_chain, info, success and ok)
+        except (PostProcessingError) as err:
+            self.report_error('postprocessing: %s' % str(err))
+            return
+        if success:
+            self.record_download_archive(info_dict)
+
+    @staticmethod
+    def _pool_size(workers):
+        if not workers:
+            try:
+                workers = multiprocessing.cpu_count()
+            except NotImplementedError:
+                workers = 1
+        return workers
+
+    def _transcode_in_background(self, pp, info, resume):
+        filename = info['filepath']
+
+        def transcode():
+            try:
+                return pp.run(info)
+            except PostProcessingError as e:
+                # Reported while another video is being processed
+                raise PostProcessingError('%s: %s' % (filename, e.msg))
+
+        with self._lock:
+            if self._transcode_pool is None:
+                self._transcode_pool = WorkerPool(
+                    self._pool_size(self.params['extract_audio_workers']))
+            self._transcodes.append((self._transcode_pool.submit(transcode), resume))
+        self._finish_transcodes()
+
+    def _finish_transcodes(self, wait=False):
+        """
+        Run the rest of the postprocessors of the finished background
+        transcodes, in download order. Unless wait is True, only wait for
+        the oldest ones if more than two per worker are pending.
+        """
+        while True:
+            with self._lock:
+                if not self._transcodes:
+                    return
+                job, resume = self._transcodes[0]
+                if not (wait or job.done()
+                        or len(self._transcodes) > 2 * self._transcode_pool.workers):
+                    return
+                self._transcodes.pop(0)
+            resume(job)
+
+    def _post_process_in_background(self, filename, info_dict):
+        with self._lock:
+            if self._pp_pool is None:
+                self._pp_pool = WorkerPool(
+                    self._pool_size(self.params['postprocess_workers']))
+            done = [job for job in self._pp_jobs if job.done()]
+            pending = [job for job in self._pp_jobs if not job.done()]
+            pending.append(self._pp_pool.submit(self._post_process_and_record, filename, info_dict))
+            self._pp_jobs = pending
+            # Not to pile up downloaded files faster than they are processed
+            oldest = pending[0] if len(pending) > 2 * self._pp_pool.workers else None
+        # Failed postprocessors stop the downloads like synchronous ones do,
+        # the error was reported when it happened
+        for job in done:
+            job.result()
+        if oldest is not None:
+            oldest.result()
+
+    def wait_for_postprocessing(self, raise_errors=True):
+        """
+        Wait for the postprocessors running in the background (see the
+        postprocess_workers option), raise the first error they had unless
+        raise_errors is False. The postprocessors following the background
+        transcodes (see the extract_audio_workers option) are run too.
+        """
+        error = None
+        while True:
+            try:
+                self._finish_transcodes(wait=True)
+            except Exception as e:
+                error = error or e
+            else:
+                break
+        with self._lock:
+            jobs, self._pp_jobs = self._pp_jobs, []
+        for job in jobs:
+            try:
+                job.result()
+            except Exception as e:
+                error = error or e
+        if error is not None and raise_errors:
+            raise error
 
     def _make_archive_id(self, info_dict):
         # Future-proof against any change in case
@@ -2091,8 +2436,62 @@ class YoutubeDL(object):
         """ Start an HTTP download """
         if isinstance(req, compat_basestring):
             req = sanitized_Request(req)
+        transport = getattr(self._async_context, 'transport', None)
+        if transport is not None and transport.can_handle(req):
+            return transport.urlopen(req)
         return self._opener.open(req, timeout=self._socket_timeout)
 
+    def store_manifest(self, url, content, final_url=None):
+        """ Keep the text of a manifest downloaded from url during extraction """
+        with self._lock:
+            if url in self._manifests:
+                self._manifest_urls.remove(url)
+            self._manifests[url] = (time.time(), content, final_url or url)
+            self._manifest_urls.append(url)
+            if len(self._manifest_urls) > self._MANIFEST_STORE_SIZE:
+                del self._manifests[self._manifest_urls.pop(0)]
+
+    def load_manifest(self, url, max_age):
+        """
+        Return a (content, final URL) tuple for the manifest stored for url
+        at most max_age seconds ago, None if there is none
+        """
+        with self._lock:
+            entry = self._manifests.get(url)
+        if entry is None or time.time() - entry[0] > max_age:
+            return None
+        return entry[1:]
+
+    def _get_async_transport(self, loop):
+        with self._lock:
+            if self._async_transport is None or self._async_transport.loop is not loop:
+                self._async_transport = AsyncHTTPTransport(self, loop)
+            return self._async_transport
+
+    def extract_info_async(self, url, loop=None, executor=None, **kwargs):
+        """
+        Asynchronous version of extract_info, returns an asyncio future.
+
+        The extractors run in executor (the default one of the event loop if
+        None), while their requests are performed by the event loop, so that
+        many extractions can be in flight at the same time. The keyword
+        arguments are those of extract_info, download defaults to False.
+        """
+        if asyncio is None:
+            raise YoutubeDLError('extract_info_async requires Python 3.4 or later')
+        if loop is None:
+            loop = asyncio.get_event_loop()
+        kwargs.setdefault('download', False)
+        transport = self._get_async_transport(loop)
+
+        def run():
+            self._async_context.transport = transport
+            try:
+                return self.extract_info(url, **kwargs)
+            finally:
+                self._async_context.transport = None
+        return loop.run_in_executor(executor, run)
+
     def print_debug_header(self):
         if not self.params.get('verbose'):
             return
@@ -2229,7 +2628,65 @@ class YoutubeDL(object):
             encoding = preferredencoding()
         return encoding
 
+    def _get_sidecar_pool(self):
+        with self._lock:
+            if self._sidecar_pool is None:
+                self._sidecar_pool = WorkerPool(self.params.get('sidecar_downloads', 4))
+            return self._sidecar_pool
+
+    def _wait_for_sidecars(self, jobs):
+        """
+        Wait for the subtitles and thumbnails without raising, return the
+        error messages of those which could not be written and the
+        exceptions raised writing them
+        """
+        failures = []
+        for job in jobs:
+            try:
+                error = job.result()
+            except Exception as e:
+                failures.append(e)
+            else:
+                if error is not None:
+                    failures.append(error)
+        return failures
+
+    def _report_sidecar_failures(self, failures):
+        """ Report what _wait_for_sidecars returned, return False if anything failed """
+        for failure in failures:
+            if isinstance(failure, Exception):
+                raise failure
+            self.report_error(failure)
+        return not failures
+
+    def _write_subtitle(self, ie, info_dict, filename, sub_lang, sub_info):
+        """ Run by the sidecar pool, return an error message if the file could not be written """
+        sub_format = sub_info['ext']
+        if sub_info.get('data') is not None:
+            sub_data = sub_info['data']
+        else:
+            try:
+                sub_data = ie._download_webpage(
+                    sub_info['url'], info_dict['id'], note=False)
+            except ExtractorError as err:
+                self.report_warning('Unable to download subtitle for "%s": %s' %
+                                    (sub_lang, error_to_compat_str(err.cause)))
+                return
+        try:
+            sub_filename = subtitles_filename(filename, sub_lang, sub_format)
+            if self.params.get('nooverwrites', False) and os.path.exists(encodeFilename(sub_filename)):
+                self.to_screen('[info] Video subtitle %s.%s is already_present' % (sub_lang, sub_format))
+            else:
+                self.to_screen('[info] Writing video subtitles to: ' + sub_filename)
+                # Use newline='' to prevent conversion of newline characters
+                # See https://github.com/rg3/youtube-dl/issues/10268
+                with io.open(encodeFilename(sub_filename), 'w', encoding='utf-8', newline='') as subfile:
+                    subfile.write(sub_data)
+        except (OSError, IOError):
+            return 'Cannot write subtitles file ' + sub_filename
+
     def _write_thumbnails(self, info_dict, filename):
+        """ Start downloading the thumbnails, return their WorkerJobs """
         if self.params.get('writethumbnail', False):
             thumbnails = info_dict.get('thumbnails')
             if thumbnails:
@@ -2237,12 +2694,13 @@ class YoutubeDL(object):
         elif self.params.get('write_all_thumbnails', False):
             thumbnails = info_dict.get('thumbnails')
         else:
-            return
+            return []
 
         if not thumbnails:
             # No thumbnails present, so return immediately
-            return
+            return []
 
+        jobs = []
         for t in thumbnails:
             thumb_ext = determine_ext(t['url'], 'jpg')
             suffix = '_%s' % t['id'] if len(thumbnails) > 1 else ''
@@ -2253,14 +2711,19 @@ class YoutubeDL(object):
                 self.to_screen('[%s] %s: Thumbnail %sis already present' %
                                (info_dict['extractor'], info_dict['id'], thumb_display_id))
             else:
-                self.to_screen('[%s] %s: Downloading thumbnail %s...' %
-                               (info_dict['extractor'], info_dict['id'], thumb_display_id))
-                try:
-                    uf = self.urlopen(t['url'])
-                    with open(encodeFilename(thumb_filename), 'wb') as thumbf:
-                        shutil.copyfileobj(uf, thumbf)
-                    self.to_screen('[%s] %s: Writing thumbnail %sto: %s' %
-                                   (info_dict['extractor'], info_dict['id'], thumb_display_id, thumb_filename))
-                except (compat_urllib_error.URLError, compat_http_client.HTTPException, socket.error) as err:
-                    self.report_warning('Unable to download thumbnail "%s": %s' %
-                                        (t['url'], error_to_compat_str(err)))
+                jobs.append(self._get_sidecar_pool().submit(
+                    self._write_thumbnail, info_dict, t, thumb_display_id))
+        return jobs
+
+    def _write_thumbnail(self, info_dict, t, thumb_display_id):
+        self.to_screen('[%s] %s: Downloading thumbnail %s...' %
+                       (info_dict['extractor'], info_dict['id'], thumb_display_id))
+        try:
+            uf = self.urlopen(t['url'])
+            with open(encodeFilename(t['filename']), 'wb') as thumbf:
+                shutil.copyfileobj(uf, thumbf)
+            self.to_screen('[%s] %s: Writing thumbnail %sto: %s' %
+                           (info_dict['extractor'], info_dict['id'], thumb_display_id, t['filename']))
+        except (compat_urllib_error.URLError, compat_http_client.HTTPException, socket.error) as err:
+            self.report_warning('Unable to download thumbnail "%s": %s' %
+                                (t['url'], error_to_compat_str(err)))
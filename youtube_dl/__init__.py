@@ -18,6 +18,7 @@ from .options import (
 from .compat import (
     compat_getpass,
     compat_shlex_split,
+    compat_str,
     workaround_optparse_bug9161,
 )
 from .utils import (
@@ -26,6 +27,7 @@ from .utils import (
     DEFAULT_OUTTMPL,
     DownloadError,
     expand_path,
+    ExtractorError,
     match_filter_func,
     MaxDownloadsReached,
     preferredencoding,
@@ -42,6 +44,8 @@ from .downloader import (
 )
 from .extractor import gen_extractors, list_extractors
 from .extractor.adobepass import MSO_INFO
+from .extractor.common import FORMAT_SORT_ALLOWED_FIELDS
+from .server import parse_serve_address, YoutubeDLServer
 from .YoutubeDL import YoutubeDL
 
 
@@ -145,6 +149,21 @@ def _real_main(argv=None):
         opts.password = compat_getpass('Type account password and press [Return]: ')
     if opts.ap_username is not None and opts.ap_password is None:
         opts.ap_password = compat_getpass('Type TV provider account password and press [Return]: ')
+    if opts.serve is not None:
+        serve_address = parse_serve_address(opts.serve)
+        if serve_address is None:
+            parser.error('invalid --serve address specified')
+        if opts.serve_workers < 1:
+            parser.error('--serve-workers must be positive')
+    if opts.sidecar_downloads < 1:
+        parser.error('--sidecar-downloads must be positive')
+    if opts.postprocess_workers is not None and opts.postprocess_workers < 0:
+        parser.error('--postprocess-workers must not be negative')
+    if opts.format_sort:
+        unknown = [f for f in opts.format_sort.split(',') if f not in FORMAT_SORT_ALLOWED_FIELDS]
+        if unknown:
+            parser.error('invalid --format-sort field(s) %s, use %s' % (
+                ', '.join(unknown), ', '.join(sorted(FORMAT_SORT_ALLOWED_FIELDS))))
     if opts.ratelimit is not None:
         numeric_limit = FileDownloader.parse_bytes(opts.ratelimit)
         if numeric_limit is None:
@@ -300,6 +319,9 @@ def _real_main(argv=None):
     external_downloader_args = None
     if opts.external_downloader_args:
         external_downloader_args = compat_shlex_split(opts.external_downloader_args)
+    # Audio encoders use a single core, transcode a file per core while
+    # the next ones are downloaded
+    extract_audio_workers = 0 if opts.extractaudio else None
     postprocessor_args = None
     if opts.postprocessor_args:
         postprocessor_args = compat_shlex_split(opts.postprocessor_args)
@@ -343,6 +365,7 @@ def _real_main(argv=None):
         'retries': opts.retries,
         'fragment_retries': opts.fragment_retries,
         'skip_unavailable_fragments': opts.skip_unavailable_fragments,
+        'sidecar_downloads': opts.sidecar_downloads,
         'buffersize': opts.buffersize,
         'noresizebuffer': opts.noresizebuffer,
         'continuedl': opts.continue_dl,
@@ -372,6 +395,7 @@ def _real_main(argv=None):
         'rejecttitle': decodeOption(opts.rejecttitle),
         'max_downloads': opts.max_downloads,
         'prefer_free_formats': opts.prefer_free_formats,
+        'format_sort': opts.format_sort.split(',') if opts.format_sort else None,
         'verbose': opts.verbose,
         'dump_intermediate_pages': opts.dump_intermediate_pages,
         'write_pages': opts.write_pages,
@@ -383,6 +407,7 @@ def _real_main(argv=None):
         'max_views': opts.max_views,
         'daterange': date,
         'cachedir': opts.cachedir,
+        'cache_backend': opts.cache_backend,
         'youtube_print_sig_code': opts.youtube_print_sig_code,
         'age_limit': opts.age_limit,
         'download_archive': download_archive_fn,
@@ -401,6 +426,7 @@ def _real_main(argv=None):
         'extract_flat': opts.extract_flat,
         'mark_watched': opts.mark_watched,
         'merge_output_format': opts.merge_output_format,
+        'live_merge': opts.live_merge,
         'postprocessors': postprocessors,
         'fixup': opts.fixup,
         'source_address': opts.source_address,
@@ -416,8 +442,11 @@ def _real_main(argv=None):
         'ffmpeg_location': opts.ffmpeg_location,
         'hls_prefer_native': opts.hls_prefer_native,
         'hls_use_mpegts': opts.hls_use_mpegts,
+        'hls_pipe_remux': opts.hls_pipe_remux,
         'external_downloader_args': external_downloader_args,
         'postprocessor_args': postprocessor_args,
+        'postprocess_workers': opts.postprocess_workers,
+        'extract_audio_workers': extract_audio_workers,
         'cn_verification_proxy': opts.cn_verification_proxy,
         'geo_verification_proxy': opts.geo_verification_proxy,
         'config_location': opts.config_location,
@@ -437,9 +466,21 @@ def _real_main(argv=None):
         if opts.rm_cachedir:
             ydl.cache.remove()
 
+        if opts.warm_youtube_cache:
+            youtube_ie = ydl.get_info_extractor('Youtube')
+            for player_url in opts.warm_youtube_cache:
+                try:
+                    youtube_ie.warm_player_cache(player_url)
+                except ExtractorError as e:
+                    ydl.report_error(compat_str(e), e.format_traceback())
+
+        if opts.serve is not None:
+            sys.exit(YoutubeDLServer(
+                ydl, serve_address, workers=opts.serve_workers).serve_forever())
+
         # Maybe do nothing
         if (len(all_urls) < 1) and (opts.load_info_filename is None):
-            if opts.update_self or opts.rm_cachedir:
+            if opts.update_self or opts.rm_cachedir or opts.warm_youtube_cache:
                 sys.exit()
 
             ydl.warn_if_short_id(sys.argv[1:] if argv is None else argv)
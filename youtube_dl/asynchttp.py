@@ -0,0 +1,747 @@
+from __future__ import unicode_literals
+
+import base64
+import io
+import socket
+import ssl
+import threading
+
+try:
+    import asyncio
+except ImportError:  # Python < 3.4
+    asyncio = None
+
+from .compat import (
+    compat_http_client,
+    compat_HTTPError,
+    compat_urllib_error,
+    compat_urllib_parse_unquote,
+    compat_urllib_parse_urlparse,
+    compat_urllib_request,
+    compat_urlparse,
+)
+from .utils import (
+    PerRequestProxyHandler,
+    YoutubeDLHandler,
+)
+
+
+def _parse_headers(data):
+    fp = io.BytesIO(data)
+    if hasattr(compat_http_client, 'parse_headers'):
+        return compat_http_client.parse_headers(fp)
+    return compat_http_client.HTTPMessage(fp)  # Python 2
+
+
+def _request_scheme(req):
+    return compat_urllib_parse_urlparse(req.get_full_url()).scheme.lower()
+
+
+def _create_future(loop):
+    if hasattr(loop, 'create_future'):
+        return loop.create_future()
+    return asyncio.Future(loop=loop)
+
+
+def _chain(future, callback, result):
+    """ Call callback with the result of future, exceptions go to result """
+    def on_done(f):
+        if result.done():
+            return
+        if f.cancelled():
+            result.cancel()
+            return
+        exc = f.exception()
+        if exc is not None:
+            result.set_exception(exc)
+            return
+        try:
+            callback(f.result())
+        except Exception as e:
+            if not result.done():
+                result.set_exception(e)
+    future.add_done_callback(on_done)
+
+
+class _ResponseStream(object):
+    """Body of a response, fed by the event loop and read by any thread
+
+    Reading from the socket is paused once more than HIGH_WATER bytes are
+    buffered and nobody waits for them, so that slow consumers do not make
+    whole responses pile up in memory."""
+
+    HIGH_WATER = 1 << 20
+
+    def __init__(self, loop):
+        self._loop = loop
+        self._cond = threading.Condition()
+        self._buf = bytearray()
+        self._eof = False
+        self._error = None
+        self._want = 0
+        self._transport = None
+        self._paused = False
+        self._eof_waiters = []
+        self.closed = False
+
+    # Event loop side
+
+    def set_transport(self, transport):
+        self._transport = transport
+
+    def feed(self, data):
+        with self._cond:
+            self._buf.extend(data)
+            self._cond.notify_all()
+            pause = (
+                not self._paused and not self._eof_waiters and
+                len(self._buf) > max(self.HIGH_WATER, self._want))
+            if pause:
+                self._paused = True
+        if pause:
+            self._transport.pause_reading()
+
+    def feed_eof(self, error=None):
+        with self._cond:
+            self._eof = True
+            self._error = error
+            self._cond.notify_all()
+        waiters, self._eof_waiters = self._eof_waiters, []
+        for waiter in waiters:
+            if not waiter.done():
+                waiter.set_result(None)
+
+    def detach(self):
+        """ Give the transport back once the whole body has been received """
+        with self._cond:
+            transport, self._transport = self._transport, None
+            paused, self._paused = self._paused, False
+        if paused:
+            transport.resume_reading()
+
+    def wait_eof(self):
+        """ Return a future resolved once the whole body has been received """
+        waiter = _create_future(self._loop)
+        with self._cond:
+            if self._eof:
+                waiter.set_result(None)
+                return waiter
+            self._eof_waiters.append(waiter)
+            paused, self._paused = self._paused, False
+        if paused:
+            self._transport.resume_reading()
+        return waiter
+
+    # Consumer side
+
+    def _resume(self):
+        # Called with self._cond held
+        if self._paused:
+            self._paused = False
+            self._loop.call_soon_threadsafe(self._resume_reading)
+
+    def _resume_reading(self):
+        # The connection may have been detached and reused in the meantime
+        if self._transport is not None:
+            self._transport.resume_reading()
+
+    def _abort(self):
+        if self._transport is not None:
+            self._transport.abort()
+
+    def _read(self, find_end):
+        with self._cond:
+            while True:
+                end = find_end(self._buf)
+                if end is not None or self._eof:
+                    break
+                self._want = len(self._buf) + 1
+                self._resume()
+                self._cond.wait()
+            self._want = 0
+            if end is None:
+                if self._error is not None and not self._buf:
+                    raise self._error
+                end = len(self._buf)
+            data = bytes(self._buf[:end])
+            del self._buf[:end]
+            if len(self._buf) <= self.HIGH_WATER:
+                self._resume()
+            return data
+
+    def read(self, size=-1):
+        if size is None or size < 0:
+            return self._read(lambda buf: None)
+        return self._read(lambda buf: size if len(buf) >= size else None)
+
+    def readline(self, size=-1):
+        def find_end(buf):
+            idx = buf.find(b'\n')
+            if idx != -1:
+                idx += 1
+                return idx if size is None or size < 0 else min(idx, size)
+            if size is not None and 0 <= size <= len(buf):
+                return size
+            return None
+        return self._read(find_end)
+
+    def readlines(self, hint=-1):
+        return list(iter(self.readline, b''))
+
+    def __iter__(self):
+        return iter(self.readline, b'')
+
+    def close(self):
+        if self.closed:
+            return
+        self.closed = True
+        with self._cond:
+            eof = self._eof
+        if not eof:
+            self._loop.call_soon_threadsafe(self._abort)
+
+
+class _HTTPProtocol(asyncio.Protocol if asyncio else object):
+    """Incremental HTTP/1.1 response parser
+
+    When tunnel is passed to send_request, the request is a CONNECT one and
+    nothing after the head of the response is parsed: send_request has to be
+    called again once the connection has been switched to TLS.
+
+    head_future gets the (code, reason, headers, stream) of the response.
+    Once a response allowing it has been received, the connection is passed
+    to on_idle, send_request can then be called again for another request.
+    Idle connections are closed after IDLE_TIMEOUT seconds."""
+
+    IDLE_TIMEOUT = 15
+
+    def __init__(self, loop, timeout):
+        self._loop = loop
+        self._timeout = timeout
+        self._timer = None
+        self._timed_out = False
+        self.transport = None
+        self.head_future = _create_future(loop)
+        self.stream = None
+        self.on_idle = None
+        self._buf = bytearray()
+        self._no_body = False
+        self._tunnel = False
+        self._keep_alive = False
+        self._state = 'head'
+        self._length = None
+        self._chunk_left = None
+
+    @property
+    def idle(self):
+        is_closing = getattr(self.transport, 'is_closing', None)
+        return self._state == 'idle' and not (is_closing and is_closing())
+
+    def _reset_timer(self):
+        if self._timer is not None:
+            self._timer.cancel()
+        if self._state not in ('done', 'idle'):
+            self._timer = self._loop.call_later(self._timeout, self._on_timeout)
+
+    def _on_timeout(self):
+        self._timed_out = True
+        if self.transport is not None:
+            self.transport.abort()
+
+    def send_request(self, transport, data, no_body=False, tunnel=False):
+        self.transport = transport
+        self.stream = _ResponseStream(self._loop)
+        self.stream.set_transport(transport)
+        self._no_body = no_body
+        self._tunnel = tunnel
+        self._state = 'head'
+        self.head_future = _create_future(self._loop)
+        transport.write(data)
+        self._reset_timer()
+
+    def connection_made(self, transport):
+        self.transport = transport
+
+    def data_received(self, data):
+        if self._state == 'idle':
+            # Nothing is expected between responses
+            self._state = 'done'
+            self.transport.close()
+            return
+        self._reset_timer()
+        self._buf.extend(data)
+        try:
+            self._process()
+        except ValueError as e:
+            self._fail(compat_http_client.BadStatusLine(str(e)))
+
+    def _fail(self, exc):
+        if not self.head_future.done():
+            self.head_future.set_exception(exc)
+        else:
+            self.stream.feed_eof(exc)
+        self._state = 'done'
+        self.transport.abort()
+
+    def _finish(self):
+        self._state = 'done'
+        if self._timer is not None:
+            self._timer.cancel()
+        self.stream.feed_eof()
+        if self._keep_alive and not self._buf and self.on_idle is not None:
+            self.stream.detach()
+            self._state = 'idle'
+            self._timer = self._loop.call_later(self.IDLE_TIMEOUT, self.transport.close)
+            self.on_idle(self)
+        else:
+            self.transport.close()
+
+    def _process(self):
+        while self._buf and self._state not in ('done', 'idle', 'tunnel'):
+            if self._state == 'head':
+                idx = self._buf.find(b'\r\n\r\n')
+                if idx == -1:
+                    return
+                head = bytes(self._buf[:idx + 4])
+                del self._buf[:idx + 4]
+                status_line, _, header_data = head.partition(b'\r\n')
+                parts = status_line.decode('iso-8859-1').split(None, 2)
+                if len(parts) < 2 or not parts[0].startswith('HTTP/'):
+                    raise ValueError(status_line)
+                code = int(parts[1])
+                reason = parts[2] if len(parts) > 2 else ''
+                if 100 <= code < 200:
+                    continue  # Interim response
+                headers = _parse_headers(header_data)
+                if self._tunnel:
+                    self._state = 'tunnel'
+                    self.head_future.set_result((code, reason, headers, None))
+                    return
+                self._keep_alive = (
+                    parts[0] == 'HTTP/1.1'
+                    and 'close' not in (headers.get('Connection') or '').lower())
+                if self._no_body or code in (204, 304):
+                    self._state = 'body'
+                    self._length = 0
+                elif 'chunked' in (headers.get('Transfer-Encoding') or '').lower():
+                    self._state = 'chunked'
+                    self._chunk_left = None
+                elif headers.get('Content-Length') is not None:
+                    self._state = 'body'
+                    self._length = int(headers['Content-Length'])
+                else:
+                    # Read until the connection is closed
+                    self._state = 'body'
+                    self._length = None
+                    self._keep_alive = False
+                self.head_future.set_result((code, reason, headers, self.stream))
+                if self._length == 0:
+                    self._finish()
+            elif self._state == 'body':
+                if self._length is None:
+                    data = bytes(self._buf)
+                else:
+                    data = bytes(self._buf[:self._length])
+                    self._length -= len(data)
+                del self._buf[:len(data)]
+                self.stream.feed(data)
+                if self._length == 0:
+                    self._finish()
+            elif self._state == 'chunked':
+                if self._chunk_left is None:
+                    idx = self._buf.find(b'\r\n')
+                    if idx == -1:
+                        return
+                    size = int(bytes(self._buf[:idx]).split(b';')[0].strip(), 16)
+                    del self._buf[:idx + 2]
+                    self._chunk_left = size if size else -1
+                elif self._chunk_left > 0:
+                    data = bytes(self._buf[:self._chunk_left])
+                    del self._buf[:len(data)]
+                    self._chunk_left -= len(data)
+                    self.stream.feed(data)
+                elif self._chunk_left == 0:
+                    if len(self._buf) < 2:
+                        return
+                    del self._buf[:2]
+                    self._chunk_left = None
+                else:
+                    # Trailer part, terminated by an empty line
+                    if self._buf.startswith(b'\r\n'):
+                        self._finish()
+                        return
+                    idx = self._buf.find(b'\r\n\r\n')
+                    if idx == -1:
+                        return
+                    self._finish()
+
+    def connection_lost(self, exc):
+        if self._timer is not None:
+            self._timer.cancel()
+        if self._state in ('done', 'idle'):
+            self._state = 'done'
+            return
+        if self._timed_out:
+            exc = socket.timeout('timed out')
+        if not self.head_future.done():
+            self.head_future.set_exception(
+                exc or compat_http_client.BadStatusLine(
+                    'Remote end closed connection without response'))
+        elif self._state == 'body' and self._length is None and exc is None:
+            self.stream.feed_eof()
+        else:
+            self.stream.feed_eof(exc or compat_http_client.IncompleteRead(b''))
+        self._state = 'done'
+
+
+class AsyncHTTPTransport(object):
+    """HTTP(S) client running on an asyncio event loop
+
+    Requests are processed with the handlers of the opener of a YoutubeDL
+    object (standard headers, cookies, compression, URL escaping) and
+    follow its proxy, source_address, socket_timeout and certificate
+    settings, so that the results match YoutubeDL.urlopen. SOCKS proxies and
+    --print-traffic are not supported, can_handle tells when the blocking
+    opener has to be used instead. Connections are kept open and reused for
+    the following requests to the same host, up to MAX_IDLE_CONNECTIONS of
+    them per host.
+
+    open returns a future with a urllib-like response, whose body can be
+    read from any thread but the one running the event loop.
+    """
+
+    MAX_IDLE_CONNECTIONS = 4
+
+    def __init__(self, ydl, loop):
+        self._ydl = ydl
+        self.loop = loop
+        # Idle connections (_HTTPProtocol) by scheme, host, port and proxy
+        self._idle = {}
+        opener = ydl._opener
+        self._timeout = ydl._socket_timeout
+        self._proxies = {}
+        self._redirect_handler = compat_urllib_request.HTTPRedirectHandler()
+        self._ssl_context = None
+        self._resolver = None
+        for handler in opener.handlers:
+            if isinstance(handler, PerRequestProxyHandler):
+                self._proxies = handler.proxies
+            elif isinstance(handler, compat_urllib_request.HTTPRedirectHandler):
+                self._redirect_handler = handler
+            elif isinstance(handler, compat_urllib_request.HTTPSHandler):
+                self._ssl_context = getattr(handler, '_context', None)
+        if self._ssl_context is None:
+            self._ssl_context = ssl.create_default_context()
+            if ydl.params.get('nocheckcertificate'):
+                self._ssl_context.check_hostname = False
+                self._ssl_context.verify_mode = ssl.CERT_NONE
+        self._processors = {}
+        for scheme in ('http', 'https'):
+            self._processors[scheme] = (
+                [getattr(h, scheme + '_request') for h in opener.process_request.get(scheme, [])],
+                [getattr(h, scheme + '_response') for h in opener.process_response.get(scheme, [])
+                 if not isinstance(h, compat_urllib_request.HTTPErrorProcessor)])
+
+    def _get_proxy(self, req):
+        scheme = _request_scheme(req)
+        proxy = req.headers.get('Ytdl-request-proxy')
+        if proxy is None:
+            proxy = self._proxies.get(scheme, '__noproxy__')
+        if proxy == '__noproxy__':
+            return None
+        if '://' not in proxy:
+            proxy = 'http://' + proxy
+        return compat_urllib_parse_urlparse(proxy)
+
+    def can_handle(self, req):
+        scheme = _request_scheme(req)
+        if scheme not in ('http', 'https'):
+            return False
+        if self._ydl.params.get('debug_printtraffic'):
+            return False
+        proxy = self._get_proxy(req)
+        if proxy is not None:
+            if proxy.scheme.lower() != 'http':
+                return False
+            if scheme == 'https' and not hasattr(self.loop, 'start_tls'):
+                return False
+        return True
+
+    def open(self, req):
+        """ Start a request, return a future with the response """
+        result = _create_future(self.loop)
+        try:
+            self._open(req, result, 0)
+        except Exception as e:
+            result.set_exception(e)
+        return result
+
+    def fetch(self, req):
+        """ Return a future with (response, body) once the body is complete """
+        result = _create_future(self.loop)
+
+        def on_response(resp):
+            if isinstance(resp.fp, _ResponseStream):
+                _chain(resp.fp.wait_eof(), lambda _: result.set_result((resp, resp.read())), result)
+            else:
+                result.set_result((resp, resp.read()))
+        _chain(self.open(req), on_response, result)
+        return result
+
+    def urlopen(self, req):
+        """ Blocking open for threads other than the one of the event loop """
+        done = threading.Event()
+        futures = []
+
+        def start():
+            fut = self.open(req)
+            futures.append(fut)
+            fut.add_done_callback(lambda f: done.set())
+        self.loop.call_soon_threadsafe(start)
+        done.wait()
+        return futures[0].result()
+
+    def _open(self, req, result, redirects):
+        scheme = _request_scheme(req)
+        request_processors, response_processors = self._processors[scheme]
+        for processor in request_processors:
+            req = processor(req)
+        proxy = self._get_proxy(req)
+        if 'Ytdl-request-proxy' in req.headers:
+            del req.headers['Ytdl-request-proxy']
+        conn = self._connect(req, proxy)
+
+        def on_head(head):
+            code, reason, headers, stream = head
+            resp = YoutubeDLHandler.addinfourl_wrapper(
+                stream, headers, req.get_full_url(), code)
+            resp.msg = reason
+            if headers.get('Content-encoding', '') in ('gzip', 'deflate'):
+                # The compression handler reads the whole body
+                _chain(stream.wait_eof(), lambda _: on_response(resp), result)
+            else:
+                on_response(resp)
+
+        def on_response(resp):
+            for processor in response_processors:
+                resp = processor(req, resp)
+            code = resp.code
+            if 200 <= code < 300:
+                result.set_result(resp)
+                return
+            headers = resp.headers
+            newurl = headers.get('Location') or headers.get('URI')
+            if code in (301, 302, 303, 307, 308) and newurl:
+                newurl = compat_urlparse.urljoin(req.get_full_url(), newurl)
+                urlparts = compat_urllib_parse_urlparse(newurl)
+                if urlparts.scheme not in ('http', 'https'):
+                    raise compat_HTTPError(
+                        newurl, code, '%s - Redirection to url \'%s\' is not allowed' % (resp.msg, newurl),
+                        headers, resp)
+                if not urlparts.path and urlparts.netloc:
+                    newurl += '/'
+                new_req = self._redirect_handler.redirect_request(
+                    req, resp, code, resp.msg, headers, newurl)
+                if new_req is not None:
+                    resp.close()
+                    if redirects + 1 > self._redirect_handler.max_redirections:
+                        raise compat_HTTPError(
+                            req.get_full_url(), code,
+                            self._redirect_handler.inf_msg + resp.msg, headers, resp)
+                    self._open(new_req, result, redirects + 1)
+                    return
+            raise compat_HTTPError(req.get_full_url(), code, resp.msg, headers, resp)
+
+        _chain(conn.head_future, on_head, result)
+
+    def _connect(self, req, proxy):
+        """ Send req, return an object with head_future and protocol """
+        url = compat_urllib_parse_urlparse(req.get_full_url())
+        scheme = url.scheme.lower()
+        host = url.hostname
+        port = url.port or (443 if scheme == 'https' else 80)
+        netloc = host if url.port is None else '%s:%d' % (host, port)
+        if ':' in host and url.port is None:
+            netloc = '[%s]' % host
+
+        target = url.path or '/'
+        if url.params:
+            target += ';' + url.params
+        if url.query:
+            target += '?' + url.query
+
+        headers = dict(req.header_items())
+        data = req.data
+        if data is not None:
+            headers.setdefault('Content-type', 'application/x-www-form-urlencoded')
+            headers.setdefault('Content-length', '%d' % len(data))
+        headers.setdefault('Host', netloc)
+
+        proxy_headers = {}
+        if proxy is not None:
+            if proxy.username is not None:
+                user_pass = '%s:%s' % (
+                    compat_urllib_parse_unquote(proxy.username),
+                    compat_urllib_parse_unquote(proxy.password or ''))
+                proxy_headers['Proxy-authorization'] = 'Basic ' + base64.b64encode(
+                    user_pass.encode('utf-8')).decode('ascii')
+            if scheme == 'http':
+                target = req.get_full_url().partition('#')[0]
+                headers.update(proxy_headers)
+
+        def build_head(method, target, headers):
+            return ('%s %s HTTP/1.1\r\n%s\r\n' % (method, target, ''.join(
+                '%s: %s\r\n' % (k, v) for k, v in headers.items()))).encode('iso-8859-1')
+
+        method = req.get_method()
+        request_data = build_head(method, target, headers) + (data or b'')
+        no_body = method == 'HEAD'
+
+        conn = _Connection(self.loop, self._timeout)
+        source_address = self._ydl.params.get('source_address')
+        kwargs = {}
+        if source_address is not None:
+            kwargs['local_addr'] = (source_address, 0)
+        use_tls = scheme == 'https'
+        if use_tls and proxy is None:
+            kwargs.update({
+                'ssl': self._ssl_context,
+                'server_hostname': host,
+            })
+
+        key = (scheme, host, port, proxy and (proxy.hostname, proxy.port, proxy.username, proxy.password))
+
+        def on_connected(res):
+            transport, protocol = res
+            protocol.on_idle = lambda p: self._put_idle(key, p)
+            if use_tls and proxy is not None:
+                protocol.send_request(transport, build_head(
+                    'CONNECT', '%s:%d' % (host, port),
+                    dict(proxy_headers, Host='%s:%d' % (host, port))), tunnel=True)
+                _chain(protocol.head_future, lambda head: on_tunnel(transport, protocol, head), conn.head_future)
+            else:
+                protocol.send_request(transport, request_data, no_body)
+                _chain(protocol.head_future, conn.head_future.set_result, conn.head_future)
+
+        def on_tunnel(transport, protocol, head):
+            code, reason = head[:2]
+            if code != 200:
+                transport.abort()
+                raise compat_http_client.HTTPException('Tunnel connection failed: %d %s' % (code, reason))
+            tls = self.loop.create_task(self.loop.start_tls(
+                transport, protocol, self._ssl_context, server_hostname=host))
+            conn.set_timeout(tls)
+
+            def on_tls(tls_transport):
+                protocol.send_request(tls_transport, request_data, no_body)
+                _chain(protocol.head_future, conn.head_future.set_result, conn.head_future)
+            _chain(tls, on_tls, conn.head_future)
+
+        if proxy is not None:
+            connect_host, connect_port = proxy.hostname, proxy.port or 80
+        else:
+            connect_host, connect_port = host, port
+
+        def connect(addrinfos):
+            # Try every address in turn, each one for socket_timeout seconds,
+            # like socket.create_connection
+            family, _, _, _, sockaddr = addrinfos[0]
+            task = self.loop.create_task(self.loop.create_connection(
+                conn.make_protocol, sockaddr[0], sockaddr[1], family=family, **kwargs))
+            if len(addrinfos) > 1:
+                timer = self.loop.call_later(self._timeout, task.cancel)
+
+                def on_done(f):
+                    timer.cancel()
+                    if f.cancelled() or isinstance(f.exception(), (OSError, IOError)):
+                        connect(addrinfos[1:])
+                    else:
+                        _chain(f, on_connected, conn.head_future)
+                task.add_done_callback(on_done)
+            else:
+                conn.set_timeout(task)
+                _chain(task, on_connected, conn.head_future)
+
+        def open_connection():
+            # Names are resolved in a separate executor since the default one
+            # of the loop may be full of extractors waiting for this very request
+            resolve = self.loop.run_in_executor(
+                self._get_resolver(), socket.getaddrinfo,
+                connect_host, connect_port, 0, socket.SOCK_STREAM)
+            conn.set_timeout(resolve)
+            _chain(resolve, connect, conn.head_future)
+
+        protocol = self._take_idle(key)
+        if protocol is None:
+            open_connection()
+            return conn
+
+        def on_reused_head(f):
+            if conn.head_future.done():
+                return
+            exc = None if f.cancelled() else f.exception()
+            if (isinstance(exc, (compat_http_client.BadStatusLine, OSError, IOError))
+                    and not isinstance(exc, socket.timeout)):
+                # The server closed the idle connection in the meantime
+                open_connection()
+            else:
+                _chain(f, conn.head_future.set_result, conn.head_future)
+        conn.protocol = protocol
+        protocol.send_request(protocol.transport, request_data, no_body)
+        protocol.head_future.add_done_callback(on_reused_head)
+        return conn
+
+    def _take_idle(self, key):
+        idle = self._idle.get(key)
+        while idle:
+            protocol = idle.pop()
+            if protocol.idle:
+                return protocol
+        return None
+
+    def _put_idle(self, key, protocol):
+        idle = [p for p in self._idle.get(key, []) if p.idle]
+        idle.append(protocol)
+        if len(idle) > self.MAX_IDLE_CONNECTIONS:
+            idle.pop(0).transport.close()
+        self._idle[key] = idle
+
+    def close(self):
+        """ Close the idle connections, must be called from the event loop thread """
+        for idle in self._idle.values():
+            for protocol in idle:
+                protocol.transport.close()
+        self._idle.clear()
+
+    def _get_resolver(self):
+        if self._resolver is None:
+            import concurrent.futures
+            self._resolver = concurrent.futures.ThreadPoolExecutor(max_workers=4)
+        return self._resolver
+
+
+class _Connection(object):
+    def __init__(self, loop, timeout):
+        self._loop = loop
+        self._timeout = timeout
+        self.protocol = None
+        self.head_future = _create_future(loop)
+
+    def make_protocol(self):
+        self.protocol = _HTTPProtocol(self._loop, self._timeout)
+        return self.protocol
+
+    def set_timeout(self, task):
+        timer = self._loop.call_later(self._timeout, task.cancel)
+        task.add_done_callback(lambda _: timer.cancel())
+
+        def on_done(f):
+            if self.head_future.done():
+                return
+            if f.cancelled():
+                self.head_future.set_exception(
+                    compat_urllib_error.URLError(socket.timeout('timed out')))
+            elif isinstance(f.exception(), (OSError, IOError, ssl.SSLError)):
+                self.head_future.set_exception(
+                    compat_urllib_error.URLError(f.exception()))
+        task.add_done_callback(on_done)
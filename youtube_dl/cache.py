@@ -1,13 +1,22 @@
 from __future__ import unicode_literals
 
+import copy
 import errno
 import io
+import itertools
 import json
 import os
 import re
 import shutil
+import threading
+import time
 import traceback
 
+try:
+    import sqlite3
+except ImportError:  # Python built without sqlite support
+    sqlite3 = None
+
 from .compat import compat_getenv
 from .utils import (
     expand_path,
@@ -15,9 +24,233 @@ from .utils import (
 )
 
 
+def _makedirs(path):
+    try:
+        os.makedirs(path)
+    except OSError as ose:
+        if ose.errno != errno.EEXIST:
+            raise
+
+
+class _FileBackend(object):
+    """ One JSON file per entry, in <cachedir>/<section>/<key>.<dtype>
+
+    The modification time of a file is the time the entry was written, its
+    access time is set explicitly on every read and drives LRU eviction.
+    Writes go through a temporary file that is renamed over the entry, so
+    readers in other processes never see a partially written file.
+    """
+
+    # Leftovers of writers that died between creating and renaming
+    _STALE_TMP_AGE = 3600
+
+    def __init__(self, root_dir):
+        self.root_dir = root_dir
+
+    def _get_fn(self, section, key, dtype):
+        return os.path.join(self.root_dir, section, '%s.%s' % (key, dtype))
+
+    def load(self, section, key, dtype):
+        fn = self._get_fn(section, key, dtype)
+        try:
+            with io.open(fn, 'r', encoding='utf-8') as cachef:
+                created = os.fstat(cachef.fileno()).st_mtime
+                try:
+                    data = json.load(cachef)
+                except ValueError:
+                    try:
+                        file_size = os.path.getsize(fn)
+                    except (OSError, IOError) as oe:
+                        file_size = str(oe)
+                    raise ValueError('%s (%s)' % (fn, file_size))
+            os.utime(fn, (time.time(), created))
+        except (OSError, IOError):
+            return None  # No cache available
+        return data, created
+
+    def store(self, section, key, dtype, data):
+        fn = self._get_fn(section, key, dtype)
+        _makedirs(os.path.dirname(fn))
+        write_json_file(data, fn)
+
+    def delete(self, section, key, dtype):
+        try:
+            os.remove(self._get_fn(section, key, dtype))
+        except OSError as ose:
+            if ose.errno != errno.ENOENT:
+                raise
+
+    def trim(self, section, ttl, max_size):
+        section_dir = os.path.join(self.root_dir, section)
+        now = time.time()
+        entries = []
+        try:
+            names = os.listdir(section_dir)
+        except OSError:
+            return
+        for name in names:
+            fn = os.path.join(section_dir, name)
+            try:
+                st = os.stat(fn)
+            except OSError:
+                continue  # Removed concurrently
+            if name.endswith('.tmp'):
+                expired = now - st.st_mtime > self._STALE_TMP_AGE
+            else:
+                expired = ttl is not None and now - st.st_mtime > ttl
+            if expired:
+                self._remove_file(fn)
+            elif not name.endswith('.tmp'):
+                entries.append((st.st_atime, st.st_size, fn))
+        if max_size is None:
+            return
+        total = sum(size for _, size, _ in entries)
+        for _, size, fn in sorted(entries):
+            if total <= max_size:
+                break
+            self._remove_file(fn)
+            total -= size
+
+    @staticmethod
+    def _remove_file(fn):
+        try:
+            os.remove(fn)
+        except OSError:
+            pass
+
+    def close(self):
+        pass
+
+
+class _SQLiteBackend(object):
+    """ All entries in a single SQLite database, <cachedir>/cache.sqlite3
+
+    Meant for hosts with many small entries, where one file per entry wastes
+    inodes and directory scans get slow. SQLite's own locking makes the
+    database safe to share between processes.
+    """
+
+    DB_NAME = 'cache.sqlite3'
+
+    def __init__(self, root_dir):
+        self.root_dir = root_dir
+        self._conn = None
+        self._lock = threading.Lock()
+
+    def _get_conn(self):
+        if self._conn is None:
+            _makedirs(self.root_dir)
+            conn = sqlite3.connect(
+                os.path.join(self.root_dir, self.DB_NAME), timeout=30,
+                isolation_level=None, check_same_thread=False)
+            try:
+                conn.execute('PRAGMA journal_mode=WAL')
+            except sqlite3.Error:
+                pass  # e.g. on network filesystems, the default journal works too
+            conn.execute(
+                'CREATE TABLE IF NOT EXISTS entries ('
+                'section TEXT NOT NULL, key TEXT NOT NULL, dtype TEXT NOT NULL, '
+                'data TEXT NOT NULL, size INTEGER NOT NULL, '
+                'created REAL NOT NULL, accessed REAL NOT NULL, '
+                'PRIMARY KEY (section, key, dtype))')
+            self._conn = conn
+        return self._conn
+
+    def load(self, section, key, dtype):
+        with self._lock:
+            conn = self._get_conn()
+            row = conn.execute(
+                'SELECT data, created FROM entries WHERE section = ? AND key = ? AND dtype = ?',
+                (section, key, dtype)).fetchone()
+            if row is None:
+                return None
+            conn.execute(
+                'UPDATE entries SET accessed = ? WHERE section = ? AND key = ? AND dtype = ?',
+                (time.time(), section, key, dtype))
+        try:
+            return json.loads(row[0]), row[1]
+        except ValueError:
+            raise ValueError('%s entry %s/%s.%s' % (
+                self.DB_NAME, section, key, dtype))
+
+    def store(self, section, key, dtype, data):
+        data = json.dumps(data)
+        now = time.time()
+        with self._lock:
+            self._get_conn().execute(
+                'INSERT OR REPLACE INTO entries VALUES (?, ?, ?, ?, ?, ?, ?)',
+                (section, key, dtype, data, len(data), now, now))
+
+    def delete(self, section, key, dtype):
+        with self._lock:
+            self._get_conn().execute(
+                'DELETE FROM entries WHERE section = ? AND key = ? AND dtype = ?',
+                (section, key, dtype))
+
+    def trim(self, section, ttl, max_size):
+        with self._lock:
+            conn = self._get_conn()
+            conn.execute('BEGIN IMMEDIATE')
+            try:
+                if ttl is not None:
+                    conn.execute(
+                        'DELETE FROM entries WHERE section = ? AND created < ?',
+                        (section, time.time() - ttl))
+                if max_size is not None:
+                    total = conn.execute(
+                        'SELECT COALESCE(SUM(size), 0) FROM entries WHERE section = ?',
+                        (section,)).fetchone()[0]
+                    if total > max_size:
+                        victims = []
+                        for key, dtype, size in conn.execute(
+                                'SELECT key, dtype, size FROM entries WHERE section = ? '
+                                'ORDER BY accessed', (section,)):
+                            if total <= max_size:
+                                break
+                            victims.append((section, key, dtype))
+                            total -= size
+                        conn.executemany(
+                            'DELETE FROM entries WHERE section = ? AND key = ? AND dtype = ?',
+                            victims)
+                conn.execute('COMMIT')
+            except Exception:
+                conn.execute('ROLLBACK')
+                raise
+
+    def close(self):
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+
+_BACKENDS = {
+    'files': _FileBackend,
+    'sqlite': _SQLiteBackend,
+}
+
+
 class Cache(object):
+    """ Persistent key-value store for extractors and friends
+
+    Entries are JSON-serializable objects grouped in sections. Recently used
+    entries are also kept in memory, so repeated loads do not hit the disk.
+    The per-section policy set with set_policy() controls how long entries
+    stay valid (ttl, in seconds) and how much space a section may take
+    (max_size, in bytes of serialized JSON); least recently used entries are
+    evicted first.
+    """
+
+    # Number of entries kept in memory across all sections
+    _MEMORY_SIZE = 256
+
     def __init__(self, ydl):
         self._ydl = ydl
+        self._lock = threading.RLock()
+        self._backend = None
+        self._memory = {}
+        self._ticks = itertools.count()
+        self._policies = {}
 
     def _get_root_dir(self):
         res = self._ydl.params.get('cachedir')
@@ -33,10 +266,38 @@ class Cache(object):
         return os.path.join(
             self._get_root_dir(), section, '%s.%s' % (key, dtype))
 
+    def _get_backend(self):
+        root_dir = self._get_root_dir()
+        backend_name = self._ydl.params.get('cache_backend') or 'files'
+        if backend_name == 'sqlite' and sqlite3 is None:
+            self._ydl.report_warning(
+                'sqlite3 is not available, falling back to the files cache backend')
+            self._ydl.params['cache_backend'] = backend_name = 'files'
+        backend_class = _BACKENDS[backend_name]
+        backend = self._backend
+        if (backend is None or backend.root_dir != root_dir
+                or not isinstance(backend, backend_class)):
+            # Parameters changed, entries in memory belong to the old store
+            if backend is not None:
+                backend.close()
+            self._memory.clear()
+            backend = self._backend = backend_class(root_dir)
+        return backend
+
     @property
     def enabled(self):
         return self._ydl.params.get('cachedir') is not False
 
+    def set_policy(self, section, ttl=None, max_size=None):
+        """ Set the expiration time and maximum size of section """
+        self._policies[section] = (ttl, max_size)
+
+    def _remember(self, mkey, data, created):
+        self._memory[mkey] = (data, created, next(self._ticks))
+        if len(self._memory) > self._MEMORY_SIZE:
+            oldest = min(self._memory, key=lambda k: self._memory[k][2])
+            del self._memory[oldest]
+
     def store(self, section, key, data, dtype='json'):
         assert dtype in ('json',)
 
@@ -44,13 +305,14 @@ class Cache(object):
             return
 
         fn = self._get_cache_fn(section, key, dtype)
+        ttl, max_size = self._policies.get(section, (None, None))
         try:
-            try:
-                os.makedirs(os.path.dirname(fn))
-            except OSError as ose:
-                if ose.errno != errno.EEXIST:
-                    raise
-            write_json_file(data, fn)
+            with self._lock:
+                backend = self._get_backend()
+                backend.store(section, key, dtype, data)
+                self._remember((section, key, dtype), copy.deepcopy(data), time.time())
+                if ttl is not None or max_size is not None:
+                    backend.trim(section, ttl, max_size)
         except Exception:
             tb = traceback.format_exc()
             self._ydl.report_warning(
@@ -62,22 +324,39 @@ class Cache(object):
         if not self.enabled:
             return default
 
-        cache_fn = self._get_cache_fn(section, key, dtype)
-        try:
-            try:
-                with io.open(cache_fn, 'r', encoding='utf-8') as cachef:
-                    return json.load(cachef)
-            except ValueError:
+        self._get_cache_fn(section, key, dtype)  # Validates section and key
+        mkey = (section, key, dtype)
+        ttl = self._policies.get(section, (None, None))[0]
+        with self._lock:
+            backend = self._get_backend()
+            entry = self._memory.get(mkey)
+            if entry is not None:
+                data, created = entry[:2]
+                self._remember(mkey, data, created)
+            else:
                 try:
-                    file_size = os.path.getsize(cache_fn)
-                except (OSError, IOError) as oe:
-                    file_size = str(oe)
-                self._ydl.report_warning(
-                    'Cache retrieval from %s failed (%s)' % (cache_fn, file_size))
-        except IOError:
-            pass  # No cache available
-
-        return default
+                    entry = backend.load(section, key, dtype)
+                except ValueError as ve:
+                    self._ydl.report_warning(
+                        'Cache retrieval from %s failed' % ve)
+                    return default
+                except Exception:
+                    self._ydl.report_warning(
+                        'Cache retrieval failed: %s' % traceback.format_exc())
+                    return default
+                if entry is None:
+                    return default
+                data, created = entry
+                self._remember(mkey, data, created)
+            if ttl is not None and time.time() - created > ttl:
+                del self._memory[mkey]
+                try:
+                    backend.delete(section, key, dtype)
+                except Exception:
+                    pass  # Expired anyway, will be overwritten or trimmed
+                return default
+        # Callers are free to modify what they get
+        return copy.deepcopy(data)
 
     def remove(self):
         if not self.enabled:
@@ -88,6 +367,12 @@ class Cache(object):
         if not any((term in cachedir) for term in ('cache', 'tmp')):
             raise Exception('Not removing directory %s - this does not look like a cache dir' % cachedir)
 
+        with self._lock:
+            if self._backend is not None:
+                self._backend.close()
+                self._backend = None
+            self._memory.clear()
+
         self._ydl.to_screen(
             'Removing cache dir %s .' % cachedir, skip_eol=True)
         if os.path.exists(cachedir):
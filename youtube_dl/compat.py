@@ -2333,6 +2333,16 @@ try:
 except ImportError:
     import BaseHTTPServer as compat_http_server
 
+try:
+    import queue as compat_queue
+except ImportError:  # Python 2
+    import Queue as compat_queue
+
+try:
+    import socketserver as compat_socketserver
+except ImportError:  # Python 2
+    import SocketServer as compat_socketserver
+
 try:
     compat_str = unicode  # Python 2
 except NameError:
@@ -2906,10 +2916,12 @@ __all__ = [
     'compat_os_name',
     'compat_parse_qs',
     'compat_print',
+    'compat_queue',
     'compat_setenv',
     'compat_shlex_quote',
     'compat_shlex_split',
     'compat_socket_create_connection',
+    'compat_socketserver',
     'compat_str',
     'compat_struct_pack',
     'compat_struct_unpack',
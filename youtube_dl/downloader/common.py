@@ -48,6 +48,8 @@ class FileDownloader(object):
     external_downloader_args:  A list of additional command-line arguments for the
                         external downloader.
     hls_use_mpegts:     Use the mpegts container for HLS videos.
+    hls_pipe_remux:     Remux the fragments of HLS videos into MP4 with
+                        ffmpeg as they are downloaded (hlsnative only).
 
     Subclasses of this one must re-define the real_download method.
     """
@@ -1,11 +1,14 @@
 from __future__ import division, unicode_literals
 
 import os
+import subprocess
 import time
 
 from .common import FileDownloader
 from .http import HttpFD
+from ..postprocessor.ffmpeg import FFmpegPostProcessor
 from ..utils import (
+    encodeArgument,
     error_to_compat_str,
     encodeFilename,
     sanitize_open,
@@ -18,6 +21,34 @@ class HttpQuietDownloader(HttpFD):
         pass
 
 
+class _RemuxPipe(object):
+    """ Stands for the destination file, what is written goes to ffmpeg """
+
+    def __init__(self, proc):
+        self._proc = proc
+
+    def write(self, data):
+        try:
+            self._proc.stdin.write(data)
+        except (IOError, OSError):
+            # ffmpeg exited, close() reports it
+            pass
+
+    def close(self):
+        """ Wait for ffmpeg to write the rest of the file, return its exit code """
+        try:
+            self._proc.stdin.close()
+        except (IOError, OSError):
+            pass
+        return self._proc.wait()
+
+    def kill(self):
+        """ Stop ffmpeg without waiting for it to write the file """
+        if self._proc.poll() is None:
+            self._proc.terminate()
+        self.close()
+
+
 class FragmentFD(FileDownloader):
     """
     A base file downloader class for fragmented media (e.g. f4m/m3u8 manifests).
@@ -28,8 +59,15 @@ class FragmentFD(FileDownloader):
                         and hlsnative only)
     skip_unavailable_fragments:
                         Skip unavailable fragments (DASH and hlsnative only)
+
+    The fragments are written to the destination file, unless ctx has
+    'remux_args': they are then fed to ffmpeg, which writes the file with
+    these output options.
     """
 
+    # Seconds a manifest downloaded by the extractor is reused for
+    _MANIFEST_MAX_AGE = 60
+
     def report_retry_fragment(self, err, fragment_name, count, retries):
         self.to_screen(
             '[download] Got server HTTP error: %s. Retrying fragment %s (attempt %d of %s)...'
@@ -42,6 +80,18 @@ class FragmentFD(FileDownloader):
         headers = info_dict.get('http_headers')
         return sanitized_Request(url, None, headers) if headers else url
 
+    def _download_manifest(self, info_dict, url):
+        """
+        Return the text and the final URL of the manifest, reusing the one
+        the extractor has just downloaded unless the stream is live
+        """
+        if not info_dict.get('is_live'):
+            stored = self.ydl.load_manifest(url, self._MANIFEST_MAX_AGE)
+            if stored is not None:
+                return stored
+        urlh = self.ydl.urlopen(self._prepare_url(info_dict, url))
+        return urlh.read().decode('utf-8', 'ignore'), urlh.geturl()
+
     def _prepare_and_start_frag_download(self, ctx):
         self._prepare_frag_download(ctx)
         self._start_frag_download(ctx)
@@ -66,7 +116,10 @@ class FragmentFD(FileDownloader):
             }
         )
         tmpfilename = self.temp_name(ctx['filename'])
-        dest_stream, tmpfilename = sanitize_open(tmpfilename, 'wb')
+        if ctx.get('remux_args') is not None:
+            dest_stream = self._start_remux(tmpfilename, ctx['remux_args'])
+        else:
+            dest_stream, tmpfilename = sanitize_open(tmpfilename, 'wb')
         ctx.update({
             'dl': dl,
             'dest_stream': dest_stream,
@@ -130,8 +183,31 @@ class FragmentFD(FileDownloader):
 
         return start
 
+    def _start_remux(self, tmpfilename, remux_args):
+        ffpp = FFmpegPostProcessor(self)
+        args = [
+            ffpp.executable, '-y', '-loglevel', 'error', '-i', 'pipe:0',
+            '-c', 'copy'] + remux_args
+        args = [encodeArgument(opt) for opt in args]
+        args.append(encodeFilename(ffpp._ffmpeg_filename_argument(tmpfilename), True))
+        self._debug_cmd(args)
+        return _RemuxPipe(subprocess.Popen(args, stdin=subprocess.PIPE))
+
+    def _abort_frag_download(self, ctx):
+        """ Close the destination of a failed download, removing what ffmpeg wrote """
+        if ctx.get('remux_args') is None:
+            ctx['dest_stream'].close()
+            return
+        ctx['dest_stream'].kill()
+        if os.path.exists(encodeFilename(ctx['tmpfilename'])):
+            os.remove(encodeFilename(ctx['tmpfilename']))
+
     def _finish_frag_download(self, ctx):
-        ctx['dest_stream'].close()
+        """ Return False if the remuxing failed """
+        retval = ctx['dest_stream'].close()
+        if ctx.get('remux_args') is not None and retval != 0:
+            self.report_error('ffmpeg exited with code %d while remuxing' % retval)
+            return False
         elapsed = time.time() - ctx['started']
         self.try_rename(ctx['tmpfilename'], ctx['filename'])
         fsize = os.path.getsize(encodeFilename(ctx['filename']))
@@ -143,3 +219,4 @@ class FragmentFD(FileDownloader):
             'status': 'finished',
             'elapsed': elapsed,
         })
+        return True
@@ -1,8 +1,6 @@
 from __future__ import unicode_literals
 
 import os.path
-import re
-import binascii
 try:
     from Crypto.Cipher import AES
     can_decrypt_frag = True
@@ -11,16 +9,21 @@ except ImportError:
 
 from .fragment import FragmentFD
 from .external import FFmpegFD
+from ..postprocessor.ffmpeg import FFmpegPostProcessor
 
 from ..compat import (
     compat_urllib_error,
     compat_urlparse,
     compat_struct_pack,
 )
+from ..m3u8 import (
+    M3U8MediaPlaylist,
+    parse_m3u8_media,
+)
 from ..utils import (
     encodeFilename,
+    is_outdated_version,
     sanitize_open,
-    parse_m3u8_attributes,
     update_url_query,
 )
 
@@ -32,39 +35,70 @@ class HlsFD(FragmentFD):
 
     @staticmethod
     def can_download(manifest, info_dict):
-        UNSUPPORTED_FEATURES = (
-            r'#EXT-X-KEY:METHOD=(?!NONE|AES-128)',  # encrypted streams [1]
-            r'#EXT-X-BYTERANGE',  # playlists composed of byte ranges of media files [2]
+        """ manifest is the text of the media playlist or the M3U8MediaPlaylist parsed from it """
+        if not isinstance(manifest, M3U8MediaPlaylist):
+            manifest = parse_m3u8_media(manifest)
+        key_methods = set(key.method for key in manifest.keys)
+        check_results = [
+            # encrypted streams [1]
+            not key_methods - set(['NONE', 'AES-128']),
+            # playlists composed of byte ranges of media files [2]
+            not any(segment.byterange for segment in manifest.segments),
 
             # Live streams heuristic does not always work (e.g. geo restricted to Germany
             # http://hls-geo.daserste.de/i/videoportal/Film/c_620000/622873/format,716451,716457,716450,716458,716459,.mp4.csmil/index_4_av.m3u8?null=0)
-            # r'#EXT-X-MEDIA-SEQUENCE:(?!0$)',  # live streams [3]
+            # manifest.media_sequence == 0,  # live streams [3]
 
             # This heuristic also is not correct since segments may not be appended as well.
             # Twitch vods of finished streams have EXT-X-PLAYLIST-TYPE:EVENT despite
             # no segments will definitely be appended to the end of the playlist.
-            # r'#EXT-X-PLAYLIST-TYPE:EVENT',  # media segments may be appended to the end of
-            #                                 # event media playlists [4]
+            # manifest.playlist_type != 'EVENT',  # media segments may be appended to the end of
+            #                                     # event media playlists [4]
 
             # 1. https://tools.ietf.org/html/draft-pantos-http-live-streaming-17#section-4.3.2.4
             # 2. https://tools.ietf.org/html/draft-pantos-http-live-streaming-17#section-4.3.2.2
             # 3. https://tools.ietf.org/html/draft-pantos-http-live-streaming-17#section-4.3.3.2
             # 4. https://tools.ietf.org/html/draft-pantos-http-live-streaming-17#section-4.3.3.5
-        )
-        check_results = [not re.search(feature, manifest) for feature in UNSUPPORTED_FEATURES]
-        check_results.append(can_decrypt_frag or '#EXT-X-KEY:METHOD=AES-128' not in manifest)
+        ]
+        check_results.append(can_decrypt_frag or 'AES-128' not in key_methods)
         check_results.append(not info_dict.get('is_live'))
         return all(check_results)
 
+    def _remux_args(self, filename, info_dict):
+        """
+        The ffmpeg options to write the MP4 file FFmpegFixupM3u8PP would make
+        while the fragments are downloaded, None to write them as they are
+        """
+        if (not self.params.get('hls_pipe_remux') or filename == '-'
+                or (os.path.exists(encodeFilename(filename)) and not os.path.isfile(encodeFilename(filename)))
+                or self.params.get('hls_use_mpegts')
+                or self.params.get('fixup') not in (None, 'detect_or_warn')):
+            return None
+        ffpp = FFmpegPostProcessor(self)
+        if not ffpp.available:
+            self.report_warning('ffmpeg or avconv not found, the fragments will not be remuxed while downloading')
+            return None
+        args = ['-f', 'mp4']
+        acodec = info_dict.get('acodec')
+        if acodec and acodec != 'none':
+            aac = acodec.split('.')[0] in ('aac', 'mp4a')
+        else:
+            # Recent versions of ffmpeg insert the filter when needed
+            aac = acodec is None and not (
+                ffpp.basename == 'ffmpeg' and not is_outdated_version(ffpp._versions['ffmpeg'], '3.2', False))
+        if aac:
+            args += ['-bsf:a', 'aac_adtstoasc']
+        return args
+
     def real_download(self, filename, info_dict):
         man_url = info_dict['url']
         self.to_screen('[%s] Downloading m3u8 manifest' % self.FD_NAME)
 
-        manifest = self.ydl.urlopen(self._prepare_url(info_dict, man_url)).read()
+        manifest, _ = self._download_manifest(info_dict, man_url)
 
-        s = manifest.decode('utf-8', 'ignore')
+        playlist = parse_m3u8_media(manifest, man_url)
 
-        if not self.can_download(s, info_dict):
+        if not self.can_download(playlist, info_dict):
             if info_dict.get('extra_param_to_segment_url'):
                 self.report_error('pycrypto not found. Please install it.')
                 return False
@@ -76,15 +110,10 @@ class HlsFD(FragmentFD):
                 fd.add_progress_hook(ph)
             return fd.real_download(filename, info_dict)
 
-        total_frags = 0
-        for line in s.splitlines():
-            line = line.strip()
-            if line and not line.startswith('#'):
-                total_frags += 1
-
         ctx = {
             'filename': filename,
-            'total_frags': total_frags,
+            'total_frags': len(playlist.segments),
+            'remux_args': self._remux_args(filename, info_dict),
         }
 
         self._prepare_and_start_frag_download(ctx)
@@ -97,78 +126,66 @@ class HlsFD(FragmentFD):
         extra_param_to_segment_url = info_dict.get('extra_param_to_segment_url')
         if extra_param_to_segment_url:
             extra_query = compat_urlparse.parse_qs(extra_param_to_segment_url)
-        i = 0
-        media_sequence = 0
-        decrypt_info = {'METHOD': 'NONE'}
+        keys = {}
         frags_filenames = []
-        for line in s.splitlines():
-            line = line.strip()
-            if line:
-                if not line.startswith('#'):
-                    frag_url = (
-                        line
-                        if re.match(r'^https?://', line)
-                        else compat_urlparse.urljoin(man_url, line))
-                    frag_name = 'Frag%d' % i
-                    frag_filename = '%s-%s' % (ctx['tmpfilename'], frag_name)
-                    if extra_query:
-                        frag_url = update_url_query(frag_url, extra_query)
-                    count = 0
-                    while count <= fragment_retries:
-                        try:
-                            success = ctx['dl'].download(frag_filename, {
-                                'url': frag_url,
-                                'http_headers': info_dict.get('http_headers'),
-                            })
-                            if not success:
-                                return False
-                            down, frag_sanitized = sanitize_open(frag_filename, 'rb')
-                            frag_content = down.read()
-                            down.close()
-                            break
-                        except compat_urllib_error.HTTPError as err:
-                            # Unavailable (possibly temporary) fragments may be served.
-                            # First we try to retry then either skip or abort.
-                            # See https://github.com/rg3/youtube-dl/issues/10165,
-                            # https://github.com/rg3/youtube-dl/issues/10448).
-                            count += 1
-                            if count <= fragment_retries:
-                                self.report_retry_fragment(err, frag_name, count, fragment_retries)
-                    if count > fragment_retries:
-                        if skip_unavailable_fragments:
-                            i += 1
-                            media_sequence += 1
-                            self.report_skip_fragment(frag_name)
-                            continue
-                        self.report_error(
-                            'giving up after %s fragment retries' % fragment_retries)
-                        return False
-                    if decrypt_info['METHOD'] == 'AES-128':
-                        iv = decrypt_info.get('IV') or compat_struct_pack('>8xq', media_sequence)
-                        frag_content = AES.new(
-                            decrypt_info['KEY'], AES.MODE_CBC, iv).decrypt(frag_content)
-                    ctx['dest_stream'].write(frag_content)
-                    frags_filenames.append(frag_sanitized)
-                    # We only download the first fragment during the test
-                    if test:
+        finished = False
+        try:
+            for i, segment in enumerate(playlist.segments):
+                frag_url = segment.url
+                frag_name = 'Frag%d' % i
+                frag_filename = '%s-%s' % (ctx['tmpfilename'], frag_name)
+                if extra_query:
+                    frag_url = update_url_query(frag_url, extra_query)
+                count = 0
+                while count <= fragment_retries:
+                    try:
+                        success = ctx['dl'].download(frag_filename, {
+                            'url': frag_url,
+                            'http_headers': info_dict.get('http_headers'),
+                        })
+                        if not success:
+                            return False
+                        down, frag_sanitized = sanitize_open(frag_filename, 'rb')
+                        frag_content = down.read()
+                        down.close()
                         break
-                    i += 1
-                    media_sequence += 1
-                elif line.startswith('#EXT-X-KEY'):
-                    decrypt_info = parse_m3u8_attributes(line[11:])
-                    if decrypt_info['METHOD'] == 'AES-128':
-                        if 'IV' in decrypt_info:
-                            decrypt_info['IV'] = binascii.unhexlify(decrypt_info['IV'][2:].zfill(32))
-                        if not re.match(r'^https?://', decrypt_info['URI']):
-                            decrypt_info['URI'] = compat_urlparse.urljoin(
-                                man_url, decrypt_info['URI'])
+                    except compat_urllib_error.HTTPError as err:
+                        # Unavailable (possibly temporary) fragments may be served.
+                        # First we try to retry then either skip or abort.
+                        # See https://github.com/rg3/youtube-dl/issues/10165,
+                        # https://github.com/rg3/youtube-dl/issues/10448).
+                        count += 1
+                        if count <= fragment_retries:
+                            self.report_retry_fragment(err, frag_name, count, fragment_retries)
+                if count > fragment_retries:
+                    if skip_unavailable_fragments:
+                        self.report_skip_fragment(frag_name)
+                        continue
+                    self.report_error(
+                        'giving up after %s fragment retries' % fragment_retries)
+                    return False
+                key = segment.key
+                if key is not None and key.method == 'AES-128':
+                    if key.url not in keys:
+                        key_url = key.url
                         if extra_query:
-                            decrypt_info['URI'] = update_url_query(decrypt_info['URI'], extra_query)
-                        decrypt_info['KEY'] = self.ydl.urlopen(decrypt_info['URI']).read()
-                elif line.startswith('#EXT-X-MEDIA-SEQUENCE'):
-                    media_sequence = int(line[22:])
-
-        self._finish_frag_download(ctx)
+                            key_url = update_url_query(key_url, extra_query)
+                        keys[key.url] = self.ydl.urlopen(key_url).read()
+                    iv = key.iv or compat_struct_pack('>8xq', segment.media_sequence)
+                    frag_content = AES.new(
+                        keys[key.url], AES.MODE_CBC, iv).decrypt(frag_content)
+                ctx['dest_stream'].write(frag_content)
+                frags_filenames.append(frag_sanitized)
+                # We only download the first fragment during the test
+                if test:
+                    break
+            finished = self._finish_frag_download(ctx)
+        finally:
+            # Don't leave ffmpeg running or a partial file behind
+            if not finished:
+                self._abort_frag_download(ctx)
+        if not finished:
+            return False
 
         for frag_file in frags_filenames:
             os.remove(encodeFilename(frag_file))
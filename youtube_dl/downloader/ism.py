@@ -2,30 +2,30 @@ from __future__ import unicode_literals
 
 import os
 import time
-import struct
 import binascii
 import io
 
 from .fragment import FragmentFD
 from ..compat import compat_urllib_error
+from ..mp4 import (
+    box,
+    full_box,
+    s16,
+    s1616,
+    s32,
+    s88,
+    u1616,
+    u16,
+    u32,
+    u64,
+    u8,
+)
 from ..utils import (
     sanitize_open,
     encodeFilename,
 )
 
 
-u8 = struct.Struct(b'>B')
-u88 = struct.Struct(b'>Bx')
-u16 = struct.Struct(b'>H')
-u1616 = struct.Struct(b'>Hxx')
-u32 = struct.Struct(b'>I')
-u64 = struct.Struct(b'>Q')
-
-s88 = struct.Struct(b'>bx')
-s16 = struct.Struct(b'>h')
-s1616 = struct.Struct(b'>hxx')
-s32 = struct.Struct(b'>i')
-
 unity_matrix = (s32.pack(0x10000) + s32.pack(0) * 3) * 2 + s32.pack(0x40000000)
 
 TRACK_ENABLED = 0x1
@@ -35,14 +35,6 @@ TRACK_IN_PREVIEW = 0x4
 SELF_CONTAINED = 0x1
 
 
-def box(box_type, payload):
-    return u32.pack(8 + len(payload)) + box_type + payload
-
-
-def full_box(box_type, version, flags, payload):
-    return box(box_type, u8.pack(version) + u32.pack(flags)[1:] + payload)
-
-
 def write_piff_header(stream, params):
     track_id = params['track_id']
     fourcc = params['fourcc']
@@ -10,6 +10,7 @@ import random
 import re
 import socket
 import sys
+import threading
 import time
 import math
 
@@ -28,6 +29,11 @@ from ..compat import (
     compat_urlparse,
 )
 from ..downloader.f4m import remove_encrypted_media
+from ..m3u8 import (
+    is_media_playlist,
+    M3U8Media,
+    parse_m3u8_master,
+)
 from ..utils import (
     NO_DEFAULT,
     age_restricted,
@@ -35,12 +41,13 @@ from ..utils import (
     bug_reports_message,
     clean_html,
     compiled_regex_type,
+    DashFragmentList,
     determine_ext,
     determine_protocol,
     error_to_compat_str,
     ExtractorError,
     extract_attributes,
-    fix_xml_ampersands,
+    fix_xml_ampersands_stream,
     float_or_none,
     GeoRestrictedError,
     GeoUtils,
@@ -51,7 +58,7 @@ from ..utils import (
     parse_codecs,
     parse_duration,
     parse_iso8601,
-    parse_m3u8_attributes,
+    parse_xml_stream,
     RegexNotFoundError,
     sanitized_Request,
     sanitize_filename,
@@ -62,12 +69,116 @@ from ..utils import (
     update_url_query,
     urljoin,
     url_basename,
+    xml_compact_children,
     xpath_element,
     xpath_text,
     xpath_with_ns,
 )
 
 
+# Guards _real_initialize (usually logging in) of extractor instances shared
+# between threads
+_INITIALIZE_LOCK = threading.RLock()
+
+# Bytes of an XML document parsed at once by _download_xml_stream
+_XML_CHUNK_SIZE = 64 * 1024
+
+# Attributes needed from the elements making up the segment timelines of
+# manifests, parse_xml_stream keeps them as tuples instead of elements
+_MPD_COMPACT = {'S': ('t', 'd', 'r'), 'SegmentURL': ('media',)}
+_ISM_COMPACT = {'c': ('t', 'd', 'r')}
+# Elements of F4M manifests whose base64 text _parse_f4m_formats does not use
+_F4M_PRUNE_TEXT = ('bootstrapInfo', 'metadata', 'xmpMetadata', 'drmAdditionalHeader')
+
+# Fields InfoExtractor._sort_formats ranks the formats by, from the most to the
+# least significant. Besides the fields of the format dicts, preference,
+# proto_preference, ext_preference and audio_ext_preference are computed from
+# the format's own preference, protocol, extension and codecs.
+FORMAT_SORT_FIELDS = (
+    'preference', 'language_preference', 'quality', 'tbr', 'filesize', 'vbr',
+    'height', 'width', 'proto_preference', 'ext_preference', 'abr',
+    'audio_ext_preference', 'fps', 'filesize_approx', 'source_preference',
+    'format_id',
+)
+
+# Other format fields the formats can be ranked by, formats without the string
+# ones coming first
+_FORMAT_SORT_STRING_FIELDS = frozenset((
+    'acodec', 'container', 'ext', 'format_id', 'format_note', 'language',
+    'protocol', 'vcodec',
+))
+FORMAT_SORT_ALLOWED_FIELDS = frozenset(
+    FORMAT_SORT_FIELDS + ('asr', 'stretched_ratio')) | _FORMAT_SORT_STRING_FIELDS
+
+# Extensions from the least to the most preferred, indexed by prefer_free_formats
+_AUDIO_EXT_ORDER = {
+    False: dict((ext, i) for i, ext in enumerate(['webm', 'opus', 'ogg', 'mp3', 'aac', 'm4a'])),
+    True: dict((ext, i) for i, ext in enumerate(['aac', 'mp3', 'm4a', 'webm', 'ogg', 'opus'])),
+}
+_VIDEO_EXT_ORDER = {
+    False: dict((ext, i) for i, ext in enumerate(['webm', 'flv', 'mp4'])),
+    True: dict((ext, i) for i, ext in enumerate(['flv', 'mp4', 'webm'])),
+}
+
+
+def _format_sort_default(field):
+    return '' if field in _FORMAT_SORT_STRING_FIELDS else -1
+
+
+def _format_sort_value(f, field):
+    value = f.get(field)
+    if value is None:
+        return _format_sort_default(field)
+    return value
+
+
+def _computed_format_sort_values(f, prefer_free_formats):
+    preference = f.get('preference')
+    if preference is None:
+        preference = 0
+        if f.get('ext') in ('f4f', 'f4m'):  # Not yet supported
+            preference -= 0.5
+
+    protocol = f.get('protocol') or determine_protocol(f)
+    proto_preference = 0 if protocol in ('http', 'https') else (-0.5 if protocol == 'rtsp' else -0.1)
+
+    if f.get('vcodec') == 'none':  # audio only
+        preference -= 50
+        ext_preference = 0
+        audio_ext_preference = _AUDIO_EXT_ORDER[prefer_free_formats].get(f['ext'], -1)
+    else:
+        if f.get('acodec') == 'none':  # video only
+            preference -= 40
+        ext_preference = _VIDEO_EXT_ORDER[prefer_free_formats].get(f['ext'], -1)
+        audio_ext_preference = 0
+
+    return {
+        'preference': preference,
+        'proto_preference': proto_preference,
+        'ext_preference': ext_preference,
+        'audio_ext_preference': audio_ext_preference,
+    }
+
+
+def format_sort_key(fields=FORMAT_SORT_FIELDS, prefer_free_formats=False):
+    """
+    Return a key function ranking the formats by fields (see
+    FORMAT_SORT_FIELDS), the best format getting the largest key
+    """
+    fields = tuple(fields)
+    defaults = [_format_sort_default(field) for field in fields]
+    prefer_free_formats = bool(prefer_free_formats)
+
+    def key(f):
+        computed = _computed_format_sort_values(f, prefer_free_formats)
+        get = f.get
+        values = [computed[field] if field in computed else get(field) for field in fields]
+        if None in values:
+            values = [default if v is None else v for v, default in zip(values, defaults)]
+        return tuple(values)
+    return key
+
+
 class InfoExtractor(object):
     """Information Extractor class.
 
@@ -130,7 +241,9 @@ class InfoExtractor(object):
                                  Base URL for fragments. Each fragment's path
                                  value (if present) will be relative to
                                  this URL.
-                    * fragments  A list of fragments of a fragmented media.
+                    * fragments  A list of fragments of a fragmented media
+                                 (or a list-like sequence such as
+                                 utils.DashFragmentList).
                                  Each fragment entry must contain either an url
                                  or a path. If an url is present it should be
                                  considered by a client. Otherwise both path and
@@ -382,8 +495,10 @@ class InfoExtractor(object):
         """Initializes an instance (authentication, etc)."""
         self._initialize_geo_bypass(self._GEO_COUNTRIES)
         if not self._ready:
-            self._real_initialize()
-            self._ready = True
+            with _INITIALIZE_LOCK:
+                if not self._ready:
+                    self._real_initialize()
+                    self._ready = True
 
     def _initialize_geo_bypass(self, countries):
         """
@@ -510,6 +625,15 @@ class InfoExtractor(object):
 
     def _download_webpage_handle(self, url_or_request, video_id, note=None, errnote=None, fatal=True, encoding=None, data=None, headers={}, query={}):
         """ Returns a tuple (page content as string, URL handle) """
+        urlh = self._open_webpage(url_or_request, video_id, note, errnote, fatal, data=data, headers=headers, query=query)
+        if urlh is False:
+            assert not fatal
+            return False
+        content = self._webpage_read_content(urlh, url_or_request, video_id, note, errnote, fatal, encoding=encoding)
+        return (content, urlh)
+
+    def _open_webpage(self, url_or_request, video_id, note=None, errnote=None, fatal=True, data=None, headers={}, query={}):
+        """ Returns the response handle of a page whose content is read by the caller """
         # Strip hashes from the URL (#1038)
         if isinstance(url_or_request, (compat_str, str)):
             url_or_request = url_or_request.partition('#')[0]
@@ -523,12 +647,7 @@ class InfoExtractor(object):
             if 'X-Forwarded-For' not in headers:
                 headers['X-Forwarded-For'] = self._x_forwarded_for_ip
 
-        urlh = self._request_webpage(url_or_request, video_id, note, errnote, fatal, data=data, headers=headers, query=query)
-        if urlh is False:
-            assert not fatal
-            return False
-        content = self._webpage_read_content(urlh, url_or_request, video_id, note, errnote, fatal, encoding=encoding)
-        return (content, urlh)
+        return self._request_webpage(url_or_request, video_id, note, errnote, fatal, data=data, headers=headers, query=query)
 
     @staticmethod
     def _guess_encoding_from_content(content_type, webpage_bytes):
@@ -641,6 +760,29 @@ class InfoExtractor(object):
             xml_string = transform_source(xml_string)
         return compat_etree_fromstring(xml_string.encode('utf-8'))
 
+    def _download_xml_stream(self, url_or_request, video_id,
+                             note='Downloading XML', errnote='Unable to download XML',
+                             fatal=True, data=None, headers={}, query={},
+                             compact={}, prune_text=(), filter_chunks=None):
+        """
+        Return a tuple (xml as an xml.etree.ElementTree.Element, URL handle),
+        the xml being parsed as it is downloaded (see parse_xml_stream).
+        filter_chunks is applied to the iterable of byte strings read.
+        """
+        urlh = self._open_webpage(url_or_request, video_id, note, errnote, fatal, data=data, headers=headers, query=query)
+        if urlh is False:
+            assert not fatal
+            return False
+        if (self._downloader.params.get('dump_intermediate_pages', False) or
+                self._downloader.params.get('write_pages', False)):
+            content = self._webpage_read_content(urlh, url_or_request, video_id, note, errnote, fatal)
+            chunks = [content.encode('utf-8')]
+        else:
+            chunks = iter(lambda: urlh.read(_XML_CHUNK_SIZE), b'')
+        if filter_chunks:
+            chunks = filter_chunks(chunks)
+        return parse_xml_stream(chunks, compact, prune_text), urlh
+
     def _download_json(self, url_or_request, video_id,
                        note='Downloading JSON metadata',
                        errnote='Unable to download JSON metadata',
@@ -1036,71 +1178,25 @@ class InfoExtractor(object):
             if 'tbr' not in f and f.get('abr') is not None and f.get('vbr') is not None:
                 f['tbr'] = f['abr'] + f['vbr']
 
-        def _formats_key(f):
             # TODO remove the following workaround
-            from ..utils import determine_ext
             if not f.get('ext') and 'url' in f:
                 f['ext'] = determine_ext(f['url'])
 
-            if isinstance(field_preference, (list, tuple)):
-                return tuple(
-                    f.get(field)
-                    if f.get(field) is not None
-                    else ('' if field == 'format_id' else -1)
-                    for field in field_preference)
-
-            preference = f.get('preference')
-            if preference is None:
-                preference = 0
-                if f.get('ext') in ['f4f', 'f4m']:  # Not yet supported
-                    preference -= 0.5
-
-            protocol = f.get('protocol') or determine_protocol(f)
-            proto_preference = 0 if protocol in ['http', 'https'] else (-0.5 if protocol == 'rtsp' else -0.1)
-
-            if f.get('vcodec') == 'none':  # audio only
-                preference -= 50
-                if self._downloader.params.get('prefer_free_formats'):
-                    ORDER = ['aac', 'mp3', 'm4a', 'webm', 'ogg', 'opus']
-                else:
-                    ORDER = ['webm', 'opus', 'ogg', 'mp3', 'aac', 'm4a']
-                ext_preference = 0
-                try:
-                    audio_ext_preference = ORDER.index(f['ext'])
-                except ValueError:
-                    audio_ext_preference = -1
-            else:
-                if f.get('acodec') == 'none':  # video only
-                    preference -= 40
-                if self._downloader.params.get('prefer_free_formats'):
-                    ORDER = ['flv', 'mp4', 'webm']
-                else:
-                    ORDER = ['webm', 'flv', 'mp4']
-                try:
-                    ext_preference = ORDER.index(f['ext'])
-                except ValueError:
-                    ext_preference = -1
-                audio_ext_preference = 0
-
-            return (
-                preference,
-                f.get('language_preference') if f.get('language_preference') is not None else -1,
-                f.get('quality') if f.get('quality') is not None else -1,
-                f.get('tbr') if f.get('tbr') is not None else -1,
-                f.get('filesize') if f.get('filesize') is not None else -1,
-                f.get('vbr') if f.get('vbr') is not None else -1,
-                f.get('height') if f.get('height') is not None else -1,
-                f.get('width') if f.get('width') is not None else -1,
-                proto_preference,
-                ext_preference,
-                f.get('abr') if f.get('abr') is not None else -1,
-                audio_ext_preference,
-                f.get('fps') if f.get('fps') is not None else -1,
-                f.get('filesize_approx') if f.get('filesize_approx') is not None else -1,
-                f.get('source_preference') if f.get('source_preference') is not None else -1,
-                f.get('format_id') if f.get('format_id') is not None else '',
-            )
-        formats.sort(key=_formats_key)
+        if isinstance(field_preference, (list, tuple)):
+            fields = tuple(field_preference)
+            formats.sort(key=lambda f: tuple(_format_sort_value(f, field) for field in fields))
+            return
+
+        params = self._downloader.params
+        fields = FORMAT_SORT_FIELDS
+        if params.get('format_sort'):
+            unknown = [field for field in params['format_sort'] if field not in FORMAT_SORT_ALLOWED_FIELDS]
+            if unknown:
+                raise ExtractorError(
+                    'Formats can not be sorted by %s' % ', '.join(unknown), expected=True)
+            # Fields requested by the user come first, the default ones break ties
+            fields = tuple(orderedSet(list(params['format_sort']) + list(fields)))
+        formats.sort(key=format_sort_key(fields, params.get('prefer_free_formats')))
 
     def _check_formats(self, formats, video_id):
         if formats:
@@ -1160,26 +1256,46 @@ class InfoExtractor(object):
         time.sleep(timeout)
 
     def _extract_f4m_formats(self, manifest_url, video_id, preference=None, f4m_id=None,
-                             transform_source=lambda s: fix_xml_ampersands(s).strip(),
-                             fatal=True, m3u8_id=None):
-        manifest = self._download_xml(
-            manifest_url, video_id, 'Downloading f4m manifest',
-            'Unable to download f4m manifest',
-            # Some manifests may be malformed, e.g. prosiebensat1 generated manifests
-            # (see https://github.com/rg3/youtube-dl/issues/6215#issuecomment-121704244)
-            transform_source=transform_source,
-            fatal=fatal)
-
-        if manifest is False:
-            return []
+                             transform_source=None, fatal=True, m3u8_id=None):
+        """
+        transform_source is applied to the text of the manifest, by default
+        it is parsed as it is downloaded, stray ampersands being escaped
+        """
+        if transform_source:
+            res = self._download_webpage_handle(
+                manifest_url, video_id, 'Downloading f4m manifest',
+                'Unable to download f4m manifest', fatal=fatal)
+            if res is False:
+                return []
+            manifest_str, urlh = res
+            manifest = compat_etree_fromstring(transform_source(manifest_str).encode('utf-8'))
+        else:
+            manifest_bytes = []
+
+            def keep_manifest(chunks):
+                for chunk in chunks:
+                    manifest_bytes.append(chunk)
+                    yield chunk
+
+            res = self._download_xml_stream(
+                manifest_url, video_id, 'Downloading f4m manifest',
+                'Unable to download f4m manifest', fatal=fatal, prune_text=_F4M_PRUNE_TEXT,
+                # Some manifests may be malformed, e.g. prosiebensat1 generated manifests
+                # (see https://github.com/rg3/youtube-dl/issues/6215#issuecomment-121704244)
+                filter_chunks=lambda chunks: fix_xml_ampersands_stream(keep_manifest(chunks)))
+            if res is False:
+                return []
+            manifest, urlh = res
+            manifest_str = b''.join(manifest_bytes).decode('utf-8', 'ignore')
+        # Spare F4mFD downloading the manifest again
+        self._downloader.store_manifest(manifest_url, manifest_str, urlh.geturl())
 
         return self._parse_f4m_formats(
             manifest, manifest_url, video_id, preference=preference, f4m_id=f4m_id,
             transform_source=transform_source, fatal=fatal, m3u8_id=m3u8_id)
 
     def _parse_f4m_formats(self, manifest, manifest_url, video_id, preference=None, f4m_id=None,
-                           transform_source=lambda s: fix_xml_ampersands(s).strip(),
-                           fatal=True, m3u8_id=None):
+                           transform_source=None, fatal=True, m3u8_id=None):
         # currently youtube-dl cannot decode the playerVerificationChallenge as Akamai uses Adobe Alchemy
         akamai_pv = manifest.find('{http://ns.adobe.com/f4m/1.0}pv-2.0')
         if akamai_pv is not None and ';' in akamai_pv.text:
@@ -1308,11 +1424,6 @@ class InfoExtractor(object):
 
         formats = [self._m3u8_meta_format(m3u8_url, ext, preference, m3u8_id)]
 
-        format_url = lambda u: (
-            u
-            if re.match(r'^https?://', u)
-            else compat_urlparse.urljoin(m3u8_url, u))
-
         # We should try extracting formats only from master playlists [1], i.e.
         # playlists that describe available qualities. On the other hand media
         # playlists [2] should be returned as is since they contain just the media
@@ -1320,13 +1431,13 @@ class InfoExtractor(object):
         # Fortunately, master playlist can be easily distinguished from media
         # playlist based on particular tags availability. As of [1, 2] master
         # playlist tags MUST NOT appear in a media playist and vice versa.
-        # As of [3] #EXT-X-TARGETDURATION tag is REQUIRED for every media playlist
-        # and MUST NOT appear in master playlist thus we can clearly detect media
-        # playlist with this criterion.
         # 1. https://tools.ietf.org/html/draft-pantos-http-live-streaming-17#section-4.3.4
         # 2. https://tools.ietf.org/html/draft-pantos-http-live-streaming-17#section-4.3.3
-        # 3. https://tools.ietf.org/html/draft-pantos-http-live-streaming-17#section-4.3.3.1
-        if '#EXT-X-TARGETDURATION' in m3u8_doc:  # media playlist, return as is
+        if is_media_playlist(m3u8_doc):  # media playlist, return as is
+            # Spare HlsFD downloading it again, playlists of live streams
+            # are still refreshed though
+            if not live and '#EXT-X-ENDLIST' in m3u8_doc:
+                self._downloader.store_manifest(m3u8_url, m3u8_doc)
             return [{
                 'url': m3u8_url,
                 'format_id': m3u8_id,
@@ -1335,25 +1446,21 @@ class InfoExtractor(object):
                 'preference': preference,
             }]
         audio_in_video_stream = {}
-        last_info = {}
         last_media = {}
-        for line in m3u8_doc.splitlines():
-            if line.startswith('#EXT-X-STREAM-INF:'):
-                last_info = parse_m3u8_attributes(line)
-            elif line.startswith('#EXT-X-MEDIA:'):
-                media = parse_m3u8_attributes(line)
+        for item in parse_m3u8_master(m3u8_doc, m3u8_url).items:
+            if isinstance(item, M3U8Media):
+                media = item.attributes
                 media_type = media.get('TYPE')
                 if media_type in ('VIDEO', 'AUDIO'):
                     group_id = media.get('GROUP-ID')
-                    media_url = media.get('URI')
-                    if media_url:
+                    if item.url:
                         format_id = []
                         for v in (group_id, media.get('NAME')):
                             if v:
                                 format_id.append(v)
                         f = {
                             'format_id': '-'.join(format_id),
-                            'url': format_url(media_url),
+                            'url': item.url,
                             'language': media.get('LANGUAGE'),
                             'ext': ext,
                             'protocol': entry_protocol,
@@ -1370,9 +1477,8 @@ class InfoExtractor(object):
                         last_media = media
                         if media_type == 'AUDIO' and group_id:
                             audio_in_video_stream[group_id] = True
-            elif line.startswith('#') or not line.strip():
-                continue
             else:
+                last_info = item.attributes
                 tbr = int_or_none(last_info.get('AVERAGE-BANDWIDTH') or last_info.get('BANDWIDTH'), scale=1000)
                 format_id = []
                 if m3u8_id:
@@ -1385,7 +1491,7 @@ class InfoExtractor(object):
                 # format_id intact.
                 if not live:
                     format_id.append(stream_name if stream_name else '%d' % (tbr if tbr else len(formats)))
-                manifest_url = format_url(line.strip())
+                manifest_url = item.url
                 f = {
                     'format_id': '-'.join(format_id),
                     'url': manifest_url,
@@ -1417,7 +1523,6 @@ class InfoExtractor(object):
                     # TODO: update acodec for audio only formats with the same GROUP-ID
                     f['acodec'] = 'none'
                 formats.append(f)
-                last_info = {}
                 last_media = {}
         return formats
 
@@ -1452,9 +1557,14 @@ class InfoExtractor(object):
         return self._parse_smil(smil, smil_url, video_id, f4m_params=f4m_params)
 
     def _download_smil(self, smil_url, video_id, fatal=True, transform_source=None):
-        return self._download_xml(
+        if transform_source:
+            return self._download_xml(
+                smil_url, video_id, 'Downloading SMIL file',
+                'Unable to download SMIL file', fatal=fatal, transform_source=transform_source)
+        res = self._download_xml_stream(
             smil_url, video_id, 'Downloading SMIL file',
-            'Unable to download SMIL file', fatal=fatal, transform_source=transform_source)
+            'Unable to download SMIL file', fatal=fatal)
+        return res if res is False else res[0]
 
     def _parse_smil(self, smil, smil_url, video_id, f4m_params=None):
         namespace = self._parse_smil_namespace(smil)
@@ -1654,19 +1764,18 @@ class InfoExtractor(object):
         return entries
 
     def _extract_mpd_formats(self, mpd_url, video_id, mpd_id=None, note=None, errnote=None, fatal=True, formats_dict={}):
-        res = self._download_webpage_handle(
+        res = self._download_xml_stream(
             mpd_url, video_id,
             note=note or 'Downloading MPD manifest',
             errnote=errnote or 'Failed to download MPD manifest',
-            fatal=fatal)
+            fatal=fatal, compact=_MPD_COMPACT)
         if res is False:
             return []
-        mpd, urlh = res
+        mpd_doc, urlh = res
         mpd_base_url = base_url(urlh.geturl())
 
         return self._parse_mpd_formats(
-            compat_etree_fromstring(mpd.encode('utf-8')), mpd_id, mpd_base_url,
-            formats_dict=formats_dict, mpd_url=mpd_url)
+            mpd_doc, mpd_id, mpd_base_url, formats_dict=formats_dict, mpd_url=mpd_url)
 
     def _parse_mpd_formats(self, mpd_doc, mpd_id=None, mpd_base_url='', formats_dict={}, mpd_url=None):
         """
@@ -1696,19 +1805,16 @@ class InfoExtractor(object):
             def extract_common(source):
                 segment_timeline = source.find(_add_ns('SegmentTimeline'))
                 if segment_timeline is not None:
-                    s_e = segment_timeline.findall(_add_ns('S'))
+                    s_e = xml_compact_children(segment_timeline, _add_ns('S'), _MPD_COMPACT['S'])
                     if s_e:
                         ms_info['total_number'] = 0
+                        # (t, d, r) tuples
                         ms_info['s'] = []
-                        for s in s_e:
-                            r = int(s.get('r', 0))
+                        for t, d, r in s_e:
+                            r = int(r or 0)
                             ms_info['total_number'] += 1 + r
-                            ms_info['s'].append({
-                                't': int(s.get('t', 0)),
-                                # @d is mandatory (see [1, 5.3.9.6.2, Table 17, page 60])
-                                'd': int(s.attrib['d']),
-                                'r': r,
-                            })
+                            # @d is mandatory (see [1, 5.3.9.6.2, Table 17, page 60])
+                            ms_info['s'].append((int(t or 0), int(d), r))
                 start_number = source.get('startNumber')
                 if start_number:
                     ms_info['start_number'] = int(start_number)
@@ -1728,9 +1834,10 @@ class InfoExtractor(object):
             if segment_list is not None:
                 extract_common(segment_list)
                 extract_Initialization(segment_list)
-                segment_urls_e = segment_list.findall(_add_ns('SegmentURL'))
+                segment_urls_e = xml_compact_children(
+                    segment_list, _add_ns('SegmentURL'), _MPD_COMPACT['SegmentURL'])
                 if segment_urls_e:
-                    ms_info['segment_urls'] = [segment.attrib['media'] for segment in segment_urls_e]
+                    ms_info['segment_urls'] = [media for media, in segment_urls_e]
             else:
                 segment_template = element.find(_add_ns('SegmentTemplate'))
                 if segment_template is not None:
@@ -1824,6 +1931,18 @@ class InfoExtractor(object):
                                 'Bandwidth': bandwidth,
                             }
 
+                        def timeline_runs():
+                            runs = []
+                            segment_time = 0
+                            for t, d, r in representation_ms_info['s']:
+                                segment_time = t or segment_time
+                                runs.append((segment_time, d, r + 1))
+                                segment_time += (r + 1) * d
+                            return runs
+
+                        # Fragments are built on demand, as long live streams
+                        # may have hundreds of thousands of them
+                        fragments = None
                         if 'segment_urls' not in representation_ms_info and 'media' in representation_ms_info:
 
                             media_template = prepare_template('media', ('Number', 'Bandwidth', 'Time'))
@@ -1833,78 +1952,38 @@ class InfoExtractor(object):
                             if '%(Number' in media_template and 's' not in representation_ms_info:
                                 segment_duration = None
                                 if 'total_number' not in representation_ms_info and 'segment_duration':
-                                    segment_duration = float_or_none(representation_ms_info['segment_duration'], representation_ms_info['timescale'])
-                                    representation_ms_info['total_number'] = int(math.ceil(float(period_duration) / segment_duration))
-                                representation_ms_info['fragments'] = [{
-                                    'url': media_template % {
-                                        'Number': segment_number,
-                                        'Bandwidth': bandwidth,
-                                    },
-                                    'duration': segment_duration,
-                                } for segment_number in range(
-                                    representation_ms_info['start_number'],
-                                    representation_ms_info['total_number'] + representation_ms_info['start_number'])]
+                                    segment_duration = representation_ms_info['segment_duration']
+                                    representation_ms_info['total_number'] = int(math.ceil(
+                                        float(period_duration) / float_or_none(segment_duration, representation_ms_info['timescale'])))
+                                runs = [(0, segment_duration, representation_ms_info['total_number'])]
                             else:
                                 # $Number*$ or $Time$ in media template with S list available
                                 # Example $Number*$: http://www.svtplay.se/klipp/9023742/stopptid-om-bjorn-borg
                                 # Example $Time$: https://play.arkena.com/embed/avp/v2/player/media/b41dda37-d8e7-4d3f-b1b5-9a9db578bdfe/1/129411
-                                representation_ms_info['fragments'] = []
-                                segment_time = 0
-                                segment_d = None
-                                segment_number = representation_ms_info['start_number']
-
-                                def add_segment_url():
-                                    segment_url = media_template % {
-                                        'Time': segment_time,
-                                        'Bandwidth': bandwidth,
-                                        'Number': segment_number,
-                                    }
-                                    representation_ms_info['fragments'].append({
-                                        'url': segment_url,
-                                        'duration': float_or_none(segment_d, representation_ms_info['timescale']),
-                                    })
-
-                                for num, s in enumerate(representation_ms_info['s']):
-                                    segment_time = s.get('t') or segment_time
-                                    segment_d = s['d']
-                                    add_segment_url()
-                                    segment_number += 1
-                                    for r in range(s.get('r', 0)):
-                                        segment_time += segment_d
-                                        add_segment_url()
-                                        segment_number += 1
-                                    segment_time += segment_d
+                                runs = timeline_runs()
+                            fragments = DashFragmentList(
+                                base_url, runs, representation_ms_info['timescale'],
+                                media_template=media_template,
+                                start_number=representation_ms_info['start_number'],
+                                bandwidth=bandwidth,
+                                initialization_url=representation_ms_info.get('initialization_url'))
                         elif 'segment_urls' in representation_ms_info and 's' in representation_ms_info:
                             # No media template
                             # Example: https://www.youtube.com/watch?v=iXZV5uAYMJI
                             # or any YouTube dashsegments video
-                            fragments = []
-                            segment_index = 0
-                            timescale = representation_ms_info['timescale']
-                            for s in representation_ms_info['s']:
-                                duration = float_or_none(s['d'], timescale)
-                                for r in range(s.get('r', 0) + 1):
-                                    fragments.append({
-                                        'url': representation_ms_info['segment_urls'][segment_index],
-                                        'duration': duration,
-                                    })
-                                    segment_index += 1
-                            representation_ms_info['fragments'] = fragments
+                            fragments = DashFragmentList(
+                                base_url, timeline_runs(), representation_ms_info['timescale'],
+                                segment_urls=representation_ms_info['segment_urls'],
+                                initialization_url=representation_ms_info.get('initialization_url'))
                         # NB: MPD manifest may contain direct URLs to unfragmented media.
                         # No fragments key is present in this case.
-                        if 'fragments' in representation_ms_info:
+                        if fragments is not None:
                             f.update({
-                                'fragments': [],
+                                'fragments': fragments,
                                 'protocol': 'http_dash_segments',
                             })
-                            if 'initialization_url' in representation_ms_info:
-                                initialization_url = representation_ms_info['initialization_url']
-                                if not f.get('url'):
-                                    f['url'] = initialization_url
-                                f['fragments'].append({'url': initialization_url})
-                            f['fragments'].extend(representation_ms_info['fragments'])
-                            for fragment in f['fragments']:
-                                fragment['url'] = urljoin(base_url, fragment['url'])
+                            if not f.get('url') and 'initialization_url' in representation_ms_info:
+                                f['url'] = representation_ms_info['initialization_url']
                         try:
                             existing_format = next(
                                 fo for fo in formats
@@ -1920,17 +1999,16 @@ class InfoExtractor(object):
         return formats
 
     def _extract_ism_formats(self, ism_url, video_id, ism_id=None, note=None, errnote=None, fatal=True):
-        res = self._download_webpage_handle(
+        res = self._download_xml_stream(
             ism_url, video_id,
             note=note or 'Downloading ISM manifest',
             errnote=errnote or 'Failed to download ISM manifest',
-            fatal=fatal)
+            fatal=fatal, compact=_ISM_COMPACT)
         if res is False:
             return []
-        ism, urlh = res
+        ism_doc, urlh = res
 
-        return self._parse_ism_formats(
-            compat_etree_fromstring(ism.encode('utf-8')), urlh.geturl(), ism_id)
+        return self._parse_ism_formats(ism_doc, urlh.geturl(), ism_id)
 
     def _parse_ism_formats(self, ism_doc, ism_url, ism_id=None):
         if ism_doc.get('IsLive') == 'TRUE' or ism_doc.find('Protection') is not None:
@@ -1965,14 +2043,14 @@ class InfoExtractor(object):
                 fragment_ctx = {
                     'time': 0,
                 }
-                stream_fragments = stream.findall('c')
-                for stream_fragment_index, stream_fragment in enumerate(stream_fragments):
-                    fragment_ctx['time'] = int_or_none(stream_fragment.get('t')) or fragment_ctx['time']
-                    fragment_repeat = int_or_none(stream_fragment.get('r')) or 1
-                    fragment_ctx['duration'] = int_or_none(stream_fragment.get('d'))
+                stream_fragments = xml_compact_children(stream, 'c', _ISM_COMPACT['c'])
+                for stream_fragment_index, (t, d, r) in enumerate(stream_fragments):
+                    fragment_ctx['time'] = int_or_none(t) or fragment_ctx['time']
+                    fragment_repeat = int_or_none(r) or 1
+                    fragment_ctx['duration'] = int_or_none(d)
                     if not fragment_ctx['duration']:
                         try:
-                            next_fragment_time = int(stream_fragment[stream_fragment_index + 1].attrib['t'])
+                            next_fragment_time = int(stream_fragments[stream_fragment_index + 1][0])
                         except IndexError:
                             next_fragment_time = duration
                         fragment_ctx['duration'] = (next_fragment_time - fragment_ctx['time']) / fragment_repeat
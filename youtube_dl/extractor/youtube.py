@@ -2,12 +2,13 @@
 
 from __future__ import unicode_literals
 
-
+import base64
 import itertools
 import json
 import os.path
 import random
 import re
+import threading
 import time
 import traceback
 
@@ -276,6 +277,10 @@ class YoutubeIE(YoutubeBaseInfoExtractor):
                      (?(1).+)?                                                # if we found the ID, everything can follow
                      $""" % {'playlist_id': YoutubeBaseInfoExtractor._PLAYLIST_ID_RE}
     _NEXT_URL_RE = r'[\?&]next_url=([^&]+)'
+    _PLAYER_CACHE_SECTION = 'youtube-players'
+    # Players are about 1MB each, keep the most recently used ones only
+    _PLAYER_CACHE_MAX_SIZE = 64 * 1024 * 1024
+
     _formats = {
         '5': {'ext': 'flv', 'width': 400, 'height': 240, 'acodec': 'mp3', 'abr': 64, 'vcodec': 'h263'},
         '6': {'ext': 'flv', 'width': 450, 'height': 270, 'acodec': 'mp3', 'abr': 64, 'vcodec': 'h263'},
@@ -940,6 +945,7 @@ class YoutubeIE(YoutubeBaseInfoExtractor):
     def __init__(self, *args, **kwargs):
         super(YoutubeIE, self).__init__(*args, **kwargs)
         self._player_cache = {}
+        self._player_cache_lock = threading.Lock()
 
     def report_video_info_webpage_download(self, video_id):
         """Report attempt to download video info webpage."""
@@ -961,23 +967,29 @@ class YoutubeIE(YoutubeBaseInfoExtractor):
         """ Return a string representation of a signature """
         return '.'.join(compat_str(len(part)) for part in example_sig.split('.'))
 
-    def _extract_signature_function(self, video_id, player_url, example_sig):
+    @staticmethod
+    def _signature_cache_id_length(sig_cache_id):
+        """ Return the length of the signatures described by sig_cache_id """
+        parts = sig_cache_id.split('.')
+        return sum(int(p) for p in parts) + len(parts) - 1
+
+    def _identify_player(self, player_url):
         id_m = re.match(
             r'.*?-(?P<id>[a-zA-Z0-9_-]+)(?:/watch_as3|/html5player(?:-new)?|/base)?\.(?P<ext>[a-z]+)$',
             player_url)
         if not id_m:
             raise ExtractorError('Cannot identify player %r' % player_url)
-        player_type = id_m.group('ext')
-        player_id = id_m.group('id')
-
-        # Read from filesystem cache
-        func_id = '%s_%s_%s' % (
-            player_type, player_id, self._signature_cache_id(example_sig))
-        assert os.path.basename(func_id) == func_id
-
-        cache_spec = self._downloader.cache.load('youtube-sigfuncs', func_id)
-        if cache_spec is not None:
-            return lambda s: ''.join(s[i] for i in cache_spec)
+        return id_m.group('ext'), id_m.group('id')
+
+    def _get_player_code(self, video_id, player_url, player_type, player_id):
+        """ Return the code of a player, from the filesystem cache if possible """
+        cache = self._downloader.cache
+        cache.set_policy(
+            self._PLAYER_CACHE_SECTION, max_size=self._PLAYER_CACHE_MAX_SIZE)
+        cache_key = '%s_%s' % (player_type, player_id)
+        code = cache.load(self._PLAYER_CACHE_SECTION, cache_key)
+        if code is not None:
+            return code if player_type == 'js' else base64.b64decode(code)
 
         download_note = (
             'Downloading player %s' % player_url
@@ -989,24 +1001,86 @@ class YoutubeIE(YoutubeBaseInfoExtractor):
                 player_url, video_id,
                 note=download_note,
                 errnote='Download of %s failed' % player_url)
-            res = self._parse_sig_js(code)
+            cache.store(self._PLAYER_CACHE_SECTION, cache_key, code)
         elif player_type == 'swf':
             urlh = self._request_webpage(
                 player_url, video_id,
                 note=download_note,
                 errnote='Download of %s failed' % player_url)
             code = urlh.read()
-            res = self._parse_sig_swf(code)
+            cache.store(
+                self._PLAYER_CACHE_SECTION, cache_key,
+                base64.b64encode(code).decode('ascii'))
         else:
             assert False, 'Invalid player type %r' % player_type
+        return code
+
+    def _store_signature_specs(self, player_type, player_id, func, sig_cache_ids):
+        """ Cache the index lists of func for all the signature shapes given """
+        for sig_cache_id in sig_cache_ids:
+            func_id = '%s_%s_%s' % (player_type, player_id, sig_cache_id)
+            assert os.path.basename(func_id) == func_id
+            test_string = ''.join(map(compat_chr, range(
+                self._signature_cache_id_length(sig_cache_id))))
+            try:
+                cache_spec = [ord(c) for c in func(test_string)]
+            except Exception:
+                # This player may just not handle signatures of this shape
+                continue
+            self._downloader.cache.store('youtube-sigfuncs', func_id, cache_spec)
 
-        test_string = ''.join(map(compat_chr, range(len(example_sig))))
-        cache_res = res(test_string)
-        cache_spec = [ord(c) for c in cache_res]
+    def _observe_signature(self, sig_cache_id):
+        """ Record a signature shape and return all the shapes seen so far """
+        cache = self._downloader.cache
+        observed = cache.load('youtube-sigfuncs', 'observed', default=[])
+        if sig_cache_id not in observed:
+            observed.append(sig_cache_id)
+            cache.store('youtube-sigfuncs', 'observed', observed)
+        return observed
+
+    def _extract_signature_function(self, video_id, player_url, example_sig):
+        player_type, player_id = self._identify_player(player_url)
+        sig_cache_id = self._signature_cache_id(example_sig)
+        observed = self._observe_signature(sig_cache_id)
+
+        # Read from filesystem cache
+        func_id = '%s_%s_%s' % (player_type, player_id, sig_cache_id)
+        assert os.path.basename(func_id) == func_id
 
-        self._downloader.cache.store('youtube-sigfuncs', func_id, cache_spec)
+        cache_spec = self._downloader.cache.load('youtube-sigfuncs', func_id)
+        if cache_spec is not None:
+            return lambda s: ''.join(s[i] for i in cache_spec)
+
+        code = self._get_player_code(video_id, player_url, player_type, player_id)
+        if player_type == 'js':
+            res = self._parse_sig_js(code)
+        else:
+            res = self._parse_sig_swf(code)
+
+        # The player is parsed anyway, cover all the other known shapes too
+        self._store_signature_specs(player_type, player_id, res, observed)
         return res
 
+    def warm_player_cache(self, player_url):
+        """ Fill the filesystem cache for a player
+
+        The player code is stored along with its signature functions for all
+        the signature shapes seen so far, so that the cache directory can be
+        copied to hosts that never downloaded this player.
+        """
+        player_url = self._normalize_player_url(player_url)
+        player_type, player_id = self._identify_player(player_url)
+        code = self._get_player_code(player_id, player_url, player_type, player_id)
+        if player_type == 'js':
+            res = self._parse_sig_js(code)
+        else:
+            res = self._parse_sig_swf(code)
+        observed = self._downloader.cache.load('youtube-sigfuncs', 'observed', default=[])
+        self._store_signature_specs(player_type, player_id, res, observed)
+        self.to_screen(
+            '%s: Cached %s player with %d signature function(s)'
+            % (player_id, player_type, len(observed)))
+
     def _print_sig_code(self, func, example_sig):
         def gen_sig_code(idxs):
             def _genslice(start, end, step):
@@ -1057,31 +1131,39 @@ class YoutubeIE(YoutubeBaseInfoExtractor):
         return lambda s: initial_function([s])
 
     def _parse_sig_swf(self, file_contents):
-        swfi = SWFInterpreter(file_contents)
+        swfi = SWFInterpreter.from_cache(self._downloader.cache, file_contents)
         TARGET_CLASSNAME = 'SignatureDecipher'
         searched_class = swfi.extract_class(TARGET_CLASSNAME)
         initial_function = swfi.extract_function(searched_class, 'decipher')
         return lambda s: initial_function([s])
 
+    @staticmethod
+    def _normalize_player_url(player_url):
+        if player_url.startswith('//'):
+            return 'https:' + player_url
+        elif not re.match(r'https?://', player_url):
+            return compat_urlparse.urljoin('https://www.youtube.com', player_url)
+        return player_url
+
     def _decrypt_signature(self, s, video_id, player_url, age_gate=False):
         """Turn the encrypted s field into a working signature"""
 
         if player_url is None:
             raise ExtractorError('Cannot decrypt signature without player_url')
 
-        if player_url.startswith('//'):
-            player_url = 'https:' + player_url
-        elif not re.match(r'https?://', player_url):
-            player_url = compat_urlparse.urljoin(
-                'https://www.youtube.com', player_url)
+        player_url = self._normalize_player_url(player_url)
         try:
             player_id = (player_url, self._signature_cache_id(s))
-            if player_id not in self._player_cache:
-                func = self._extract_signature_function(
-                    video_id, player_url, s
-                )
-                self._player_cache[player_id] = func
-            func = self._player_cache[player_id]
+            func = self._player_cache.get(player_id)
+            if func is None:
+                # Only one thread downloads and parses a given player
+                with self._player_cache_lock:
+                    func = self._player_cache.get(player_id)
+                    if func is None:
+                        func = self._extract_signature_function(
+                            video_id, player_url, s
+                        )
+                        self._player_cache[player_id] = func
             if self._downloader.params.get('youtube_print_sig_code'):
                 self._print_sig_code(func, s)
             return func(s)
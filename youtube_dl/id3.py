@@ -0,0 +1,168 @@
+from __future__ import unicode_literals
+
+import os
+import shutil
+import struct
+
+from .utils import (
+    encodeFilename,
+    prepend_extension,
+    YoutubeDLError,
+)
+
+
+_header = struct.Struct(b'>3sBBB4s')
+_frame_header = struct.Struct(b'>4s4sH')
+
+# Text encodings of the frames and their terminators
+_ENCODINGS = {
+    0: ('latin-1', b'\0'),
+    1: ('utf-16', b'\0\0'),
+    2: ('utf-16-be', b'\0\0'),
+    3: ('utf-8', b'\0'),
+}
+UTF8 = 3
+
+# Padding left after a tag written at the start of the file, for edits to come
+_PADDING = 1024
+
+
+class ID3Error(YoutubeDLError):
+    pass
+
+
+def _syncsafe(n):
+    return struct.pack(b'>4B', (n >> 21) & 0x7f, (n >> 14) & 0x7f, (n >> 7) & 0x7f, n & 0x7f)
+
+
+def _unsyncsafe(data):
+    b = struct.unpack(b'>4B', data)
+    return (b[0] << 21) | (b[1] << 14) | (b[2] << 7) | b[3]
+
+
+def _split_string(payload, encoding):
+    """ Split the terminated string starting payload from what follows """
+    terminator = _ENCODINGS[encoding][1]
+    pos = payload.find(terminator)
+    while pos != -1 and len(terminator) == 2 and pos % 2:
+        pos = payload.find(terminator, pos + 1)
+    if pos == -1:
+        return payload, b''
+    return payload[:pos], payload[pos + len(terminator):]
+
+
+def text_frame(text):
+    return struct.pack(b'>B', UTF8) + text.encode('utf-8')
+
+
+def user_text_frame(description, text):
+    """ A TXXX frame """
+    return struct.pack(b'>B', UTF8) + description.encode('utf-8') + b'\0' + text.encode('utf-8')
+
+
+def comment_frame(text, language='eng'):
+    """ A COMM frame """
+    return struct.pack(b'>B', UTF8) + language.encode('ascii') + b'\0' + text.encode('utf-8')
+
+
+def picture_frame(data, mime_type, description='', picture_type=3):
+    """ An APIC frame, a front cover by default """
+    return (
+        struct.pack(b'>B', UTF8) + mime_type.encode('ascii') + b'\0'
+        + struct.pack(b'>B', picture_type) + description.encode('utf-8') + b'\0' + data)
+
+
+class ID3Tag(object):
+    """
+    The ID3v2 tag at the start of an mp3 file, saved as ID3v2.4
+
+    frames holds the (frame id, payload) pairs of the tag. It is written
+    over the original tag and its padding when it fits, otherwise the file
+    is copied after a new tag with room for later edits. Tags using
+    unsynchronisation, an extended header, a footer or compressed or
+    encrypted frames cannot be edited, ID3Error is raised for them.
+    """
+
+    def __init__(self, filename):
+        self.filename = filename
+        self.frames = []
+        # Size of the original tag, padding included
+        self.size = 0
+        with open(encodeFilename(filename), 'rb') as f:
+            header = f.read(10)
+            if len(header) < 10 or header[:3] != b'ID3':
+                return
+            _, version, _, flags, size = _header.unpack(header)
+            if version not in (3, 4):
+                raise ID3Error('Unsupported ID3v2.%d tag' % version)
+            if flags & 0xd0:
+                raise ID3Error('Unsupported ID3v2 tag flags %#x' % flags)
+            self.size = 10 + _unsyncsafe(size)
+            data = f.read(self.size - 10)
+        pos = 0
+        while pos + 10 <= len(data) and data[pos:pos + 1] != b'\0':
+            frame_id, size, flags = _frame_header.unpack_from(data, pos)
+            size = _unsyncsafe(size) if version == 4 else struct.unpack(b'>I', size)[0]
+            # Compression, encryption, unsynchronisation and data length
+            # indicator in ID3v2.4, compression and encryption in ID3v2.3
+            if flags & (0x000f if version == 4 else 0x00c0):
+                raise ID3Error('Unsupported %s frame flags %#x' % (frame_id.decode('latin-1'), flags))
+            pos += 10
+            if pos + size > len(data):
+                raise ID3Error('Truncated %s frame' % frame_id.decode('latin-1'))
+            self.frames.append((frame_id, data[pos:pos + size]))
+            pos += size
+
+    def _description(self, payload):
+        encoding = payload[:1]
+        if not encoding or ord(encoding) not in _ENCODINGS:
+            return None
+        encoding = ord(encoding)
+        description = _split_string(payload[1:], encoding)[0]
+        return description.decode(_ENCODINGS[encoding][0], 'replace')
+
+    def set(self, frame_id, payload):
+        """
+        Replace the frames of frame_id with a frame of payload, the TXXX
+        ones only if they have the same description
+        """
+        if frame_id == b'TXXX':
+            description = self._description(payload)
+            self.frames = [
+                f for f in self.frames
+                if f[0] != frame_id or self._description(f[1]) != description]
+        else:
+            self.frames = [f for f in self.frames if f[0] != frame_id]
+        self.frames.append((frame_id, payload))
+
+    def _serialize_frames(self):
+        return b''.join(
+            _frame_header.pack(frame_id, _syncsafe(len(payload)), 0) + payload
+            for frame_id, payload in self.frames)
+
+    @property
+    def fits(self):
+        """ Whether save() writes the frames over the original tag, not copying the file """
+        return 10 + len(self._serialize_frames()) <= self.size
+
+    def save(self):
+        frames = self._serialize_frames()
+        if 10 + len(frames) <= self.size:
+            size = self.size
+        else:
+            size = 10 + len(frames) + _PADDING
+        tag = _header.pack(b'ID3', 4, 0, 0, _syncsafe(size - 10)) + frames
+        tag += b'\0' * (size - len(tag))
+        if size == self.size:
+            with open(encodeFilename(self.filename), 'r+b') as f:
+                f.write(tag)
+            return
+        temp_filename = prepend_extension(self.filename, 'temp')
+        with open(encodeFilename(self.filename), 'rb') as src:
+            src.seek(self.size)
+            with open(encodeFilename(temp_filename), 'wb') as dst:
+                dst.write(tag)
+                shutil.copyfileobj(src, dst)
+        os.remove(encodeFilename(self.filename))
+        os.rename(encodeFilename(temp_filename), encodeFilename(self.filename))
+        self.size = size
@@ -1,32 +1,251 @@
 from __future__ import unicode_literals
 
-import json
 import operator
 import re
 
+from .compat import compat_chr
 from .utils import (
     ExtractorError,
 )
 
-_OPERATORS = [
-    ('|', operator.or_),
-    ('^', operator.xor),
-    ('&', operator.and_),
-    ('>>', operator.rshift),
-    ('<<', operator.lshift),
-    ('-', operator.sub),
-    ('+', operator.add),
-    ('%', operator.mod),
-    ('/', operator.truediv),
-    ('*', operator.mul),
-]
-_ASSIGN_OPERATORS = [(op + '=', opfunc) for op, opfunc in _OPERATORS]
-_ASSIGN_OPERATORS.append(('=', lambda cur, right: right))
-
 _NAME_RE = r'[a-zA-Z_$][a-zA-Z_$0-9]*'
 
+# Binary operators by precedence, higher binds tighter
+_BINARY_OPERATORS = dict((op, (prec, opfunc)) for prec, ops in enumerate([
+    [('||', None)],
+    [('&&', None)],
+    [('|', operator.or_)],
+    [('^', operator.xor)],
+    [('&', operator.and_)],
+    [('==', operator.eq), ('!=', operator.ne), ('===', operator.eq), ('!==', operator.ne)],
+    [('<', operator.lt), ('>', operator.gt), ('<=', operator.le), ('>=', operator.ge)],
+    [('<<', operator.lshift), ('>>', operator.rshift),
+     ('>>>', lambda x, y: (x % 0x100000000) >> y)],
+    [('+', operator.add), ('-', operator.sub)],
+    [('*', operator.mul), ('/', operator.truediv), ('%', operator.mod)],
+], 1) for op, opfunc in ops)
+_ASSIGN_OPERATORS_MAP = dict(
+    (op + '=', opfunc) for op, (prec, opfunc) in _BINARY_OPERATORS.items()
+    if opfunc is not None and op[-1] != '=' and op not in ('<', '>'))
+_ASSIGN_OPERATORS_MAP['='] = None
+
+_UNARY_OPERATORS = {
+    '-': operator.neg,
+    '+': operator.pos,
+    '!': operator.not_,
+    '~': operator.invert,
+}
+
+_CONSTANTS = {
+    'true': True,
+    'false': False,
+    'null': None,
+    'undefined': None,
+}
+
+_TOKEN_RE = re.compile(r'''(?xs)
+    (?P<skip>\s+|/\*.*?\*/|//[^\n]*)|
+    (?P<number>0[xX][0-9a-fA-F]+|(?:\d+\.?\d*|\.\d+)(?:[eE][+-]?\d+)?)|
+    (?P<string>"(?:[^"\\]|\\.)*"|'(?:[^'\\]|\\.)*')|
+    (?P<name>%s)|
+    (?P<op>>>>=?|===|!==|<<=|>>=|&&|\|\||\+\+|--|<<|>>|[-+*/%%&|^!=<>]=|[-+*/%%&|^!~<>=?:.,;()\[\]{}])
+''' % _NAME_RE)
+
+_ESCAPE_RE = re.compile(r'\\(?:x([0-9a-fA-F]{2})|u([0-9a-fA-F]{4})|(.))', re.S)
+_ESCAPES = {
+    'b': '\b', 'f': '\f', 'n': '\n', 'r': '\r', 't': '\t', 'v': '\v', '0': '\0',
+}
+
+
+def _unescape(s):
+    def repl(m):
+        if m.group(3) is None:
+            return compat_chr(int(m.group(1) or m.group(2), 16))
+        return _ESCAPES.get(m.group(3), m.group(3))
+    return _ESCAPE_RE.sub(repl, s)
+
+
+def _tokenize(code):
+    tokens = []
+    pos = 0
+    end = len(code)
+    while pos < end:
+        m = _TOKEN_RE.match(code, pos)
+        if m is None:
+            raise ExtractorError('Unsupported JS syntax %r' % code[pos:pos + 20])
+        pos = m.end()
+        kind = m.lastgroup
+        value = m.group(kind)
+        if kind == 'skip':
+            continue
+        if kind == 'number':
+            if value[:2] in ('0x', '0X'):
+                value = int(value, 16)
+            elif re.match(r'^\d+$', value):
+                value = int(value)
+            else:
+                value = float(value)
+        elif kind == 'string':
+            value = _unescape(value[1:-1])
+        elif kind == 'name' and value in _CONSTANTS:
+            kind, value = 'const', _CONSTANTS[value]
+        tokens.append((kind, value))
+    return tokens
+
+
+class _Parser(object):
+    """ Turns JS source into a tree of tuples, ('kind', ...) """
+
+    def __init__(self, code):
+        self.code = code
+        self.tokens = _tokenize(code)
+        self.pos = 0
+
+    def error(self, msg='Unsupported JS expression'):
+        raise ExtractorError('%s %r' % (msg, self.code))
+
+    def peek(self):
+        if self.pos < len(self.tokens):
+            return self.tokens[self.pos]
+        return (None, None)
+
+    def next(self):
+        tok = self.peek()
+        self.pos += 1
+        return tok
+
+    def accept(self, op):
+        if self.peek() == ('op', op):
+            self.pos += 1
+            return True
+        return False
+
+    def expect(self, op):
+        if not self.accept(op):
+            self.error('Expected %r in' % op)
+
+    def at_end(self):
+        return self.pos >= len(self.tokens)
+
+    def parse_statements(self):
+        statements = []
+        while not self.at_end():
+            if self.accept(';'):
+                continue
+            statements.append(self.parse_statement())
+            if not self.at_end():
+                self.expect(';')
+        return statements
+
+    def parse_statement(self):
+        tok = self.peek()
+        if tok == ('name', 'var'):
+            self.pos += 1
+            declarations = []
+            while True:
+                kind, name = self.next()
+                if kind != 'name':
+                    self.error()
+                declarations.append(
+                    (name, self.parse_assignment() if self.accept('=') else None))
+                if not self.accept(','):
+                    return ('var', declarations)
+        if tok == ('name', 'return'):
+            self.pos += 1
+            if self.at_end() or self.peek() == ('op', ';'):
+                return ('return', None)
+            return ('return', self.parse_expression())
+        return ('expr', self.parse_expression())
+
+    def parse_expression(self):
+        return self.parse_assignment()
+
+    def parse_assignment(self):
+        left = self.parse_conditional()
+        kind, op = self.peek()
+        if kind == 'op' and op in _ASSIGN_OPERATORS_MAP:
+            if left[0] not in ('name', 'member', 'index'):
+                self.error('Invalid assignment target in')
+            self.pos += 1
+            return ('assign', op, left, self.parse_assignment())
+        return left
+
+    def parse_conditional(self):
+        cond = self.parse_binary(1)
+        if self.accept('?'):
+            if_true = self.parse_assignment()
+            self.expect(':')
+            return ('cond', cond, if_true, self.parse_assignment())
+        return cond
+
+    def parse_binary(self, min_prec):
+        left = self.parse_unary()
+        while True:
+            kind, op = self.peek()
+            if kind != 'op' or op not in _BINARY_OPERATORS:
+                return left
+            prec = _BINARY_OPERATORS[op][0]
+            if prec < min_prec:
+                return left
+            self.pos += 1
+            left = ('binop', op, left, self.parse_binary(prec + 1))
+
+    def parse_unary(self):
+        kind, op = self.peek()
+        if kind == 'op' and op in _UNARY_OPERATORS:
+            self.pos += 1
+            return ('unary', op, self.parse_unary())
+        return self.parse_postfix()
+
+    def parse_postfix(self):
+        node = self.parse_primary()
+        while True:
+            if self.accept('.'):
+                kind, name = self.next()
+                if kind != 'name':
+                    self.error()
+                node = ('member', node, name)
+            elif self.accept('['):
+                node = ('index', node, self.parse_expression())
+                self.expect(']')
+            elif self.accept('('):
+                node = ('call', node, self.parse_list(')'))
+            else:
+                return node
+
+    def parse_list(self, closing):
+        items = []
+        if self.accept(closing):
+            return items
+        while True:
+            items.append(self.parse_assignment())
+            if self.accept(closing):
+                return items
+            self.expect(',')
+
+    def parse_primary(self):
+        kind, value = self.next()
+        if kind in ('number', 'string', 'const'):
+            return ('const', value)
+        if kind == 'name':
+            return ('name', value)
+        if kind == 'op':
+            if value == '(':
+                node = self.parse_expression()
+                self.expect(')')
+                return node
+            if value == '[':
+                return ('array', self.parse_list(']'))
+        self.error()
+
 
 class JSInterpreter(object):
+    """ Runs functions extracted from JS code
+
+    Functions are parsed once and compiled to nested Python closures, so
+    calling them again only costs the evaluation.
+    """
+
     def __init__(self, code, objects=None):
         if objects is None:
             objects = {}
@@ -35,180 +254,205 @@ class JSInterpreter(object):
         self._objects = objects
 
     def interpret_statement(self, stmt, local_vars, allow_recursion=100):
-        if allow_recursion < 0:
-            raise ExtractorError('Recursion limit reached')
-
-        should_abort = False
-        stmt = stmt.lstrip()
-        stmt_m = re.match(r'var\s', stmt)
-        if stmt_m:
-            expr = stmt[len(stmt_m.group(0)):]
-        else:
-            return_m = re.match(r'return(?:\s+|$)', stmt)
-            if return_m:
-                expr = stmt[len(return_m.group(0)):]
-                should_abort = True
-            else:
-                # Try interpreting it as an expression
-                expr = stmt
-
-        v = self.interpret_expression(expr, local_vars, allow_recursion)
-        return v, should_abort
+        statements = self._compile_statements(stmt)
+        if not statements:
+            return None, False
+        should_abort, stmt_f = statements[0]
+        return stmt_f(local_vars), should_abort
 
     def interpret_expression(self, expr, local_vars, allow_recursion):
-        expr = expr.strip()
-
-        if expr == '':  # Empty expression
+        parser = _Parser(expr)
+        if parser.at_end():  # Empty expression
             return None
+        node = parser.parse_expression()
+        if not parser.at_end():
+            parser.error()
+        return self._compile(node)(local_vars)
+
+    def _get_object(self, objname):
+        obj = self._objects.get(objname)
+        if obj is None:
+            obj = self._objects[objname] = self.extract_object(objname)
+        return obj
 
-        if expr.startswith('('):
-            parens_count = 0
-            for m in re.finditer(r'[()]', expr):
-                if m.group(0) == '(':
-                    parens_count += 1
-                else:
-                    parens_count -= 1
-                    if parens_count == 0:
-                        sub_expr = expr[1:m.start()]
-                        sub_result = self.interpret_expression(
-                            sub_expr, local_vars, allow_recursion)
-                        remaining_expr = expr[m.end():].strip()
-                        if not remaining_expr:
-                            return sub_result
-                        else:
-                            expr = json.dumps(sub_result) + remaining_expr
-                        break
-            else:
-                raise ExtractorError('Premature end of parens in %r' % expr)
-
-        for op, opfunc in _ASSIGN_OPERATORS:
-            m = re.match(r'''(?x)
-                (?P<out>%s)(?:\[(?P<index>[^\]]+?)\])?
-                \s*%s
-                (?P<expr>.*)$''' % (_NAME_RE, re.escape(op)), expr)
-            if not m:
-                continue
-            right_val = self.interpret_expression(
-                m.group('expr'), local_vars, allow_recursion - 1)
-
-            if m.groupdict().get('index'):
-                lvar = local_vars[m.group('out')]
-                idx = self.interpret_expression(
-                    m.group('index'), local_vars, allow_recursion)
-                assert isinstance(idx, int)
-                cur = lvar[idx]
-                val = opfunc(cur, right_val)
-                lvar[idx] = val
-                return val
-            else:
-                cur = local_vars.get(m.group('out'))
-                val = opfunc(cur, right_val)
-                local_vars[m.group('out')] = val
-                return val
-
-        if expr.isdigit():
-            return int(expr)
-
-        var_m = re.match(
-            r'(?!if|return|true|false)(?P<name>%s)$' % _NAME_RE,
-            expr)
-        if var_m:
-            return local_vars[var_m.group('name')]
-
-        try:
-            return json.loads(expr)
-        except ValueError:
-            pass
-
-        m = re.match(
-            r'(?P<var>%s)\.(?P<member>[^(]+)(?:\(+(?P<args>[^()]*)\))?$' % _NAME_RE,
-            expr)
-        if m:
-            variable = m.group('var')
-            member = m.group('member')
-            arg_str = m.group('args')
-
-            if variable in local_vars:
-                obj = local_vars[variable]
+    def _get_function(self, funcname):
+        func = self._functions.get(funcname)
+        if func is None:
+            func = self._functions[funcname] = self.extract_function(funcname)
+        return func
+
+    @staticmethod
+    def _call_method(obj, member, argvals):
+        if member == 'split':
+            if not argvals or argvals[0] == '':
+                return list(obj)
+            return obj.split(argvals[0])
+        if member == 'join':
+            return (argvals[0] if argvals else ',').join(obj)
+        if member == 'reverse':
+            assert len(argvals) == 0
+            obj.reverse()
+            return obj
+        if member == 'slice':
+            return obj[argvals[0]:argvals[1]] if len(argvals) > 1 else obj[argvals[0]:]
+        if member == 'splice':
+            assert isinstance(obj, list)
+            index, howMany = argvals[:2]
+            res = obj[index:index + howMany]
+            obj[index:index + howMany] = argvals[2:]
+            return res
+        return obj[member](argvals)
+
+    def _compile_statements(self, code):
+        """ Return a list of (is_return, closure) for the statements in code """
+        compiled = []
+        for stmt in _Parser(code).parse_statements():
+            kind = stmt[0]
+            if kind == 'var':
+                compiled.append((False, self._compile_var(stmt[1])))
+            elif kind == 'return':
+                compiled.append((True, (
+                    (lambda local_vars: None) if stmt[1] is None
+                    else self._compile(stmt[1]))))
             else:
-                if variable not in self._objects:
-                    self._objects[variable] = self.extract_object(variable)
-                obj = self._objects[variable]
-
-            if arg_str is None:
-                # Member access
-                if member == 'length':
-                    return len(obj)
-                return obj[member]
-
-            assert expr.endswith(')')
-            # Function call
-            if arg_str == '':
-                argvals = tuple()
+                compiled.append((False, self._compile(stmt[1])))
+        return compiled
+
+    def _compile_var(self, declarations):
+        compiled = [
+            (name, None if expr is None else self._compile(expr))
+            for name, expr in declarations]
+
+        def declare(local_vars):
+            val = None
+            for name, expr_f in compiled:
+                if expr_f is None:
+                    local_vars.setdefault(name, None)
+                else:
+                    val = local_vars[name] = expr_f(local_vars)
+            return val
+        return declare
+
+    def _compile_object(self, node):
+        """ Like _compile, but a bare name may also refer to an object in the code """
+        if node[0] != 'name':
+            return self._compile(node)
+        name = node[1]
+
+        def get_object(local_vars):
+            if name in local_vars:
+                return local_vars[name]
+            return self._get_object(name)
+        return get_object
+
+    def _compile(self, node):
+        kind = node[0]
+
+        if kind == 'const':
+            value = node[1]
+            return lambda local_vars: value
+
+        if kind == 'name':
+            name = node[1]
+
+            def get_var(local_vars):
+                try:
+                    return local_vars[name]
+                except KeyError:
+                    raise ExtractorError('%s is not defined' % name)
+            return get_var
+
+        if kind == 'array':
+            items = [self._compile(item) for item in node[1]]
+            return lambda local_vars: [item(local_vars) for item in items]
+
+        if kind == 'unary':
+            opfunc = _UNARY_OPERATORS[node[1]]
+            operand = self._compile(node[2])
+            return lambda local_vars: opfunc(operand(local_vars))
+
+        if kind == 'binop':
+            op = node[1]
+            left, right = self._compile(node[2]), self._compile(node[3])
+            if op == '||':
+                return lambda local_vars: left(local_vars) or right(local_vars)
+            if op == '&&':
+                return lambda local_vars: left(local_vars) and right(local_vars)
+            opfunc = _BINARY_OPERATORS[op][1]
+            return lambda local_vars: opfunc(left(local_vars), right(local_vars))
+
+        if kind == 'cond':
+            cond, if_true, if_false = [self._compile(n) for n in node[1:]]
+            return lambda local_vars: (
+                if_true(local_vars) if cond(local_vars) else if_false(local_vars))
+
+        if kind == 'member':
+            obj = self._compile_object(node[1])
+            member = node[2]
+            if member == 'length':
+                return lambda local_vars: len(obj(local_vars))
+            return lambda local_vars: obj(local_vars)[member]
+
+        if kind == 'index':
+            obj, idx = self._compile(node[1]), self._compile(node[2])
+            return lambda local_vars: obj(local_vars)[idx(local_vars)]
+
+        if kind == 'call':
+            callee = node[1]
+            args = [self._compile(arg) for arg in node[2]]
+            if callee[0] == 'member':
+                obj = self._compile_object(callee[1])
+                member = callee[2]
+                return lambda local_vars: self._call_method(
+                    obj(local_vars), member, tuple(arg(local_vars) for arg in args))
+            if callee[0] == 'name':
+                fname = callee[1]
+
+                def call_function(local_vars):
+                    func = local_vars.get(fname)
+                    if func is None:
+                        func = self._get_function(fname)
+                    return func(tuple(arg(local_vars) for arg in args))
+                return call_function
+            func = self._compile(callee)
+            return lambda local_vars: func(local_vars)(
+                tuple(arg(local_vars) for arg in args))
+
+        if kind == 'assign':
+            return self._compile_assign(*node[1:])
+
+        raise ExtractorError('Unsupported JS node %r' % (node,))
+
+    def _compile_assign(self, op, target, expr):
+        opfunc = _ASSIGN_OPERATORS_MAP[op]
+        right = self._compile(expr)
+
+        if target[0] == 'name':
+            name = target[1]
+            if opfunc is None:
+                def assign(local_vars):
+                    val = local_vars[name] = right(local_vars)
+                    return val
             else:
-                argvals = tuple([
-                    self.interpret_expression(v, local_vars, allow_recursion)
-                    for v in arg_str.split(',')])
+                def assign(local_vars):
+                    val = local_vars[name] = opfunc(local_vars.get(name), right(local_vars))
+                    return val
+            return assign
 
-            if member == 'split':
-                assert argvals == ('',)
-                return list(obj)
-            if member == 'join':
-                assert len(argvals) == 1
-                return argvals[0].join(obj)
-            if member == 'reverse':
-                assert len(argvals) == 0
-                obj.reverse()
-                return obj
-            if member == 'slice':
-                assert len(argvals) == 1
-                return obj[argvals[0]:]
-            if member == 'splice':
-                assert isinstance(obj, list)
-                index, howMany = argvals
-                res = []
-                for i in range(index, min(index + howMany, len(obj))):
-                    res.append(obj.pop(index))
-                return res
-
-            return obj[member](argvals)
-
-        m = re.match(
-            r'(?P<in>%s)\[(?P<idx>.+)\]$' % _NAME_RE, expr)
-        if m:
-            val = local_vars[m.group('in')]
-            idx = self.interpret_expression(
-                m.group('idx'), local_vars, allow_recursion - 1)
-            return val[idx]
-
-        for op, opfunc in _OPERATORS:
-            m = re.match(r'(?P<x>.+?)%s(?P<y>.+)' % re.escape(op), expr)
-            if not m:
-                continue
-            x, abort = self.interpret_statement(
-                m.group('x'), local_vars, allow_recursion - 1)
-            if abort:
-                raise ExtractorError(
-                    'Premature left-side return of %s in %r' % (op, expr))
-            y, abort = self.interpret_statement(
-                m.group('y'), local_vars, allow_recursion - 1)
-            if abort:
-                raise ExtractorError(
-                    'Premature right-side return of %s in %r' % (op, expr))
-            return opfunc(x, y)
-
-        m = re.match(
-            r'^(?P<func>%s)\((?P<args>[a-zA-Z0-9_$,]*)\)$' % _NAME_RE, expr)
-        if m:
-            fname = m.group('func')
-            argvals = tuple([
-                int(v) if v.isdigit() else local_vars[v]
-                for v in m.group('args').split(',')]) if len(m.group('args')) > 0 else tuple()
-            if fname not in self._functions:
-                self._functions[fname] = self.extract_function(fname)
-            return self._functions[fname](argvals)
-
-        raise ExtractorError('Unsupported JS expression %r' % expr)
+        if target[0] == 'member':
+            obj, key = self._compile_object(target[1]), (lambda local_vars: target[2])
+        else:
+            obj, key = self._compile(target[1]), self._compile(target[2])
+
+        def assign_item(local_vars):
+            container = obj(local_vars)
+            idx = key(local_vars)
+            val = right(local_vars)
+            if opfunc is not None:
+                val = opfunc(container[idx], val)
+            container[idx] = val
+            return val
+        return assign_item
 
     def extract_object(self, objname):
         obj = {}
@@ -217,6 +461,8 @@ class JSInterpreter(object):
             r'\s*(?P<fields>([a-zA-Z$0-9]+\s*:\s*function\(.*?\)\s*\{.*?\}(?:,\s*)?)*)' +
             r'\}\s*;',
             self.code)
+        if obj_m is None:
+            raise ExtractorError('Could not find JS object %r' % objname)
         fields = obj_m.group('fields')
         # Currently, it only supports function definitions
         fields_m = re.finditer(
@@ -244,15 +490,17 @@ class JSInterpreter(object):
         return self.build_function(argnames, func_m.group('code'))
 
     def call_function(self, funcname, *args):
-        f = self.extract_function(funcname)
-        return f(args)
+        return self._get_function(funcname)(args)
 
     def build_function(self, argnames, code):
+        argnames = [name.strip() for name in argnames]
+        statements = self._compile_statements(code)
+
         def resf(args):
             local_vars = dict(zip(argnames, args))
-            for stmt in code.split(';'):
-                res, abort = self.interpret_statement(stmt, local_vars)
-                if abort:
-                    break
-            return res
+            for is_return, stmt in statements:
+                res = stmt(local_vars)
+                if is_return:
+                    return res
+            return None
         return resf
@@ -0,0 +1,289 @@
+from __future__ import unicode_literals
+
+import binascii
+import re
+
+from .compat import compat_urlparse
+from .utils import (
+    float_or_none,
+    int_or_none,
+    parse_m3u8_attributes,
+)
+
+
+def _absolute_url(base_url, uri):
+    if not base_url or re.match(r'^https?://', uri):
+        return uri
+    return compat_urlparse.urljoin(base_url, uri)
+
+
+def _parse_byterange(value, default_offset=None):
+    """ Parse "<length>[@<offset>]" into a (length, offset) tuple """
+    length, _, offset = value.partition('@')
+    return int(length), int(offset) if offset else default_offset
+
+
+class M3U8Key(object):
+    """ An EXT-X-KEY tag, shared by all the segments it applies to """
+
+    def __init__(self, attributes, base_url=None):
+        self.attributes = attributes
+        self.method = attributes.get('METHOD')
+        uri = attributes.get('URI')
+        self.url = _absolute_url(base_url, uri) if uri else None
+
+    @property
+    def iv(self):
+        """ The IV as bytes, None when it is derived from the media sequence """
+        iv = self.attributes.get('IV')
+        if iv:
+            return binascii.unhexlify(iv[2:].zfill(32))
+
+
+class M3U8Map(object):
+    """ An EXT-X-MAP tag, the initialization section of the segments following it """
+
+    def __init__(self, attributes, base_url=None):
+        self.attributes = attributes
+        self.url = _absolute_url(base_url, attributes['URI'])
+        byterange = attributes.get('BYTERANGE')
+        self.byterange = _parse_byterange(byterange, 0) if byterange else None
+
+
+class M3U8Segment(object):
+    __slots__ = (
+        'uri', 'duration', 'title', 'byterange', 'key', 'map', 'discontinuity',
+        'media_sequence', 'program_date_time', '_base_url')
+
+    def __init__(self, uri, base_url=None, duration=None, title=None, byterange=None,
+                 key=None, map=None, discontinuity=False, media_sequence=0,
+                 program_date_time=None):
+        self.uri = uri
+        self._base_url = base_url
+        self.duration = duration
+        self.title = title
+        # (length, offset) in bytes
+        self.byterange = byterange
+        # M3U8Key, None for unencrypted segments
+        self.key = key
+        self.map = map
+        self.discontinuity = discontinuity
+        self.media_sequence = media_sequence
+        self.program_date_time = program_date_time
+
+    @property
+    def url(self):
+        return _absolute_url(self._base_url, self.uri)
+
+
+class M3U8MediaPlaylist(object):
+    def __init__(self, base_url=None):
+        self.base_url = base_url
+        self.version = None
+        self.target_duration = None
+        self.media_sequence = 0
+        self.discontinuity_sequence = 0
+        self.playlist_type = None
+        self.endlist = False
+        self.segments = []
+        # Every EXT-X-KEY found, METHOD=NONE included
+        self.keys = []
+
+    @property
+    def duration(self):
+        return sum(s.duration or 0 for s in self.segments)
+
+
+class M3U8MediaParser(object):
+    """
+    Incremental media playlist parser
+
+    feed() it the playlist text as it arrives, for example what is appended
+    to a live playlist, and it returns the segments completed by each chunk.
+    The whole playlist is available as the playlist attribute.
+    """
+
+    def __init__(self, base_url=None):
+        self.playlist = M3U8MediaPlaylist(base_url)
+        self._buffer = ''
+        self._media_sequence = 0
+        self._key = None
+        self._map = None
+        self._byterange_end = 0
+        self._reset_segment()
+
+    def _reset_segment(self):
+        self._duration = None
+        self._title = None
+        self._byterange = None
+        self._discontinuity = False
+        self._program_date_time = None
+
+    def feed(self, data):
+        data = self._buffer + data
+        lines = data.splitlines()
+        # The last line is only complete once its line break has arrived
+        if lines and not data.endswith(('\n', '\r')):
+            self._buffer = lines.pop()
+        else:
+            self._buffer = ''
+        return self._parse_lines(lines)
+
+    def close(self):
+        """ Parse what remains of the playlist and return the playlist """
+        buf, self._buffer = self._buffer, ''
+        self._parse_lines([buf])
+        return self.playlist
+
+    def _parse_lines(self, lines):
+        new_segments = []
+        handlers = self._TAG_HANDLERS
+        for line in lines:
+            line = line.strip()
+            if not line:
+                continue
+            if line[0] != '#':
+                new_segments.append(self._add_segment(line))
+                continue
+            tag, _, value = line.partition(':')
+            handler = handlers.get(tag)
+            if handler is not None:
+                handler(self, value)
+        return new_segments
+
+    def _add_segment(self, uri):
+        playlist = self.playlist
+        segment = M3U8Segment(
+            uri, playlist.base_url, self._duration, self._title, self._byterange,
+            self._key, self._map, self._discontinuity, self._media_sequence,
+            self._program_date_time)
+        playlist.segments.append(segment)
+        if self._byterange:
+            self._byterange_end = sum(self._byterange)
+        self._media_sequence += 1
+        self._reset_segment()
+        return segment
+
+    def _parse_extinf(self, value):
+        duration, _, title = value.partition(',')
+        self._duration = float_or_none(duration.strip())
+        self._title = title or None
+
+    def _parse_segment_byterange(self, value):
+        self._byterange = _parse_byterange(value, self._byterange_end)
+
+    def _parse_key(self, value):
+        key = M3U8Key(parse_m3u8_attributes(value), self.playlist.base_url)
+        self.playlist.keys.append(key)
+        self._key = None if key.method == 'NONE' else key
+
+    def _parse_map(self, value):
+        self._map = M3U8Map(parse_m3u8_attributes(value), self.playlist.base_url)
+
+    def _parse_discontinuity(self, value):
+        self._discontinuity = True
+
+    def _parse_program_date_time(self, value):
+        self._program_date_time = value
+
+    def _parse_media_sequence(self, value):
+        self._media_sequence = self.playlist.media_sequence = int(value)
+
+    def _parse_discontinuity_sequence(self, value):
+        self.playlist.discontinuity_sequence = int(value)
+
+    def _parse_target_duration(self, value):
+        self.playlist.target_duration = int_or_none(value)
+
+    def _parse_playlist_type(self, value):
+        self.playlist.playlist_type = value
+
+    def _parse_version(self, value):
+        self.playlist.version = int_or_none(value)
+
+    def _parse_endlist(self, value):
+        self.playlist.endlist = True
+
+    _TAG_HANDLERS = {
+        '#EXTINF': _parse_extinf,
+        '#EXT-X-BYTERANGE': _parse_segment_byterange,
+        '#EXT-X-KEY': _parse_key,
+        '#EXT-X-MAP': _parse_map,
+        '#EXT-X-DISCONTINUITY': _parse_discontinuity,
+        '#EXT-X-PROGRAM-DATE-TIME': _parse_program_date_time,
+        '#EXT-X-MEDIA-SEQUENCE': _parse_media_sequence,
+        '#EXT-X-DISCONTINUITY-SEQUENCE': _parse_discontinuity_sequence,
+        '#EXT-X-TARGETDURATION': _parse_target_duration,
+        '#EXT-X-PLAYLIST-TYPE': _parse_playlist_type,
+        '#EXT-X-VERSION': _parse_version,
+        '#EXT-X-ENDLIST': _parse_endlist,
+    }
+
+
+class M3U8Media(object):
+    """ An EXT-X-MEDIA tag, a rendition of a master playlist """
+
+    def __init__(self, attributes, base_url=None):
+        self.attributes = attributes
+        uri = attributes.get('URI')
+        self.url = _absolute_url(base_url, uri) if uri else None
+
+
+class M3U8Variant(object):
+    """ A variant stream of a master playlist and its EXT-X-STREAM-INF attributes """
+
+    def __init__(self, uri, attributes, base_url=None):
+        self.uri = uri
+        self.attributes = attributes
+        self.url = _absolute_url(base_url, uri)
+
+
+class M3U8MasterPlaylist(object):
+    def __init__(self, base_url=None):
+        self.base_url = base_url
+        # M3U8Media and M3U8Variant objects in playlist order
+        self.items = []
+
+    @property
+    def media(self):
+        return [item for item in self.items if isinstance(item, M3U8Media)]
+
+    @property
+    def variants(self):
+        return [item for item in self.items if isinstance(item, M3U8Variant)]
+
+
+def is_media_playlist(m3u8_doc):
+    # As of [1] #EXT-X-TARGETDURATION tag is REQUIRED for every media playlist
+    # and MUST NOT appear in master playlist
+    # 1. https://tools.ietf.org/html/draft-pantos-http-live-streaming-17#section-4.3.3.1
+    return '#EXT-X-TARGETDURATION' in m3u8_doc
+
+
+def parse_m3u8_master(m3u8_doc, base_url=None):
+    playlist = M3U8MasterPlaylist(base_url)
+    stream_inf = {}
+    for line in m3u8_doc.splitlines():
+        if line.startswith('#EXT-X-STREAM-INF:'):
+            stream_inf = parse_m3u8_attributes(line[18:])
+        elif line.startswith('#EXT-X-MEDIA:'):
+            playlist.items.append(M3U8Media(parse_m3u8_attributes(line[13:]), base_url))
+        elif line.startswith('#') or not line.strip():
+            continue
+        else:
+            playlist.items.append(M3U8Variant(line.strip(), stream_inf, base_url))
+            stream_inf = {}
+    return playlist
+
+
+def parse_m3u8_media(m3u8_doc, base_url=None):
+    parser = M3U8MediaParser(base_url)
+    parser.feed(m3u8_doc)
+    return parser.close()
+
+
+def parse_m3u8(m3u8_doc, base_url=None):
+    """ Parse a master or media playlist, whichever m3u8_doc is """
+    if is_media_playlist(m3u8_doc):
+        return parse_m3u8_media(m3u8_doc, base_url)
+    return parse_m3u8_master(m3u8_doc, base_url)
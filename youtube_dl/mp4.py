@@ -0,0 +1,372 @@
+from __future__ import division, unicode_literals
+
+import fractions
+import os
+import struct
+
+from .utils import (
+    encodeFilename,
+    YoutubeDLError,
+)
+
+
+u8 = struct.Struct(b'>B')
+u88 = struct.Struct(b'>Bx')
+u16 = struct.Struct(b'>H')
+u1616 = struct.Struct(b'>Hxx')
+u32 = struct.Struct(b'>I')
+u64 = struct.Struct(b'>Q')
+
+s88 = struct.Struct(b'>bx')
+s16 = struct.Struct(b'>h')
+s1616 = struct.Struct(b'>hxx')
+s32 = struct.Struct(b'>i')
+
+_box_header = struct.Struct(b'>I4s')
+
+# Size of what precedes the children of the boxes containing other boxes
+_CONTAINERS = {
+    b'moov': 0, b'trak': 0, b'mdia': 0, b'minf': 0, b'stbl': 0, b'dinf': 0,
+    b'edts': 0, b'mvex': 0, b'udta': 0, b'ilst': 0,
+    b'meta': 4,  # version and flags
+    b'stsd': 8,  # version, flags and entry count
+    # Visual sample entries
+    b'avc1': 78, b'avc3': 78, b'hvc1': 78, b'hev1': 78, b'vp08': 78,
+    b'vp09': 78, b'av01': 78, b'mp4v': 78, b'encv': 78,
+}
+
+
+def box(box_type, payload):
+    return u32.pack(8 + len(payload)) + box_type + payload
+
+
+def full_box(box_type, version, flags, payload):
+    return box(box_type, u8.pack(version) + u32.pack(flags)[1:] + payload)
+
+
+def free_box(size):
+    """ A free box of size bytes, header included """
+    return box(b'free', b'\0' * (size - 8))
+
+
+class MP4EditError(YoutubeDLError):
+    pass
+
+
+class Box(object):
+    """
+    A box of a tree built by parse_boxes
+
+    The boxes containing other boxes have children, and as header what
+    precedes them in the payload; the others keep their payload as is.
+    """
+
+    def __init__(self, box_type, payload=b'', children=None, header=b''):
+        self.type = box_type
+        self.payload = payload
+        self.children = children
+        self.header = header
+
+    @classmethod
+    def parse(cls, box_type, payload, parent_type=None):
+        header_size = _CONTAINERS.get(box_type)
+        if parent_type == b'ilst':
+            # Metadata items contain data boxes
+            header_size = 0
+        elif box_type == b'meta' and payload[4:8] == b'hdlr':
+            # QuickTime meta boxes are not full boxes
+            header_size = 0
+        if header_size is not None and len(payload) >= header_size:
+            children = parse_boxes(payload[header_size:], box_type)
+            if children is not None:
+                return cls(box_type, children=children, header=payload[:header_size])
+        return cls(box_type, payload)
+
+    def find(self, *path):
+        """ The first box reached by following the box types of path, None if none is """
+        for child in self.children or []:
+            if child.type == path[0]:
+                if len(path) == 1:
+                    return child
+                found = child.find(*path[1:])
+                if found is not None:
+                    return found
+        return None
+
+    def find_all(self, box_type):
+        return [child for child in self.children or [] if child.type == box_type]
+
+    def replace(self, new_box):
+        """ Replace the children of the type of new_box with it, append it if there is none """
+        children = [child for child in self.children if child.type != new_box.type]
+        for i, child in enumerate(self.children):
+            if child.type == new_box.type:
+                children.insert(i, new_box)
+                break
+        else:
+            children.append(new_box)
+        self.children = children
+
+    def serialize(self):
+        if self.children is None:
+            return box(self.type, self.payload)
+        return box(self.type, self.header + b''.join(c.serialize() for c in self.children))
+
+
+def parse_boxes(data, parent_type=None):
+    """ Parse data into a list of Box, None if it is not a sequence of boxes """
+    boxes = []
+    pos = 0
+    while pos < len(data):
+        if pos + 8 > len(data):
+            return None
+        size, box_type = _box_header.unpack_from(data, pos)
+        header_size = 8
+        if size == 1:
+            if pos + 16 > len(data):
+                return None
+            size = u64.unpack_from(data, pos + 8)[0]
+            header_size = 16
+        elif size == 0:
+            size = len(data) - pos
+        if size < header_size or pos + size > len(data):
+            return None
+        boxes.append(Box.parse(box_type, data[pos + header_size:pos + size], parent_type))
+        pos += size
+    return boxes
+
+
+class MP4File(object):
+    """
+    Edit the boxes describing an MP4 file in place
+
+    The top level boxes are indexed and the ftyp and moov boxes parsed into
+    Box trees. save() writes moov over the original one and the free boxes
+    following it when it fits, otherwise at the end of the file if nothing
+    refers to its position. It raises MP4EditError, leaving the file as it
+    is, when the file can only be rewritten as a whole.
+    """
+
+    def __init__(self, filename, readonly=False):
+        self.filename = filename
+        self._f = open(encodeFilename(filename), 'rb' if readonly else 'r+b')
+        try:
+            self._load()
+        except Exception:
+            self._f.close()
+            raise
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def close(self):
+        self._f.close()
+
+    def _load(self):
+        f = self._f
+        f.seek(0, os.SEEK_END)
+        self._file_size = file_size = f.tell()
+        # (type, offset, size, header size) of the top level boxes
+        self._index = []
+        self._open_ended = False
+        pos = 0
+        while pos < file_size:
+            f.seek(pos)
+            header = f.read(16)
+            if len(header) < 8:
+                raise MP4EditError('Truncated box at offset %d' % pos)
+            size, box_type = _box_header.unpack(header[:8])
+            header_size = 8
+            if size == 1 and len(header) == 16:
+                size = u64.unpack(header[8:])[0]
+                header_size = 16
+            elif size == 0:
+                size = file_size - pos
+                self._open_ended = True
+            if size < header_size or pos + size > file_size:
+                raise MP4EditError('Invalid %r box at offset %d' % (box_type, pos))
+            self._index.append((box_type, pos, size, header_size))
+            pos += size
+
+        # The original boxes, to tell if they need writing
+        self._raw = {}
+        parsed = []
+        for box_type in (b'ftyp', b'moov'):
+            entry = self._find_entry(box_type)
+            if entry is None:
+                raise MP4EditError('No %s box found' % box_type.decode('ascii'))
+            _, offset, size, header_size = self._index[entry]
+            f.seek(offset)
+            self._raw[box_type] = raw = f.read(size)
+            parsed.append(Box.parse(box_type, raw[header_size:]))
+        self.ftyp, self.moov = parsed
+
+    def _find_entry(self, box_type):
+        for i, entry in enumerate(self._index):
+            if entry[0] == box_type:
+                return i
+        return None
+
+    @property
+    def brands(self):
+        """ The major brand and the compatible brands of the file """
+        payload = self.ftyp.payload
+        return payload[:4], [payload[i:i + 4] for i in range(8, len(payload) - 3, 4)]
+
+    @property
+    def fragmented(self):
+        """ Whether the samples are described by movie fragments (moof boxes) """
+        return (self._find_entry(b'moof') is not None
+                or self.moov.find(b'mvex') is not None)
+
+    def set_brands(self, major_brand, compatible_brands):
+        self.ftyp.payload = (
+            major_brand + self.ftyp.payload[4:8] + b''.join(compatible_brands))
+
+    def _writes(self):
+        """ The (offset, data) writes saving the file and the size to truncate it to """
+        writes = []
+        truncate = None
+        ftyp = self.ftyp.serialize()
+        if ftyp != self._raw[b'ftyp']:
+            _, offset, size, _ = self._index[self._find_entry(b'ftyp')]
+            if len(ftyp) != size:
+                raise MP4EditError('The size of the ftyp box cannot change')
+            writes.append((offset, ftyp))
+
+        moov = self.moov.serialize()
+        if moov == self._raw[b'moov']:
+            return writes, truncate
+        entry = self._find_entry(b'moov')
+        _, offset, size, _ = self._index[entry]
+        room = size
+        following = self._index[entry + 1:]
+        at_end = True
+        for box_type, _, free_size, _ in following:
+            if box_type not in (b'free', b'skip'):
+                at_end = False
+                break
+            room += free_size
+        if at_end and len(moov) != room and len(moov) + 8 > room:
+            # Nothing follows moov but free space
+            room = len(moov)
+            truncate = offset + room
+        if len(moov) == room or len(moov) + 8 <= room:
+            if room > len(moov):
+                moov += free_box(room - len(moov))
+            writes.append((offset, moov))
+        elif self._open_ended or any(e[0] == b'moof' for e in following):
+            # Fragments must follow moov, and nothing can follow a last box
+            # extending to the end of the file
+            raise MP4EditError('The moov box cannot grow in place')
+        else:
+            # The chunk offsets are absolute, the samples must not move
+            writes.append((self._file_size, moov))
+            writes.append((offset, free_box(size)))
+        return writes, truncate
+
+    def check(self):
+        """ Raise MP4EditError if save() cannot save the file """
+        self._writes()
+
+    def save(self):
+        writes, truncate = self._writes()
+        f = self._f
+        for offset, data in writes:
+            f.seek(offset)
+            f.write(data)
+        if truncate is not None:
+            f.truncate(truncate)
+        f.flush()
+        self._load()
+
+
+def handler_type(trak):
+    hdlr = trak.find(b'mdia', b'hdlr')
+    return hdlr.payload[8:12] if hdlr is not None else None
+
+
+def set_display_aspect_ratio(moov, ratio):
+    """
+    Make the video tracks of moov display with the width:height ratio,
+    setting their pixel aspect ratio like ffmpeg -aspect
+    """
+    tracks = [trak for trak in moov.find_all(b'trak') if handler_type(trak) == b'vide']
+    if not tracks:
+        raise MP4EditError('No video track found')
+    for trak in tracks:
+        tkhd = trak.find(b'tkhd')
+        stsd = trak.find(b'mdia', b'minf', b'stbl', b'stsd')
+        if tkhd is None or stsd is None or not stsd.children:
+            raise MP4EditError('No video sample description found')
+        for entry in stsd.children:
+            if entry.children is None:
+                raise MP4EditError('Unsupported sample entry %r' % entry.type)
+            width, height = u16.unpack_from(entry.header, 24)[0], u16.unpack_from(entry.header, 26)[0]
+            if not width or not height:
+                raise MP4EditError('Invalid video dimensions')
+            sar = fractions.Fraction(ratio * height / width).limit_denominator(0xffff)
+            entry.replace(Box(b'pasp', u32.pack(sar.numerator) + u32.pack(sar.denominator)))
+        # The displayed width, a 16.16 fixed-point number following the matrix
+        pos = 88 if tkhd.payload[:1] == b'\1' else 76
+        if len(tkhd.payload) < pos + 8:
+            raise MP4EditError('Invalid tkhd box')
+        height = u32.unpack_from(tkhd.payload, pos + 4)[0]
+        tkhd.payload = tkhd.payload[:pos] + u32.pack(int(round(height * ratio))) + tkhd.payload[pos + 4:]
+
+
+# Types of the data boxes of iTunes metadata items
+ITUNES_UTF8 = 1
+ITUNES_JPEG = 13
+ITUNES_PNG = 14
+
+
+def itunes_item(name, data, data_type=ITUNES_UTF8):
+    """ An item of an ilst box, text is encoded as UTF-8 """
+    if data_type == ITUNES_UTF8:
+        data = data.encode('utf-8')
+    return Box(name, children=[Box(b'data', u32.pack(data_type) + u32.pack(0) + data)])
+
+
+def itunes_number_item(name, number, total=0):
+    """ A trkn or disk item, number out of total """
+    data = u16.pack(0) + u16.pack(number) + u16.pack(total)
+    if name == b'trkn':
+        data += u16.pack(0)
+    return itunes_item(name, data, 0)
+
+
+def set_itunes_items(moov, items):
+    """
+    Replace the iTunes metadata items of moov in moov/udta/meta/ilst with
+    items of the same names, taking the room they need from the free box of
+    meta if there is one
+    """
+    udta = moov.find(b'udta')
+    if udta is None:
+        udta = Box(b'udta', children=[])
+        moov.children.append(udta)
+    meta = udta.find(b'meta')
+    if meta is None:
+        hdlr = full_box(b'hdlr', 0, 0, u32.pack(0) + b'mdir' + b'appl' + u32.pack(0) * 2 + b'\0')
+        meta = Box(b'meta', children=parse_boxes(hdlr), header=u32.pack(0))
+        udta.children.append(meta)
+    if udta.children is None or meta.children is None:
+        raise MP4EditError('Invalid udta box')
+    ilst = meta.find(b'ilst')
+    if ilst is None:
+        ilst = Box(b'ilst', children=[])
+        meta.children.append(ilst)
+    if ilst.children is None:
+        raise MP4EditError('Invalid ilst box')
+
+    size = len(meta.serialize())
+    for item in items:
+        ilst.replace(item)
+    growth = len(meta.serialize()) - size
+    free = meta.find(b'free')
+    if free is not None and free.children is None and 0 < growth <= len(free.payload):
+        free.payload = free.payload[growth:]
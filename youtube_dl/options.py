@@ -200,6 +200,15 @@ def parseOpts(overrideArguments=None):
         action='store_true', dest='no_color',
         default=False,
         help='Do not emit color codes in output')
+    general.add_option(
+        '--serve',
+        dest='serve', metavar='ADDRESS', default=None,
+        help='Run as a daemon accepting download jobs through a JSON API instead of downloading URLs. '
+             'ADDRESS is [HOST:]PORT (HOST defaults to localhost) or unix:PATH for a Unix domain socket')
+    general.add_option(
+        '--serve-workers',
+        dest='serve_workers', metavar='NUMBER', default=4, type=int,
+        help='Number of jobs run concurrently in --serve mode (default is %default)')
 
     network = optparse.OptionGroup(parser, 'Network Options')
     network.add_option(
@@ -400,6 +409,14 @@ def parseOpts(overrideArguments=None):
         '--prefer-free-formats',
         action='store_true', dest='prefer_free_formats', default=False,
         help='Prefer free video formats unless a specific one is requested')
+    video_format.add_option(
+        '--format-sort',
+        metavar='FIELDS', dest='format_sort',
+        help='Comma separated list of fields to rank the formats by before the default ones, '
+             'from the most to the least significant, e.g. "height,fps,tbr". '
+             'Besides the numeric format fields (see "OUTPUT TEMPLATE") and format_id, ext, vcodec, '
+             'acodec, protocol, container, format_note and language, preference, proto_preference, '
+             'ext_preference and audio_ext_preference can be used')
     video_format.add_option(
         '-F', '--list-formats',
         action='store_true', dest='listformats',
@@ -419,6 +436,12 @@ def parseOpts(overrideArguments=None):
             'If a merge is required (e.g. bestvideo+bestaudio), '
             'output to given container format. One of mkv, mp4, ogg, webm, flv. '
             'Ignored if no merge is required'))
+    video_format.add_option(
+        '--live-merge',
+        action='store_true', dest='live_merge', default=False,
+        help=(
+            'Merge the formats while they are downloaded, feeding them to ffmpeg through named pipes '
+            'instead of intermediate files (DASH, WebM and native HLS formats only, not available on Windows)'))
 
     subtitles = optparse.OptionGroup(parser, 'Subtitle Options')
     subtitles.add_option(
@@ -468,6 +491,10 @@ def parseOpts(overrideArguments=None):
         '--abort-on-unavailable-fragment',
         action='store_false', dest='skip_unavailable_fragments',
         help='Abort downloading when some fragment is not available')
+    downloader.add_option(
+        '--sidecar-downloads',
+        dest='sidecar_downloads', metavar='NUMBER', default=4, type=int,
+        help='Number of subtitles and thumbnails downloaded at the same time, alongside the video (default is %default)')
     downloader.add_option(
         '--buffer-size',
         dest='buffersize', metavar='SIZE', default='1024',
@@ -505,6 +532,11 @@ def parseOpts(overrideArguments=None):
         dest='hls_use_mpegts', action='store_true',
         help='Use the mpegts container for HLS videos, allowing to play the '
              'video while downloading (some players may not be able to play it)')
+    downloader.add_option(
+        '--hls-pipe-remux',
+        dest='hls_pipe_remux', action='store_true',
+        help='Feed the fragments downloaded by the native HLS downloader to ffmpeg as they arrive, '
+             'which writes the final MP4 file instead of fixing the container once the download is done')
     downloader.add_option(
         '--external-downloader',
         dest='external_downloader', metavar='COMMAND',
@@ -747,10 +779,19 @@ def parseOpts(overrideArguments=None):
     filesystem.add_option(
         '--no-cache-dir', action='store_const', const=False, dest='cachedir',
         help='Disable filesystem caching')
+    filesystem.add_option(
+        '--cache-backend', dest='cache_backend', default=None, metavar='BACKEND',
+        choices=('files', 'sqlite'),
+        help='How to store the cache: files (one file per entry, default) or sqlite (a single database file, better suited for huge caches)')
     filesystem.add_option(
         '--rm-cache-dir',
         action='store_true', dest='rm_cachedir',
         help='Delete all filesystem cache files')
+    filesystem.add_option(
+        '--warm-youtube-cache',
+        action='append', dest='warm_youtube_cache', metavar='PLAYER_URL',
+        help='Store the YouTube player at PLAYER_URL in the cache along with its signature functions for all signature lengths seen so far. '
+             'The cache directory can then be copied to other hosts. Can be used multiple times')
 
     thumbnail = optparse.OptionGroup(parser, 'Thumbnail images')
     thumbnail.add_option(
@@ -770,7 +811,8 @@ def parseOpts(overrideArguments=None):
     postproc.add_option(
         '-x', '--extract-audio',
         action='store_true', dest='extractaudio', default=False,
-        help='Convert video files to audio-only files (requires ffmpeg or avconv and ffprobe or avprobe)')
+        help='Convert video files to audio-only files, one per CPU core while the next ones are downloaded '
+             '(requires ffmpeg or avconv and ffprobe or avprobe)')
     postproc.add_option(
         '--audio-format', metavar='FORMAT', dest='audioformat', default='best',
         help='Specify audio format: "best", "aac", "flac", "mp3", "m4a", "opus", "vorbis", or "wav"; "%default" by default; No effect without -x')
@@ -845,6 +887,11 @@ def parseOpts(overrideArguments=None):
         '--convert-subs', '--convert-subtitles',
         metavar='FORMAT', dest='convertsubtitles', default=None,
         help='Convert the subtitles to other format (currently supported: srt|ass|vtt)')
+    postproc.add_option(
+        '--postprocess-workers',
+        metavar='NUMBER', dest='postprocess_workers', type=int, default=None,
+        help='Post-process the downloaded files in the background with NUMBER workers while the next videos are downloaded, '
+             '0 for one worker per CPU core. The download archive is only updated once the post-processing succeeded')
 
     parser.add_option_group(general)
     parser.add_option_group(network)
@@ -5,8 +5,15 @@ from __future__ import unicode_literals
 import os
 import subprocess
 
-from .ffmpeg import FFmpegPostProcessor
-
+from .ffmpeg import FFmpegCopyPlan, FFmpegPostProcessor
+
+from ..id3 import picture_frame
+from ..mp4 import (
+    itunes_item,
+    ITUNES_JPEG,
+    ITUNES_PNG,
+    set_itunes_items,
+)
 from ..utils import (
     check_executable,
     encodeArgument,
@@ -26,10 +33,8 @@ class EmbedThumbnailPP(FFmpegPostProcessor):
         super(EmbedThumbnailPP, self).__init__(downloader)
         self._already_have_thumbnail = already_have_thumbnail
 
-    def run(self, info):
-        filename = info['filepath']
-        temp_filename = prepend_extension(filename, 'temp')
-
+    def _thumbnail_filename(self, info):
+        """ The file to embed, None if it is missing """
         if not info.get('thumbnails'):
             raise EmbedThumbnailPPError('Thumbnail was not found. Nothing to do.')
 
@@ -38,23 +43,74 @@ class EmbedThumbnailPP(FFmpegPostProcessor):
         if not os.path.exists(encodeFilename(thumbnail_filename)):
             self._downloader.report_warning(
                 'Skipping embedding the thumbnail because the file is missing.')
-            return [], info
+            return None
+        return thumbnail_filename
+
+    def copy_plan(self, info):
+        # Only mp3 files get their thumbnail from ffmpeg
+        if info['ext'] != 'mp3':
+            return None
+
+        thumbnail_filename = self._thumbnail_filename(info)
+        if thumbnail_filename is None:
+            return FFmpegCopyPlan()
+        # run() writes the tag itself when it can
+        if self._embed_in_place(info, thumbnail_filename, dry_run=True):
+            return None
+        return self._ffmpeg_copy_plan(info, thumbnail_filename)
+
+    def _ffmpeg_copy_plan(self, info, thumbnail_filename):
+        return FFmpegCopyPlan(
+            ['[ffmpeg] Adding thumbnail to "%s"' % info['filepath']],
+            [thumbnail_filename], ['{0}', '{1}'],
+            metadata=[
+                ('-metadata:s:v', 'title="Album cover"'),
+                ('-metadata:s:v', 'comment="Cover (Front)"')],
+            remove_files=[] if self._already_have_thumbnail else [thumbnail_filename])
+
+    def _embed_in_place(self, info, thumbnail_filename, dry_run=False):
+        """ Embed JPEG and PNG thumbnails in the tags of mp3 and m4a/mp4 files """
+        with open(encodeFilename(thumbnail_filename), 'rb') as f:
+            data = f.read()
+        if data.startswith(b'\xff\xd8\xff'):
+            mime_type, data_type = 'image/jpeg', ITUNES_JPEG
+        elif data.startswith(b'\x89PNG\r\n\x1a\n'):
+            mime_type, data_type = 'image/png', ITUNES_PNG
+        else:
+            return False
 
+        filename = info['filepath']
         if info['ext'] == 'mp3':
-            options = [
-                '-c', 'copy', '-map', '0', '-map', '1',
-                '-metadata:s:v', 'title="Album cover"', '-metadata:s:v', 'comment="Cover (Front)"']
+            done = self.edit_id3(
+                filename, lambda tag: tag.set(b'APIC', picture_frame(data, mime_type, 'Album cover')),
+                dry_run)
+        elif info['ext'] in ['m4a', 'mp4']:
+            done = self.edit_mp4(
+                filename, lambda mp4: set_itunes_items(mp4.moov, [itunes_item(b'covr', data, data_type)]),
+                dry_run)
+        else:
+            return False
+        if done and not dry_run:
+            self._downloader.to_screen('[embedthumbnail] Added thumbnail to "%s"' % filename)
+            if not self._already_have_thumbnail:
+                os.remove(encodeFilename(thumbnail_filename))
+        return done
 
-            self._downloader.to_screen('[ffmpeg] Adding thumbnail to "%s"' % filename)
+    def run(self, info):
+        filename = info['filepath']
+        temp_filename = prepend_extension(filename, 'temp')
 
-            self.run_ffmpeg_multiple_files([filename, thumbnail_filename], temp_filename, options)
+        thumbnail_filename = self._thumbnail_filename(info)
+        if thumbnail_filename is None:
+            return [], info
 
-            if not self._already_have_thumbnail:
-                os.remove(encodeFilename(thumbnail_filename))
-            os.remove(encodeFilename(filename))
-            os.rename(encodeFilename(temp_filename), encodeFilename(filename))
+        if self._embed_in_place(info, thumbnail_filename):
+            return [], info
 
-        elif info['ext'] in ['m4a', 'mp4']:
+        if info['ext'] == 'mp3':
+            return self.run_copy_plan(self._ffmpeg_copy_plan(info, thumbnail_filename), info)
+
+        if info['ext'] in ['m4a', 'mp4']:
             if not check_executable('AtomicParsley', ['-v']):
                 raise EmbedThumbnailPPError('AtomicParsley was not found. Please install.')
 
@@ -1,20 +1,50 @@
 from __future__ import unicode_literals
 
+import copy
+import hashlib
 import io
+import itertools
+import json
 import os
 import subprocess
+import threading
 import time
 
 
 from .common import AudioConversionError, PostProcessor
 
 from ..compat import (
+    compat_getenv,
+    compat_os_name,
+    compat_str,
     compat_subprocess_get_DEVNULL,
 )
+from ..id3 import (
+    comment_frame,
+    ID3Error,
+    ID3Tag,
+    text_frame,
+    user_text_frame,
+)
+from ..mp4 import (
+    itunes_item,
+    itunes_number_item,
+    MP4EditError,
+    MP4File,
+    set_display_aspect_ratio,
+    set_itunes_items,
+)
+from ..subtitles import (
+    convert_subtitles,
+    SubtitlesConversionError,
+)
 from ..utils import (
     encodeArgument,
     encodeFilename,
+    error_to_compat_str,
+    float_or_none,
     get_exe_version,
+    int_or_none,
     is_outdated_version,
     PostProcessingError,
     prepend_extension,
@@ -52,6 +82,101 @@ class FFmpegPostProcessorError(PostProcessingError):
     pass
 
 
+def _find_executable(exe):
+    """ The file subprocess runs for exe, None if there is none """
+    exts = ['']
+    if compat_os_name == 'nt':
+        exts.extend(compat_getenv('PATHEXT', '.EXE').split(os.pathsep))
+    if os.path.dirname(exe):
+        candidates = [exe]
+    else:
+        candidates = [
+            os.path.join(d, exe)
+            for d in (compat_getenv('PATH') or os.defpath).split(os.pathsep)]
+    for candidate in candidates:
+        for ext in exts:
+            fn = candidate + ext
+            if os.path.isfile(fn) and os.access(fn, os.X_OK):
+                return fn
+    return None
+
+
+# Versions of the executables found by FFmpegPostProcessor, by executables key
+_exe_versions = {}
+
+# FFmpegPostProcessor.probe results and when they were last used, by
+# (path, size, mtime, inode) of the file
+_probe_results = {}
+_probe_ticks = itertools.count()
+_probe_results_lock = threading.Lock()
+_PROBE_RESULTS_SIZE = 64
+
+
+class FFmpegCopyPlan(object):
+    """
+    How a postprocessor rewrites a file with ffmpeg, copying its streams,
+    so that consecutive ones can do it with a single command
+
+    inputs are the files read besides the processed one and maps the -map
+    arguments, as format strings where {0} is the processed file and {1}...
+    are the inputs; None lets ffmpeg pick the streams. opts are the other
+    output options and metadata the -metadata ones, as (option, value)
+    pairs, value being None for flags. An empty plan leaves the file as is.
+    """
+
+    def __init__(self, notes=(), inputs=(), maps=None, opts=(), metadata=(),
+                 files_to_delete=(), remove_files=()):
+        # Printed before running ffmpeg
+        self.notes = list(notes)
+        self.inputs = list(inputs)
+        self.maps = None if maps is None else list(maps)
+        self.opts = list(opts)
+        self.metadata = list(metadata)
+        # Returned to YoutubeDL.post_process, deleted unless keepvideo is set
+        self.files_to_delete = list(files_to_delete)
+        # Always deleted once the file is written
+        self.remove_files = list(remove_files)
+
+    @property
+    def empty(self):
+        return not (self.inputs or self.maps or self.opts or self.metadata)
+
+    def merge(self, other):
+        """ Return the plan doing self then other, None if they conflict """
+        if self.maps is not None and other.maps is not None:
+            return None
+        opts = list(self.opts)
+        for option, value in other.opts:
+            if any(o == option and v != value for o, v in opts):
+                return None
+            if (option, value) not in opts:
+                opts.append((option, value))
+        maps = self.maps
+        if other.maps is not None:
+            # Renumber the inputs of other, they follow those of self
+            offset = len(self.inputs)
+            indexes = ['{0}'] + [
+                '{%d}' % (offset + i) for i in range(1, len(other.inputs) + 1)]
+            maps = [m.format(*indexes) for m in other.maps]
+        return FFmpegCopyPlan(
+            self.notes + other.notes, self.inputs + other.inputs, maps, opts,
+            self.metadata + other.metadata,
+            self.files_to_delete + other.files_to_delete,
+            self.remove_files + other.remove_files)
+
+    def ffmpeg_args(self):
+        args = ['-c', 'copy']
+        if self.maps is not None:
+            indexes = range(len(self.inputs) + 1)
+            for m in self.maps:
+                args.extend(['-map', m.format(*indexes)])
+        for option, value in self.opts + self.metadata:
+            args.append(option)
+            if value is not None:
+                args.append(value)
+        return args
+
+
 class FFmpegPostProcessor(PostProcessor):
     def __init__(self, downloader=None):
         PostProcessor.__init__(self, downloader)
@@ -107,13 +232,9 @@ class FFmpegPostProcessor(PostProcessor):
 
                 self._paths = dict(
                     (p, os.path.join(location, p)) for p in programs)
-                self._versions = dict(
-                    (p, get_exe_version(self._paths[p], args=['-version']))
-                    for p in programs)
-        if self._versions is None:
-            self._versions = dict(
-                (p, get_exe_version(p, args=['-version'])) for p in programs)
+        if self._paths is None:
             self._paths = dict((p, p) for p in programs)
+        self._versions = self._get_exe_versions(self._paths)
 
         if prefer_ffmpeg:
             prefs = ('ffmpeg', 'avconv')
@@ -133,6 +254,46 @@ class FFmpegPostProcessor(PostProcessor):
                 self.probe_basename = p
                 break
 
+    _VERSIONS_CACHE_SECTION = 'ffmpeg-versions'
+    _VERSIONS_CACHE_MAX_SIZE = 64 * 1024
+
+    def _get_exe_versions(self, paths):
+        """
+        Run the executables to find out their versions, unless they have
+        already been run in this process or the cache has their versions.
+        The executables the paths resolve to, with their modification times
+        and sizes, are part of the key: upgrades are noticed.
+        """
+        executables = []
+        for p, path in sorted(paths.items()):
+            exe = _find_executable(path)
+            try:
+                st = os.stat(exe) if exe else None
+            except OSError:
+                st = None
+            executables.append(
+                [p, path, exe, st and st.st_mtime, st and st.st_size])
+        key = hashlib.sha1(json.dumps(
+            [compat_getenv('PATH'), executables]).encode('utf-8')).hexdigest()
+
+        versions = _exe_versions.get(key)
+        if versions is not None:
+            return dict(versions)
+        # FFmpegFD passes itself as the downloader, it has no cache
+        cache = getattr(self._downloader, 'cache', None)
+        if cache:
+            cache.set_policy(
+                self._VERSIONS_CACHE_SECTION, max_size=self._VERSIONS_CACHE_MAX_SIZE)
+            versions = cache.load(self._VERSIONS_CACHE_SECTION, key)
+        if not isinstance(versions, dict) or set(versions) != set(paths):
+            versions = dict(
+                (p, get_exe_version(path, args=['-version']))
+                for p, path in paths.items())
+            if cache:
+                cache.store(self._VERSIONS_CACHE_SECTION, key, versions)
+        _exe_versions[key] = versions
+        return dict(versions)
+
     @property
     def available(self):
         return self.basename is not None
@@ -149,28 +310,93 @@ class FFmpegPostProcessor(PostProcessor):
     def probe_executable(self):
         return self._paths[self.probe_basename]
 
-    def get_audio_codec(self, path):
+    def probe(self, path):
+        """
+        Return what ffprobe or avprobe finds in the media file at path, as
+        {'container': ..., 'duration': ..., 'bitrate': ..., 'streams': [...]}
+        (see parse_probe_output), None if it cannot be probed. The result
+        is reused until the file changes.
+        """
         if not self.probe_available:
             raise PostProcessingError('ffprobe or avprobe not found. Please install one.')
+        try:
+            st = os.stat(encodeFilename(path))
+        except OSError:
+            return None
+        key = (os.path.abspath(path), st.st_size, st.st_mtime, st.st_ino)
+        with _probe_results_lock:
+            result = _probe_results.get(key, (None, None))[0]
+            if result is not None:
+                _probe_results[key] = (result, next(_probe_ticks))
+        if result is None:
+            result = self._run_probe(path)
+            if result is None:
+                return None
+            with _probe_results_lock:
+                _probe_results[key] = (result, next(_probe_ticks))
+                if len(_probe_results) > _PROBE_RESULTS_SIZE:
+                    oldest = min(_probe_results, key=lambda k: _probe_results[k][1])
+                    del _probe_results[oldest]
+        # Callers are free to modify what they get
+        return copy.deepcopy(result)
+
+    def _run_probe(self, path):
         try:
             cmd = [
                 encodeFilename(self.probe_executable, True),
+                encodeArgument('-of'), encodeArgument('json'),
+                encodeArgument('-show_format'),
                 encodeArgument('-show_streams'),
                 encodeFilename(self._ffmpeg_filename_argument(path), True)]
             if self._downloader.params.get('verbose', False):
-                self._downloader.to_screen('[debug] %s command line: %s' % (self.basename, shell_quote(cmd)))
+                self._downloader.to_screen('[debug] %s command line: %s' % (self.probe_basename, shell_quote(cmd)))
             handle = subprocess.Popen(cmd, stderr=compat_subprocess_get_DEVNULL(), stdout=subprocess.PIPE, stdin=subprocess.PIPE)
             output = handle.communicate()[0]
             if handle.wait() != 0:
                 return None
         except (IOError, OSError):
             return None
-        audio_codec = None
-        for line in output.decode('ascii', 'ignore').split('\n'):
-            if line.startswith('codec_name='):
-                audio_codec = line.split('=')[1].strip()
-            elif line.strip() == 'codec_type=audio' and audio_codec is not None:
-                return audio_codec
+        return self.parse_probe_output(output)
+
+    @staticmethod
+    def parse_probe_output(output):
+        """ Parse the JSON output of ffprobe/avprobe -show_format -show_streams """
+        try:
+            data = json.loads(output.decode('utf-8', 'replace'))
+        except ValueError:
+            return None
+        if not isinstance(data, dict):
+            return None
+        fmt = data.get('format') or {}
+        streams = []
+        for stream in data.get('streams') or []:
+            streams.append({
+                'index': int_or_none(stream.get('index')),
+                # audio, video, subtitle, data or attachment
+                'type': stream.get('codec_type'),
+                'codec': stream.get('codec_name'),
+                'duration': float_or_none(stream.get('duration')),
+                'bitrate': int_or_none(stream.get('bit_rate')),
+                'width': int_or_none(stream.get('width')),
+                'height': int_or_none(stream.get('height')),
+                'sample_rate': int_or_none(stream.get('sample_rate')),
+                'channels': int_or_none(stream.get('channels')),
+            })
+        return {
+            # Comma separated names of the format, like "mov,mp4,m4a,3gp,3g2,mj2"
+            'container': fmt.get('format_name'),
+            'duration': float_or_none(fmt.get('duration')),
+            'bitrate': int_or_none(fmt.get('bit_rate')),
+            'streams': streams,
+        }
+
+    def get_audio_codec(self, path):
+        media = self.probe(path)
+        if media is None:
+            return None
+        for stream in media['streams']:
+            if stream['type'] == 'audio':
+                return stream['codec']
         return None
 
     def run_ffmpeg_multiple_files(self, input_paths, out_path, opts):
@@ -205,6 +431,69 @@ class FFmpegPostProcessor(PostProcessor):
     def run_ffmpeg(self, path, out_path, opts):
         self.run_ffmpeg_multiple_files([path], out_path, opts)
 
+    def copy_plan(self, info):
+        """
+        Return the FFmpegCopyPlan of what run() would do to info, None if
+        it does something else than copying the streams with ffmpeg
+        """
+        return None
+
+    def run_copy_plan(self, plan, info):
+        """ Carry out plan on info['filepath'] and return like run() """
+        if plan.empty:
+            return [], info
+        filename = info['filepath']
+        temp_filename = prepend_extension(filename, 'temp')
+        for note in plan.notes:
+            self._downloader.to_screen(note)
+        self.run_ffmpeg_multiple_files(
+            [filename] + plan.inputs, temp_filename, plan.ffmpeg_args())
+        for fn in plan.remove_files:
+            os.remove(encodeFilename(fn))
+        os.remove(encodeFilename(filename))
+        os.rename(encodeFilename(temp_filename), encodeFilename(filename))
+        return plan.files_to_delete, info
+
+    def edit_mp4(self, filename, edit, dry_run=False):
+        """
+        Call edit with the MP4File of filename and save it, return False if
+        that cannot be done in place, the file is left as is then
+        """
+        try:
+            with MP4File(filename, readonly=dry_run) as mp4:
+                edit(mp4)
+                if dry_run:
+                    mp4.check()
+                else:
+                    mp4.save()
+        except MP4EditError as e:
+            self._report_edit_error(filename, e)
+            return False
+        return True
+
+    def edit_id3(self, filename, edit, dry_run=False):
+        """
+        Like edit_mp4, with the ID3Tag of an mp3 file. The dry run returns
+        False as well when the tag would outgrow its padding and ffmpeg is
+        available: copying the file is then left to ffmpeg, which rewrites
+        it once for all the postprocessors of the chain.
+        """
+        try:
+            tag = ID3Tag(filename)
+            edit(tag)
+            if dry_run:
+                return tag.fits or not self.available
+            tag.save()
+        except ID3Error as e:
+            self._report_edit_error(filename, e)
+            return False
+        return True
+
+    def _report_edit_error(self, filename, e):
+        if self._downloader.params.get('verbose', False):
+            self._downloader.to_screen(
+                '[debug] Cannot edit "%s" in place: %s' % (filename, error_to_compat_str(e)))
+
     def _ffmpeg_filename_argument(self, fn):
         # Always use 'file:' because the filename may contain ':' (ffmpeg
         # interprets that as a protocol) or can start with '-' (-- is broken in
@@ -241,7 +530,9 @@ class FFmpegExtractAudioPP(FFmpegPostProcessor):
             raise PostProcessingError('WARNING: unable to obtain file audio codec with ffprobe')
 
         more_opts = []
-        if self._preferredcodec == 'best' or self._preferredcodec == filecodec or (self._preferredcodec == 'm4a' and filecodec == 'aac'):
+        if (self._preferredcodec == 'best' or self._preferredcodec == filecodec
+                or (self._preferredcodec == 'm4a' and filecodec == 'aac')
+                or (self._preferredcodec == 'wav' and filecodec.startswith('pcm_'))):
             if filecodec == 'aac' and self._preferredcodec in ['m4a', 'best']:
                 # Lossless, but in another container
                 acodec = 'copy'
@@ -255,6 +546,11 @@ class FFmpegExtractAudioPP(FFmpegPostProcessor):
                     more_opts = ['-f', 'adts']
                 if filecodec == 'vorbis':
                     extension = 'ogg'
+            elif filecodec.startswith('pcm_') and self._preferredcodec == 'wav':
+                # Already uncompressed, only the container changes
+                acodec = 'copy'
+                extension = 'wav'
+                more_opts = ['-f', 'wav']
             else:
                 # MP3 otherwise.
                 acodec = 'libmp3lame'
@@ -341,13 +637,16 @@ class FFmpegVideoConvertorPP(FFmpegPostProcessor):
 
 class FFmpegEmbedSubtitlePP(FFmpegPostProcessor):
     def run(self, information):
+        return self.run_copy_plan(self.copy_plan(information), information)
+
+    def copy_plan(self, information):
         if information['ext'] not in ('mp4', 'webm', 'mkv'):
             self._downloader.to_screen('[ffmpeg] Subtitles can only be embedded in mp4, webm or mkv files')
-            return [], information
+            return FFmpegCopyPlan()
         subtitles = information.get('requested_subtitles')
         if not subtitles:
             self._downloader.to_screen('[ffmpeg] There aren\'t any subtitles to embed')
-            return [], information
+            return FFmpegCopyPlan()
 
         filename = information['filepath']
 
@@ -367,36 +666,66 @@ class FFmpegEmbedSubtitlePP(FFmpegPostProcessor):
                     self._downloader.to_screen('[ffmpeg] Only WebVTT subtitles can be embedded in webm files')
 
         if not sub_langs:
-            return [], information
-
-        input_files = [filename] + sub_filenames
+            return FFmpegCopyPlan()
 
-        opts = [
-            '-map', '0',
-            '-c', 'copy',
+        maps = [
+            '{0}',
             # Don't copy the existing subtitles, we may be running the
             # postprocessor a second time
-            '-map', '-0:s',
+            '-{0}:s',
         ]
+        opts = []
+        metadata = []
         if information['ext'] == 'mp4':
-            opts += ['-c:s', 'mov_text']
+            opts.append(('-c:s', 'mov_text'))
         for (i, lang) in enumerate(sub_langs):
-            opts.extend(['-map', '%d:0' % (i + 1)])
+            maps.append('{%d}:0' % (i + 1))
             lang_code = ISO639Utils.short2long(lang)
             if lang_code is not None:
-                opts.extend(['-metadata:s:s:%d' % i, 'language=%s' % lang_code])
-
-        temp_filename = prepend_extension(filename, 'temp')
-        self._downloader.to_screen('[ffmpeg] Embedding subtitles in \'%s\'' % filename)
-        self.run_ffmpeg_multiple_files(input_files, temp_filename, opts)
-        os.remove(encodeFilename(filename))
-        os.rename(encodeFilename(temp_filename), encodeFilename(filename))
+                metadata.append(('-metadata:s:s:%d' % i, 'language=%s' % lang_code))
 
-        return sub_filenames, information
+        return FFmpegCopyPlan(
+            ['[ffmpeg] Embedding subtitles in \'%s\'' % filename],
+            sub_filenames, maps, opts, metadata, files_to_delete=sub_filenames)
 
 
 class FFmpegMetadataPP(FFmpegPostProcessor):
+    # The tags written in place for the metadata fields of ffmpeg
+    _ID3_FRAMES = {
+        'title': b'TIT2',
+        'date': b'TDRC',
+        'track': b'TRCK',
+        'artist': b'TPE1',
+        'genre': b'TCON',
+        'album': b'TALB',
+        'album_artist': b'TPE2',
+        'disc': b'TPOS',
+    }
+    _ITUNES_ITEMS = {
+        'title': b'\xa9nam',
+        'date': b'\xa9day',
+        'description': b'desc',
+        'comment': b'\xa9cmt',
+        'artist': b'\xa9ART',
+        'genre': b'\xa9gen',
+        'album': b'\xa9alb',
+        'album_artist': b'aART',
+    }
+
     def run(self, info):
+        metadata = self._get_metadata(info)
+        if metadata and self._tag_in_place(info, metadata):
+            return [], info
+        return self.run_copy_plan(self._ffmpeg_copy_plan(info, metadata), info)
+
+    def copy_plan(self, info):
+        metadata = self._get_metadata(info)
+        # run() writes the tags itself when it can
+        if metadata and self._tag_in_place(info, metadata, dry_run=True):
+            return None
+        return self._ffmpeg_copy_plan(info, metadata)
+
+    def _get_metadata(self, info):
         metadata = {}
 
         def add(meta_list, info_list=None):
@@ -422,39 +751,67 @@ class FFmpegMetadataPP(FFmpegPostProcessor):
         add('album')
         add('album_artist')
         add('disc', 'disc_number')
+        return metadata
 
+    def _tag_in_place(self, info, metadata, dry_run=False):
+        filename = info['filepath']
+        metadata = sorted((name, compat_str(value)) for name, value in metadata.items())
+        if info['ext'] == 'mp3':
+            def edit(tag):
+                for name, value in metadata:
+                    if name in self._ID3_FRAMES:
+                        tag.set(self._ID3_FRAMES[name], text_frame(value))
+                    elif name == 'comment':
+                        tag.set(b'COMM', comment_frame(value))
+                    else:
+                        tag.set(b'TXXX', user_text_frame(name, value))
+            done = self.edit_id3(filename, edit, dry_run)
+        elif info['ext'] in ('m4a', 'mp4', 'm4v', 'mov'):
+            items = []
+            for name, value in metadata:
+                if name in ('track', 'disc'):
+                    number, _, total = value.partition('/')
+                    number, total = int_or_none(number), int_or_none(total) or 0
+                    if number is not None and 0 <= number <= 0xffff and total <= 0xffff:
+                        items.append(itunes_number_item(
+                            b'trkn' if name == 'track' else b'disk', number, total))
+                elif name in self._ITUNES_ITEMS:
+                    items.append(itunes_item(self._ITUNES_ITEMS[name], value))
+            done = self.edit_mp4(filename, lambda mp4: set_itunes_items(mp4.moov, items), dry_run)
+        else:
+            return False
+        if done and not dry_run:
+            self._downloader.to_screen('[metadata] Added metadata to \'%s\'' % filename)
+        return done
+
+    def _ffmpeg_copy_plan(self, info, metadata):
         if not metadata:
             self._downloader.to_screen('[ffmpeg] There isn\'t any metadata to add')
-            return [], info
-
-        filename = info['filepath']
-        temp_filename = prepend_extension(filename, 'temp')
+            return FFmpegCopyPlan()
 
+        opts = []
         if info['ext'] == 'm4a':
-            options = ['-vn', '-acodec', 'copy']
-        else:
-            options = ['-c', 'copy']
+            opts.append(('-vn', None))
 
-        for (name, value) in metadata.items():
-            options.extend(['-metadata', '%s=%s' % (name, value)])
-
-        self._downloader.to_screen('[ffmpeg] Adding metadata to \'%s\'' % filename)
-        self.run_ffmpeg(filename, temp_filename, options)
-        os.remove(encodeFilename(filename))
-        os.rename(encodeFilename(temp_filename), encodeFilename(filename))
-        return [], info
+        return FFmpegCopyPlan(
+            ['[ffmpeg] Adding metadata to \'%s\'' % info['filepath']], opts=opts,
+            metadata=[('-metadata', '%s=%s' % (name, value)) for name, value in metadata.items()])
 
 
 class FFmpegMergerPP(FFmpegPostProcessor):
     def run(self, info):
         filename = info['filepath']
         temp_filename = prepend_extension(filename, 'temp')
-        args = ['-c', 'copy', '-map', '0:v:0', '-map', '1:a:0']
         self._downloader.to_screen('[ffmpeg] Merging formats into "%s"' % filename)
-        self.run_ffmpeg_multiple_files(info['__files_to_merge'], temp_filename, args)
+        self.merge(info['__files_to_merge'], temp_filename)
         os.rename(encodeFilename(temp_filename), encodeFilename(filename))
         return info['__files_to_merge'], info
 
+    def merge(self, input_paths, out_path):
+        """ Write the video of the first file and the audio of the second one to out_path """
+        args = ['-c', 'copy', '-map', '0:v:0', '-map', '1:a:0']
+        self.run_ffmpeg_multiple_files(input_paths, out_path, args)
+
     def can_merge(self):
         # TODO: figure out merge-capable ffmpeg version
         if self.basename != 'avconv':
@@ -475,54 +832,96 @@ class FFmpegMergerPP(FFmpegPostProcessor):
 
 class FFmpegFixupStretchedPP(FFmpegPostProcessor):
     def run(self, info):
-        stretched_ratio = info.get('stretched_ratio')
-        if stretched_ratio is None or stretched_ratio == 1:
+        if self._fix_in_place(info):
             return [], info
+        return self.run_copy_plan(self._ffmpeg_copy_plan(info), info)
 
-        filename = info['filepath']
-        temp_filename = prepend_extension(filename, 'temp')
+    def copy_plan(self, info):
+        # run() sets the aspect ratio in place when it can
+        if self._fix_in_place(info, dry_run=True):
+            return None
+        return self._ffmpeg_copy_plan(info)
 
-        options = ['-c', 'copy', '-aspect', '%f' % stretched_ratio]
-        self._downloader.to_screen('[ffmpeg] Fixing aspect ratio in "%s"' % filename)
-        self.run_ffmpeg(filename, temp_filename, options)
+    def _fix_in_place(self, info, dry_run=False):
+        stretched_ratio = info.get('stretched_ratio')
+        if stretched_ratio is None or stretched_ratio == 1:
+            return False
+        filename = info['filepath']
+        if not self.edit_mp4(
+                filename, lambda mp4: set_display_aspect_ratio(mp4.moov, stretched_ratio), dry_run):
+            return False
+        if not dry_run:
+            self._downloader.to_screen('[fixup] Fixed aspect ratio in "%s"' % filename)
+        return True
 
-        os.remove(encodeFilename(filename))
-        os.rename(encodeFilename(temp_filename), encodeFilename(filename))
+    def _ffmpeg_copy_plan(self, info):
+        stretched_ratio = info.get('stretched_ratio')
+        if stretched_ratio is None or stretched_ratio == 1:
+            return FFmpegCopyPlan()
 
-        return [], info
+        return FFmpegCopyPlan(
+            ['[ffmpeg] Fixing aspect ratio in "%s"' % info['filepath']],
+            opts=[('-aspect', '%f' % stretched_ratio)])
 
 
 class FFmpegFixupM4aPP(FFmpegPostProcessor):
     def run(self, info):
-        if info.get('container') != 'm4a_dash':
+        if self._fix_in_place(info):
             return [], info
+        return self.run_copy_plan(self._ffmpeg_copy_plan(info), info)
 
-        filename = info['filepath']
-        temp_filename = prepend_extension(filename, 'temp')
+    def copy_plan(self, info):
+        # run() replaces the DASH brand in place when the file is not
+        # fragmented
+        if self._fix_in_place(info, dry_run=True):
+            return None
+        return self._ffmpeg_copy_plan(info)
 
-        options = ['-c', 'copy', '-f', 'mp4']
-        self._downloader.to_screen('[ffmpeg] Correcting container in "%s"' % filename)
-        self.run_ffmpeg(filename, temp_filename, options)
+    def _fix_in_place(self, info, dry_run=False):
+        if info.get('container') != 'm4a_dash':
+            return False
 
-        os.remove(encodeFilename(filename))
-        os.rename(encodeFilename(temp_filename), encodeFilename(filename))
+        def fix_brands(mp4):
+            if mp4.fragmented:
+                # Players need the remuxed file, which has a sample index
+                raise MP4EditError('Fragmented files must be remuxed')
+            major_brand, compatible_brands = mp4.brands
+            mp4.set_brands(
+                b'M4A ' if major_brand == b'dash' else major_brand,
+                [b'isom' if brand == b'dash' else brand for brand in compatible_brands])
 
-        return [], info
+        filename = info['filepath']
+        if not self.edit_mp4(filename, fix_brands, dry_run):
+            return False
+        if not dry_run:
+            self._downloader.to_screen('[fixup] Corrected container in "%s"' % filename)
+        return True
+
+    def _ffmpeg_copy_plan(self, info):
+        if info.get('container') != 'm4a_dash':
+            return FFmpegCopyPlan()
+
+        return FFmpegCopyPlan(
+            ['[ffmpeg] Correcting container in "%s"' % info['filepath']],
+            opts=[('-f', 'mp4')])
 
 
 class FFmpegFixupM3u8PP(FFmpegPostProcessor):
     def run(self, info):
-        filename = info['filepath']
-        if self.get_audio_codec(filename) == 'aac':
-            temp_filename = prepend_extension(filename, 'temp')
+        return self.run_copy_plan(self.copy_plan(info), info)
 
-            options = ['-c', 'copy', '-f', 'mp4', '-bsf:a', 'aac_adtstoasc']
-            self._downloader.to_screen('[ffmpeg] Fixing malformated aac bitstream in "%s"' % filename)
-            self.run_ffmpeg(filename, temp_filename, options)
+    def copy_plan(self, info):
+        filename = info['filepath']
+        media = self.probe(filename)
+        # The bitstream of the AAC audio in MPEG-TS files needs fixing,
+        # fragmented MP4 files are fine
+        if (media is None or 'mp4' in (media['container'] or '').split(',')
+                or self.get_audio_codec(filename) != 'aac'):
+            return FFmpegCopyPlan()
 
-            os.remove(encodeFilename(filename))
-            os.rename(encodeFilename(temp_filename), encodeFilename(filename))
-        return [], info
+        return FFmpegCopyPlan(
+            ['[ffmpeg] Fixing malformated aac bitstream in "%s"' % filename],
+            opts=[('-f', 'mp4'), ('-bsf:a', 'aac_adtstoasc')])
 
 
 class FFmpegSubtitlesConvertorPP(FFmpegPostProcessor):
@@ -534,9 +933,6 @@ class FFmpegSubtitlesConvertorPP(FFmpegPostProcessor):
         subs = info.get('requested_subtitles')
         filename = info['filepath']
         new_ext = self.format
-        new_format = new_ext
-        if new_format == 'vtt':
-            new_format = 'webvtt'
         if subs is None:
             self._downloader.to_screen('[ffmpeg] There aren\'t any subtitles to convert')
             return [], info
@@ -557,27 +953,14 @@ class FFmpegSubtitlesConvertorPP(FFmpegPostProcessor):
                     'You have requested to convert dfxp (TTML) subtitles into another format, '
                     'which results in style information loss')
 
-                dfxp_file = old_file
-                srt_file = subtitles_filename(filename, lang, 'srt')
-
-                with io.open(dfxp_file, 'rt', encoding='utf-8') as f:
-                    srt_data = dfxp2srt(f.read())
-
-                with io.open(srt_file, 'wt', encoding='utf-8') as f:
-                    f.write(srt_data)
-                old_file = srt_file
-
-                subs[lang] = {
-                    'ext': 'srt',
-                    'data': srt_data
-                }
-
-                if new_ext == 'srt':
-                    continue
-                else:
-                    sub_filenames.append(srt_file)
-
-            self.run_ffmpeg(old_file, new_file, ['-f', new_format])
+            try:
+                convert_subtitles(old_file, ext, new_file, new_ext)
+            except SubtitlesConversionError as e:
+                # ffmpeg converts the styling and syntax the converters don't
+                if self._downloader.params.get('verbose', False):
+                    self._downloader.to_screen(
+                        '[debug] Converting "%s" with ffmpeg: %s' % (old_file, error_to_compat_str(e)))
+                self._convert_with_ffmpeg(filename, lang, ext, old_file, new_file, sub_filenames)
 
             with io.open(new_file, 'rt', encoding='utf-8') as f:
                 subs[lang] = {
@@ -586,3 +969,22 @@ class FFmpegSubtitlesConvertorPP(FFmpegPostProcessor):
                 }
 
         return sub_filenames, info
+
+    def _convert_with_ffmpeg(self, filename, lang, ext, old_file, new_file, sub_filenames):
+        new_ext = self.format
+        if ext == 'dfxp' or ext == 'ttml' or ext == 'tt':
+            # ffmpeg reads the SRT dfxp2srt makes of them
+            srt_file = subtitles_filename(filename, lang, 'srt')
+
+            with io.open(old_file, 'rt', encoding='utf-8') as f:
+                srt_data = dfxp2srt(f.read())
+
+            with io.open(srt_file, 'wt', encoding='utf-8') as f:
+                f.write(srt_data)
+            old_file = srt_file
+
+            if new_ext == 'srt':
+                return
+            sub_filenames.append(srt_file)
+
+        self.run_ffmpeg(old_file, new_file, ['-f', 'webvtt' if new_ext == 'vtt' else new_ext])
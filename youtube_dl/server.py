@@ -0,0 +1,525 @@
+from __future__ import unicode_literals
+
+import copy
+import itertools
+import json
+import os
+import re
+import socket
+import threading
+import traceback
+
+from .compat import (
+    compat_http_server,
+    compat_queue,
+    compat_socketserver,
+    compat_str,
+    compat_urllib_parse_urlparse,
+)
+from .utils import (
+    DownloadError,
+    error_to_compat_str,
+    InfoJSONEncoder,
+    MaxDownloadsReached,
+)
+from .YoutubeDL import YoutubeDL
+
+
+# Parameters the opener is built from, a job overriding any of them gets its
+# own opener instead of the shared one
+_OPENER_PARAMS = ('geo_verification_proxy', 'proxy', 'socket_timeout', 'source_address')
+
+# The only parameters a job may set: format selection and download options.
+# Anything naming a file (outtmpl, cookiefile, download_archive, ...), a
+# command (postprocessors, external_downloader, ...) or belonging to the
+# process owning the server stays as the server was started.
+_JOB_PARAMS = _OPENER_PARAMS + (
+    'age_limit', 'allsubtitles', 'ap_mso', 'ap_password', 'ap_username',
+    'autonumber_size', 'autonumber_start', 'buffersize', 'continuedl',
+    'extract_flat', 'fixup', 'force_generic_extractor', 'forcedescription',
+    'forceduration', 'forcefilename', 'forceformat', 'forceid', 'forcejson',
+    'forcethumbnail', 'forcetitle', 'forceurl', 'format', 'format_sort',
+    'fragment_retries', 'geo_bypass', 'geo_bypass_country',
+    'hls_pipe_remux', 'hls_prefer_native', 'hls_use_mpegts', 'ignoreerrors',
+    'include_ads', 'keepvideo', 'live_merge', 'mark_watched', 'matchtitle',
+    'max_downloads', 'max_filesize', 'max_sleep_interval', 'max_views',
+    'merge_output_format', 'min_filesize', 'min_views', 'no_warnings',
+    'noplaylist', 'nooverwrites', 'nopart', 'noresizebuffer', 'password',
+    'playlist_items', 'playlistend', 'playlistrandom', 'playlistreverse',
+    'playliststart', 'prefer_free_formats', 'quiet', 'ratelimit',
+    'rejecttitle', 'restrictfilenames', 'retries', 'sidecar_downloads',
+    'simulate', 'skip_download', 'skip_unavailable_fragments',
+    'sleep_interval', 'subtitlesformat', 'subtitleslangs', 'twofactor',
+    'updatetime', 'username', 'videopassword', 'write_all_thumbnails',
+    'writeannotations', 'writeautomaticsub', 'writedescription',
+    'writeinfojson', 'writesubtitles', 'writethumbnail',
+    'youtube_include_dash_manifest',
+)
+
+
+def parse_serve_address(address):
+    """ Return (family, address) for a --serve argument or None if invalid """
+    if address.startswith('unix:'):
+        path = address[len('unix:'):]
+        if not path or not hasattr(socket, 'AF_UNIX'):
+            return None
+        return 'unix', path
+    mobj = re.match(r'^(?:(?P<host>\[[^\]]+\]|[^:]+):)?(?P<port>\d+)$', address)
+    if not mobj:
+        return None
+    host = (mobj.group('host') or 'localhost').strip('[]')
+    return 'tcp', (host, int(mobj.group('port')))
+
+
+class _JobLogger(object):
+    def __init__(self, job):
+        self._job = job
+
+    def debug(self, msg):
+        self._job.add_event({'type': 'log', 'level': 'debug', 'message': msg})
+
+    def warning(self, msg):
+        self._job.add_event({'type': 'log', 'level': 'warning', 'message': msg})
+
+    def error(self, msg):
+        self._job.add_event({'type': 'log', 'level': 'error', 'message': msg})
+
+
+class ServerJob(object):
+    """A single download job submitted to YoutubeDLServer
+
+    Every message and progress report of the job is recorded as an event,
+    a dictionary with at least a "type" key that can be sent as JSON.
+    Events are numbered in the order they happen; of the progress reports
+    of a download, only the latest one is kept, under a new number."""
+
+    def __init__(self, job_id, urls, options):
+        self.id = job_id
+        self.urls = urls
+        self.options = options
+        self.status = 'queued'
+        self.retcode = None
+        self.error = None
+        self.result = None
+        # (number, event) pairs
+        self.events = []
+        self.event_count = 0
+        self._cond = threading.Condition()
+
+    @property
+    def done(self):
+        return self.status in ('finished', 'error')
+
+    def _append_event(self, event):
+        # Must be called with _cond held
+        last = self.events[-1][1] if self.events else None
+        if (event['type'] == 'progress' and last is not None
+                and last['type'] == 'progress' and last.get('status') == 'downloading'
+                and last.get('filename') == event.get('filename')):
+            self.events.pop()
+        self.events.append((self.event_count, event))
+        self.event_count += 1
+        self._cond.notify_all()
+
+    def add_event(self, event):
+        with self._cond:
+            self._append_event(event)
+
+    def progress_hook(self, status):
+        event = dict(
+            (k, v) for k, v in status.items()
+            if isinstance(v, (compat_str, int, float, bool)) or v is None)
+        event['type'] = 'progress'
+        self.add_event(event)
+
+    def set_status(self, status, retcode=None, error=None):
+        with self._cond:
+            self.status = status
+            if retcode is not None:
+                self.retcode = retcode
+            if error is not None:
+                self.error = error
+            self._append_event({
+                'type': 'status',
+                'status': status,
+                'retcode': self.retcode,
+                'error': self.error,
+            })
+
+    def iter_events(self, start=0):
+        """
+        Yield the events of the job from the one numbered start, blocking
+        until it is done
+        """
+        idx = start
+        while True:
+            with self._cond:
+                while idx >= self.event_count and not self.done:
+                    self._cond.wait()
+                i = len(self.events)
+                while i > 0 and self.events[i - 1][0] >= idx:
+                    i -= 1
+                new_events = self.events[i:]
+                idx = self.event_count
+                done = self.done
+            for _, event in new_events:
+                yield event
+            if done:
+                return
+
+    def to_dict(self):
+        res = {
+            'id': self.id,
+            'urls': self.urls,
+            'status': self.status,
+            'retcode': self.retcode,
+            'error': self.error,
+            'events': self.event_count,
+        }
+        if self.result is not None:
+            res['result'] = self.result
+        return res
+
+
+class _ServerRequestHandler(compat_http_server.BaseHTTPRequestHandler):
+    server_version = 'youtube-dl'
+
+    def address_string(self):
+        # Unix domain socket connections have no (host, port) address
+        if isinstance(self.client_address, tuple) and self.client_address:
+            return compat_str(self.client_address[0])
+        return 'unix'
+
+    def log_message(self, format, *args):
+        ydl = self.server.ydl_server.ydl
+        if ydl.params.get('verbose'):
+            ydl.to_screen('[server] %s - %s' % (self.address_string(), format % args))
+
+    def _send_json(self, code, obj):
+        body = json.dumps(obj, cls=InfoJSONEncoder).encode('utf-8')
+        self.send_response(code)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', '%d' % len(body))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _send_error_json(self, code, message):
+        self._send_json(code, {'error': message})
+
+    def _get_job(self, job_id):
+        job = self.server.ydl_server.get_job(job_id)
+        if job is None:
+            self._send_error_json(404, 'No such job: %s' % job_id)
+        return job
+
+    def _check_origin(self):
+        # A page of another domain re-resolved to this server (DNS
+        # rebinding) sends its own name as Host and as Origin
+        host = self.headers.get('Host')
+        if not self.server.ydl_server.is_allowed_host(host):
+            self._send_error_json(403, 'Host %s is not allowed' % host)
+            return False
+        # Browsers send the Origin of the page making a cross-site request,
+        # which must not be able to control the server
+        origin = self.headers.get('Origin')
+        if origin is None:
+            return True
+        if host and compat_urllib_parse_urlparse(origin).netloc == host:
+            return True
+        self._send_error_json(403, 'Requests from %s are not allowed' % origin)
+        return False
+
+    def do_GET(self):
+        if not self._check_origin():
+            return
+        url = compat_urllib_parse_urlparse(self.path)
+        parts = [p for p in url.path.split('/') if p]
+        if parts == ['jobs']:
+            self._send_json(200, [
+                job.to_dict() for job in self.server.ydl_server.list_jobs()])
+        elif len(parts) == 2 and parts[0] == 'jobs':
+            job = self._get_job(parts[1])
+            if job is not None:
+                self._send_json(200, job.to_dict())
+        elif len(parts) == 3 and parts[0] == 'jobs' and parts[2] == 'events':
+            job = self._get_job(parts[1])
+            if job is None:
+                return
+            mobj = re.search(r'(?:^|&)since=(\d+)', url.query)
+            start = int(mobj.group(1)) if mobj else 0
+            # Newline-delimited JSON, the connection is closed when the job is
+            # done (HTTP/1.0 response without Content-Length)
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/x-ndjson')
+            self.end_headers()
+            try:
+                for event in job.iter_events(start):
+                    self.wfile.write(json.dumps(event, cls=InfoJSONEncoder).encode('utf-8') + b'\n')
+                    self.wfile.flush()
+            except (IOError, socket.error):
+                pass  # Client went away
+        else:
+            self._send_error_json(404, 'Unknown endpoint %s' % url.path)
+
+    def do_POST(self):
+        url = compat_urllib_parse_urlparse(self.path)
+        parts = [p for p in url.path.split('/') if p]
+        if parts != ['jobs']:
+            self._send_error_json(404, 'Unknown endpoint %s' % url.path)
+            return
+        if not self._check_origin():
+            return
+        # Unlike form submissions, JSON can't be posted cross-site without
+        # a preflight request
+        content_type = (self.headers.get('Content-Type') or '').partition(';')[0]
+        if content_type.strip().lower() != 'application/json':
+            self._send_error_json(415, 'Jobs must be sent as application/json')
+            return
+        try:
+            length = int(self.headers.get('Content-Length') or 0)
+            request = json.loads(self.rfile.read(length).decode('utf-8'))
+            if not isinstance(request, dict):
+                raise ValueError('job must be a JSON object')
+        except ValueError as e:
+            self._send_error_json(400, 'Invalid job: %s' % error_to_compat_str(e))
+            return
+        try:
+            job = self.server.ydl_server.submit(
+                request.get('urls') or request.get('url'),
+                request.get('options'))
+        except ValueError as e:
+            self._send_error_json(400, error_to_compat_str(e))
+            return
+        self._send_json(202, job.to_dict())
+
+
+class _ThreadingHTTPServer(compat_socketserver.ThreadingMixIn, compat_http_server.HTTPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+
+if hasattr(socket, 'AF_UNIX'):
+    class _ThreadingUnixHTTPServer(compat_socketserver.ThreadingMixIn, compat_socketserver.UnixStreamServer):
+        daemon_threads = True
+
+
+class YoutubeDLServer(object):
+    """Long-running server accepting download jobs through a JSON API
+
+    The server keeps one process warm: the opener (and with it the cookie
+    jar), the cache and the extractors of the YoutubeDL object passed in are
+    reused by every job.  Jobs are run by a pool of worker threads, each one
+    owning a YoutubeDL object sharing the opener of the main one, so that
+    extractor instances (and their caches) stay alive across jobs.
+
+    Endpoints:
+    POST /jobs              Submit a job, the body is a JSON object with
+                            "url" (or a list of "urls") and optional
+                            "options", YoutubeDL parameters overriding the
+                            ones the server was started with (only format
+                            selection and download options, see
+                            _JOB_PARAMS). It must be sent with
+                            "Content-Type: application/json".
+    GET /jobs               List all jobs.
+    GET /jobs/ID            Status of a job.
+    GET /jobs/ID/events     Stream the events of a job as newline-delimited
+                            JSON until the job is done. Pass ?since=N to skip
+                            the first N events.
+
+    Only the last MAX_FINISHED_JOBS finished jobs are kept.
+
+    Requests from web pages of other origins (with a foreign Origin header)
+    are rejected, and so are TCP requests whose Host header is not an IP
+    address, localhost or the host name the server is bound to.
+    """
+
+    MAX_FINISHED_JOBS = 100
+
+    def __init__(self, ydl, address, workers=4):
+        self.ydl = ydl
+        self.address = address
+        self.workers = max(1, workers)
+        self._jobs = {}
+        self._jobs_lock = threading.Lock()
+        self._job_ids = itertools.count(1)
+        self._queue = compat_queue.Queue()
+        self._httpd = None
+
+    def _make_httpd(self):
+        family, address = self.address
+        if family == 'unix':
+            if os.path.exists(address):
+                os.remove(address)
+            httpd = _ThreadingUnixHTTPServer(address, _ServerRequestHandler)
+        else:
+            httpd = _ThreadingHTTPServer(address, _ServerRequestHandler)
+        httpd.ydl_server = self
+        return httpd
+
+    def is_allowed_host(self, host):
+        """ Whether a request with this Host header may be served """
+        family, address = self.address
+        if family == 'unix':
+            # Web pages can't connect to unix domain sockets
+            return True
+        mobj = re.match(r'^(?:(?P<ip6>\[[^\]]+\])|(?P<name>[^:]+))(?::(?P<port>\d+))?$', host or '')
+        if not mobj or int(mobj.group('port') or 80) != self.server_address[1]:
+            return False
+        if mobj.group('ip6'):
+            return True
+        name = mobj.group('name').lower()
+        return (name in ('localhost', address[0].lower())
+                or re.match(r'^\d+\.\d+\.\d+\.\d+$', name) is not None)
+
+    def get_job(self, job_id):
+        with self._jobs_lock:
+            return self._jobs.get(job_id)
+
+    def list_jobs(self):
+        with self._jobs_lock:
+            return sorted(self._jobs.values(), key=lambda job: int(job.id))
+
+    def submit(self, urls, options=None):
+        if isinstance(urls, compat_str):
+            urls = [urls]
+        if not urls or not isinstance(urls, list) or not all(isinstance(u, compat_str) for u in urls):
+            raise ValueError('A job needs a "url" string or a list of "urls"')
+        if options is None:
+            options = {}
+        if not isinstance(options, dict):
+            raise ValueError('Job "options" must be a JSON object')
+        for key in options:
+            if key not in _JOB_PARAMS:
+                raise ValueError('Option %s can not be set per job' % key)
+        with self._jobs_lock:
+            job = ServerJob(compat_str(next(self._job_ids)), urls, options)
+            self._jobs[job.id] = job
+        self._queue.put(job)
+        return job
+
+    def _make_worker_ydl(self):
+        ydl = YoutubeDL(dict(self.ydl.params), auto_init=False)
+        ydl.add_default_info_extractors()
+        self._share_opener(ydl)
+        return ydl
+
+    def _share_opener(self, ydl):
+        ydl._opener = self.ydl._opener
+        ydl.cookiejar = self.ydl.cookiejar
+        ydl._socket_timeout = self.ydl._socket_timeout
+
+    def _prepare_ydl(self, ydl, job):
+        params = dict(self.ydl.params)
+        params.update(job.options)
+        params.update({
+            'logger': _JobLogger(job),
+            'progress_hooks': [job.progress_hook],
+        })
+        ydl.params = params
+        ydl._download_retcode = 0
+        ydl._num_downloads = 0
+        ydl._progress_hooks = [job.progress_hook]
+        # Copies bound to the job, for its output and options
+        ydl._pps = []
+        for pp in self.ydl._pps:
+            ydl.add_post_processor(copy.copy(pp))
+        if any(key in job.options for key in _OPENER_PARAMS):
+            ydl._setup_opener()
+        else:
+            self._share_opener(ydl)
+
+    def _run_job(self, ydl, job):
+        job.set_status('running')
+        try:
+            self._prepare_ydl(ydl, job)
+            results = []
+            try:
+                for url in job.urls:
+                    res = ydl.extract_info(url)
+                    if res is not None:
+                        results.append(ydl.filter_requested_info(res))
+            except Exception:
+                # Not to leave background postprocessing to the next job
+                ydl.wait_for_postprocessing(raise_errors=False)
+                raise
+            ydl.wait_for_postprocessing()
+            try:
+                json.dumps(results, cls=InfoJSONEncoder)
+            except (TypeError, ValueError):
+                pass
+            else:
+                job.result = results
+            retcode = ydl._download_retcode
+            job.set_status('finished' if retcode == 0 else 'error', retcode=retcode)
+        except MaxDownloadsReached:
+            job.set_status('finished', retcode=101)
+        except DownloadError as e:
+            job.set_status('error', retcode=1, error=error_to_compat_str(e))
+        except Exception as e:
+            if self.ydl.params.get('verbose'):
+                self.ydl.to_stderr(traceback.format_exc())
+            job.set_status('error', retcode=1, error=error_to_compat_str(e))
+
+    def _worker(self):
+        ydl = self._make_worker_ydl()
+        while True:
+            job = self._queue.get()
+            if job is None:
+                break
+            self._run_job(ydl, job)
+            self._forget_finished_jobs()
+
+    def _forget_finished_jobs(self):
+        with self._jobs_lock:
+            finished = sorted(
+                (job for job in self._jobs.values() if job.done),
+                key=lambda job: int(job.id))
+            for job in finished[:max(0, len(finished) - self.MAX_FINISHED_JOBS)]:
+                del self._jobs[job.id]
+
+    def _start(self):
+        self._httpd = self._make_httpd()
+        for _ in range(self.workers):
+            t = threading.Thread(target=self._worker)
+            t.daemon = True
+            t.start()
+
+    def start(self):
+        """ Bind the socket and start serving in a background thread """
+        self._start()
+        t = threading.Thread(target=self._httpd.serve_forever)
+        t.daemon = True
+        t.start()
+
+    @property
+    def server_address(self):
+        return self._httpd.server_address
+
+    def shutdown(self):
+        for _ in range(self.workers):
+            self._queue.put(None)
+        if self._httpd is not None:
+            self._httpd.shutdown()
+            self._close()
+
+    def _close(self):
+        self._httpd.server_close()
+        family, address = self.address
+        if family == 'unix' and os.path.exists(address):
+            os.remove(address)
+        self._httpd = None
+
+    def serve_forever(self):
+        """ Serve jobs until interrupted """
+        self._start()
+        family, address = self.address
+        self.ydl.to_screen('[server] Listening on %s with %d workers' % (
+            address if family == 'unix' else '%s:%d' % self.server_address[:2],
+            self.workers))
+        try:
+            self._httpd.serve_forever()
+        finally:
+            for _ in range(self.workers):
+                self._queue.put(None)
+            self._close()
+        return 0
@@ -0,0 +1,293 @@
+from __future__ import unicode_literals
+
+import io
+import re
+import xml.etree.ElementTree
+
+from .utils import (
+    encodeFilename,
+    parse_dfxp_time_expr,
+    unescapeHTML,
+    YoutubeDLError,
+)
+
+
+class SubtitlesConversionError(YoutubeDLError):
+    """ Raised for subtitles with styling or syntax the converters don't support """
+    pass
+
+
+class Cue(object):
+    """
+    A subtitle cue, from start to end in milliseconds
+
+    text is WebVTT cue text: lines of text escaped with &amp;, &lt; and
+    &gt;, the only tags being <i>, <b> and <u> and their end tags.
+    """
+
+    __slots__ = ('start', 'end', 'text')
+
+    def __init__(self, start, end, text):
+        self.start = start
+        self.end = end
+        self.text = text
+
+
+_SRT_TIMING_RE = re.compile(
+    r'^(\d+):(\d\d):(\d\d)[,.](\d{3})\s*-->\s*(\d+):(\d\d):(\d\d)[,.](\d{3})\s*$')
+_VTT_TIMESTAMP = r'(?:(\d+):)?(\d\d):(\d\d)\.(\d{3})'
+_VTT_TIMING_RE = re.compile(r'^%s[ \t]+-->[ \t]+%s(?:[ \t]+(.*))?$' % (_VTT_TIMESTAMP, _VTT_TIMESTAMP))
+_ASS_TIME_RE = re.compile(r'^(\d+):(\d\d):(\d\d)\.(\d\d)$')
+_TAG_RE = re.compile(r'<(/?)([^\s>/.]*)[^>]*>')
+_STYLE_TAGS = ('i', 'b', 'u')
+_ASS_OVERRIDE_RE = re.compile(r'\{([^}]*)\}')
+
+# What ffmpeg writes before the events of ASS files
+ASS_HEADER = '''[Script Info]
+ScriptType: v4.00+
+PlayResX: 384
+PlayResY: 288
+
+[V4+ Styles]
+Format: Name, Fontname, Fontsize, PrimaryColour, SecondaryColour, OutlineColour, BackColour, Bold, Italic, Underline, StrikeOut, ScaleX, ScaleY, Spacing, Angle, BorderStyle, Outline, Shadow, Alignment, MarginL, MarginR, MarginV, Encoding
+Style: Default,Arial,16,&Hffffff,&Hffffff,&H0,&H0,0,0,0,0,100,100,0,0,1,1,0,2,10,10,10,0
+
+[Events]
+Format: Layer, Start, End, Style, Name, MarginL, MarginR, MarginV, Effect, Text
+'''
+
+
+def _ms(hours, minutes, seconds, fraction):
+    return ((int(hours or 0) * 60 + int(minutes)) * 60 + int(seconds)) * 1000 + int(fraction)
+
+
+def _escape(text):
+    return text.replace('&', '&amp;').replace('<', '&lt;').replace('>', '&gt;')
+
+
+def _unescape(text):
+    return text.replace('&lt;', '<').replace('&gt;', '>').replace('&amp;', '&')
+
+
+def _cue_text(text, escaped):
+    """
+    The cue text of SRT text, or WebVTT text if escaped, raising
+    SubtitlesConversionError for other tags than <i>, <b> and <u>
+    """
+    out = []
+    pos = 0
+    for mobj in _TAG_RE.finditer(text):
+        closing, name = mobj.group(1), mobj.group(2).lower()
+        if name not in _STYLE_TAGS or mobj.group(0) != '<%s%s>' % (closing, mobj.group(2)):
+            raise SubtitlesConversionError('Unsupported tag %s' % mobj.group(0))
+        out.append(text[pos:mobj.start()])
+        out.append('<%s%s>' % (closing, name))
+        pos = mobj.end()
+    out.append(text[pos:])
+    for i in range(0, len(out), 2):
+        segment = out[i]
+        if escaped:
+            segment = unescapeHTML(segment)
+        elif '{\\' in segment:
+            # ASS override tags, which ffmpeg interprets
+            raise SubtitlesConversionError('Unsupported override tags in "%s"' % segment)
+        out[i] = _escape(segment)
+    return ''.join(out)
+
+
+def _blocks(lines):
+    """ Group lines into blocks separated by blank lines """
+    block = []
+    for line in lines:
+        line = line.rstrip('\r\n')
+        if line.strip():
+            block.append(line)
+        elif block:
+            yield block
+            block = []
+    if block:
+        yield block
+
+
+def parse_srt(lines):
+    """ Generate the cues of the lines of an SRT file """
+    for block in _blocks(lines):
+        if not _SRT_TIMING_RE.match(block[0]):
+            # Cue number
+            block = block[1:]
+        mobj = _SRT_TIMING_RE.match(block[0]) if block else None
+        if not mobj:
+            raise SubtitlesConversionError('Invalid SRT cue %r' % '\n'.join(block))
+        times = mobj.groups()
+        yield Cue(_ms(*times[:4]), _ms(*times[4:]), _cue_text('\n'.join(block[1:]), False))
+
+
+def parse_vtt(lines):
+    """ Generate the cues of the lines of a WebVTT file """
+    blocks = _blocks(lines)
+    header = next(blocks, None)
+    if not header or not header[0].lstrip('\ufeff').startswith('WEBVTT'):
+        raise SubtitlesConversionError('Not a WebVTT file')
+    for block in blocks:
+        if block[0].startswith('NOTE'):
+            continue
+        if '-->' not in block[0]:
+            if block[0].startswith(('STYLE', 'REGION')):
+                raise SubtitlesConversionError('Unsupported WebVTT %s block' % block[0].split()[0])
+            # Cue identifier
+            block = block[1:]
+        mobj = _VTT_TIMING_RE.match(block[0]) if block else None
+        if not mobj:
+            raise SubtitlesConversionError('Invalid WebVTT cue %r' % '\n'.join(block))
+        times = mobj.groups()
+        if times[8]:
+            raise SubtitlesConversionError('Unsupported cue settings %s' % times[8])
+        yield Cue(_ms(*times[:4]), _ms(*times[4:8]), _cue_text('\n'.join(block[1:]), True))
+
+
+def _ass_cue_text(text):
+    out = []
+    pos = 0
+    for mobj in _ASS_OVERRIDE_RE.finditer(text):
+        out.append(_escape(text[pos:mobj.start()]))
+        for override in mobj.group(1).split('\\')[1:]:
+            if len(override) != 2 or override[0] not in _STYLE_TAGS or override[1] not in '01':
+                raise SubtitlesConversionError('Unsupported override tag \\%s' % override)
+            out.append('<%s%s>' % ('' if override[1] == '1' else '/', override[0]))
+        pos = mobj.end()
+    out.append(_escape(text[pos:]))
+    text = ''.join(out).replace('\\N', '\n').replace('\\n', '\n').replace('\\h', '\xa0')
+    if '\\' in text or '{' in text:
+        raise SubtitlesConversionError('Unsupported ASS text "%s"' % text)
+    return text
+
+
+def _ass_ms(mobj):
+    hours, minutes, seconds, centiseconds = mobj.groups()
+    return _ms(hours, minutes, seconds, int(centiseconds) * 10)
+
+
+def parse_ass(lines):
+    """ Generate the cues of the Dialogue events of the lines of an ASS file """
+    fields = None
+    section = None
+    for line in lines:
+        line = line.strip()
+        if line.startswith('['):
+            section = line.lower()
+            continue
+        if section != '[events]':
+            continue
+        key, _, value = line.partition(':')
+        if key == 'Format':
+            fields = [f.strip().lower() for f in value.split(',')]
+        elif key == 'Dialogue':
+            if not fields or fields[-1] != 'text':
+                raise SubtitlesConversionError('Invalid ASS events format')
+            event = dict(zip(fields, value.lstrip().split(',', len(fields) - 1)))
+            start, end = [_ASS_TIME_RE.match(event.get(f, '').strip()) for f in ('start', 'end')]
+            if not start or not end:
+                raise SubtitlesConversionError('Invalid ASS event %r' % line)
+            yield Cue(_ass_ms(start), _ass_ms(end), _ass_cue_text(event['text']))
+
+
+def parse_ttml(f):
+    """
+    Generate the cues of the p elements of the TTML (DFXP) file object f,
+    dropping their styling like dfxp2srt
+    """
+    def text(element):
+        out = [element.text or '']
+        for child in element:
+            if child.tag == 'br' or child.tag.endswith('}br'):
+                out.append('\n')
+            else:
+                out.append(text(child))
+            out.append(child.tail or '')
+        return ''.join(out)
+
+    found = False
+    try:
+        for _, element in xml.etree.ElementTree.iterparse(f):
+            if element.tag != 'p' and not element.tag.endswith('}p'):
+                continue
+            found = True
+            begin = parse_dfxp_time_expr(element.attrib.get('begin'))
+            end = parse_dfxp_time_expr(element.attrib.get('end'))
+            if not end:
+                dur = parse_dfxp_time_expr(element.attrib.get('dur'))
+                end = begin + dur if begin is not None and dur else None
+            if begin is not None and end:
+                yield Cue(
+                    int(round(begin * 1000)), int(round(end * 1000)), _escape(text(element).strip()))
+            element.clear()
+    except xml.etree.ElementTree.ParseError as e:
+        raise SubtitlesConversionError('Invalid TTML file: %s' % e)
+    if not found:
+        raise SubtitlesConversionError('Invalid dfxp/TTML subtitle')
+
+
+def _timestamp(ms, separator):
+    return '%02d:%02d:%02d%s%03d' % (ms // 3600000, ms // 60000 % 60, ms // 1000 % 60, separator, ms % 1000)
+
+
+def write_srt(cues, f):
+    for index, cue in enumerate(cues, 1):
+        f.write('%d\n%s --> %s\n%s\n\n' % (
+            index, _timestamp(cue.start, ','), _timestamp(cue.end, ','), _unescape(cue.text)))
+
+
+def write_vtt(cues, f):
+    f.write('WEBVTT\n\n')
+    for cue in cues:
+        f.write('%s --> %s\n%s\n\n' % (
+            _timestamp(cue.start, '.'), _timestamp(cue.end, '.'), cue.text))
+
+
+def _ass_time(ms):
+    cs = (ms + 5) // 10
+    return '%d:%02d:%02d.%02d' % (cs // 360000, cs // 6000 % 60, cs // 100 % 60, cs % 100)
+
+
+def write_ass(cues, f):
+    f.write(ASS_HEADER)
+    for cue in cues:
+        text = re.sub(
+            r'<(/?)([ibu])>', lambda m: '{\\%s%d}' % (m.group(2), 0 if m.group(1) else 1), cue.text)
+        f.write('Dialogue: 0,%s,%s,Default,,0,0,0,,%s\n' % (
+            _ass_time(cue.start), _ass_time(cue.end), _unescape(text).replace('\n', '\\N')))
+
+
+PARSERS = {
+    'srt': parse_srt,
+    'vtt': parse_vtt,
+    'ass': parse_ass,
+    'dfxp': parse_ttml,
+    'ttml': parse_ttml,
+    'tt': parse_ttml,
+}
+
+WRITERS = {
+    'srt': write_srt,
+    'vtt': write_vtt,
+    'ass': write_ass,
+}
+
+
+def convert_subtitles(in_path, in_format, out_path, out_format):
+    """
+    Convert the subtitles of in_path to out_path cue by cue, raising
+    SubtitlesConversionError when it cannot be done (out_path may be left
+    incomplete then)
+    """
+    parse, write = PARSERS.get(in_format), WRITERS.get(out_format)
+    if parse is None or write is None:
+        raise SubtitlesConversionError(
+            'Cannot convert %s subtitles to %s' % (in_format, out_format))
+    binary = parse is parse_ttml
+    with io.open(encodeFilename(in_path), 'rb' if binary else 'rt', encoding=None if binary else 'utf-8') as inf:
+        with io.open(encodeFilename(out_path), 'wt', encoding='utf-8') as outf:
+            try:
+                write(parse(inf), outf)
+            except UnicodeDecodeError as e:
+                raise SubtitlesConversionError('Invalid subtitles: %s' % e)
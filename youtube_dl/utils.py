@@ -5,6 +5,7 @@ from __future__ import unicode_literals
 
 import base64
 import binascii
+import bisect
 import calendar
 import codecs
 import contextlib
@@ -30,6 +31,7 @@ import ssl
 import subprocess
 import sys
 import tempfile
+import threading
 import traceback
 import xml.etree.ElementTree
 import zlib
@@ -46,6 +48,7 @@ from .compat import (
     compat_kwargs,
     compat_os_name,
     compat_parse_qs,
+    compat_queue,
     compat_shlex_quote,
     compat_socket_create_connection,
     compat_str,
@@ -234,15 +237,19 @@ def write_json_file(obj, fn):
 
     try:
         with tf:
-            json.dump(obj, tf)
-        if sys.platform == 'win32':
-            # Need to remove existing file on Windows, else os.rename raises
-            # WindowsError or FileExistsError.
-            try:
-                os.unlink(fn)
-            except OSError:
-                pass
-        os.rename(tf.name, fn)
+            json.dump(obj, tf, cls=InfoJSONEncoder)
+        if hasattr(os, 'replace'):
+            # Atomic on all platforms, even if fn already exists
+            os.replace(tf.name, fn)
+        else:
+            if sys.platform == 'win32':
+                # Need to remove existing file on Windows, else os.rename raises
+                # WindowsError or FileExistsError.
+                try:
+                    os.unlink(fn)
+                except OSError:
+                    pass
+            os.rename(tf.name, fn)
     except Exception:
         try:
             os.remove(tf.name)
@@ -333,6 +340,99 @@ def xpath_attr(node, xpath, key, name=None, fatal=False, default=NO_DEFAULT):
     return n.attrib[key]
 
 
+class _XMLStreamElement(xml.etree.ElementTree.Element):
+    # Attribute tuples of the children compacted by parse_xml_stream, by tag
+    compacted = None
+
+
+class _XMLStreamBuilder(object):
+    def __init__(self, compact, prune_text):
+        self._builder = xml.etree.ElementTree.TreeBuilder(element_factory=_XMLStreamElement)
+        self._compact = compact
+        self._prune_text = prune_text
+        self._elements = []
+        # Depth inside a compacted element
+        self._skipped = 0
+
+    def doctype(self, name, pubid, system):
+        pass
+
+    def start(self, tag, attrib):
+        if self._skipped:
+            self._skipped += 1
+            return
+        if sys.version_info[0] < 3:
+            # python 2.x gives bytes for ASCII only text
+            attrib = dict(
+                (k, v.decode('utf-8') if isinstance(v, bytes) else v)
+                for k, v in attrib.items())
+        attributes = self._compact.get(tag.rpartition('}')[2])
+        if attributes is not None and self._elements:
+            parent = self._elements[-1]
+            if parent.compacted is None:
+                parent.compacted = {}
+            parent.compacted.setdefault(tag, []).append(
+                tuple(attrib.get(a) for a in attributes))
+            self._skipped = 1
+            return
+        self._elements.append(self._builder.start(tag, attrib))
+
+    def end(self, tag):
+        if self._skipped:
+            self._skipped -= 1
+            return
+        self._elements.pop()
+        return self._builder.end(tag)
+
+    def data(self, data):
+        if self._skipped:
+            return
+        if self._elements and self._elements[-1].tag.rpartition('}')[2] in self._prune_text:
+            return
+        if isinstance(data, bytes):
+            data = data.decode('utf-8')
+        self._builder.data(data)
+
+    def close(self):
+        return self._builder.close()
+
+
+def parse_xml_stream(chunks, compact={}, prune_text=()):
+    """
+    Parse the XML document given as an iterable of byte strings as they come,
+    so that neither its text nor the tree of elements it holds are kept whole.
+
+    compact maps local names of childless elements, e.g. the segments of a
+    timeline, to the attributes needed from them: such elements are not
+    built, the tuples of these attributes' values are kept by their parent
+    instead (see xml_compact_children). The text of the elements whose local
+    name is in prune_text is dropped.
+    """
+    parser = xml.etree.ElementTree.XMLParser(
+        target=_XMLStreamBuilder(compact, frozenset(prune_text)))
+    started = False
+    for chunk in chunks:
+        if not started:
+            # Nothing may precede the XML declaration
+            chunk = chunk.lstrip()
+            started = bool(chunk)
+        if chunk:
+            parser.feed(chunk)
+    return parser.close()
+
+
+def xml_compact_children(element, tag, attributes):
+    """
+    Return the tuples of the values of attributes of the children of element
+    with that tag, attributes being those given to parse_xml_stream() if it
+    compacted them
+    """
+    compacted = getattr(element, 'compacted', None)
+    if compacted and tag in compacted:
+        return compacted[tag]
+    return [tuple(child.get(a) for a in attributes) for child in element.findall(tag)]
+
+
 def get_element_by_id(id, html):
     """Return the content of the tag with the specified ID in the passed HTML document"""
     return get_element_by_attribute('id', id, html)
@@ -1693,12 +1793,30 @@ def month_by_abbreviation(abbrev):
         return None
 
 
+_XML_AMPERSAND_RE = r'&(?!amp;|lt;|gt;|apos;|quot;|#x[0-9a-fA-F]{,4};|#[0-9]{,4};)'
+
+
 def fix_xml_ampersands(xml_str):
     """Replace all the '&' by '&amp;' in XML"""
-    return re.sub(
-        r'&(?!amp;|lt;|gt;|apos;|quot;|#x[0-9a-fA-F]{,4};|#[0-9]{,4};)',
-        '&amp;',
-        xml_str)
+    return re.sub(_XML_AMPERSAND_RE, '&amp;', xml_str)
+
+
+def fix_xml_ampersands_stream(chunks):
+    """fix_xml_ampersands() for XML read as an iterable of byte strings"""
+    ampersand_re = re.compile(_XML_AMPERSAND_RE.encode('ascii'))
+    tail = b''
+    for chunk in chunks:
+        chunk = tail + chunk
+        # Keep an entity split between two chunks for the next one, the
+        # longest allowed is &#xXXXX;
+        amp = chunk.rfind(b'&', max(len(chunk) - 8, 0))
+        if amp != -1:
+            chunk, tail = chunk[:amp], chunk[amp:]
+        else:
+            tail = b''
+        yield ampersand_re.sub(b'&amp;', chunk)
+    if tail:
+        yield ampersand_re.sub(b'&amp;', tail)
 
 
 def setproctitle(title):
@@ -2007,6 +2125,178 @@ class InAdvancePagedList(PagedList):
         return res
 
 
+class WorkerJob(object):
+    """ A call submitted to a WorkerPool """
+
+    def __init__(self, func, args, kwargs):
+        self._func = func
+        self._args = args
+        self._kwargs = kwargs
+        self._done = threading.Event()
+        self._result = None
+        self._exception = None
+
+    def run(self):
+        try:
+            self._result = self._func(*self._args, **self._kwargs)
+        except BaseException as e:
+            self._exception = e
+        finally:
+            self._done.set()
+
+    def done(self):
+        return self._done.is_set()
+
+    def result(self):
+        """ Wait for the call to finish, return its result or raise its exception """
+        self._done.wait()
+        if self._exception is not None:
+            raise self._exception
+        return self._result
+
+
+class WorkerPool(object):
+    """
+    Run the calls submitted in at most `workers` daemon threads, which are
+    started as needed
+    """
+
+    def __init__(self, workers):
+        self.workers = workers
+        self._queue = compat_queue.Queue()
+        self._threads = []
+        self._lock = threading.Lock()
+
+    def submit(self, func, *args, **kwargs):
+        """ Queue func(*args, **kwargs) and return its WorkerJob """
+        job = WorkerJob(func, args, kwargs)
+        with self._lock:
+            if len(self._threads) < self.workers:
+                t = threading.Thread(target=self._work)
+                t.daemon = True
+                t.start()
+                self._threads.append(t)
+            self._queue.put(job)
+        return job
+
+    def _work(self):
+        while True:
+            job = self._queue.get()
+            if job is None:
+                break
+            job.run()
+
+    def shutdown(self):
+        """ Stop the threads once the calls queued are done """
+        with self._lock:
+            threads, self._threads = self._threads, []
+            for _ in threads:
+                self._queue.put(None)
+        for t in threads:
+            t.join()
+
+
+class DashFragmentList(object):
+    """
+    The fragments of a DASH representation, as a read-only sequence of
+    {'url': ..., 'duration': ...} dicts built on demand.
+
+    Segments are described by runs of (time, d, count) in timescale units as
+    found in a SegmentTimeline (d is None when unknown), and get their URL either from media_template
+    (a %-format string using Number, Time and Bandwidth) or from segment_urls.
+    initialization_url, if any, is the first fragment.
+    """
+
+    def __init__(self, base_url, runs, timescale=1, media_template=None,
+                 segment_urls=None, start_number=1, bandwidth=None,
+                 initialization_url=None):
+        self._base_url = base_url
+        self._timescale = timescale
+        self._media_template = media_template
+        self._segment_urls = segment_urls
+        self._start_number = start_number
+        self._bandwidth = bandwidth
+        self._initialization_url = initialization_url
+        self._run_starts = []
+        self._run_times = []
+        self._run_durations = []
+        self._segment_count = 0
+        for time, d, count in runs:
+            self._run_starts.append(self._segment_count)
+            self._run_times.append(time)
+            self._run_durations.append(d)
+            self._segment_count += count
+
+    def _fragment(self, index, time, d):
+        if self._segment_urls is not None:
+            url = self._segment_urls[index]
+        else:
+            url = self._media_template % {
+                'Time': time,
+                'Bandwidth': self._bandwidth,
+                'Number': self._start_number + index,
+            }
+        return {
+            'url': urljoin(self._base_url, url),
+            'duration': float_or_none(d, self._timescale),
+        }
+
+    def _segment(self, index):
+        run = bisect.bisect_right(self._run_starts, index) - 1
+        d = self._run_durations[run]
+        time = self._run_times[run] + (index - self._run_starts[run]) * (d or 0)
+        return self._fragment(index, time, d)
+
+    def __len__(self):
+        return self._segment_count + (1 if self._initialization_url is not None else 0)
+
+    def __getitem__(self, idx):
+        if isinstance(idx, slice):
+            return [self[i] for i in range(*idx.indices(len(self)))]
+        length = len(self)
+        if idx < 0:
+            idx += length
+        if not 0 <= idx < length:
+            raise IndexError('fragment index out of range')
+        if self._initialization_url is not None:
+            if idx == 0:
+                return {'url': urljoin(self._base_url, self._initialization_url)}
+            idx -= 1
+        return self._segment(idx)
+
+    def __iter__(self):
+        if self._initialization_url is not None:
+            yield {'url': urljoin(self._base_url, self._initialization_url)}
+        index = 0
+        runs = zip(self._run_times, self._run_durations, self._run_starts[1:] + [self._segment_count])
+        for time, d, end in runs:
+            while index < end:
+                yield self._fragment(index, time, d)
+                time += d or 0
+                index += 1
+
+    def __eq__(self, other):
+        if isinstance(other, (DashFragmentList, list)):
+            return len(self) == len(other) and list(self) == list(other)
+        return NotImplemented
+
+    def __ne__(self, other):
+        eq = self.__eq__(other)
+        return eq if eq is NotImplemented else not eq
+
+    def __repr__(self):
+        return '<%s of %d fragments>' % (self.__class__.__name__, len(self))
+
+
+class InfoJSONEncoder(json.JSONEncoder):
+    """ JSON encoder for info dicts, which may hold fragment sequences """
+
+    def default(self, o):
+        if isinstance(o, DashFragmentList):
+            return list(o)
+        return super(InfoJSONEncoder, self).default(o)
+
+
 def uppercase_escape(s):
     unicode_escape = codecs.getdecoder('unicode_escape')
     return re.sub(
@@ -2153,45 +2443,109 @@ def strip_jsonp(code):
         r'(?s)^[a-zA-Z0-9_.$]+\s*\(\s*(.*)\);?\s*?(?://[^\n]*)*$', r'\1', code)
 
 
+_JS_COMMENT_RE = r'/\*(?:(?!\*/).)*?\*/|//[^\n]*'
+_JS_SKIP_RE = r'\s*(?:{comment})?\s*'.format(comment=_JS_COMMENT_RE)
+_JS_INTEGER_TABLE = (
+    (re.compile(r'(?s)^(0[xX][0-9a-fA-F]+){skip}:?$'.format(skip=_JS_SKIP_RE)), 16),
+    (re.compile(r'(?s)^(0+[0-7]+){skip}:?$'.format(skip=_JS_SKIP_RE)), 8),
+)
+_JS_STRING_RE = (
+    r'"(?:[^"\\]*(?:\\\\|\\[\'"nurtbfx/\n]))*[^"\\]*"|'
+    r"'(?:[^'\\]*(?:\\\\|\\['\"nurtbfx/\n]))*[^'\\]*'")
+# Identifiers, strings and trailing commas are handled right away, the other
+# characters that may start something to rewrite are left to the slow path
+_JS_TOKEN_RE = re.compile(
+    r'(?s)(?P<identifier>[a-zA-Z_][.a-zA-Z_0-9]*)|(?P<string>%s)|'
+    r'(?P<comma>,(?=%s[\]}]))|[/0-9"\']' % (_JS_STRING_RE, _JS_SKIP_RE))
+_JS_COMMENT_MATCH_RE = re.compile(r'(?s)' + _JS_COMMENT_RE)
+_JS_INTEGER_RE = re.compile(r'0[xX][0-9a-fA-F]+|0+[0-7]+')
+_JS_SKIP_COLON_RE = re.compile(r'(?s){skip}:'.format(skip=_JS_SKIP_RE))
+_JS_DIGITS_RE = re.compile(r'[0-9]+')
+_JS_WORD_CHAR_RE = re.compile(r'\w')
+_JS_STRING_ESCAPE_RE = re.compile(r'(?s)\\.|"')
+_JS_STRING_ESCAPES = {
+    '"': '\\"',
+    "\\'": "'",
+    '\\\n': '',
+    '\\x': '\\u00',
+}
+
+
+def _js_integer_to_json(v):
+    for regex, base in _JS_INTEGER_TABLE:
+        im = regex.match(v)
+        if im:
+            i = int(im.group(1), base)
+            return '"%d":' % i if v.endswith(':') else '%d' % i
+    return None
+
+
+def _js_string_to_json(v):
+    if '\\' in v or '"' in v:
+        v = _JS_STRING_ESCAPE_RE.sub(
+            lambda m: _JS_STRING_ESCAPES.get(m.group(0), m.group(0)), v)
+    # Strings holding octal or hexadecimal integers become numbers
+    return (v[:1] == '0' and _js_integer_to_json(v)) or '"%s"' % v
+
+
 def js_to_json(code):
-    COMMENT_RE = r'/\*(?:(?!\*/).)*?\*/|//[^\n]*'
-    SKIP_RE = r'\s*(?:{comment})?\s*'.format(comment=COMMENT_RE)
-    INTEGER_TABLE = (
-        (r'(?s)^(0[xX][0-9a-fA-F]+){skip}:?$'.format(skip=SKIP_RE), 16),
-        (r'(?s)^(0+[0-7]+){skip}:?$'.format(skip=SKIP_RE), 8),
-    )
+    res = []
+    pos = 0
+    while True:
+        m = _JS_TOKEN_RE.search(code, pos)
+        if m is None:
+            res.append(code[pos:])
+            return ''.join(res)
+        start = m.start()
+        if start > pos:
+            res.append(code[pos:start])
+        kind = m.lastgroup
+        if kind == 'identifier':
+            v = m.group(0)
+            res.append(v if v in ('true', 'false', 'null') else '"%s"' % v)
+            pos = m.end()
+            continue
+        if kind == 'string':
+            pos = m.end()
+            res.append(_js_string_to_json(code[start + 1:pos - 1]))
+            continue
+        if kind == 'comma':
+            pos = start + 1
+            continue
 
-    def fix_kv(m):
-        v = m.group(0)
-        if v in ('true', 'false', 'null'):
-            return v
-        elif v.startswith('/*') or v.startswith('//') or v == ',':
-            return ""
-
-        if v[0] in ("'", '"'):
-            v = re.sub(r'(?s)\\.|"', lambda m: {
-                '"': '\\"',
-                "\\'": "'",
-                '\\\n': '',
-                '\\x': '\\u00',
-            }.get(m.group(0), m.group(0)), v[1:-1])
-
-        for regex, base in INTEGER_TABLE:
-            im = re.match(regex, v)
-            if im:
-                i = int(im.group(1), base)
-                return '"%d":' % i if v.endswith(':') else '%d' % i
-
-        return '"%s"' % v
-
-    return re.sub(r'''(?sx)
-        "(?:[^"\\]*(?:\\\\|\\['"nurtbfx/\n]))*[^"\\]*"|
-        '(?:[^'\\]*(?:\\\\|\\['"nurtbfx/\n]))*[^'\\]*'|
-        {comment}|,(?={skip}[\]}}])|
-        [a-zA-Z_][.a-zA-Z_0-9]*|
-        \b(?:0[xX][0-9a-fA-F]+|0+[0-7]+)(?:{skip}:)?|
-        [0-9]+(?={skip}:)
-        '''.format(comment=COMMENT_RE, skip=SKIP_RE), fix_kv, code)
+        pos = start
+        c = code[pos]
+        if c == '/':
+            m = _JS_COMMENT_MATCH_RE.match(code, pos)
+            if m:
+                pos = m.end()
+                continue
+        elif '0' <= c <= '9':
+            if c == '0' and (pos == 0 or not _JS_WORD_CHAR_RE.match(code[pos - 1])):
+                m = _JS_INTEGER_RE.match(code, pos)
+                if m:
+                    end = m.end()
+                    m = _JS_SKIP_COLON_RE.match(code, end)
+                    if m:
+                        end = m.end()
+                    res.append(_js_integer_to_json(code[pos:end]))
+                    pos = end
+                    continue
+            m = _JS_DIGITS_RE.match(code, pos)
+            v = m.group(0)
+            pos = m.end()
+            if _JS_SKIP_COLON_RE.match(code, pos):
+                # Integer object key
+                res.append(_js_integer_to_json(v) or '"%s"' % v)
+            else:
+                # Nothing else can start inside a run of digits
+                res.append(v)
+            continue
+
+        # Not the start of anything after all, e.g. the quote of a string with
+        # an invalid escape sequence: keep the character and go on after it
+        res.append(c)
+        pos += 1
 
 
 def qualities(quality_ids):